@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, BigInteger, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, BigInteger, DateTime, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
 
 class Category(Base):
     __tablename__ = "categories"
+    __table_args__ = (
+        # Навигация по дереву категорий магазина (GET /api/categories/tree)
+        Index("ix_categories_shop_parent", "user_id", "bot_id", "parent_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -17,8 +21,44 @@ class Category(Base):
     # sold_products relationship определен в модели SoldProduct через backref
     # При удалении категории category_id в sold_products устанавливается в NULL (ondelete="SET NULL")
 
+class SyncGroup(Base):
+    """
+    Группа синхронизации товара: копии одного товара в основном магазине и магазинах ботов
+    ссылаются на одну группу (Product.sync_group_id). Создается при создании товара (utils/sync_groups.py).
+    """
+    __tablename__ = "sync_groups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(BigInteger, index=True)  # ID владельца магазина
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SyncJob(Base):
+    """
+    Отложенная синхронизация группы товара в остальные магазины (utils/sync_queue.py).
+    Одна строка на группу: повторные правки до обработки схлопываются в нее (последняя запись побеждает).
+    """
+    __tablename__ = "sync_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sync_group_id = Column(Integer, ForeignKey("sync_groups.id"), nullable=False, unique=True)
+    user_id = Column(BigInteger, index=True)  # ID владельца магазина
+    product_id = Column(Integer, nullable=False)  # Последний измененный товар группы - источник для копий
+    action = Column(String, nullable=False, default="update")  # 'update' или 'create' (создать недостающие копии)
+    edits = Column(Integer, nullable=False, default=1)  # Сколько правок схлопнуто в задачу (и версия строки)
+    enqueued_at = Column(DateTime, default=datetime.utcnow)  # Первая необработанная правка (для метрики задержки)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Последняя правка
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # Неудачные попытки применения подряд
+    last_error = Column(Text, nullable=True)  # Ошибка последней неудачной попытки
+
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Выборка витрины: магазин, бот, без проданных, с учетом скрытых и категории
+        Index("ix_products_storefront", "user_id", "bot_id", "is_sold", "is_hidden", "category_id"),
+        # Не больше одной копии товара группы в каждом магазине (основной магазин - bot_id IS NULL -> 0);
+        # по этому же индексу одним запросом находятся все копии товара
+        Index("ux_products_sync_group_bot", "sync_group_id", text("coalesce(bot_id, 0)"), unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -30,6 +70,7 @@ class Product(Base):
     user_id = Column(BigInteger, index=True)  # ID пользователя Telegram
     bot_id = Column(Integer, ForeignKey("bots.id"), nullable=True, index=True)  # ID бота (для независимых магазинов)
     sync_product_id = Column(Integer, ForeignKey("products.id"), nullable=True, index=True)  # ID оригинального товара в основном магазине (для синхронизации)
+    sync_group_id = Column(Integer, ForeignKey("sync_groups.id"), nullable=True)  # Группа синхронизации: все копии товара в основном магазине и ботах
     is_hot_offer = Column(Boolean, default=False)  # Горящее предложение
     quantity = Column(Integer, default=0)  # Количество товара на складе
     is_sold = Column(Boolean, default=False)  # Продан ли товар (скрыт с витрины)
@@ -59,6 +100,10 @@ class Channel(Base):
 
 class Reservation(Base):
     __tablename__ = "reservations"
+    __table_args__ = (
+        # Занятое количество товара: SUM(quantity) активных резерваций читается из индекса
+        Index("ix_reservations_product_active", "product_id", "is_active", "reserved_until", "quantity"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), index=True)
@@ -67,6 +112,7 @@ class Reservation(Base):
     reserved_until = Column(DateTime, index=True)  # До какого времени зарезервировано
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)  # Активна ли резервация
+    quantity = Column(Integer, nullable=False, default=1, server_default="1")  # Зарезервированное количество
     
     product = relationship("Product", backref="reservations")
 
@@ -84,6 +130,59 @@ class ShopSettings(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class ShopSettingsChange(Base):
+    """
+    Изменение одного поля настроек магазина (utils/shop_settings_sync.py).
+    По событию изменение переносится только в строки настроек других магазинов владельца,
+    где значение поля отличается.
+    """
+    __tablename__ = "shop_settings_changes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(BigInteger, index=True)  # ID владельца магазина
+    bot_id = Column(Integer, nullable=True)  # Магазин, в котором изменили настройку (None - основной)
+    field = Column(String, nullable=False)  # Имя поля ShopSettings
+    old_value = Column(Text, nullable=True)  # Значения в JSON
+    new_value = Column(Text, nullable=True)
+    propagated_rows = Column(Integer, nullable=False, default=0)  # Сколько строк других магазинов изменено
+    changed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ReconcileCheckpoint(Base):
+    """
+    Владелец, сверенный запуском reconcile_catalog.py: пишется в той же транзакции,
+    что и исправления, поэтому прерванный запуск продолжается с тем же --run-id без повторов.
+    """
+    __tablename__ = "reconcile_checkpoints"
+    __table_args__ = (
+        Index("ux_reconcile_checkpoints_run_user", "run_id", "user_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String, nullable=False)  # Идентификатор запуска сверки
+    user_id = Column(BigInteger, nullable=False)  # ID владельца магазина
+    changes = Column(Integer, nullable=False, default=0)  # Сколько изменений применено
+    finished_at = Column(DateTime, default=datetime.utcnow)
+
+class CatalogDigest(Base):
+    """
+    Контрольная сумма каталога магазина (основного или бота) по синхронизируемым полям.
+    Поддерживается при записи (utils/catalog_digest.py); совпадение сумм основного магазина
+    и бота означает, что сверять их товары и категории не нужно.
+    """
+    __tablename__ = "catalog_digests"
+    __table_args__ = (
+        # Одна строка на магазин: bot_id = NULL (основной магазин) сводится к 0, как в ux_products_sync_group_bot
+        Index("ux_catalog_digests_shop", "user_id", text("coalesce(bot_id, 0)"), unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(BigInteger, nullable=False)  # ID владельца магазина
+    bot_id = Column(Integer, nullable=True)  # ID бота (None для основного магазина)
+    digest = Column(String(16), nullable=False)  # Сумма хэшей строк по модулю 2^64 (hex)
+    products_count = Column(Integer, nullable=False, default=0)  # Непроданных товаров в сумме
+    categories_count = Column(Integer, nullable=False, default=0)  # Категорий в сумме
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class ShopVisit(Base):
     __tablename__ = "shop_visits"
 
@@ -214,9 +313,37 @@ class Bot(Base):
     owner_user_id = Column(BigInteger, index=True)  # ID владельца (Telegram user_id)
     is_active = Column(Boolean, default=True)  # Активен ли бот
     direct_link_name = Column(String, nullable=True)  # Название Direct Link (например, "shop", "TGshowcase_bot")
+    # Хранение каталога: "copied" - свои копии категорий и товаров, "shared" - каталог основного
+    # магазина с переопределениями bot_product_overrides (utils/shared_catalog.py)
+    catalog_mode = Column(String, nullable=False, default="copied", server_default="copied")
     created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Время регистрации
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Время обновления
 
+class BotProductOverride(Base):
+    """
+    Поля товара основного магазина, измененные ботом с общим каталогом (None - как в основном магазине).
+    Подставляются при чтении витрины бота (utils/shared_catalog.py).
+    """
+    __tablename__ = "bot_product_overrides"
+    __table_args__ = (
+        Index("ux_bot_product_overrides_bot_product", "bot_id", "product_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(BigInteger, nullable=False, index=True)  # ID владельца магазина
+    bot_id = Column(Integer, ForeignKey("bots.id"), nullable=False)  # Бот с общим каталогом
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)  # Товар основного магазина
+    name = Column(String, nullable=True)
+    description = Column(Text, nullable=True)
+    price = Column(Float, nullable=True)
+    discount = Column(Float, nullable=True)
+    is_hidden = Column(Boolean, nullable=True)
+    is_hot_offer = Column(Boolean, nullable=True)
+    # Производные поля для фильтров и сортировки витрины бота (пересчитываются вместе с проекцией витрины)
+    effective_price = Column(Float, nullable=True)  # Цена со скидкой с учетом переопределений
+    has_discount = Column(Boolean, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class UserProductSnapshot(Base):
     __tablename__ = "user_product_snapshots"
 
@@ -233,6 +360,52 @@ class UserProductSnapshot(Base):
     # Примечание: при удалении Product, product_id устанавливается в NULL (ondelete="SET NULL")
     # Это позволяет сохранить исторические snapshots даже после удаления товара
 
+class ProductImage(Base):
+    """
+    Изображение товара (нормализованная замена JSON-колонки Product.images_urls).
+    Строки поддерживаются при записи товара (utils/product_images.py).
+    """
+    __tablename__ = "product_images"
+    __table_args__ = (
+        Index("ix_product_images_product_position", "product_id", "position"),
+    )
 
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False, default=0)  # Порядок изображения (0 - главное)
+    path = Column(String, nullable=False)  # Путь, как он хранится в товаре (например, /static/uploads/<файл>)
+    width = Column(Integer, nullable=True)  # Ширина в пикселях (None, если файл не найден или формат не распознан)
+    height = Column(Integer, nullable=True)  # Высота в пикселях
+    size_bytes = Column(Integer, nullable=True)  # Размер файла в байтах
+    created_at = Column(DateTime, default=datetime.utcnow)
 
+class StorefrontItem(Base):
+    """
+    Готовая к выдаче строка витрины (проекция Product + резервации).
+    Поддерживается при записи (utils/storefront_projection.py), читается в GET /api/products/.
+    """
+    __tablename__ = "storefront_items"
+    __table_args__ = (
+        # Выдача витрины - один диапазонный проход по этому индексу
+        Index("ix_storefront_items_shop", "user_id", "bot_id", "category_id", "product_id"),
+        # Фильтр по диапазону цены и сортировка по цене
+        Index("ix_storefront_items_shop_price", "user_id", "bot_id", "effective_price", "product_id"),
+    )
 
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), unique=True, index=True)
+    user_id = Column(BigInteger, nullable=False)  # ID владельца магазина
+    bot_id = Column(Integer, nullable=True)  # ID бота (None для основного магазина)
+    category_id = Column(Integer, nullable=True)
+    is_hidden = Column(Boolean, default=False)  # Скрыт от клиентов
+    payload = Column(Text, nullable=False)  # JSON элемента списка товаров (полные URL изображений и т.д.)
+    reservation = Column(Text, nullable=True)  # JSON объекта резервации для фронтенда (None - не зарезервирован)
+    reservation_expires_at = Column(DateTime, nullable=True)  # Когда истечет ближайшая резервация группы (строку нужно пересчитать)
+    # Поля для фильтров и сортировки витрины на сервере
+    effective_price = Column(Float, nullable=True)  # Цена со скидкой, как ее показывает витрина (None - цена по запросу)
+    is_hot_offer = Column(Boolean, default=False)
+    is_made_to_order = Column(Boolean, default=False)
+    is_for_sale = Column(Boolean, default=False)
+    in_stock = Column(Boolean, default=False)  # Есть на складе (quantity > 0 и не под заказ)
+    has_discount = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
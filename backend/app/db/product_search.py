@@ -0,0 +1,65 @@
+"""
+Полнотекстовый индекс товаров (SQLite FTS5) для поиска по названию и описанию.
+
+products_fts - FTS5-таблица с внешним содержимым (content='products'): сам текст
+не дублируется, индекс ссылается на products.id. Индекс поддерживается триггерами
+на products, поэтому любые записи (обработчики, фоновая сверка, скрипты) его обновляют.
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from . import database
+
+PRODUCT_SEARCH_TABLE = "products_fts"
+
+_CREATE_TABLE = """
+    CREATE VIRTUAL TABLE products_fts USING fts5(
+        name,
+        description,
+        content='products',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """
+]
+
+
+def ensure_product_search_index(engine: Engine = database.engine) -> bool:
+    """
+    Создает FTS5-индекс товаров и триггеры, если их еще нет.
+    Новый индекс сразу заполняется по существующим товарам.
+
+    Returns:
+        True, если индекс был создан
+    """
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type='table' AND name=:name"),
+            {"name": PRODUCT_SEARCH_TABLE}
+        ).first()
+        if not exists:
+            conn.execute(text(_CREATE_TABLE))
+        for trigger in _TRIGGERS:
+            conn.execute(text(trigger))
+        if not exists:
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+    if not exists:
+        print(f"✅ Full-text product search index created ({PRODUCT_SEARCH_TABLE})")
+    return not exists
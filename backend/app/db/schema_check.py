@@ -85,6 +85,28 @@ def check_schema_integrity(db_path: str = "sql_app.db") -> Tuple[bool, List[str]
                     "выполните миграцию: python migrate_add_id_to_user_product_snapshots.py"
                 )
         
+        # Специальная проверка: резервации хранят количество (quantity), а не строку на единицу
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='reservations'")
+        if cursor.fetchone():
+            cursor.execute("PRAGMA table_info(reservations)")
+            reservation_columns = {row[1] for row in cursor.fetchall()}
+            if 'quantity' not in reservation_columns:
+                issues.append(
+                    "Таблица reservations: отсутствует колонка quantity - "
+                    "выполните миграцию: python migrate_add_reservation_quantity.py"
+                )
+        
+        # Специальная проверка: задачи очереди синхронизации считают неудачные попытки
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sync_jobs'")
+        if cursor.fetchone():
+            cursor.execute("PRAGMA table_info(sync_jobs)")
+            sync_job_columns = {row[1] for row in cursor.fetchall()}
+            if 'attempts' not in sync_job_columns or 'last_error' not in sync_job_columns:
+                issues.append(
+                    "Таблица sync_jobs: отсутствуют колонки attempts/last_error - "
+                    "выполните миграцию: python migrate_add_sync_job_attempts.py"
+                )
+        
         conn.close()
         
         return len(issues) == 0, issues
@@ -110,5 +132,9 @@ def log_schema_status():
         print("   Рекомендуется выполнить миграцию:")
         if any("user_product_snapshots" in issue for issue in issues):
             print("     - python migrate_add_id_to_user_product_snapshots.py")
+        if any("reservations" in issue for issue in issues):
+            print("     - python migrate_add_reservation_quantity.py")
+        if any("sync_jobs" in issue for issue in issues):
+            print("     - python migrate_add_sync_job_attempts.py")
         if any("sold_products" in issue or "categories" in issue or "products" in issue for issue in issues):
             print("     - python migrate_fix_schema_consistency.py")
@@ -10,7 +10,11 @@ from sqlalchemy.orm import Session
 from ..db import models, database
 from ..utils.products_utils import str_to_bool, make_full_url, normalize_category_id
 from ..utils.products_sync import sync_product_to_all_bots
-from ..utils.telegram_auth import validate_init_data_multi_bot
+from ..utils.catalog_reconciler import reconcile_owner_catalog
+from ..utils.sync_groups import assign_sync_groups, remove_orphaned_copies
+from ..utils.catalog_cache import bump_shop_version
+from ..utils.request_auth import validate_request_init_data
+from ..utils.shared_catalog import catalog_bot_id
 
 
 async def create_product(
@@ -145,7 +149,7 @@ async def create_product(
         if x_telegram_init_data:
             # Запрос от WebApp - определяем bot_id из initData
             try:
-                from ..routers.context import get_validated_user_and_bot
+                from ..utils.request_auth import get_validated_user_and_bot
                 _, final_bot_id = await get_validated_user_and_bot(x_telegram_init_data, db)
                 print(f"✅ Determined bot_id={final_bot_id} from initData for product creation")
             except:
@@ -164,6 +168,9 @@ async def create_product(
                 final_bot_id = None  # Основной бот
                 print(f"ℹ️ No connected bot found for user {user_id}, using main bot (bot_id=None)")
 
+    # Товар из бота с общим каталогом создается в основном магазине
+    final_bot_id = catalog_bot_id(final_bot_id, db)
+
     # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
     normalized_category_id = normalize_category_id(category_id, final_bot_id, user_id, db)
 
@@ -208,6 +215,7 @@ async def create_product(
     sync_product_to_all_bots(db_product, db, action="create")
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     print(f"DEBUG: Product created in DB: id={db_product.id}, name={db_product.name}, images_count={len(images_urls)}")
@@ -242,274 +250,28 @@ async def sync_all_products(
     Используется для синхронизации товаров, которые были созданы до добавления автоматической синхронизации.
     """
     # Проверяем авторизацию
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    
-    try:
-        authenticated_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=bot_token if bot_token else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+    authenticated_user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
     
     # Проверяем, что пользователь является владельцем
     if authenticated_user_id != user_id:
         raise HTTPException(status_code=403, detail="You don't have permission to sync products")
     
-    # Находим все подключенные боты пользователя
-    connected_bots = db.query(models.Bot).filter(
-        models.Bot.owner_user_id == user_id,
-        models.Bot.is_active == True
-    ).all()
-    
-    synced_count = 0
-    
-    # 1. Синхронизируем товары из основного бота во все подключенные боты
-    main_products = db.query(models.Product).filter(
+    # Сначала удаляются копии в ботах, оригинал которых удален,
+    # иначе сверка скопировала бы их обратно во все магазины
+    if db.query(models.Product.id).filter(
         models.Product.user_id == user_id,
-        models.Product.bot_id == None,
-        models.Product.is_sold == False
-    ).all()
-    
-    for main_product in main_products:
-        # Устанавливаем sync_product_id для товаров в основном магазине
-        if not main_product.sync_product_id:
-            main_product.sync_product_id = main_product.id
-            db.flush()
-        
-        sync_id = main_product.sync_product_id
-        
-        for bot in connected_bots:
-            # Ищем синхронизированный товар по sync_product_id (надежный способ)
-            existing = None
-            if sync_id:
-                existing = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-            
-            # Fallback: если не нашли по sync_product_id, ищем по имени и цене
-            if not existing:
-                existing = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.name == main_product.name,
-                    models.Product.price == main_product.price
-                ).first()
-            
-            if not existing:
-                # Находим соответствующую категорию в этом боте по имени
-                category_id_for_bot = None
-                if main_product.category_id:
-                    original_category = db.query(models.Category).filter(
-                        models.Category.id == main_product.category_id
-                    ).first()
-                    if original_category:
-                        matching_category = db.query(models.Category).filter(
-                            models.Category.user_id == user_id,
-                            models.Category.bot_id == bot.id,
-                            models.Category.name == original_category.name
-                        ).first()
-                        if matching_category:
-                            category_id_for_bot = matching_category.id
-                
-                new_product = models.Product(
-                    name=main_product.name,
-                    description=main_product.description,
-                    price=main_product.price,
-                    image_url=main_product.image_url,
-                    images_urls=main_product.images_urls,
-                    discount=main_product.discount,
-                    user_id=user_id,
-                    bot_id=bot.id,
-                    sync_product_id=sync_id,  # Связываем с оригинальным товаром
-                    is_hot_offer=main_product.is_hot_offer,
-                    quantity=main_product.quantity,
-                    is_sold=main_product.is_sold,
-                    is_made_to_order=main_product.is_made_to_order,
-                    is_for_sale=main_product.is_for_sale,
-                    price_from=main_product.price_from,
-                    price_to=main_product.price_to,
-                    quantity_from=main_product.quantity_from,
-                    quantity_unit=main_product.quantity_unit,
-                    category_id=category_id_for_bot
-                )
-                db.add(new_product)
-                synced_count += 1
-                print(f"🔄 Synced product '{main_product.name}' (id={main_product.id}, sync_id={sync_id}) to bot {bot.id}")
-    
-    # 2. Синхронизируем товары из подключенных ботов в основной бот
-    for bot in connected_bots:
-        bot_products = db.query(models.Product).filter(
-            models.Product.user_id == user_id,
-            models.Product.bot_id == bot.id,
-            models.Product.is_sold == False
-        ).all()
-        
-        for bot_product in bot_products:
-            # Используем sync_product_id для поиска оригинального товара
-            sync_id = bot_product.sync_product_id
-            
-            # Ищем оригинальный товар в основном боте по sync_product_id
-            existing = None
-            if sync_id:
-                existing = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-            
-            # Fallback: если не нашли по sync_product_id, ищем по имени и цене
-            if not existing:
-                existing = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.name == bot_product.name,
-                    models.Product.price == bot_product.price
-                ).first()
-            
-            if not existing:
-                # Находим соответствующую категорию в основном боте по имени
-                category_id_for_main = None
-                if bot_product.category_id:
-                    original_category = db.query(models.Category).filter(
-                        models.Category.id == bot_product.category_id
-                    ).first()
-                    if original_category:
-                        matching_category = db.query(models.Category).filter(
-                            models.Category.user_id == user_id,
-                            models.Category.bot_id == None,
-                            models.Category.name == original_category.name
-                        ).first()
-                        if matching_category:
-                            category_id_for_main = matching_category.id
-                
-                new_product = models.Product(
-                    name=bot_product.name,
-                    description=bot_product.description,
-                    price=bot_product.price,
-                    image_url=bot_product.image_url,
-                    images_urls=bot_product.images_urls,
-                    discount=bot_product.discount,
-                    user_id=user_id,
-                    bot_id=None,
-                    sync_product_id=None,  # Будет установлен после получения ID
-                    is_hot_offer=bot_product.is_hot_offer,
-                    quantity=bot_product.quantity,
-                    is_sold=bot_product.is_sold,
-                    is_made_to_order=bot_product.is_made_to_order,
-                    is_for_sale=bot_product.is_for_sale,
-                    price_from=bot_product.price_from,
-                    price_to=bot_product.price_to,
-                    quantity_from=bot_product.quantity_from,
-                    quantity_unit=bot_product.quantity_unit,
-                    category_id=category_id_for_main
-                )
-                db.add(new_product)
-                db.flush()  # Получаем ID нового товара
-                # Устанавливаем sync_product_id = id (сам на себя)
-                new_product.sync_product_id = new_product.id
-                # Обновляем sync_product_id у товара в боте
-                if not bot_product.sync_product_id:
-                    bot_product.sync_product_id = new_product.id
-                synced_count += 1
-                print(f"🔄 Synced product '{bot_product.name}' (id={new_product.id}, sync_id={new_product.id}) to main bot")
-    
-    # 3. Очистка дубликатов: удаляем товары в ботах, которых нет в основном магазине
-    deleted_count = 0
-    for bot in connected_bots:
-        bot_products = db.query(models.Product).filter(
-            models.Product.user_id == user_id,
-            models.Product.bot_id == bot.id,
-            models.Product.is_sold == False
-        ).all()
-        
-        # Получаем все sync_product_id из основного магазина
-        main_sync_ids = set()
-        for main_product in main_products:
-            if main_product.sync_product_id:
-                main_sync_ids.add(main_product.sync_product_id)
-            else:
-                main_sync_ids.add(main_product.id)
-        
-        for bot_product in bot_products:
-            # Если у товара в боте есть sync_product_id, проверяем, существует ли соответствующий товар в основном магазине
-            if bot_product.sync_product_id:
-                if bot_product.sync_product_id not in main_sync_ids:
-                    # Товар в боте ссылается на несуществующий товар в основном магазине - удаляем
-                    print(f"🗑️ Deleting orphaned product '{bot_product.name}' (id={bot_product.id}, sync_id={bot_product.sync_product_id}) from bot {bot.id}")
-                    db.delete(bot_product)
-                    deleted_count += 1
-            else:
-                # Если у товара в боте нет sync_product_id, проверяем, есть ли он в основном магазине по имени и цене
-                found_in_main = False
-                for main_product in main_products:
-                    if main_product.name == bot_product.name and main_product.price == bot_product.price:
-                        # Нашли соответствующий товар - устанавливаем sync_product_id
-                        sync_id = main_product.sync_product_id or main_product.id
-                        bot_product.sync_product_id = sync_id
-                        found_in_main = True
-                        print(f"🔗 Linked product '{bot_product.name}' (id={bot_product.id}) to main product (sync_id={sync_id})")
-                        break
-                
-                if not found_in_main:
-                    # Товар в боте не найден в основном магазине - удаляем (или создаем в основном магазине)
-                    # Создаем товар в основном магазине, если его там нет
-                    print(f"🔄 Creating missing product '{bot_product.name}' in main shop from bot {bot.id}")
-                    # Находим соответствующую категорию в основном боте по имени
-                    category_id_for_main = None
-                    if bot_product.category_id:
-                        original_category = db.query(models.Category).filter(
-                            models.Category.id == bot_product.category_id
-                        ).first()
-                        if original_category:
-                            matching_category = db.query(models.Category).filter(
-                                models.Category.user_id == user_id,
-                                models.Category.bot_id == None,
-                                models.Category.name == original_category.name
-                            ).first()
-                            if matching_category:
-                                category_id_for_main = matching_category.id
-                    
-                    new_main_product = models.Product(
-                        name=bot_product.name,
-                        description=bot_product.description,
-                        price=bot_product.price,
-                        image_url=bot_product.image_url,
-                        images_urls=bot_product.images_urls,
-                        discount=bot_product.discount,
-                        user_id=user_id,
-                        bot_id=None,
-                        sync_product_id=None,  # Будет установлен после получения ID
-                        is_hot_offer=bot_product.is_hot_offer,
-                        quantity=bot_product.quantity,
-                        is_sold=bot_product.is_sold,
-                        is_made_to_order=bot_product.is_made_to_order,
-                        is_for_sale=bot_product.is_for_sale,
-                        price_from=bot_product.price_from,
-                        price_to=bot_product.price_to,
-                        price_fixed=bot_product.price_fixed,
-                        price_type=bot_product.price_type,
-                        quantity_from=bot_product.quantity_from,
-                        quantity_unit=bot_product.quantity_unit,
-                        quantity_show_enabled=bot_product.quantity_show_enabled,
-                        category_id=category_id_for_main
-                    )
-                    db.add(new_main_product)
-                    db.flush()
-                    new_main_product.sync_product_id = new_main_product.id
-                    bot_product.sync_product_id = new_main_product.id
-                    synced_count += 1
-                    print(f"🔄 Created product '{bot_product.name}' (id={new_main_product.id}, sync_id={new_main_product.id}) in main shop")
+        models.Product.sync_group_id == None
+    ).first():
+        assign_sync_groups(user_id, db)
+    deleted_count = remove_orphaned_copies(user_id, db)
     
-    db.commit()
+    # Сверка по группам синхронизации: недостающие копии создаются в основном магазине и в ботах
+    stats = reconcile_owner_catalog(user_id, db)
+    synced_count = stats["created_in_main"] + stats["created_in_bots"]
+    if deleted_count and not synced_count:
+        # Сверка коммитит и сбрасывает кэш, только если создала копии
+        db.commit()
+        bump_shop_version(user_id)
     
     return {
         "message": f"Синхронизировано {synced_count} товаров, удалено {deleted_count} дубликатов",
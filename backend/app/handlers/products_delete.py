@@ -9,8 +9,9 @@ from fastapi import HTTPException, Query, Header, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from ..db import models, database
-from ..utils.telegram_auth import validate_init_data_multi_bot
+from ..utils.request_auth import validate_request_init_data
 from ..utils.products_sync import sync_product_to_all_bots
+from ..utils.catalog_cache import bump_shop_version
 
 
 async def delete_product(
@@ -44,23 +45,11 @@ async def delete_product(
     
     # Если есть initData - проверяем авторизацию через него (запрос от WebApp)
     if x_telegram_init_data:
-        bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
+        authenticated_user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
         
-        try:
-            # Используем функцию для валидации с любым ботом
-            authenticated_user_id, _, _ = await validate_init_data_multi_bot(
-                x_telegram_init_data,
-                db,
-                default_bot_token=bot_token if bot_token else None
-            )
-            
-            # Проверяем, что авторизованный пользователь является владельцем
-            if authenticated_user_id != user_id:
-                raise HTTPException(status_code=403, detail="You don't have permission to delete this product")
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+        # Проверяем, что авторизованный пользователь является владельцем
+        if authenticated_user_id != user_id:
+            raise HTTPException(status_code=403, detail="You don't have permission to delete this product")
     # Если нет initData - это запрос от бота (localhost), проверяем только что user_id совпадает с владельцем товара
     # (товар уже проверен выше, что он принадлежит user_id)
     
@@ -86,6 +75,7 @@ async def delete_product(
     # Удаляем товар из БД
     db.delete(db_product)
     db.commit()
+    bump_shop_version(user_id)
     
     # НЕ удаляем файлы изображений автоматически!
     # Файлы могут использоваться другими товарами (включая синхронизированные копии)
@@ -137,22 +127,7 @@ async def mark_product_sold(
         HTTPException: Если товар не найден, нет прав, недостаточно товара или нет initData
     """
     # Проверяем авторизацию через initData
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    
-    try:
-        # Используем функцию для валидации с любым ботом
-        authenticated_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=bot_token if bot_token else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+    authenticated_user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
     
     # Проверяем, что товар существует и принадлежит пользователю
     db_product = db.query(models.Product).filter(
@@ -196,6 +171,7 @@ async def mark_product_sold(
     sync_product_to_all_bots(db_product, db, action="update")
     
     db.commit()
+    bump_shop_version(user_id)
     
     # Создаем запись в истории продаж
     sold_product = models.SoldProduct(
@@ -1,14 +1,18 @@
 """
 Обработчики для чтения товаров
 """
+import base64
 import json
+import math
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, Query
+from sqlalchemy import and_, case, func
 from ..db import models, database
 from ..utils.products_utils import make_full_url
+from ..utils.product_images import load_product_image_paths, parse_product_images
+from ..utils.shared_catalog import apply_product_override, resolve_catalog_shop
 
 
 def get_product_by_id(
@@ -20,20 +24,11 @@ def get_product_by_id(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # Преобразуем images_urls из JSON строки в список
-    images_list = []
-    if product.images_urls:
-        try:
-            images_list = json.loads(product.images_urls)
-        except:
-            images_list = []
-    
-    # Для обратной совместимости: если есть image_url, но нет images_urls, добавляем его
-    if not images_list and product.image_url:
-        images_list = [product.image_url]
+    # Изображения из product_images (с fallback на images_urls / image_url)
+    images_list = load_product_image_paths([product], db)[product.id]
     
     # Преобразуем относительные пути в полные HTTPS URL для Telegram Mini App
-    images_list = [make_full_url(img_url) for img_url in images_list if img_url]
+    images_list = [make_full_url(img_url) for img_url in images_list]
     image_url_full = make_full_url(product.image_url) if product.image_url else None
     
     # Проверяем активную резервацию (используем sync_product_id для надежного поиска)
@@ -78,182 +73,273 @@ def get_product_by_id(
     }
 
 
-def get_products(
-    user_id: int,
-    category_id: Optional[int],
-    bot_id: Optional[int],
-    db: Session,
-    viewer_id: Optional[int] = None  # ID пользователя, который просматривает товары (для фильтрации скрытых)
-):
-    """Получить список товаров с автоматической синхронизацией между основным магазином и ботами"""
-    print(f"DEBUG: get_products called with user_id={user_id}, category_id={category_id}, bot_id={bot_id}")
+def get_reservation_states(products: List[models.Product], user_id: int, db: Session) -> Dict[int, Tuple[Optional[models.Reservation], int]]:
+    """
+    Загружает состояние резервации для списка товаров за фиксированное число запросов.
     
-    # Автоматическая синхронизация: проверяем расхождения между основным магазином и ботами
-    # Находим все подключенные боты пользователя
-    connected_bots = db.query(models.Bot).filter(
-        models.Bot.owner_user_id == user_id,
-        models.Bot.is_active == True
-    ).all()
-    
-    if connected_bots:
-        # Получаем товары из основного магазина
-        main_products = db.query(models.Product).filter(
-            models.Product.user_id == user_id,
-            models.Product.bot_id == None,
-            models.Product.is_sold == False
-        ).all()
+    Резервации учитываются по всем синхронизированным копиям товара (по sync_product_id),
+    как и раньше при поштучной проверке. Один сгруппированный запрос возвращает для каждой
+    группы синхронизации первую активную резервацию и зарезервированное количество
+    (SUM(quantity) активных резерваций). Старые товары без копий по sync_product_id
+    сопоставляются по имени и цене вторым сгруппированным запросом.
+    
+    Args:
+        products: Товары, для которых нужно состояние резервации
+        user_id: ID владельца магазина
+        db: Сессия базы данных
         
-        # Получаем товары из всех ботов
-        for bot in connected_bots:
-            bot_products = db.query(models.Product).filter(
+    Returns:
+        Словарь {product.id: (первая активная резервация или None, зарезервированное количество)}
+    """
+    if not products:
+        return {}
+    
+    now = datetime.utcnow()
+    sync_ids = {prod.sync_product_id or prod.id for prod in products}
+    
+    # Одна агрегация по группам синхронизации: LEFT JOIN, чтобы видеть и группы без резерваций
+    # (пустая группа означает, что нужен fallback по имени и цене, как в старом коде)
+    grouped = db.query(
+        models.Product.sync_product_id,
+        func.min(models.Reservation.id),
+        func.sum(models.Reservation.quantity)
+    ).outerjoin(
+        models.Reservation,
+        and_(
+            models.Reservation.product_id == models.Product.id,
+            models.Reservation.is_active == True,
+            models.Reservation.reserved_until > now
+        )
+    ).filter(
+        models.Product.user_id == user_id,
+        models.Product.sync_product_id.in_(sync_ids)
+    ).group_by(models.Product.sync_product_id).all()
+    
+    group_states = {sync_id: (first_id, count) for sync_id, first_id, count in grouped}
+    
+    # Fallback для старых товаров без sync_product_id: копии ищутся по имени и цене -
+    # одна агрегация по (name, price) для всех таких товаров страницы.
+    # Фильтр только по имени: группа с price IS NULL сопоставляется так же, как и раньше
+    # (сравнение с None в старом запросе давало IS NULL), лишние группы отбрасываются
+    fallback_products = [prod for prod in products if (prod.sync_product_id or prod.id) not in group_states]
+    fallback_states = {}
+    if fallback_products:
+        by_name_price = {
+            (name, price): (first_id, count)
+            for name, price, first_id, count in db.query(
+                models.Product.name,
+                models.Product.price,
+                func.min(models.Reservation.id),
+                func.sum(models.Reservation.quantity)
+            ).join(
+                models.Product, models.Reservation.product_id == models.Product.id
+            ).filter(
                 models.Product.user_id == user_id,
-                models.Product.bot_id == bot.id,
-                models.Product.is_sold == False
-            ).all()
-            
-            # Проверяем товары в боте, которых нет в основном магазине
-            for bot_product in bot_products:
-                sync_id = bot_product.sync_product_id
-                
-                # Ищем соответствующий товар в основном магазине
-                found_in_main = False
-                if sync_id:
-                    found_in_main = any(
-                        p.sync_product_id == sync_id or p.id == sync_id 
-                        for p in main_products
-                    )
-                
-                # Если не нашли по sync_id, ищем по имени и цене
-                if not found_in_main:
-                    found_in_main = any(
-                        p.name == bot_product.name and p.price == bot_product.price
-                        for p in main_products
-                    )
-                
-                # Если товар в боте не найден в основном магазине - синхронизируем
-                if not found_in_main:
-                    print(f"🔄 Auto-syncing product '{bot_product.name}' from bot {bot.id} to main shop")
-                    # Находим соответствующую категорию в основном боте по имени
-                    category_id_for_main = None
-                    if bot_product.category_id:
-                        original_category = db.query(models.Category).filter(
-                            models.Category.id == bot_product.category_id
-                        ).first()
-                        if original_category:
-                            matching_category = db.query(models.Category).filter(
-                                models.Category.user_id == user_id,
-                                models.Category.bot_id == None,
-                                models.Category.name == original_category.name
-                            ).first()
-                            if matching_category:
-                                category_id_for_main = matching_category.id
-                    
-                    new_main_product = models.Product(
-                        name=bot_product.name,
-                        description=bot_product.description,
-                        price=bot_product.price,
-                        image_url=bot_product.image_url,
-                        images_urls=bot_product.images_urls,
-                        discount=bot_product.discount,
-                        user_id=user_id,
-                        bot_id=None,
-                        sync_product_id=None,  # Будет установлен после получения ID
-                        is_hot_offer=bot_product.is_hot_offer,
-                        quantity=bot_product.quantity,
-                        is_sold=bot_product.is_sold,
-                        is_made_to_order=bot_product.is_made_to_order,
-                        is_for_sale=bot_product.is_for_sale,
-                        price_from=bot_product.price_from,
-                        price_to=bot_product.price_to,
-                        price_fixed=bot_product.price_fixed,
-                        price_type=bot_product.price_type,
-                        quantity_from=bot_product.quantity_from,
-                        quantity_unit=bot_product.quantity_unit,
-                        quantity_show_enabled=bot_product.quantity_show_enabled,
-                        is_hidden=bot_product.is_hidden,
-                        category_id=category_id_for_main
-                    )
-                    db.add(new_main_product)
-                    db.flush()
-                    new_main_product.sync_product_id = new_main_product.id
-                    if not bot_product.sync_product_id:
-                        bot_product.sync_product_id = new_main_product.id
-                    db.commit()
-                    print(f"✅ Auto-synced product '{bot_product.name}' (id={new_main_product.id}) to main shop")
+                models.Product.name.in_({prod.name for prod in fallback_products}),
+                models.Reservation.is_active == True,
+                models.Reservation.reserved_until > now
+            ).group_by(models.Product.name, models.Product.price).all()
+        }
+        for prod in fallback_products:
+            fallback_states[prod.id] = by_name_price.get((prod.name, prod.price), (None, None))
+    
+    states_by_product = {}
+    for prod in products:
+        if prod.id in fallback_states:
+            states_by_product[prod.id] = fallback_states[prod.id]
+        else:
+            states_by_product[prod.id] = group_states[prod.sync_product_id or prod.id]
+    
+    # Подгружаем сами резервации (id, срок, кто зарезервировал) одним запросом
+    first_ids = {first_id for first_id, _ in states_by_product.values() if first_id is not None}
+    reservations_by_id = {}
+    if first_ids:
+        reservations_by_id = {
+            reservation.id: reservation
+            for reservation in db.query(models.Reservation).filter(models.Reservation.id.in_(first_ids)).all()
+        }
+    
+    return {
+        product_id: (reservations_by_id.get(first_id) if first_id is not None else None, count or 0)
+        for product_id, (first_id, count) in states_by_product.items()
+    }
+
+
+def get_next_reservation_expiry(user_id: int, db: Session) -> Optional[float]:
+    """
+    Время (unix time) ближайшего истечения активной резервации в магазине владельца.
+    Истечение резервации меняет is_reserved без записи в БД, поэтому закэшированный
+    список товаров не должен жить дольше этого момента.
+
+    Returns:
+        Unix time или None, если активных резерваций нет
+    """
+    next_expiry = db.query(func.min(models.Reservation.reserved_until)).join(
+        models.Product, models.Reservation.product_id == models.Product.id
+    ).filter(
+        models.Product.user_id == user_id,
+        models.Reservation.is_active == True,
+        models.Reservation.reserved_until > datetime.utcnow()
+    ).scalar()
+    if next_expiry is None:
+        return None
+    # reserved_until хранится в UTC без часового пояса
+    return (next_expiry - datetime(1970, 1, 1)).total_seconds()
+
+
+# Поля элемента списка товаров (допустимые значения для проекции fields=)
+PRODUCT_LIST_FIELDS = (
+    "id", "name", "description", "price", "image_url", "images_urls", "discount",
+    "category_id", "user_id", "is_hot_offer", "quantity", "is_reserved", "is_made_to_order",
+    "is_for_sale", "price_from", "price_to", "price_fixed", "price_type", "quantity_from",
+    "quantity_unit", "quantity_show_enabled", "is_hidden", "reservation"
+)
+RESERVATION_FIELDS = {"is_reserved", "reservation"}
+IMAGE_FIELDS = {"image_url", "images_urls"}
+
+# Размер страницы по умолчанию и максимальный для постраничной выдачи
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Допустимые сортировки списка товаров: по id (по умолчанию), новые первыми, по цене со скидкой
+PRODUCT_SORTS = ("id", "newest", "price_asc", "price_desc")
+# Сортировки по цене листаются по смещению (keyset по id для них не подходит)
+OFFSET_SORTS = {"price_asc", "price_desc"}
+
+
+def get_effective_price(price: Optional[float], discount: Optional[float]) -> Optional[float]:
+    """
+    Цена со скидкой так, как ее показывает витрина (webapp/js/filters.js):
+    округление до целого, если есть скидка.
+    """
+    if price is None:
+        return None
+    if discount and discount > 0:
+        # Math.round в JS округляет .5 вверх, в отличие от round() в Python
+        return float(math.floor(price * (1 - discount / 100) + 0.5))
+    return price
+
+
+def parse_sort(sort: Optional[str]) -> Optional[str]:
+    """
+    Проверяет параметр sort=.
+    
+    Raises:
+        HTTPException: Если сортировка неизвестна
+    """
+    if sort is None:
+        return None
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort: {sort}. Allowed: {', '.join(PRODUCT_SORTS)}")
+    return sort
+
+
+def storefront_filter_columns(override=None) -> Dict[str, Any]:
+    """
+    Колонки storefront_items для фильтров и сортировки витрины.
+    
+    Args:
+        override: bot_product_overrides в LEFT JOIN (бот с общим каталогом) - тогда
+                  переопределяемые колонки берутся с учетом переопределений бота
+    """
+    item = models.StorefrontItem
+    columns = {
+        "effective_price": item.effective_price,
+        "is_hidden": item.is_hidden,
+        "is_hot_offer": item.is_hot_offer,
+        "is_made_to_order": item.is_made_to_order,
+        "is_for_sale": item.is_for_sale,
+        "in_stock": item.in_stock,
+        "has_discount": item.has_discount
+    }
+    if override is not None:
+        columns.update(
+            effective_price=case((override.id == None, item.effective_price), else_=override.effective_price),
+            has_discount=case((override.id == None, item.has_discount), else_=override.has_discount),
+            is_hidden=func.coalesce(override.is_hidden, item.is_hidden),
+            is_hot_offer=func.coalesce(override.is_hot_offer, item.is_hot_offer)
+        )
+    return columns
+
+
+def apply_storefront_filters(query: Query, filters: Optional[Dict[str, Any]], columns: Optional[Dict[str, Any]] = None) -> Query:
+    """
+    Применяет фильтры витрины к запросу storefront_items.
+    
+    Args:
+        filters: Словарь фильтров (None-значения игнорируются):
+            price_min, price_max - диапазон цены со скидкой (товары с ценой по запросу исключаются)
+            hot_offer, made_to_order, for_sale, in_stock, with_discount - флаги (True/False)
+        columns: Колонки из storefront_filter_columns (по умолчанию - без переопределений)
+    """
+    if not filters:
+        return query
+    columns = columns or storefront_filter_columns()
+    if filters.get("price_min") is not None:
+        query = query.filter(columns["effective_price"] >= filters["price_min"])
+    if filters.get("price_max") is not None:
+        query = query.filter(columns["effective_price"] <= filters["price_max"])
+    flag_columns = {
+        "hot_offer": columns["is_hot_offer"],
+        "made_to_order": columns["is_made_to_order"],
+        "for_sale": columns["is_for_sale"],
+        "in_stock": columns["in_stock"],
+        "with_discount": columns["has_discount"]
+    }
+    for name, column in flag_columns.items():
+        if filters.get(name) is not None:
+            query = query.filter(column == bool(filters[name]))
+    return query
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Set[str]]:
+    """
+    Разбирает параметр fields= (список полей через запятую).
+    
+    Returns:
+        Множество полей (id добавляется всегда) или None, если проекция не запрошена
         
-        # Также синхронизируем товары из основного магазина в боты
-        for main_product in main_products:
-            if not main_product.sync_product_id:
-                main_product.sync_product_id = main_product.id
-                db.flush()
-            
-            sync_id = main_product.sync_product_id
-            for bot in connected_bots:
-                # Ищем товар в боте по sync_product_id
-                existing = None
-                if sync_id:
-                    existing = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.sync_product_id == sync_id
-                    ).first()
-                
-                # Если не нашли, ищем по имени и цене
-                if not existing:
-                    existing = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.name == main_product.name,
-                        models.Product.price == main_product.price
-                    ).first()
-                
-                # Если товар в основном магазине не найден в боте - синхронизируем
-                if not existing:
-                    print(f"🔄 Auto-syncing product '{main_product.name}' from main shop to bot {bot.id}")
-                    # Находим соответствующую категорию в боте по имени
-                    category_id_for_bot = None
-                    if main_product.category_id:
-                        original_category = db.query(models.Category).filter(
-                            models.Category.id == main_product.category_id
-                        ).first()
-                        if original_category:
-                            matching_category = db.query(models.Category).filter(
-                                models.Category.user_id == user_id,
-                                models.Category.bot_id == bot.id,
-                                models.Category.name == original_category.name
-                            ).first()
-                            if matching_category:
-                                category_id_for_bot = matching_category.id
-                    
-                    new_bot_product = models.Product(
-                        name=main_product.name,
-                        description=main_product.description,
-                        price=main_product.price,
-                        image_url=main_product.image_url,
-                        images_urls=main_product.images_urls,
-                        discount=main_product.discount,
-                        user_id=user_id,
-                        bot_id=bot.id,
-                        sync_product_id=sync_id,
-                        is_hot_offer=main_product.is_hot_offer,
-                        quantity=main_product.quantity,
-                        is_sold=main_product.is_sold,
-                        is_made_to_order=main_product.is_made_to_order,
-                        is_for_sale=main_product.is_for_sale,
-                        price_from=main_product.price_from,
-                        price_to=main_product.price_to,
-                        price_fixed=main_product.price_fixed,
-                        price_type=main_product.price_type,
-                        quantity_from=main_product.quantity_from,
-                        quantity_unit=main_product.quantity_unit,
-                        quantity_show_enabled=main_product.quantity_show_enabled,
-                        is_hidden=main_product.is_hidden,
-                        category_id=category_id_for_bot
-                    )
-                    db.add(new_bot_product)
-                    db.commit()
-                    print(f"✅ Auto-synced product '{main_product.name}' (id={new_bot_product.id}) to bot {bot.id}")
+    Raises:
+        HTTPException: Если указано неизвестное поле
+    """
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(PRODUCT_LIST_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return requested
+
+
+def encode_cursor(last_id: int, key: str = "id") -> str:
+    """Кодирует курсор следующей страницы (непрозрачная для клиента строка)"""
+    raw = json.dumps({key: last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key: str = "id") -> int:
+    """
+    Декодирует курсор, выданный encode_cursor.
     
+    Raises:
+        HTTPException: Если курсор поврежден
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))[key])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def build_products_query(
+    user_id: int,
+    category_id: Optional[int],
+    bot_id: Optional[int],
+    db: Session,
+    viewer_id: Optional[int] = None
+) -> Query:
+    """Строит запрос товаров витрины (без проданных, с учетом магазина бота и скрытых товаров)"""
     query = db.query(models.Product).filter(
         models.Product.user_id == user_id,
         models.Product.is_sold == False  # Не показываем проданные товары на витрине
@@ -273,116 +359,300 @@ def get_products(
     
     if category_id is not None:
         query = query.filter(models.Product.category_id == category_id)
-    products = query.all()
-    # Логируем информацию о товарах и их изображениях
-    print(f"DEBUG: Found {len(products)} products for user {user_id}")
-    result = []
-    for prod in products:
-        # Преобразуем images_urls из JSON строки в список
-        images_list = []
-        if prod.images_urls:
-            try:
-                images_list = json.loads(prod.images_urls)
-            except:
-                images_list = []
+    return query
+
+
+def serialize_product_list_item(
+    prod: models.Product,
+    reservation_state: Tuple[Optional[models.Reservation], int],
+    fields: Optional[Set[str]] = None,
+    image_paths: Optional[List[str]] = None
+) -> dict:
+    """
+    Формирует элемент списка товаров для витрины.
+    
+    Args:
+        prod: Товар
+        reservation_state: (первая активная резервация или None, зарезервированное количество)
+        fields: Набор полей для проекции (None - все поля)
+        image_paths: Пути изображений из load_product_image_paths (None - разобрать images_urls товара)
         
-        # Для обратной совместимости: если есть image_url, но нет images_urls, добавляем его
-        if not images_list and prod.image_url:
-            images_list = [prod.image_url]
+    Returns:
+        Словарь с данными товара
+    """
+    images_list = []
+    image_url_full = None
+    if fields is None or fields & IMAGE_FIELDS:
+        if image_paths is None:
+            image_paths = parse_product_images(prod)
         
         # Преобразуем относительные пути в полные HTTPS URL для Telegram Mini App
-        images_list = [make_full_url(img_url) for img_url in images_list if img_url]
+        images_list = [make_full_url(img_url) for img_url in image_paths]
         image_url_full = make_full_url(prod.image_url) if prod.image_url else None
-        
-        # Проверяем активную резервацию
-        # Используем sync_product_id для надежного поиска всех синхронизированных копий
-        sync_id = prod.sync_product_id or prod.id
-        
-        # Находим все синхронизированные копии товара по sync_product_id
-        synced_products = db.query(models.Product).filter(
-            models.Product.user_id == prod.user_id,
-            models.Product.sync_product_id == sync_id
-        ).all()
-        
-        # Fallback: если sync_product_id не установлен, ищем по имени и цене (для обратной совместимости)
-        if not synced_products:
-            synced_products = db.query(models.Product).filter(
-                models.Product.user_id == prod.user_id,
-                models.Product.name == prod.name,
-                models.Product.price == prod.price
-            ).all()
-        
-        # Проверяем активные резервации для всех синхронизированных копий
-        active_reservation = db.query(models.Reservation).filter(
-            and_(
-                models.Reservation.product_id.in_([p.id for p in synced_products]),
-                models.Reservation.is_active == True,
-                models.Reservation.reserved_until > datetime.utcnow()
-            )
-        ).first()
-        
-        has_reservation = active_reservation is not None
-        
-        # Подсчитываем количество активных резерваций для всех синхронизированных копий товара
-        active_reservations_count = 0
-        if has_reservation:
-            active_reservations_count = db.query(models.Reservation).filter(
-                and_(
-                    models.Reservation.product_id.in_([p.id for p in synced_products]),
-                    models.Reservation.is_active == True,
-                    models.Reservation.reserved_until > datetime.utcnow()
-                )
-            ).count()
-        
-        # Формируем объект резервации для фронтенда
-        reservation_data = None
-        if active_reservation:
-            reservation_data = {
-                "id": active_reservation.id,
-                "reserved_until": active_reservation.reserved_until.isoformat() if active_reservation.reserved_until else None,
-                "reserved_by_user_id": active_reservation.reserved_by_user_id,
-                "active_count": active_reservations_count
-            }
-        
+    
+    active_reservation, active_reservations_count = reservation_state
+    
+    # Формируем объект резервации для фронтенда
+    reservation_data = None
+    if active_reservation:
+        reservation_data = {
+            "id": active_reservation.id,
+            "reserved_until": active_reservation.reserved_until.isoformat() if active_reservation.reserved_until else None,
+            "reserved_by_user_id": active_reservation.reserved_by_user_id,
+            "active_count": active_reservations_count
+        }
+    
+    item = {
+        "id": prod.id,
+        "name": prod.name,
+        "description": prod.description if fields is None or "description" in fields else None,
+        "price": prod.price,
+        "image_url": image_url_full,
+        "images_urls": images_list,
+        "discount": prod.discount,
+        "category_id": prod.category_id,
+        "user_id": prod.user_id,
+        "is_hot_offer": getattr(prod, 'is_hot_offer', False),
+        "quantity": getattr(prod, 'quantity', 0),
+        "is_reserved": active_reservation is not None,
         # Преобразуем is_made_to_order в bool
-        is_made_to_order = bool(getattr(prod, 'is_made_to_order', False))
+        "is_made_to_order": bool(getattr(prod, 'is_made_to_order', False)),
+        "is_for_sale": getattr(prod, 'is_for_sale', False),
+        "price_from": getattr(prod, 'price_from', None),
+        "price_to": getattr(prod, 'price_to', None),
+        "price_fixed": getattr(prod, 'price_fixed', None),
+        "price_type": getattr(prod, 'price_type', 'range'),
+        "quantity_from": getattr(prod, 'quantity_from', None),
+        "quantity_unit": getattr(prod, 'quantity_unit', None),
+        "quantity_show_enabled": getattr(prod, 'quantity_show_enabled', None),
+        "is_hidden": getattr(prod, 'is_hidden', False),
+        "reservation": reservation_data
+    }
+    if fields is not None:
+        item = {key: value for key, value in item.items() if key in fields}
+    return item
+
+
+def load_storefront_items(
+    user_id: int,
+    category_id: Optional[int],
+    bot_id: Optional[int],
+    db: Session,
+    viewer_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[Set[str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    sort: Optional[str] = None,
+    offset: Optional[int] = None
+) -> List[dict]:
+    """
+    Читает готовые элементы списка товаров из проекции storefront_items
+    (один диапазонный проход по индексу (user_id, bot_id, category_id, product_id)).
+    Для бота с общим каталогом читаются строки основного магазина с переопределениями бота.
+    
+    Args:
+        after_id: Вернуть товары после этого id в порядке сортировки (keyset-пагинация)
+        limit: Максимальное количество строк
+        fields: Набор полей для проекции (None - все поля)
+        filters: Фильтры витрины (см. apply_storefront_filters)
+        sort: Сортировка из PRODUCT_SORTS (None - по id)
+        offset: Смещение (для сортировок по цене)
+    """
+    item = models.StorefrontItem
+    shop_bot_id, overlay_bot_id = resolve_catalog_shop(bot_id, db)
+    override = None
+    if overlay_bot_id is not None:
+        override = models.BotProductOverride
+        query = db.query(item, override).outerjoin(
+            override, and_(override.product_id == item.product_id, override.bot_id == overlay_bot_id)
+        )
+    else:
+        query = db.query(item)
+    columns = storefront_filter_columns(override)
+    
+    query = query.filter(item.user_id == user_id)
+    # Логика фильтров та же, что в build_products_query
+    if shop_bot_id is not None:
+        query = query.filter(item.bot_id == shop_bot_id)
+    else:
+        query = query.filter(item.bot_id == None)
+    if category_id is not None:
+        query = query.filter(item.category_id == category_id)
+    if viewer_id is not None and viewer_id != user_id:
+        query = query.filter(columns["is_hidden"] == False)
+    query = apply_storefront_filters(query, filters, columns)
+    
+    if sort == "newest":
+        # Отдельной даты создания у товара нет: новые товары - с большими id
+        if after_id is not None:
+            query = query.filter(item.product_id < after_id)
+        query = query.order_by(item.product_id.desc())
+    elif sort in OFFSET_SORTS:
+        # Товары с ценой по запросу - в конце, как и при сортировке на клиенте
+        effective_price = columns["effective_price"]
+        price_order = effective_price.asc() if sort == "price_asc" else effective_price.desc()
+        query = query.order_by(effective_price.is_(None), price_order, item.product_id)
+    else:
+        if after_id is not None:
+            query = query.filter(item.product_id > after_id)
+        query = query.order_by(item.product_id)
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    if override is None:
+        return storefront_rows_to_items(query.all(), user_id, db, fields)
+    rows = query.all()
+    return storefront_rows_to_items(
+        [row for row, _ in rows], user_id, db, fields,
+        overrides={row.product_id: row_override for row, row_override in rows if row_override is not None}
+    )
+
+
+def storefront_rows_to_items(
+    rows: List[models.StorefrontItem],
+    user_id: int,
+    db: Session,
+    fields: Optional[Set[str]] = None,
+    overrides: Optional[Dict[int, models.BotProductOverride]] = None
+) -> List[dict]:
+    """
+    Превращает строки storefront_items в элементы списка товаров (в том же порядке).
+    Строки, у которых истекла резервация, пересчитываются на лету (без записи в БД).
+    overrides - переопределения бота с общим каталогом по product_id.
+    """
+    # Резервации, истекшие после последней записи, пересчитываем для этих строк
+    live_reservations = {}
+    if fields is None or fields & RESERVATION_FIELDS:
+        now = datetime.utcnow()
+        stale_ids = [
+            row.product_id for row in rows
+            if row.reservation_expires_at is not None and row.reservation_expires_at <= now
+        ]
+        if stale_ids:
+            stale_products = db.query(models.Product).filter(models.Product.id.in_(stale_ids)).all()
+            states = get_reservation_states(stale_products, user_id, db)
+            live_reservations = {
+                prod.id: serialize_product_list_item(prod, states.get(prod.id, (None, 0)), RESERVATION_FIELDS)
+                for prod in stale_products
+            }
+    
+    items = []
+    for row in rows:
+        values = json.loads(row.payload)
+        if row.product_id in live_reservations:
+            values.update(live_reservations[row.product_id])
+        else:
+            reservation = json.loads(row.reservation) if row.reservation else None
+            values["is_reserved"] = reservation is not None
+            values["reservation"] = reservation
+        if overrides:
+            apply_product_override(values, overrides.get(row.product_id))
+        keys = PRODUCT_LIST_FIELDS if fields is None else [key for key in PRODUCT_LIST_FIELDS if key in fields]
+        items.append({key: values.get(key) for key in keys})
+    return items
+
+
+def get_products(
+    user_id: int,
+    category_id: Optional[int],
+    bot_id: Optional[int],
+    db: Session,
+    viewer_id: Optional[int] = None,  # ID пользователя, который просматривает товары (для фильтрации скрытых)
+    filters: Optional[Dict[str, Any]] = None,
+    sort: Optional[str] = None
+):
+    """
+    Получить список товаров магазина.
+    
+    Только чтение: элементы берутся из проекции storefront_items
+    (см. utils/storefront_projection.py), сверка с ботами выполняется в фоне.
+    Фильтры и сортировка (см. apply_storefront_filters, PRODUCT_SORTS) выполняются в SQL.
+    """
+    print(f"DEBUG: get_products called with user_id={user_id}, category_id={category_id}, bot_id={bot_id}")
+    
+    result = load_storefront_items(
+        user_id, category_id, bot_id, db,
+        viewer_id=viewer_id, filters=filters, sort=parse_sort(sort)
+    )
+    # Логируем информацию о товарах и их изображениях
+    print(f"DEBUG: Found {len(result)} products for user {user_id}")
+    
+    for item in result:
+        images_list = item["images_urls"]
         
-        print(f"DEBUG: Product {prod.id} '{prod.name}' has {'active' if has_reservation else 'no active'} reservation")
-        print(f"DEBUG: Product {prod.id} '{prod.name}' - is_made_to_order raw={getattr(prod, 'is_made_to_order', False)} (type: {type(getattr(prod, 'is_made_to_order', False))}), converted={is_made_to_order}")
-        print(f"DEBUG: Product {prod.id} '{prod.name}' - images_urls: {len(images_list)} images")
+        print(f"DEBUG: Product {item['id']} '{item['name']}' has {'active' if item['is_reserved'] else 'no active'} reservation")
+        print(f"DEBUG: Product {item['id']} '{item['name']}' - is_made_to_order={item['is_made_to_order']}")
+        print(f"DEBUG: Product {item['id']} '{item['name']}' - images_urls: {len(images_list)} images")
         if images_list:
             first_image = images_list[0]
-            print(f"DEBUG: Product {prod.id} first image URL: {first_image}")
+            print(f"DEBUG: Product {item['id']} first image URL: {first_image}")
             if '/api/images/' in first_image:
-                print(f"OK: Product {prod.id} image URL correctly uses /api/images/")
+                print(f"OK: Product {item['id']} image URL correctly uses /api/images/")
             elif '/static/uploads/' in first_image:
-                print(f"WARNING: Product {prod.id} image URL still contains /static/uploads/ - should use /api/images/")
-        
-        result.append({
-            "id": prod.id,
-            "name": prod.name,
-            "description": prod.description,
-            "price": prod.price,
-            "image_url": image_url_full,
-            "images_urls": images_list,
-            "discount": prod.discount,
-            "category_id": prod.category_id,
-            "user_id": prod.user_id,
-            "is_hot_offer": getattr(prod, 'is_hot_offer', False),
-            "quantity": getattr(prod, 'quantity', 0),
-            "is_reserved": has_reservation,
-            "is_made_to_order": is_made_to_order,
-            "is_for_sale": getattr(prod, 'is_for_sale', False),
-            "price_from": getattr(prod, 'price_from', None),
-            "price_to": getattr(prod, 'price_to', None),
-            "price_fixed": getattr(prod, 'price_fixed', None),
-            "price_type": getattr(prod, 'price_type', 'range'),
-            "quantity_from": getattr(prod, 'quantity_from', None),
-            "quantity_unit": getattr(prod, 'quantity_unit', None),
-            "quantity_show_enabled": getattr(prod, 'quantity_show_enabled', None),
-            "is_hidden": getattr(prod, 'is_hidden', False),
-            "reservation": reservation_data
-        })
+                print(f"WARNING: Product {item['id']} image URL still contains /static/uploads/ - should use /api/images/")
     
     return result
 
+
+def get_products_page(
+    user_id: int,
+    category_id: Optional[int],
+    bot_id: Optional[int],
+    db: Session,
+    viewer_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    sort: Optional[str] = None
+) -> dict:
+    """
+    Постраничный список товаров (keyset по id) с проекцией полей.
+    При сортировке по цене страницы листаются по смещению.
+    
+    Args:
+        user_id: ID владельца магазина
+        category_id: ID категории (опционально)
+        bot_id: ID бота (None для основного магазина)
+        db: Сессия базы данных
+        viewer_id: ID просматривающего пользователя (для фильтрации скрытых)
+        limit: Размер страницы (None - все товары одной страницей)
+        cursor: Курсор next_cursor из предыдущей страницы
+        fields: Поля через запятую, например "name,price,image_url" (None - все поля)
+        filters: Фильтры витрины (см. apply_storefront_filters)
+        sort: Сортировка из PRODUCT_SORTS (None - по id)
+        
+    Returns:
+        {"items": [...], "next_cursor": str или None}
+    """
+    requested_fields = parse_fields(fields)
+    sort = parse_sort(sort)
+    by_offset = sort in OFFSET_SORTS
+    after_id = offset = None
+    if cursor:
+        if by_offset:
+            offset = decode_cursor(cursor, key="offset")
+        else:
+            after_id = decode_cursor(cursor)
+    
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Берем на один товар больше, чтобы узнать, есть ли следующая страница
+    items = load_storefront_items(
+        user_id, category_id, bot_id, db,
+        viewer_id=viewer_id, after_id=after_id, limit=limit + 1 if limit is not None else None,
+        fields=requested_fields, filters=filters, sort=sort, offset=offset
+    )
+    has_more = limit is not None and len(items) > limit
+    if has_more:
+        items = items[:limit]
+    
+    next_cursor = None
+    if has_more and items:
+        if by_offset:
+            next_cursor = encode_cursor((offset or 0) + limit, key="offset")
+        else:
+            next_cursor = encode_cursor(items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,133 @@
+"""
+Обработчики для поиска товаров (полнотекстовый индекс products_fts, см. db/product_search.py)
+"""
+import re
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ..db import models
+from ..utils.shared_catalog import resolve_catalog_shop
+from .products_read import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, encode_cursor, parse_fields, storefront_rows_to_items
+)
+
+# Вес совпадения в названии относительно описания при ранжировании (bm25)
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Максимальное количество слов в запросе
+MAX_QUERY_TERMS = 10
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """
+    Преобразует строку поиска в запрос FTS5: каждое слово ищется как префикс,
+    все слова должны встречаться (в названии или описании).
+
+    Например: 'Крас пла' -> '"крас"* "пла"*'
+
+    Returns:
+        Запрос MATCH или None, если в строке нет слов
+    """
+    terms = re.findall(r"\w+", q.lower(), flags=re.UNICODE)[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    # Слова берутся в кавычки, чтобы операторы FTS5 (AND, NEAR, *) из ввода не интерпретировались
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_products(
+    user_id: int,
+    q: str,
+    bot_id: Optional[int],
+    db: Session,
+    viewer_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+) -> dict:
+    """
+    Поиск товаров магазина по названию и описанию с ранжированием по релевантности.
+    Для бота с общим каталогом ищется по товарам основного магазина (переопределенные
+    ботом названия в индекс не входят - совпадение ищется по исходному названию).
+
+    Args:
+        user_id: ID владельца магазина
+        q: Строка поиска (слова ищутся по префиксу)
+        bot_id: ID бота (None для основного магазина)
+        db: Сессия базы данных
+        viewer_id: ID просматривающего пользователя (для фильтрации скрытых)
+        category_id: ID категории (опционально)
+        limit: Размер страницы (по умолчанию DEFAULT_PAGE_SIZE)
+        cursor: Курсор next_cursor из предыдущей страницы
+        fields: Поля через запятую, например "name,price,image_url" (None - все поля)
+
+    Returns:
+        {"items": [...], "next_cursor": str или None}
+    """
+    requested_fields = parse_fields(fields)
+    match_query = build_match_query(q)
+    if match_query is None:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    offset = decode_cursor(cursor, key="offset") if cursor else 0
+
+    # Фильтры витрины те же, что в build_products_query
+    conditions = ["products_fts MATCH :match", "p.user_id = :user_id", "p.is_sold = 0"]
+    params = {"match": match_query, "user_id": user_id, "limit": limit + 1, "offset": offset}
+    bot_id, overlay_bot_id = resolve_catalog_shop(bot_id, db)
+    override_join = ""
+    hidden_column = "p.is_hidden"
+    if overlay_bot_id is not None:
+        override_join = "LEFT JOIN bot_product_overrides o ON o.product_id = p.id AND o.bot_id = :overlay_bot_id"
+        hidden_column = "COALESCE(o.is_hidden, p.is_hidden)"
+        params["overlay_bot_id"] = overlay_bot_id
+    if bot_id is not None:
+        conditions.append("p.bot_id = :bot_id")
+        params["bot_id"] = bot_id
+    else:
+        conditions.append("p.bot_id IS NULL")
+    if viewer_id is not None and viewer_id != user_id:
+        conditions.append(f"({hidden_column} = 0 OR {hidden_column} IS NULL)")
+    if category_id is not None:
+        conditions.append("p.category_id = :category_id")
+        params["category_id"] = category_id
+
+    ranked_ids = [row[0] for row in db.execute(text(f"""
+        SELECT p.id
+        FROM products_fts
+        JOIN products p ON p.id = products_fts.rowid
+        {override_join}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY bm25(products_fts, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), p.id
+        LIMIT :limit OFFSET :offset
+    """), params)]
+
+    has_more = len(ranked_ids) > limit
+    ranked_ids = ranked_ids[:limit]
+
+    rows_by_id = {}
+    if ranked_ids:
+        rows_by_id = {
+            row.product_id: row
+            for row in db.query(models.StorefrontItem).filter(models.StorefrontItem.product_id.in_(ranked_ids)).all()
+        }
+    rows = [rows_by_id[product_id] for product_id in ranked_ids if product_id in rows_by_id]
+
+    overrides = None
+    if overlay_bot_id is not None and ranked_ids:
+        overrides = {
+            override.product_id: override
+            for override in db.query(models.BotProductOverride).filter(
+                models.BotProductOverride.bot_id == overlay_bot_id,
+                models.BotProductOverride.product_id.in_(ranked_ids)
+            ).all()
+        }
+
+    return {
+        "items": storefront_rows_to_items(rows, user_id, db, requested_fields, overrides=overrides),
+        "next_cursor": encode_cursor(offset + limit, key="offset") if has_more else None
+    }
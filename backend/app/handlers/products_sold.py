@@ -7,7 +7,7 @@ from typing import Optional, List
 from fastapi import HTTPException, Query, Header, Depends
 from sqlalchemy.orm import Session
 from ..db import models, database
-from ..utils.telegram_auth import validate_init_data_multi_bot
+from ..utils.request_auth import validate_request_init_data
 from ..utils.products_utils import make_full_url
 
 
@@ -18,21 +18,7 @@ async def get_sold_products(
 ):
     """Получает список проданных товаров (история продаж)"""
     # Проверяем авторизацию через initData
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    
-    try:
-        authenticated_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=bot_token if bot_token else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+    authenticated_user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
     
     # Проверяем, что авторизованный пользователь запрашивает свои продажи
     if authenticated_user_id != user_id:
@@ -86,21 +72,7 @@ async def delete_sold_product(
 ):
     """Удалить запись о проданном товаре"""
     # Проверяем авторизацию через initData
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    
-    try:
-        authenticated_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=bot_token if bot_token else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+    authenticated_user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
     
     # Проверяем, что авторизованный пользователь является владельцем
     if authenticated_user_id != user_id:
@@ -130,21 +102,7 @@ async def delete_sold_products(
 ):
     """Удалить несколько записей о проданных товарах"""
     # Проверяем авторизацию через initData
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    
-    try:
-        authenticated_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=bot_token if bot_token else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+    authenticated_user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
     
     # Проверяем, что авторизованный пользователь является владельцем
     if authenticated_user_id != user_id:
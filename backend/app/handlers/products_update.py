@@ -9,9 +9,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import distinct
 from ..db import models
 from ..models import product as schemas
-from ..utils.products_sync import sync_product_to_all_bots, sync_product_to_all_bots_with_rename
-from ..utils.products_utils import get_bot_token_for_notifications
-from ..utils.telegram_auth import validate_init_data_multi_bot
+from ..utils.sync_queue import enqueue_product_sync
+from ..utils.products_bulk import apply_bulk_product_patch
+from ..utils.products_utils import get_bot_token_for_notifications, validate_discount
+from ..utils.catalog_cache import bump_shop_version
+from ..utils.request_auth import validate_request_init_data
+from ..utils.storefront_projection import mark_storefront_dirty
+from ..utils.shared_catalog import is_shared_catalog_bot, set_product_override
 
 
 def update_product(
@@ -47,10 +51,11 @@ def update_product(
     
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     return db_product
 
@@ -86,10 +91,11 @@ def toggle_hot_offer(
     db_product.is_hot_offer = hot_offer_update.is_hot_offer
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     return {
@@ -136,10 +142,11 @@ def update_price_discount(
     db_product.discount = price_discount_update.discount
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     # Определяем, что изменилось
@@ -320,21 +327,18 @@ def update_name_description(
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    # КРИТИЧНО: Сохраняем старое имя для синхронизации
-    # Синхронизация ищет товар по имени, поэтому нужно использовать старое имя для поиска
-    old_name = db_product.name
-    old_price = db_product.price  # Также сохраняем цену для более точного поиска
-    
+    # Копии находятся по группе синхронизации, старое имя для поиска не нужно
     # Обновляем значения
     db_product.name = name_description_update.name
     db_product.description = name_description_update.description
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    # Используем специальную функцию для синхронизации с переименованием
-    sync_product_to_all_bots_with_rename(db_product, db, old_name=old_name, old_price=old_price)
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее.
+    # Для товара основного магазина недостающие копии в ботах создаются (как раньше при переименовании)
+    enqueue_product_sync(db_product, db, action="create" if db_product.bot_id is None else "update")
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     return {
@@ -379,10 +383,11 @@ def update_quantity(
         db_product.quantity_unit = quantity_update.quantity_unit
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     return {
@@ -424,10 +429,11 @@ def update_made_to_order(
     db_product.is_made_to_order = bool(made_to_order_update.is_made_to_order)
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     # Отладочный вывод
@@ -478,10 +484,11 @@ def update_for_sale(
     db_product.quantity_unit = for_sale_update.quantity_unit
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     return {
@@ -533,10 +540,11 @@ def update_quantity_show_enabled(
         db_product.quantity_show_enabled = bool(quantity_show_enabled_update.quantity_show_enabled)
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     return {
@@ -566,77 +574,149 @@ async def bulk_update_made_to_order(
     Raises:
         HTTPException: Если авторизация не прошла или произошла ошибка
     """
-    # Валидация пользователя через initData
-    if not x_telegram_init_data:
-        raise HTTPException(
-            status_code=401,
-            detail="Telegram initData is required. Open the app through Telegram bot."
-        )
-    
-    # Получаем bot_token из окружения (как в других эндпоинтах)
-    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
-    print(f"🔄 Bulk update made-to-order - initData present: {bool(x_telegram_init_data)}, bot_token present: {bool(bot_token)}")
+    authenticated_user_id, _ = await _validate_bulk_init_data(x_telegram_init_data, db)
     
+    # Только активные товары основного магазина; их копии в ботах меняются тем же UPDATE
     try:
-        # Используем функцию для валидации с любым ботом
-        authenticated_user_id, bot_token_validated, bot_id = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=bot_token if bot_token else None
+        result = apply_bulk_product_patch(
+            authenticated_user_id, None, {},
+            {"is_made_to_order": bool(bulk_update.is_made_to_order)},
+            db
         )
-        print(f"✅ Validated initData - user_id={authenticated_user_id}, bot_id={bot_id}")
-    except HTTPException as e:
-        print(f"❌ HTTPException during validation: {e.status_code} - {e.detail}")
-        raise
+        db.commit()
+        bump_shop_version(authenticated_user_id)
     except Exception as e:
-        print(f"❌ Exception during validation: {type(e).__name__} - {str(e)}")
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
-    # Получаем только активные товары из основного бота (bot_id=None)
-    # Синхронизация обновит их во все подключенные боты
-    # Это исключает дубликаты - один товар может быть в основном боте и в подключенных ботах
-    all_products = db.query(models.Product).filter(
-        models.Product.user_id == authenticated_user_id,
-        models.Product.bot_id == None,  # Только товары из основного бота
-        models.Product.is_sold == False  # Только активные товары (не проданные)
-    ).all()
-    
-    print(f"📦 Found {len(all_products)} active products in main bot for user {authenticated_user_id}")
+        db.rollback()
+        print(f"❌ Error during bulk update: {type(e).__name__} - {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ошибка при обновлении товаров: {str(e)}")
     
-    if not all_products:
+    updated_count = result["matched_count"]
+    if not updated_count:
         return {
             "updated_count": 0,
             "message": "У вас нет активных товаров для обновления"
         }
     
-    # Обновляем все товары из основного бота
-    # sync_product_to_all_bots обновит их во все подключенные боты
-    updated_count = 0
-    try:
-        for product in all_products:
-            product.is_made_to_order = bool(bulk_update.is_made_to_order)
-            # Синхронизируем обновление товара во все боты
-            try:
-                sync_product_to_all_bots(product, db, action="update")
-            except Exception as e:
-                print(f"⚠️ Error syncing product {product.id} to bots: {str(e)}")
-                # Продолжаем обновление других товаров даже если синхронизация не удалась
-            updated_count += 1
+    print(f"✅ Bulk update made-to-order - user_id={authenticated_user_id}, is_made_to_order={bulk_update.is_made_to_order}, updated_count={updated_count}")
+    return {
+        "updated_count": updated_count,
+        "is_made_to_order": bulk_update.is_made_to_order,
+        "message": f"Обновлено {updated_count} товаров"
+    }
+
+
+async def bulk_patch_products(
+    patch: schemas.BulkProductPatch,
+    x_telegram_init_data: Optional[str],
+    db: Session
+):
+    """
+    Массовое изменение товаров по фильтру: под заказ, скрытие, скидка, горящее предложение,
+    перенос в категорию. Товары выбираются в магазине, из которого открыт WebApp,
+    изменения применяются и ко всем их копиям (основной магазин и подключенные боты)
+    несколькими UPDATE независимо от числа товаров.
+    Требует авторизации через Telegram initData (владелец магазина).
+    
+    Args:
+        patch: Фильтр и изменения
+        x_telegram_init_data: Telegram initData для авторизации
+        db: Сессия базы данных
+        
+    Returns:
+        Словарь с количеством выбранных товаров и измененных строк (вместе с копиями)
         
+    Raises:
+        HTTPException: Если авторизация не прошла, нет изменений или категория не найдена
+    """
+    authenticated_user_id, bot_id = await _validate_bulk_init_data(x_telegram_init_data, db)
+    changes = patch.changes.model_dump(exclude_none=True)
+    
+    try:
+        result = apply_bulk_product_patch(authenticated_user_id, bot_id, patch.filter.model_dump(), changes, db)
         db.commit()
-        print(f"✅ Bulk update made-to-order - user_id={authenticated_user_id}, is_made_to_order={bulk_update.is_made_to_order}, updated_count={updated_count}")
+    except HTTPException:
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
-        print(f"❌ Error during bulk update: {type(e).__name__} - {str(e)}")
+        print(f"❌ Error during bulk patch: {type(e).__name__} - {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ошибка при обновлении товаров: {str(e)}")
     
+    if result["updated_count"]:
+        bump_shop_version(authenticated_user_id)
+    
     return {
-        "updated_count": updated_count,
-        "is_made_to_order": bulk_update.is_made_to_order,
-        "message": f"Обновлено {updated_count} товаров"
+        **result,
+        "changes": changes,
+        "message": f"Обновлено {result['matched_count']} товаров"
     }
 
 
+async def set_bot_product_override(
+    product_id: int,
+    override_update: schemas.ProductOverrideUpdate,
+    x_telegram_init_data: Optional[str],
+    db: Session
+):
+    """
+    Изменение товара только для бота с общим каталогом, через который открыт WebApp:
+    в основном магазине и других ботах товар не меняется. Меняются только переданные поля,
+    null снимает переопределение поля.
+    Требует авторизации через Telegram initData (владелец магазина).
+    
+    Args:
+        product_id: ID товара основного магазина
+        override_update: Переопределяемые поля
+        x_telegram_init_data: Telegram initData для авторизации
+        db: Сессия базы данных
+        
+    Returns:
+        Словарь с действующими переопределениями бота для товара
+        
+    Raises:
+        HTTPException: Если авторизация не прошла, бот без общего каталога или товар не найден
+    """
+    authenticated_user_id, bot_id = await _validate_bulk_init_data(x_telegram_init_data, db)
+    if not is_shared_catalog_bot(bot_id, db):
+        raise HTTPException(status_code=400, detail="Product overrides are available only in bots with a shared catalog")
+    validate_discount(override_update.discount)
+    
+    db_product = db.query(models.Product).filter(
+        models.Product.id == product_id,
+        models.Product.user_id == authenticated_user_id,
+        models.Product.bot_id == None
+    ).first()
+    if not db_product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    override = set_product_override(db_product, bot_id, override_update.model_dump(exclude_unset=True), db)
+    # Цена со скидкой переопределения пересчитывается вместе с витриной владельца
+    mark_storefront_dirty(db, authenticated_user_id, product_ids=[db_product.id])
+    db.commit()
+    bump_shop_version(authenticated_user_id)
+    
+    return {
+        "product_id": product_id,
+        "bot_id": bot_id,
+        "overrides": {
+            field: getattr(override, field) for field in schemas.ProductOverrideUpdate.model_fields
+            if getattr(override, field) is not None
+        } if override is not None else {}
+    }
+
+
+async def _validate_bulk_init_data(x_telegram_init_data: Optional[str], db: Session):
+    """
+    Валидация initData для массовых операций.
+    
+    Returns:
+        (ID пользователя, ID бота, через которого открыт WebApp - None для основного)
+    """
+    authenticated_user_id, _, bot_id = await validate_request_init_data(x_telegram_init_data, db)
+    print(f"✅ Validated initData - user_id={authenticated_user_id}, bot_id={bot_id}")
+    return authenticated_user_id, bot_id
+
+
 def update_hidden(
     product_id: int,
     hidden_update: schemas.HiddenUpdate,
@@ -669,10 +749,11 @@ def update_hidden(
     db_product.is_hidden = bool(hidden_update.is_hidden)
     db.flush()
     
-    # Синхронизируем обновление товара во все боты
-    sync_product_to_all_bots(db_product, db, action="update")
+    # Синхронизация во все боты - в фоне (очередь sync_jobs), ответ не ждет ее
+    enqueue_product_sync(db_product, db)
     
     db.commit()
+    bump_shop_version(db_product.user_id)
     db.refresh(db_product)
     
     return {
@@ -6,13 +6,23 @@ from fastapi.responses import FileResponse
 from pathlib import Path
 from .db import database, models
 from .db.schema_check import log_schema_status
-from .routers import products, categories, channels, reservations, context, shop_settings, shop_visits, orders, bots, purchases, debug
+from .db.product_search import ensure_product_search_index
+from .utils.catalog_digest import backfill_catalog_digests
+from .utils.catalog_reconciler import start_reconciler, stop_reconciler
+from .utils.storefront_projection import backfill_storefront_items
+from .utils.sync_groups import backfill_sync_groups
+from .utils.sync_queue import start_sync_worker, stop_sync_worker
+from .utils.telegram_auth import BOT_HINT_HEADER, begin_request_auth, finish_request_auth
+from .utils.session_tokens import SESSION_HEADER
+from .routers import products, categories, channels, reservations, context, shop_settings, shop_visits, orders, bots, purchases, debug, bootstrap, session
 
 # Проверяем целостность схемы БД перед созданием таблиц
 log_schema_status()
 
 # Создаем таблицы базы данных
 models.Base.metadata.create_all(bind=database.engine)
+# Полнотекстовый индекс товаров (FTS5 + триггеры) создается отдельно: create_all его не знает
+ensure_product_search_index()
 
 app = FastAPI(title="PriseMiniApp API")
 
@@ -72,6 +82,20 @@ async def add_ngrok_headers(request, call_next):
             response.headers["Cache-Control"] = "public, max-age=31536000"
     return response
 
+# Проверка initData один раз на запрос (request.state.auth); подсказка бота из заголовка
+# X-Telegram-Bot-Id - ключ этого бота пробуется первым, токен сессии X-Session-Token
+# заменяет проверку initData (utils/telegram_auth.py)
+@app.middleware("http")
+async def telegram_request_auth(request, call_next):
+    request.state.auth = begin_request_auth(
+        request.headers.get(BOT_HINT_HEADER),
+        request.headers.get(SESSION_HEADER)
+    )
+    try:
+        return await call_next(request)
+    finally:
+        finish_request_auth(request.state.auth)
+
 # Настройка CORS
 app.add_middleware(
     CORSMiddleware,
@@ -93,6 +117,29 @@ app.include_router(orders.router)
 app.include_router(bots.router)
 app.include_router(purchases.router)
 app.include_router(debug.router)
+app.include_router(bootstrap.router)
+app.include_router(session.router)
+
+@app.on_event("startup")
+def start_background_workers():
+    """
+    Назначает группы синхронизации, заполняет проекцию витрины и суммы каталогов (если нужно),
+    затем запускает очередь синхронизации правок и фоновую сверку товаров основного магазина и ботов
+    """
+    db = database.SessionLocal()
+    try:
+        backfill_sync_groups(db)
+        backfill_storefront_items(db)
+        backfill_catalog_digests(db)
+    finally:
+        db.close()
+    start_sync_worker()
+    start_reconciler()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    stop_sync_worker()
+    stop_reconciler()
 
 @app.get("/")
 async def root():
@@ -15,8 +15,18 @@ class Category(CategoryBase):
     class Config:
         from_attributes = True
 
+class CategoryTreeNode(BaseModel):
+    """Узел дерева категорий с количеством видимых товаров"""
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+    product_count: int = 0  # Товары непосредственно в категории
+    subtree_product_count: int = 0  # Товары в категории и во всех ее подкатегориях
+    subcategories: List['CategoryTreeNode'] = []
+
 # Для обновления модели после определения
 Category.model_rebuild()
+CategoryTreeNode.model_rebuild()
 
 
 
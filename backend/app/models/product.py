@@ -54,6 +54,36 @@ class MadeToOrderUpdate(BaseModel):
 class BulkMadeToOrderUpdate(BaseModel):
     is_made_to_order: bool
 
+class BulkProductFilter(BaseModel):
+    """Какие товары менять: товары магазина, из которого пришел запрос (условия объединяются через И)"""
+    product_ids: Optional[List[int]] = None
+    category_id: Optional[int] = None
+    is_hidden: Optional[bool] = None
+    is_hot_offer: Optional[bool] = None
+    is_made_to_order: Optional[bool] = None
+    include_sold: bool = False  # По умолчанию проданные товары не трогаем
+
+class BulkProductChanges(BaseModel):
+    """Новые значения полей (None - поле не меняется)"""
+    is_made_to_order: Optional[bool] = None
+    is_hidden: Optional[bool] = None
+    discount: Optional[float] = None
+    is_hot_offer: Optional[bool] = None
+    category_id: Optional[int] = None  # Перенос в категорию (в ботах - в категорию с тем же именем)
+
+class BulkProductPatch(BaseModel):
+    filter: BulkProductFilter = BulkProductFilter()
+    changes: BulkProductChanges
+
+class ProductOverrideUpdate(BaseModel):
+    """Переопределение товара в боте с общим каталогом (переданный null - как в основном магазине)"""
+    name: Optional[str] = None
+    description: Optional[str] = None
+    price: Optional[float] = None
+    discount: Optional[float] = None
+    is_hidden: Optional[bool] = None
+    is_hot_offer: Optional[bool] = None
+
 class ForSaleUpdate(BaseModel):
     is_for_sale: bool
     price_from: Optional[float] = None
@@ -15,6 +15,7 @@ class Reservation(ReservationBase):
     reserved_by_user_id: int  # Кто зарезервировал
     created_at: datetime
     is_active: bool
+    quantity: int = 1  # Зарезервированное количество
 
     class Config:
         from_attributes = True
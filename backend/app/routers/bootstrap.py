@@ -0,0 +1,65 @@
+"""
+Роутер для холодного старта WebApp: один запрос вместо последовательных
+/api/context, /api/shop-settings, /api/categories/ и /api/products/
+"""
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+from typing import Optional
+from ..db import database
+from ..models import shop_settings as shop_settings_schemas
+from ..handlers.products_read import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .context import resolve_shop_context
+from ..utils.request_auth import get_validated_user_and_bot
+from .shop_settings import load_shop_settings
+from .categories import get_categories_json
+from .products import get_products_json
+
+router = APIRouter(prefix="/api", tags=["bootstrap"])
+
+_shop_settings_adapter = TypeAdapter(shop_settings_schemas.ShopSettings)
+
+
+@router.get("/bootstrap")
+async def get_bootstrap(
+    shop_owner_id: Optional[int] = Query(None, description="ID владельца магазина (если смотрим чужой магазин)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Размер первой страницы товаров"),
+    fields: Optional[str] = Query(None, description="Поля товаров через запятую, например name,price,image_url"),
+    auth: tuple = Depends(get_validated_user_and_bot),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Все данные для первого экрана WebApp за один запрос.
+
+    initData валидируется один раз, дальше ответ собирается теми же функциями,
+    что и отдельные endpoints, поэтому поведение не расходится:
+    - context: как GET /api/context (viewer_id, shop_owner_id, role, permissions, bot_id)
+    - shop_settings: как GET /api/shop-settings для магазина из контекста
+    - categories: дерево категорий, как GET /api/categories/
+    - products: первая страница, как GET /api/products/?limit=... ({"items": [...], "next_cursor": ...})
+
+    Returns:
+        {"context": {...}, "shop_settings": {...}, "categories": [...], "products": {...}}
+    """
+    viewer_id, bot_id = auth
+    print(f"🚀 GET /api/bootstrap - viewer_id={viewer_id}, bot_id={bot_id}, shop_owner_id={shop_owner_id}")
+
+    context = resolve_shop_context(viewer_id, bot_id, shop_owner_id, db)
+    shop_id = context["shop_owner_id"]
+    shop_bot_id = context["bot_id"]
+
+    # Та же сериализация, что дает response_model=schemas.ShopSettings
+    shop_settings = _shop_settings_adapter.dump_python(
+        _shop_settings_adapter.validate_python(load_shop_settings(shop_id, shop_bot_id, db)), mode="json"
+    )
+    categories_json = get_categories_json(shop_id, shop_bot_id, False, db)
+    products_json = get_products_json(
+        shop_id, None, shop_bot_id, db,
+        viewer_id=context["viewer_id"], limit=limit, fields=fields
+    )
+
+    # Категории и товары уже готовым JSON (из кэша каталога), вставляем их без повторной сериализации
+    head = JSONResponse(content={"context": context, "shop_settings": shop_settings}).body
+    body = head[:-1] + b',"categories":' + categories_json + b',"products":' + products_json + b'}'
+    return Response(content=body, media_type="application/json")
@@ -10,7 +10,15 @@ from typing import Optional
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from ..db import database
-from ..utils.telegram_auth import validate_telegram_init_data
+from ..utils.telegram_auth import invalidate_bot_keys
+from ..utils.request_auth import validate_request_init_data, get_optional_validated_user_and_bot
+from ..utils.catalog_reconciler import mark_shop_dirty
+from ..utils.sync_groups import ensure_sync_group
+from ..utils.category_resolver import get_category_resolver
+from ..utils.catalog_cache import bump_shop_version
+from ..utils.catalog_reconciler import reconcile_owner_catalog
+from ..utils.storefront_projection import mark_storefront_dirty
+from ..utils.shared_catalog import CATALOG_MODES, CATALOG_MODE_COPIED, CATALOG_MODE_SHARED, convert_bot_to_shared_catalog
 
 load_dotenv()
 
@@ -25,6 +33,7 @@ class BotRegisterRequest(BaseModel):
     bot_token: str
     owner_user_id: int  # ID владельца (из initData главного бота)
     direct_link_name: Optional[str] = None  # Название Direct Link (например, "shop", "TGshowcase_bot")
+    catalog_mode: Optional[str] = None  # "copied" (по умолчанию) или "shared" - общий каталог основного магазина
 
 
 class BotResponse(BaseModel):
@@ -33,54 +42,57 @@ class BotResponse(BaseModel):
     owner_user_id: int
     is_active: bool
     direct_link_name: Optional[str] = None
+    catalog_mode: str = CATALOG_MODE_COPIED
     created_at: str
 
 
+def bot_response(bot) -> BotResponse:
+    """Ответ API по строке бота"""
+    return BotResponse(
+        id=bot.id,
+        bot_username=bot.bot_username,
+        owner_user_id=bot.owner_user_id,
+        is_active=bot.is_active,
+        direct_link_name=bot.direct_link_name,  # Может быть None, это нормально
+        catalog_mode=bot.catalog_mode or CATALOG_MODE_COPIED,
+        created_at=bot.created_at.isoformat()
+    )
+
+
 async def get_validated_user(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data")
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
 ):
     """
-    Dependency для валидации Telegram initData и извлечения user_id
+    Dependency для валидации Telegram initData и извлечения user_id.
+    Управлять ботами можно только из главного бота: initData подключенного бота
+    подписан его владельцем и здесь не принимается.
     """
-    if not x_telegram_init_data:
-        raise HTTPException(
-            status_code=401,
-            detail="Telegram initData is required. Open the app through Telegram bot."
-        )
-    
     if not TELEGRAM_BOT_TOKEN:
         raise HTTPException(
             status_code=500,
             detail="Bot token is not configured"
         )
     
-    try:
-        validated_data = validate_telegram_init_data(x_telegram_init_data, TELEGRAM_BOT_TOKEN)
-        return validated_data["user"]["id"]
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+    user_id, _, bot_id = await validate_request_init_data(x_telegram_init_data, db)
+    if bot_id is not None:
+        raise HTTPException(status_code=401, detail="Invalid Telegram initData: main bot initData is required")
+    return user_id
 
 
 async def get_optional_validated_user(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data")
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
 ) -> Optional[int]:
     """
-    Опциональная dependency для валидации Telegram initData.
-    Возвращает None, если initData не предоставлен.
+    Опциональная dependency для валидации Telegram initData главного бота.
+    Возвращает None, если initData не предоставлен или не подписан главным ботом.
     """
-    if not x_telegram_init_data:
-        return None
-    
     if not TELEGRAM_BOT_TOKEN:
         return None
     
-    try:
-        validated_data = validate_telegram_init_data(x_telegram_init_data, TELEGRAM_BOT_TOKEN)
-        return validated_data["user"]["id"]
-    except:
-        return None
+    user_id, bot_id = await get_optional_validated_user_and_bot(x_telegram_init_data, db)
+    return user_id if bot_id is None else None
 
 
 async def verify_bot_token(bot_token: str) -> dict:
@@ -143,6 +155,12 @@ async def register_bot(
             detail="Owner user_id is required"
         )
     
+    if request.catalog_mode is not None and request.catalog_mode not in CATALOG_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"catalog_mode must be one of: {', '.join(CATALOG_MODES)}"
+        )
+    
     # Проверяем токен бота через Telegram API
     bot_info = await verify_bot_token(request.bot_token)
     bot_username = bot_info.get("username")
@@ -190,6 +208,7 @@ async def register_bot(
             existing_bot.updated_at = datetime.utcnow()
             db.commit()
             db.refresh(existing_bot)
+            invalidate_bot_keys()
         
         # Проверяем, есть ли данные магазина для этого бота
         bot_settings = db.query(models.ShopSettings).filter(
@@ -202,8 +221,11 @@ async def register_bot(
             models.Category.bot_id == existing_bot.id
         ).count()
         
-        # Если данных нет, копируем их из основного бота
-        if not bot_settings or bot_categories == 0:
+        if request.catalog_mode and request.catalog_mode != existing_bot.catalog_mode:
+            print(f"ℹ️ Bot {existing_bot.id} keeps catalog_mode='{existing_bot.catalog_mode}' (use POST /api/bots/{existing_bot.id}/shared-catalog to switch)")
+        
+        # Если данных нет, копируем их из основного бота (боту с общим каталогом копии не нужны)
+        if existing_bot.catalog_mode != CATALOG_MODE_SHARED and (not bot_settings or bot_categories == 0):
             print(f"📦 Copying shop data from main bot to existing bot {existing_bot.id} (user {final_owner_user_id})...")
             
             # Копируем настройки магазина (если их нет)
@@ -253,8 +275,15 @@ async def register_bot(
                     models.Product.bot_id == None
                 ).all()
                 
+                # Группы, у которых уже есть копия в этом боте
+                bot_groups = {group_id for (group_id,) in db.query(models.Product.sync_group_id).filter(
+                    models.Product.bot_id == existing_bot.id
+                ).all()}
+                
                 copied_products = 0
                 for main_product in main_products:
+                    if main_product.sync_group_id in bot_groups:
+                        continue
                     new_category_id = category_mapping.get(main_product.category_id)
                     new_product = models.Product(
                         name=main_product.name,
@@ -265,6 +294,8 @@ async def register_bot(
                         discount=main_product.discount,
                         user_id=final_owner_user_id,
                         bot_id=existing_bot.id,
+                        sync_product_id=main_product.sync_product_id or main_product.id,
+                        sync_group_id=ensure_sync_group(main_product, db),
                         is_hot_offer=main_product.is_hot_offer,
                         quantity=main_product.quantity,
                         is_sold=False,
@@ -276,15 +307,11 @@ async def register_bot(
                 
                 db.commit()
                 print(f"✅ Bot {existing_bot.id} ready: {len(main_categories)} categories, {copied_products} products copied")
+                # Расхождения между основным магазином и ботом исправит фоновая сверка
+                mark_shop_dirty(final_owner_user_id)
+                bump_shop_version(final_owner_user_id)
         
-        return BotResponse(
-            id=existing_bot.id,
-            bot_username=existing_bot.bot_username,
-            owner_user_id=existing_bot.owner_user_id,
-            is_active=existing_bot.is_active,
-            direct_link_name=existing_bot.direct_link_name,
-            created_at=existing_bot.created_at.isoformat()
-        )
+        return bot_response(existing_bot)
     
     # Создаем новую запись
     # Если direct_link_name не указан, используем стандартное название "shop"
@@ -295,12 +322,20 @@ async def register_bot(
         bot_username=bot_username,
         owner_user_id=final_owner_user_id,
         is_active=True,
-        direct_link_name=direct_link_name
+        direct_link_name=direct_link_name,
+        catalog_mode=request.catalog_mode or CATALOG_MODE_COPIED
     )
     
     db.add(new_bot)
     db.commit()
     db.refresh(new_bot)
+    invalidate_bot_keys()
+    
+    if new_bot.catalog_mode == CATALOG_MODE_SHARED:
+        # Общий каталог: товары, категории и настройки основного магазина, копировать нечего
+        print(f"✅ Bot registered: {bot_username} (owner: {final_owner_user_id}, shared catalog)")
+        bump_shop_version(final_owner_user_id)
+        return bot_response(new_bot)
     
     # КОПИРУЕМ ВСЕ ДАННЫЕ МАГАЗИНА ИЗ ОСНОВНОГО БОТА В НОВЫЙ БОТ
     # Создаем независимый магазин для нового бота с копированными данными
@@ -357,15 +392,18 @@ async def register_bot(
     # Создаем маппинг старых category_id -> новых category_id
     category_mapping = {}  # old_id -> new_id
     
+    # Уже скопированные категории (по имени) - одним запросом для всех категорий
+    resolver = get_category_resolver(final_owner_user_id, db)
+    existing_category_ids = {
+        main_category.id: resolver.resolve(main_category.id, new_bot.id)
+        for main_category in main_categories
+    }
+    
     for main_category in main_categories:
         # Проверяем, не скопирована ли уже категория
-        existing_category = db.query(models.Category).filter(
-            models.Category.user_id == final_owner_user_id,
-            models.Category.bot_id == new_bot.id,
-            models.Category.name == main_category.name
-        ).first()
+        existing_category_id = existing_category_ids[main_category.id]
         
-        if not existing_category:
+        if not existing_category_id:
             new_category = models.Category(
                 name=main_category.name,
                 user_id=final_owner_user_id,
@@ -376,7 +414,7 @@ async def register_bot(
             category_mapping[main_category.id] = new_category.id
             print(f"✅ Copied category '{main_category.name}' (old_id={main_category.id} -> new_id={new_category.id})")
         else:
-            category_mapping[main_category.id] = existing_category.id
+            category_mapping[main_category.id] = existing_category_id
     
     db.commit()
     
@@ -386,17 +424,15 @@ async def register_bot(
         models.Product.bot_id == None
     ).all()
     
+    # Группы, у которых уже есть копия в этом боте
+    bot_groups = {group_id for (group_id,) in db.query(models.Product.sync_group_id).filter(
+        models.Product.bot_id == new_bot.id
+    ).all()}
+    
     copied_products = 0
     for main_product in main_products:
         # Проверяем, не скопирован ли уже товар
-        existing_product = db.query(models.Product).filter(
-            models.Product.user_id == final_owner_user_id,
-            models.Product.bot_id == new_bot.id,
-            models.Product.name == main_product.name,
-            models.Product.price == main_product.price
-        ).first()
-        
-        if not existing_product:
+        if main_product.sync_group_id not in bot_groups:
             # Получаем новый category_id из маппинга
             new_category_id = category_mapping.get(main_product.category_id)
             
@@ -409,6 +445,8 @@ async def register_bot(
                 discount=main_product.discount,
                 user_id=final_owner_user_id,
                 bot_id=new_bot.id,  # Индивидуальный товар для нового бота
+                sync_product_id=main_product.sync_product_id or main_product.id,  # Связываем с оригинальным товаром
+                sync_group_id=ensure_sync_group(main_product, db),
                 is_hot_offer=main_product.is_hot_offer,
                 quantity=main_product.quantity,
                 is_sold=False,  # Новый товар не продан
@@ -422,17 +460,13 @@ async def register_bot(
     db.commit()
     
     print(f"✅ Bot {new_bot.id} ready: {len(main_categories)} categories, {copied_products} products copied (independent shop)")
+    # Расхождения между основным магазином и ботом исправит фоновая сверка
+    mark_shop_dirty(final_owner_user_id)
+    bump_shop_version(final_owner_user_id)
     
     print(f"✅ Bot registered: {bot_username} (owner: {final_owner_user_id})")
     
-    return BotResponse(
-        id=new_bot.id,
-        bot_username=new_bot.bot_username,
-        owner_user_id=new_bot.owner_user_id,
-        is_active=new_bot.is_active,
-        direct_link_name=new_bot.direct_link_name,
-        created_at=new_bot.created_at.isoformat()
-    )
+    return bot_response(new_bot)
 
 
 @router.get("/bots/my", response_model=list[BotResponse])
@@ -459,7 +493,7 @@ async def get_my_bots(
                 status_code=401,
                 detail="Telegram initData is required or user_id must be provided"
             )
-        final_user_id = await get_validated_user(x_telegram_init_data)
+        final_user_id = await get_validated_user(x_telegram_init_data, db)
     
     bots = db.query(models.Bot).filter(
         models.Bot.owner_user_id == final_user_id,
@@ -467,14 +501,7 @@ async def get_my_bots(
     ).all()
     
     result = [
-        BotResponse(
-            id=bot.id,
-            bot_username=bot.bot_username,
-            owner_user_id=bot.owner_user_id,
-            is_active=bot.is_active,
-            direct_link_name=bot.direct_link_name,  # Может быть None, это нормально
-            created_at=bot.created_at.isoformat()
-        )
+        bot_response(bot)
         for bot in bots
     ]
     
@@ -509,7 +536,7 @@ async def update_direct_link_name(
                 status_code=401,
                 detail="Telegram initData is required or user_id must be provided"
             )
-        final_user_id = await get_validated_user(x_telegram_init_data)
+        final_user_id = await get_validated_user(x_telegram_init_data, db)
     
     # Находим бота
     bot = db.query(models.Bot).filter(
@@ -529,14 +556,7 @@ async def update_direct_link_name(
     db.commit()
     db.refresh(bot)
     
-    return BotResponse(
-        id=bot.id,
-        bot_username=bot.bot_username,
-        owner_user_id=bot.owner_user_id,
-        is_active=bot.is_active,
-        direct_link_name=bot.direct_link_name,
-        created_at=bot.created_at.isoformat()
-    )
+    return bot_response(bot)
 
 @router.delete("/bots/{bot_id}")
 async def delete_bot(
@@ -561,7 +581,7 @@ async def delete_bot(
                 status_code=401,
                 detail="Telegram initData is required or user_id must be provided"
             )
-        final_user_id = await get_validated_user(x_telegram_init_data)
+        final_user_id = await get_validated_user(x_telegram_init_data, db)
     
     # Находим бота
     bot = db.query(models.Bot).filter(
@@ -582,6 +602,7 @@ async def delete_bot(
     # Используем мягкое удаление для возможности восстановления
     bot.is_active = False
     db.commit()
+    invalidate_bot_keys(deactivated_bot_id=bot_id)
     
     return {
         "message": f"Bot @{bot_username} has been deactivated",
@@ -589,6 +610,61 @@ async def delete_bot(
         "bot_username": bot_username
     }
 
+@router.post("/bots/{bot_id}/shared-catalog")
+async def switch_bot_to_shared_catalog(
+    bot_id: int,
+    owner_user_id: Optional[int] = Query(None, description="User ID для запросов от бота (localhost)"),
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Перевести бота с копиями каталога в общий каталог основного магазина.
+    Отличия товаров бота от основного магазина сохраняются как переопределения бота,
+    копии товаров и категорий бота удаляются. Обратного перевода нет.
+    Поддерживает запросы от бота (user_id в query) и от WebApp (initData).
+    """
+    from ..db import models
+    
+    if owner_user_id is not None:
+        final_user_id = owner_user_id
+    else:
+        if not x_telegram_init_data:
+            raise HTTPException(
+                status_code=401,
+                detail="Telegram initData is required or user_id must be provided"
+            )
+        final_user_id = await get_validated_user(x_telegram_init_data, db)
+    
+    bot = db.query(models.Bot).filter(
+        models.Bot.id == bot_id,
+        models.Bot.owner_user_id == final_user_id
+    ).first()
+    
+    if not bot:
+        raise HTTPException(
+            status_code=404,
+            detail="Bot not found"
+        )
+    
+    if bot.catalog_mode == CATALOG_MODE_SHARED:
+        return {"bot": bot_response(bot), "converted": False}
+    
+    # Сначала сверка: у каждой копии бота должен быть товар основного магазина
+    reconcile_owner_catalog(final_user_id, db, commit=False)
+    try:
+        stats = convert_bot_to_shared_catalog(bot, db)
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+    # Ссылки переносились UPDATE в обход flush - витрину владельца пересчитываем при коммите явно
+    mark_storefront_dirty(db, final_user_id)
+    bot.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(bot)
+    bump_shop_version(final_user_id)
+    
+    return {"bot": bot_response(bot), "converted": True, **stats}
+
 @router.get("/bots/{bot_token}/token")
 async def get_bot_by_token(
     bot_token: str,
@@ -1,234 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Header
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..db import models, database
 from ..models import category as schemas
+from ..utils.catalog_cache import catalog_cache, bump_shop_version, viewer_class
+from ..utils.category_sync import sync_category_tree
+from ..utils.shared_catalog import resolve_catalog_shop, catalog_bot_id
+from ..utils.request_auth import get_optional_validated_user_and_bot
 
 router = APIRouter(prefix="/api/categories", tags=["categories"])
 
 def sync_category_to_all_bots(db_category: models.Category, db: Session, action: str = "create"):
     """
     Синхронизирует категорию во все боты пользователя (двусторонняя синхронизация).
+    Дерево магазина категории сравнивается с деревьями остальных магазинов целиком
+    (utils/category_sync.py), поэтому заодно исправляются и родители по имени.
     
     action: "create", "update", "delete"
+    Для "delete" категория уже должна быть удалена в своем магазине (flush),
+    в остальных магазинах удаляются категории с тем же именем.
     """
-    user_id = db_category.user_id
-    
-    # Находим все подключенные боты пользователя
-    connected_bots = db.query(models.Bot).filter(
-        models.Bot.owner_user_id == user_id,
-        models.Bot.is_active == True
-    ).all()
-    
-    if db_category.bot_id is None:
-        # Категория в основном боте - синхронизируем во все подключенные боты
-        for bot in connected_bots:
-            if action == "create":
-                # Проверяем, не существует ли уже такая категория
-                existing = db.query(models.Category).filter(
-                    models.Category.user_id == user_id,
-                    models.Category.bot_id == bot.id,
-                    models.Category.name == db_category.name
-                ).first()
-                
-                if not existing:
-                    # Создаем копию категории для этого бота
-                    # Нужно найти родительскую категорию в целевом боте, если есть parent_id
-                    synced_parent_id = None
-                    if db_category.parent_id is not None:
-                        # Находим родительскую категорию в основном боте
-                        parent_in_main = db.query(models.Category).filter(
-                            models.Category.id == db_category.parent_id,
-                            models.Category.user_id == user_id,
-                            models.Category.bot_id == None
-                        ).first()
-                        if parent_in_main:
-                            # Ищем соответствующую категорию в целевом боте
-                            parent_in_target = db.query(models.Category).filter(
-                                models.Category.user_id == user_id,
-                                models.Category.bot_id == bot.id,
-                                models.Category.name == parent_in_main.name
-                            ).first()
-                            if parent_in_target:
-                                synced_parent_id = parent_in_target.id
-                    
-                    new_category = models.Category(
-                        name=db_category.name,
-                        user_id=user_id,
-                        bot_id=bot.id,
-                        parent_id=synced_parent_id
-                    )
-                    db.add(new_category)
-                    print(f"🔄 Synced category '{db_category.name}' to bot {bot.id} (CREATE)")
-                else:
-                    # Категория уже существует в этом боте - это нормально
-                    print(f"ℹ️ Category '{db_category.name}' already exists in bot {bot.id}, skipping creation")
-            
-            elif action == "update":
-                # Находим соответствующую категорию и обновляем ее
-                matching = db.query(models.Category).filter(
-                    models.Category.user_id == user_id,
-                    models.Category.bot_id == bot.id,
-                    models.Category.name == db_category.name
-                ).first()
-                
-                if matching:
-                    matching.name = db_category.name
-                    print(f"🔄 Synced category '{db_category.name}' to bot {bot.id} (UPDATE)")
-            
-            elif action == "delete":
-                # Удаляем соответствующую категорию
-                matching = db.query(models.Category).filter(
-                    models.Category.user_id == user_id,
-                    models.Category.bot_id == bot.id,
-                    models.Category.name == db_category.name
-                ).first()
-                
-                if matching:
-                    db.delete(matching)
-                    print(f"🔄 Synced deletion of category '{db_category.name}' to bot {bot.id} (DELETE)")
-    
-    else:
-        # Категория в подключенном боте - синхронизируем в основной бот И во все другие подключенные боты
-        if action == "create":
-            # 1. Синхронизируем в основной бот
-            existing_main = db.query(models.Category).filter(
-                models.Category.user_id == user_id,
-                models.Category.bot_id == None,
-                models.Category.name == db_category.name
-            ).first()
-            
-            if not existing_main:
-                # Создаем копию категории в основном боте
-                # Нужно найти родительскую категорию в основном боте, если есть parent_id
-                synced_parent_id = None
-                if db_category.parent_id is not None:
-                    # Находим родительскую категорию в текущем боте
-                    parent_in_current = db.query(models.Category).filter(
-                        models.Category.id == db_category.parent_id,
-                        models.Category.user_id == user_id,
-                        models.Category.bot_id == db_category.bot_id
-                    ).first()
-                    if parent_in_current:
-                        # Ищем соответствующую категорию в основном боте
-                        parent_in_main = db.query(models.Category).filter(
-                            models.Category.user_id == user_id,
-                            models.Category.bot_id == None,
-                            models.Category.name == parent_in_current.name
-                        ).first()
-                        if parent_in_main:
-                            synced_parent_id = parent_in_main.id
-                
-                new_category = models.Category(
-                    name=db_category.name,
-                    user_id=user_id,
-                    bot_id=None,
-                    parent_id=synced_parent_id
-                )
-                db.add(new_category)
-                print(f"🔄 Synced category '{db_category.name}' to main bot (CREATE)")
-            else:
-                # Категория уже существует в основном боте - это нормально
-                print(f"ℹ️ Category '{db_category.name}' already exists in main bot, skipping creation")
-            
-            # 2. Синхронизируем во все другие подключенные боты (кроме текущего)
-            # ВАЖНО: Синхронизируем даже если категория уже существует в основном боте
-            # Это гарантирует, что все боты имеют одинаковые категории
-            for bot in connected_bots:
-                if bot.id == db_category.bot_id:
-                    continue  # Пропускаем текущий бот
-                
-                existing = db.query(models.Category).filter(
-                    models.Category.user_id == user_id,
-                    models.Category.bot_id == bot.id,
-                    models.Category.name == db_category.name
-                ).first()
-                
-                if not existing:
-                    # Нужно найти родительскую категорию в целевом боте, если есть parent_id
-                    synced_parent_id = None
-                    if db_category.parent_id is not None:
-                        # Находим родительскую категорию в текущем боте
-                        parent_in_current = db.query(models.Category).filter(
-                            models.Category.id == db_category.parent_id,
-                            models.Category.user_id == user_id,
-                            models.Category.bot_id == db_category.bot_id
-                        ).first()
-                        if parent_in_current:
-                            # Ищем соответствующую категорию в целевом боте
-                            parent_in_target = db.query(models.Category).filter(
-                                models.Category.user_id == user_id,
-                                models.Category.bot_id == bot.id,
-                                models.Category.name == parent_in_current.name
-                            ).first()
-                            if parent_in_target:
-                                synced_parent_id = parent_in_target.id
-                    
-                    new_category = models.Category(
-                        name=db_category.name,
-                        user_id=user_id,
-                        bot_id=bot.id,
-                        parent_id=synced_parent_id
-                    )
-                    db.add(new_category)
-                    print(f"🔄 Synced category '{db_category.name}' to bot {bot.id} (CREATE)")
-                else:
-                    # Категория уже существует в этом боте - это нормально
-                    print(f"ℹ️ Category '{db_category.name}' already exists in bot {bot.id}, skipping creation")
-        
-        elif action == "update":
-            # 1. Обновляем категорию в основном боте
-            matching_main = db.query(models.Category).filter(
-                models.Category.user_id == user_id,
-                models.Category.bot_id == None,
-                models.Category.name == db_category.name
-            ).first()
-            
-            if matching_main:
-                matching_main.name = db_category.name
-                print(f"🔄 Synced category '{db_category.name}' to main bot (UPDATE)")
-            
-            # 2. Обновляем категорию во всех других подключенных ботах (кроме текущего)
-            for bot in connected_bots:
-                if bot.id == db_category.bot_id:
-                    continue  # Пропускаем текущий бот
-                
-                matching = db.query(models.Category).filter(
-                    models.Category.user_id == user_id,
-                    models.Category.bot_id == bot.id,
-                    models.Category.name == db_category.name
-                ).first()
-                
-                if matching:
-                    matching.name = db_category.name
-                    print(f"🔄 Synced category '{db_category.name}' to bot {bot.id} (UPDATE)")
-        
-        elif action == "delete":
-            # 1. Удаляем соответствующую категорию в основном боте
-            matching_main = db.query(models.Category).filter(
-                models.Category.user_id == user_id,
-                models.Category.bot_id == None,
-                models.Category.name == db_category.name
-            ).first()
-            
-            if matching_main:
-                db.delete(matching_main)
-                print(f"🔄 Synced deletion of category '{db_category.name}' to main bot (DELETE)")
-            
-            # 2. Удаляем категорию из всех других подключенных ботов (кроме текущего)
-            for bot in connected_bots:
-                if bot.id == db_category.bot_id:
-                    continue  # Пропускаем текущий бот
-                
-                matching = db.query(models.Category).filter(
-                    models.Category.user_id == user_id,
-                    models.Category.bot_id == bot.id,
-                    models.Category.name == db_category.name
-                ).first()
-                
-                if matching:
-                    db.delete(matching)
-                    print(f"🔄 Synced deletion of category '{db_category.name}' to bot {bot.id} (DELETE)")
+    if action == "delete":
+        return sync_category_tree(
+            db_category.user_id, db_category.bot_id, db, prune=True, prune_names=[db_category.name]
+        )
+    return sync_category_tree(db_category.user_id, db_category.bot_id, db)
+
+_category_list_adapter = TypeAdapter(List[schemas.Category])
 
 @router.get("/", response_model=List[schemas.Category])
 def get_categories(
@@ -238,7 +39,26 @@ def get_categories(
     db: Session = Depends(database.get_db)
 ):
     print(f"📂 [CATEGORIES API] get_categories called: user_id={user_id}, bot_id={bot_id}, flat={flat}")
+    body = get_categories_json(user_id, bot_id, flat, db)
+    return Response(content=body, media_type="application/json")
+
+def get_categories_json(user_id: int, bot_id: Optional[int], flat: bool, db: Session) -> bytes:
+    """Готовый JSON списка категорий (как в GET /api/categories/), используется также в GET /api/bootstrap"""
+    def build():
+        categories = load_categories(user_id, bot_id, flat, db)
+        content = _category_list_adapter.dump_python(
+            _category_list_adapter.validate_python(categories), mode="json"
+        )
+        return JSONResponse(content=content).body, None
+    
+    # Готовый JSON кэшируется по версии магазина (см. utils/catalog_cache.py)
+    return catalog_cache.get_or_build(("categories", user_id, bot_id, flat), user_id, build)
+
+def load_categories(user_id: int, bot_id: Optional[int], flat: bool, db: Session):
+    """Загружает категории магазина: плоским списком или основные с подкатегориями внутри"""
     query = db.query(models.Category).filter(models.Category.user_id == user_id)
+    # Бот с общим каталогом показывает категории основного магазина
+    bot_id = catalog_bot_id(bot_id, db)
     # Если bot_id указан - фильтруем по bot_id (независимый магазин бота)
     # Если bot_id не указан - фильтруем по bot_id = None (основной бот)
     if bot_id is not None:
@@ -278,12 +98,117 @@ def get_categories(
             print(f"   - {main_cat.name} (id={main_cat.id}): {len(main_cat.subcategories)} subcategories")
         return main_categories
 
+_category_tree_adapter = TypeAdapter(List[schemas.CategoryTreeNode])
+
+# Ограничение глубины обхода дерева (защита от циклов в parent_id)
+MAX_CATEGORY_DEPTH = 32
+
+@router.get("/tree", response_model=List[schemas.CategoryTreeNode])
+def get_category_tree(
+    user_id: int,
+    bot_id: Optional[int] = Query(None, description="ID бота для независимых магазинов"),
+    viewer_id: Optional[int] = Query(None, description="ID пользователя, который просматривает магазин (скрытые товары не считаются для клиентов)"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Дерево категорий магазина с количеством видимых товаров в каждом узле:
+    product_count - товары непосредственно в категории,
+    subtree_product_count - вместе со всеми подкатегориями.
+    Пустые категории (subtree_product_count == 0) клиент может скрыть без загрузки товаров.
+    """
+    def build():
+        tree = load_category_tree(user_id, bot_id, viewer_id, db)
+        content = _category_tree_adapter.dump_python(_category_tree_adapter.validate_python(tree), mode="json")
+        return JSONResponse(content=content).body, None
+    
+    cache_key = ("category_tree", user_id, bot_id, viewer_class(user_id, viewer_id))
+    body = catalog_cache.get_or_build(cache_key, user_id, build)
+    return Response(content=body, media_type="application/json")
+
+def load_category_tree(user_id: int, bot_id: Optional[int], viewer_id: Optional[int], db: Session) -> List[dict]:
+    """
+    Загружает дерево категорий одним запросом: рекурсивный CTE строит пары (категория, предок),
+    количество товаров считается группировкой по категориям и суммируется по предкам.
+    
+    Returns:
+        Основные категории (parent_id = None) с вложенными subcategories
+    """
+    params = {"user_id": user_id, "max_depth": MAX_CATEGORY_DEPTH}
+    # Бот с общим каталогом: категории и товары основного магазина, скрытость - с переопределениями бота
+    bot_id, overlay_bot_id = resolve_catalog_shop(bot_id, db)
+    override_join = ""
+    hidden_column = "p.is_hidden"
+    if overlay_bot_id is not None:
+        override_join = "LEFT JOIN bot_product_overrides o ON o.product_id = p.id AND o.bot_id = :overlay_bot_id"
+        hidden_column = "COALESCE(o.is_hidden, p.is_hidden)"
+        params["overlay_bot_id"] = overlay_bot_id
+    if bot_id is not None:
+        category_bot_filter = "c.bot_id = :bot_id"
+        product_bot_filter = "p.bot_id = :bot_id"
+        params["bot_id"] = bot_id
+    else:
+        category_bot_filter = "c.bot_id IS NULL"
+        product_bot_filter = "p.bot_id IS NULL"
+    
+    # Видимые товары - как на витрине: не проданы, скрытые видит только владелец
+    product_filters = ["p.user_id = :user_id", product_bot_filter, "p.is_sold = 0"]
+    if viewer_id is not None and viewer_id != user_id:
+        product_filters.append(f"({hidden_column} = 0 OR {hidden_column} IS NULL)")
+    
+    rows = db.execute(text(f"""
+        WITH RECURSIVE
+        shop_categories AS (
+            SELECT c.id, c.name, c.parent_id FROM categories c
+            WHERE c.user_id = :user_id AND {category_bot_filter}
+        ),
+        direct_counts AS (
+            SELECT p.category_id, COUNT(*) AS product_count FROM products p {override_join}
+            WHERE {' AND '.join(product_filters)} AND p.category_id IS NOT NULL
+            GROUP BY p.category_id
+        ),
+        ancestry(category_id, ancestor_id, depth) AS (
+            SELECT id, id, 0 FROM shop_categories
+            UNION ALL
+            SELECT a.category_id, c.parent_id, a.depth + 1
+            FROM ancestry a JOIN shop_categories c ON c.id = a.ancestor_id
+            WHERE c.parent_id IS NOT NULL AND a.depth < :max_depth
+        )
+        SELECT c.id, c.name, c.parent_id,
+               COALESCE(own.product_count, 0) AS product_count,
+               COALESCE(SUM(sub.product_count), 0) AS subtree_product_count
+        FROM shop_categories c
+        JOIN ancestry a ON a.ancestor_id = c.id
+        LEFT JOIN direct_counts own ON own.category_id = c.id
+        LEFT JOIN direct_counts sub ON sub.category_id = a.category_id
+        GROUP BY c.id
+        ORDER BY c.id
+    """), params).all()
+    
+    nodes = {
+        row.id: {
+            "id": row.id, "name": row.name, "parent_id": row.parent_id,
+            "product_count": row.product_count, "subtree_product_count": row.subtree_product_count,
+            "subcategories": []
+        }
+        for row in rows
+    }
+    roots = []
+    for node in nodes.values():
+        if node["parent_id"] is None:
+            roots.append(node)
+        elif node["parent_id"] in nodes:
+            nodes[node["parent_id"]]["subcategories"].append(node)
+        # Категории с родителем из другого магазина не показываются (как в load_categories)
+    print(f"📂 [CATEGORIES API] Category tree: {len(nodes)} categories, {len(roots)} main")
+    return roots
+
 @router.post("/", response_model=schemas.Category)
 async def create_category(
     category: schemas.CategoryCreate, 
     user_id: int = Query(...),
     bot_id: Optional[int] = Query(None, description="ID бота для независимых магазинов"),
     x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    auth: tuple = Depends(get_optional_validated_user_and_bot),
     db: Session = Depends(database.get_db)
 ):
     # Если bot_id не указан, определяем его:
@@ -292,18 +217,16 @@ async def create_category(
     final_bot_id = bot_id
     if final_bot_id is None:
         if x_telegram_init_data:
-            # Запрос от WebApp - определяем bot_id из initData
-            try:
-                from ..routers.context import get_validated_user_and_bot
-                _, final_bot_id = await get_validated_user_and_bot(x_telegram_init_data, db)
-                print(f"✅ Determined bot_id={final_bot_id} from initData for category creation")
-            except:
-                final_bot_id = None
+            # Запрос от WebApp - bot_id из проверенного initData (None, если проверка не прошла)
+            _, final_bot_id = auth
+            print(f"✅ Determined bot_id={final_bot_id} from initData for category creation")
         else:
             # Запрос от бота (localhost) - ВСЕГДА создаем в основном боте (bot_id=None)
             # Категории будут синхронизированы во все подключенные боты автоматически
             final_bot_id = None  # Основной бот
             print(f"ℹ️ Category creation from bot - using main bot (bot_id=None), will sync to all connected bots")
+    # Категории бота с общим каталогом - категории основного магазина
+    final_bot_id = catalog_bot_id(final_bot_id, db)
     
     # Проверяем, что parent_id существует и принадлежит тому же пользователю, если указан
     if category.parent_id is not None:
@@ -330,6 +253,7 @@ async def create_category(
     sync_category_to_all_bots(db_category, db, action="create")
     
     db.commit()
+    bump_shop_version(user_id)
     db.refresh(db_category)
     print(f"✅ Created category '{category.name}' for user {user_id}, bot_id={final_bot_id}")
     return db_category
@@ -380,14 +304,16 @@ def delete_category(
         ).update({models.SoldProduct.category_id: None})
         print(f"📦 Set category_id=NULL for {sold_products_count} historical sold_products")
     
-    # Синхронизируем удаление категории во все боты (ПЕРЕД удалением)
-    sync_category_to_all_bots(db_category, db, action="delete")
-    
     # Удаляем категорию
     # Товары удалятся автоматически из-за cascade="all, delete-orphan" в relationship
     # Подкатегории также удалятся каскадно
     db.delete(db_category)
+    db.flush()
+    
+    # Синхронизируем удаление категории во все боты (дерево без удаленной категории)
+    sync_category_to_all_bots(db_category, db, action="delete")
     db.commit()
+    bump_shop_version(user_id)
     
     message_parts = [f"Category '{db_category.name}' deleted."]
     if products_count > 0:
@@ -9,7 +9,9 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from ..db import database
-from ..utils.telegram_auth import validate_telegram_init_data, validate_init_data_multi_bot
+# Общие зависимости авторизации (импортируются из context и другими модулями)
+from ..utils.request_auth import get_validated_user, get_validated_user_and_bot
+from ..utils.shared_catalog import catalog_bot_id
 
 load_dotenv()
 
@@ -25,63 +27,6 @@ class WebAppContextCreate(BaseModel):
     chat_id: Optional[int] = None
 
 
-async def get_validated_user(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
-    db: Session = Depends(database.get_db)
-):
-    """
-    Dependency для валидации Telegram initData и извлечения user_id.
-    Поддерживает множественные боты - валидирует с главным ботом или с любым зарегистрированным ботом.
-    """
-    if not x_telegram_init_data:
-        raise HTTPException(
-            status_code=401,
-            detail="Telegram initData is required. Open the app through Telegram bot."
-        )
-    
-    try:
-        # Используем функцию для валидации с любым ботом
-        user_id, bot_token, bot_id = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-        print(f"✅ Validated initData - user_id={user_id}, bot_token={'***' + bot_token[-10:] if bot_token else 'None'}, bot_id={bot_id}")
-        return user_id
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-
-
-async def get_validated_user_and_bot(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
-    db: Session = Depends(database.get_db)
-) -> tuple[int, Optional[int]]:
-    """
-    Dependency для валидации Telegram initData и извлечения user_id и bot_id.
-    Возвращает tuple (user_id, bot_id) для использования в endpoints, которым нужен bot_id.
-    """
-    if not x_telegram_init_data:
-        raise HTTPException(
-            status_code=401,
-            detail="Telegram initData is required. Open the app through Telegram bot."
-        )
-    
-    try:
-        user_id, bot_token, bot_id = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-        print(f"✅ Validated initData - user_id={user_id}, bot_id={bot_id}")
-        return (user_id, bot_id)
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-
-
 @router.post("/context")
 async def set_context(
     context_data: WebAppContextCreate,
@@ -150,9 +95,8 @@ async def set_context(
 
 @router.get("/context")
 async def get_context(
-    viewer_id: int = Depends(get_validated_user),
+    auth: tuple = Depends(get_validated_user_and_bot),
     shop_owner_id: Optional[int] = Query(None, description="ID владельца магазина (если смотрим чужой магазин)"),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
     db: Session = Depends(database.get_db)
 ):
     """
@@ -165,32 +109,42 @@ async def get_context(
     4. viewer_id (свой магазин)
     
     Args:
-        viewer_id: ID текущего пользователя (из валидированного Telegram initData)
+        auth: (viewer_id, bot_id) из валидированного Telegram initData
         shop_owner_id: ID владельца магазина (опционально, если не указан - свой магазин)
-        x_telegram_init_data: initData для определения bot_id
         db: Сессия базы данных
         
     Returns:
         Контекст с viewer_id, shop_owner_id, role и permissions
     """
-    from ..db import models
-    
+    viewer_id, bot_id = auth
     print(f"📡 GET /api/context - viewer_id={viewer_id}, shop_owner_id={shop_owner_id}")
     
-    # Получаем bot_id из initData
-    bot_id = None
+    return resolve_shop_context(viewer_id, bot_id, shop_owner_id, db)
+
+
+def resolve_shop_context(viewer_id: int, bot_id: Optional[int], shop_owner_id: Optional[int], db: Session) -> dict:
+    """
+    Определяет магазин, роль и права пользователя (логика GET /api/context).
+    Используется также в GET /api/bootstrap.
+    
+    Args:
+        viewer_id: ID текущего пользователя (из валидированного Telegram initData)
+        bot_id: ID бота, через который открыт WebApp (None для главного бота)
+        shop_owner_id: ID владельца магазина из query параметра (опционально)
+        db: Сессия базы данных
+        
+    Returns:
+        Контекст с viewer_id, shop_owner_id, role, permissions и bot_id
+    """
+    from ..db import models
+    
     bot_owner_user_id = None
-    if x_telegram_init_data:
-        try:
-            _, bot_id = await get_validated_user_and_bot(x_telegram_init_data, db)
-            if bot_id:
-                # Получаем владельца бота
-                bot = db.query(models.Bot).filter(models.Bot.id == bot_id).first()
-                if bot:
-                    bot_owner_user_id = bot.owner_user_id
-                    print(f"🤖 Bot {bot_id} owner: {bot_owner_user_id}, viewer: {viewer_id}")
-        except:
-            pass
+    if bot_id:
+        # Получаем владельца бота
+        bot = db.query(models.Bot).filter(models.Bot.id == bot_id).first()
+        if bot:
+            bot_owner_user_id = bot.owner_user_id
+            print(f"🤖 Bot {bot_id} owner: {bot_owner_user_id}, viewer: {viewer_id}")
     
     # Приоритет 1: shop_owner_id из URL параметра (обратная совместимость)
     if shop_owner_id is not None:
@@ -254,14 +208,16 @@ async def get_context(
                 if viewer_id == bot_owner_user_id:
                     shop_owner_id = viewer_id
                     role = "owner"
-                    # Проверяем, что магазин для этого бота существует (с учетом bot_id)
+                    # Проверяем, что магазин для этого бота существует (с учетом bot_id;
+                    # бот с общим каталогом показывает основной магазин)
+                    shop_bot_id = catalog_bot_id(bot_id, db)
                     has_products = db.query(models.Product).filter(
                         models.Product.user_id == shop_owner_id,
-                        models.Product.bot_id == bot_id
+                        models.Product.bot_id == shop_bot_id
                     ).first()
                     has_categories = db.query(models.Category).filter(
                         models.Category.user_id == shop_owner_id,
-                        models.Category.bot_id == bot_id
+                        models.Category.bot_id == shop_bot_id
                     ).first()
                     
                     if not has_products and not has_categories:
@@ -286,14 +242,16 @@ async def get_context(
                 else:
                     # Если пользователь НЕ является владельцем бота - показываем магазин владельца бота
                     shop_owner_id = bot_owner_user_id
-                    # Проверяем, что магазин владельца бота для этого бота существует (с учетом bot_id)
+                    # Проверяем, что магазин владельца бота для этого бота существует (с учетом bot_id;
+                    # бот с общим каталогом показывает основной магазин)
+                    shop_bot_id = catalog_bot_id(bot_id, db)
                     has_products = db.query(models.Product).filter(
                         models.Product.user_id == shop_owner_id,
-                        models.Product.bot_id == bot_id
+                        models.Product.bot_id == shop_bot_id
                     ).first()
                     has_categories = db.query(models.Category).filter(
                         models.Category.user_id == shop_owner_id,
-                        models.Category.bot_id == bot_id
+                        models.Category.bot_id == shop_bot_id
                     ).first()
                     
                     if not has_products and not has_categories:
@@ -342,6 +300,7 @@ async def get_context(
         "shop_owner_id": shop_owner_id,
         "role": role,
         "permissions": permissions,
-        "bot_id": context_bot_id  # Добавляем bot_id в контекст
+        "bot_id": context_bot_id,  # Добавляем bot_id в контекст
+        "auth_bot_id": bot_id  # Бот, подписавший initData (WebApp шлет его в X-Telegram-Bot-Id)
     }
 
@@ -2,6 +2,11 @@ from fastapi import APIRouter, Body
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from ..utils.catalog_cache import catalog_cache
+from ..utils.catalog_digest import digest_stats
+from ..utils.init_data_cache import init_data_cache
+from ..utils.sync_queue import sync_queue_stats
+from ..utils.telegram_auth import request_auth_stats
 
 router = APIRouter(prefix="/api/debug", tags=["debug"])
 
@@ -53,3 +58,16 @@ async def receive_logs(log_data: LogData):
         print(f"{'='*80}\n")
     
     return {"status": "ok", "received": len(log_data.logs)}
+
+@router.get("/metrics")
+def get_metrics():
+    """
+    Счетчики кэшей и фоновых задач для мониторинга.
+    """
+    return {
+        "catalog_cache": catalog_cache.stats(),
+        "sync_queue": sync_queue_stats(),
+        "catalog_digests": digest_stats(),
+        "init_data_cache": init_data_cache.stats(),
+        "request_auth": request_auth_stats()
+    }
@@ -1,7 +1,7 @@
 import os
 import json
 import requests
-from fastapi import APIRouter, Depends, HTTPException, Query, Header, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_
 from typing import List, Optional
@@ -9,7 +9,8 @@ from datetime import datetime
 from dotenv import load_dotenv
 from ..db import models, database
 from ..models import order as schemas
-from ..utils.telegram_auth import get_user_id_from_init_data, validate_init_data_multi_bot
+from ..utils.telegram_auth import get_user_id_from_init_data
+from ..utils.request_auth import get_validated_user
 from ..utils.product_snapshot import create_product_snapshot, get_product_display_info_from_snapshot
 from ..utils.products_utils import make_full_url
 
@@ -97,24 +98,10 @@ async def create_order(
     order_data: Optional[schemas.OrderCreate] = Body(None),
     product_id: Optional[int] = Query(None),
     quantity: Optional[int] = Query(None, ge=1),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    ordered_by_user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Создать заказ товара (ordered_by_user_id определяется из валидированного Telegram initData)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        ordered_by_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Поддерживаем старый формат (query параметры) и новый формат (body)
     if order_data and order_data.product_id:
         # Новый формат: данные из формы
@@ -351,24 +338,10 @@ async def create_order(
 @router.get("/user/{user_id}/username")
 async def get_user_username(
     user_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    current_user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить username пользователя по его ID (для создания ссылки на чат)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        current_user_id, _, bot_id = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем токен бота для запроса
     bot_token_for_request = get_bot_token_for_notifications(current_user_id, db)
     bot_api_url = f"https://api.telegram.org/bot{bot_token_for_request}"
@@ -395,24 +368,10 @@ async def get_user_username(
 
 @router.get("/shop", response_model=List[schemas.Order])
 async def get_shop_orders(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить все заказы для магазина текущего пользователя (только для владельца магазина)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем заказы, где пользователь - владелец магазина, и заказ не отменен
     orders = db.query(models.Order).options(
         joinedload(models.Order.product)
@@ -523,24 +482,10 @@ async def get_shop_orders(
 
 @router.get("/my")
 async def get_my_orders(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить все заказы текущего пользователя (где он заказчик)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем заказы, где пользователь - заказчик, заказ не отменен и не завершен
     # В корзине показываем только активные заказы (не завершенные и не отмененные)
     orders = db.query(models.Order).options(
@@ -652,24 +597,10 @@ async def get_my_orders(
 
 @router.get("/history", response_model=List[schemas.Order])
 async def get_orders_history(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить историю заказов пользователя (только завершенные и отмененные, неактивные)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем только завершенные или отмененные заказы (история = неактивные)
     # Активные заказы показываются в разделе "Активные", а не в истории
     orders = db.query(models.Order).options(
@@ -784,24 +715,10 @@ async def get_orders_history(
 
 @router.delete("/history/clear")
 async def clear_orders_history(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Очистить всю историю заказов пользователя (удалить все завершенные и отмененные заказы)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Удаляем все завершенные и отмененные заказы пользователя (история)
     deleted_count = db.query(models.Order).filter(
         and_(
@@ -820,24 +737,10 @@ async def clear_orders_history(
 @router.patch("/{order_id}/complete")
 async def complete_order(
     order_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Выполнить заказ (только владелец магазина)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -871,24 +774,10 @@ async def complete_order(
 @router.delete("/{order_id}")
 async def cancel_order(
     order_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Отменить заказ (владелец магазина или заказчик)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -919,24 +808,10 @@ async def cancel_order(
 @router.delete("/{order_id}/delete")
 async def delete_order(
     order_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Удалить заказ из базы данных (только владелец магазина)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     order = db.query(models.Order).filter(models.Order.id == order_id).first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -957,24 +832,10 @@ async def delete_order(
 @router.post("/batch-delete")
 async def delete_orders(
     order_ids: List[int],
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Удалить несколько заказов из базы данных (только владелец магазина)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     if not order_ids:
         raise HTTPException(status_code=400, detail="Order IDs list is required")
     
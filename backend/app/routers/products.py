@@ -4,6 +4,8 @@ import uuid
 import json
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Header, Request, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from typing import List, Optional, Any, Union
@@ -12,11 +14,13 @@ from ..models import product as schemas
 from ..utils.telegram_auth import get_user_id_from_init_data, validate_init_data_multi_bot
 from ..utils.products_utils import get_bot_token_for_notifications, make_full_url, str_to_bool
 from ..utils.products_sync import sync_product_to_all_bots_with_rename, sync_product_to_all_bots
+from ..utils.catalog_cache import catalog_cache, viewer_class
 from ..handlers.products_sold import get_sold_products as get_sold_products_handler, delete_sold_product as delete_sold_product_handler, delete_sold_products as delete_sold_products_handler
-from ..handlers.products_read import get_product_by_id as get_product_by_id_handler, get_products as get_products_handler
+from ..handlers.products_read import get_product_by_id as get_product_by_id_handler, get_products as get_products_handler, get_products_page as get_products_page_handler, get_next_reservation_expiry
 from ..handlers.products_create import create_product as create_product_handler, sync_all_products as sync_all_products_handler
-from ..handlers.products_update import update_product as update_product_handler, toggle_hot_offer as toggle_hot_offer_handler, update_price_discount as update_price_discount_handler, update_name_description as update_name_description_handler, update_quantity as update_quantity_handler, update_made_to_order as update_made_to_order_handler, update_for_sale as update_for_sale_handler, update_quantity_show_enabled as update_quantity_show_enabled_handler, bulk_update_made_to_order as bulk_update_made_to_order_handler, update_hidden as update_hidden_handler
+from ..handlers.products_update import update_product as update_product_handler, toggle_hot_offer as toggle_hot_offer_handler, update_price_discount as update_price_discount_handler, update_name_description as update_name_description_handler, update_quantity as update_quantity_handler, update_made_to_order as update_made_to_order_handler, update_for_sale as update_for_sale_handler, update_quantity_show_enabled as update_quantity_show_enabled_handler, bulk_update_made_to_order as bulk_update_made_to_order_handler, bulk_patch_products as bulk_patch_products_handler, update_hidden as update_hidden_handler, set_bot_product_override as set_bot_product_override_handler
 from ..handlers.products_delete import delete_product as delete_product_handler, mark_product_sold as mark_product_sold_handler
+from ..handlers.products_search import search_products as search_products_handler
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
@@ -1536,6 +1540,38 @@ async def delete_sold_products(
 """
 # ========== END REFACTORING STEP 3.3 ==========
 
+@router.get("/search")
+def search_products(
+    user_id: int,
+    q: str = Query(..., min_length=1, max_length=200, description="Строка поиска (слова ищутся по префиксу)"),
+    bot_id: Optional[int] = Query(None, description="ID бота для независимых магазинов"),
+    viewer_id: Optional[int] = Query(None, description="ID пользователя, который просматривает товары (для фильтрации скрытых)"),
+    category_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор next_cursor из предыдущей страницы"),
+    fields: Optional[str] = Query(None, description="Поля через запятую, например name,price,image_url"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Полнотекстовый поиск товаров магазина по названию и описанию (FTS5).
+    
+    Результаты отсортированы по релевантности, возвращается страница {"items": [...], "next_cursor": ...}.
+    Проданные товары не ищутся, скрытые - только для владельца.
+    """
+    def build():
+        page = search_products_handler(
+            user_id, q, bot_id, db,
+            viewer_id=viewer_id, category_id=category_id, limit=limit, cursor=cursor, fields=fields
+        )
+        return JSONResponse(content=page).body, get_next_reservation_expiry(user_id, db)
+    
+    cache_key = (
+        "search", user_id, bot_id, category_id, viewer_class(user_id, viewer_id),
+        q.strip().lower(), limit, cursor, fields
+    )
+    body = catalog_cache.get_or_build(cache_key, user_id, build)
+    return Response(content=body, media_type="application/json")
+
 # ========== REFACTORING STEP 4.1: get_product_by_id ==========
 # НОВЫЙ КОД (используется сейчас)
 # Функция перенесена в backend/app/handlers/products_read.py
@@ -1624,16 +1660,81 @@ def get_product_by_id(
 # Функция перенесена в backend/app/handlers/products_read.py
 # Импорт: from ..handlers.products_read import get_products as get_products_handler
 
+_product_list_adapter = TypeAdapter(List[schemas.Product])
+
 @router.get("/", response_model=List[schemas.Product])
 def get_products(
     user_id: int,
     category_id: Optional[int] = None,
     bot_id: Optional[int] = Query(None, description="ID бота для независимых магазинов"),
     viewer_id: Optional[int] = Query(None, description="ID пользователя, который просматривает товары (для фильтрации скрытых)"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Размер страницы (keyset-пагинация по id)"),
+    cursor: Optional[str] = Query(None, description="Курсор next_cursor из предыдущей страницы"),
+    fields: Optional[str] = Query(None, description="Поля через запятую, например name,price,image_url"),
+    price_min: Optional[float] = Query(None, ge=0, description="Минимальная цена со скидкой"),
+    price_max: Optional[float] = Query(None, ge=0, description="Максимальная цена со скидкой"),
+    hot_offer: Optional[bool] = Query(None, description="Только горящие предложения"),
+    in_stock: Optional[bool] = Query(None, description="Только в наличии (quantity > 0, не под заказ)"),
+    made_to_order: Optional[bool] = Query(None, description="Только товары под заказ"),
+    for_sale: Optional[bool] = Query(None, description="Только товары для покупки"),
+    with_discount: Optional[bool] = Query(None, description="Только товары со скидкой"),
+    sort: Optional[str] = Query(None, description="Сортировка: id, newest, price_asc, price_desc"),
     db: Session = Depends(database.get_db)
 ):
-    """Получить список товаров с автоматической синхронизацией между основным магазином и ботами"""
-    return get_products_handler(user_id, category_id, bot_id, db, viewer_id=viewer_id)
+    """
+    Получить список товаров (только чтение, сверка с ботами выполняется в фоне).
+    
+    Без limit/cursor/fields возвращает полный список, как раньше (для старых клиентов).
+    С любым из них возвращает страницу {"items": [...], "next_cursor": ...}.
+    Фильтры (цена со скидкой, флаги) и сортировка выполняются в SQL в обоих режимах.
+    
+    Готовый JSON кэшируется по версии магазина (см. utils/catalog_cache.py).
+    """
+    filters = {
+        "price_min": price_min, "price_max": price_max, "hot_offer": hot_offer, "in_stock": in_stock,
+        "made_to_order": made_to_order, "for_sale": for_sale, "with_discount": with_discount
+    }
+    body = get_products_json(
+        user_id, category_id, bot_id, db,
+        viewer_id=viewer_id, limit=limit, cursor=cursor, fields=fields, filters=filters, sort=sort
+    )
+    return Response(content=body, media_type="application/json")
+
+def get_products_json(
+    user_id: int,
+    category_id: Optional[int],
+    bot_id: Optional[int],
+    db: Session,
+    viewer_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    filters: Optional[dict] = None,
+    sort: Optional[str] = None
+) -> bytes:
+    """Готовый JSON списка товаров (как в GET /api/products/), используется также в GET /api/bootstrap"""
+    paged = limit is not None or cursor is not None or fields is not None
+    filters = filters or {}
+    
+    def build():
+        if paged:
+            content = get_products_page_handler(
+                user_id, category_id, bot_id, db,
+                viewer_id=viewer_id, limit=limit, cursor=cursor, fields=fields, filters=filters, sort=sort
+            )
+        else:
+            products = get_products_handler(user_id, category_id, bot_id, db, viewer_id=viewer_id, filters=filters, sort=sort)
+            # Та же сериализация, что дает response_model=List[schemas.Product]
+            content = _product_list_adapter.dump_python(
+                _product_list_adapter.validate_python(products), mode="json"
+            )
+        return JSONResponse(content=content).body, get_next_reservation_expiry(user_id, db)
+    
+    cache_key = (
+        "products", user_id, bot_id, category_id, viewer_class(user_id, viewer_id),
+        limit, cursor, fields, tuple(sorted((k, v) for k, v in filters.items() if v is not None)), sort
+    )
+    return catalog_cache.get_or_build(cache_key, user_id, build)
 
 # СТАРЫЙ КОД (закомментирован, будет удален после проверки)
 """
@@ -2114,7 +2215,7 @@ async def create_product(
         if x_telegram_init_data:
             # Запрос от WebApp - определяем bot_id из initData
             try:
-                from ..routers.context import get_validated_user_and_bot
+                from ..utils.request_auth import get_validated_user_and_bot
                 _, final_bot_id = await get_validated_user_and_bot(x_telegram_init_data, db)
                 print(f"✅ Determined bot_id={final_bot_id} from initData for product creation")
             except:
@@ -2783,6 +2884,19 @@ def update_hidden(
     return update_hidden_handler(product_id, hidden_update, user_id, db)
 # ========== END REFACTORING STEP 6.9 ==========
 
+@router.put("/{product_id}/override")
+async def set_bot_product_override(
+    product_id: int,
+    override_update: schemas.ProductOverrideUpdate,
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Изменение товара только для бота с общим каталогом (название, описание, цена, скидка,
+    скрытие, горящее предложение). Требует авторизации через Telegram initData.
+    """
+    return await set_bot_product_override_handler(product_id, override_update, x_telegram_init_data, db)
+
 # ========== REFACTORING STEP 6.10: bulk_update_made_to_order ==========
 # НОВЫЙ КОД (используется сейчас)
 # Функция перенесена в backend/app/handlers/products_update.py
@@ -2800,6 +2914,19 @@ async def bulk_update_made_to_order(
     """
     return await bulk_update_made_to_order_handler(bulk_update, x_telegram_init_data, db)
 
+@router.patch("/bulk")
+async def bulk_patch_products(
+    patch: schemas.BulkProductPatch,
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Массовое изменение товаров по фильтру (под заказ, скрытие, скидка, горящее предложение,
+    перенос в категорию) вместе со всеми синхронизированными копиями.
+    Требует авторизации через Telegram initData.
+    """
+    return await bulk_patch_products_handler(patch, x_telegram_init_data, db)
+
 # СТАРЫЙ КОД (закомментирован, будет удален после проверки)
 """
 @router.patch("/bulk-update-made-to-order")
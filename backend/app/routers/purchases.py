@@ -2,7 +2,7 @@ import os
 import json
 import uuid
 import requests
-from fastapi import APIRouter, Depends, HTTPException, Query, Header, Body, UploadFile, File, Form, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Body, UploadFile, File, Form, Request
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_
 from typing import List, Optional
@@ -10,7 +10,8 @@ from datetime import datetime
 from dotenv import load_dotenv
 from ..db import models, database
 from ..models import purchase as schemas
-from ..utils.telegram_auth import get_user_id_from_init_data, validate_init_data_multi_bot
+from ..utils.telegram_auth import get_user_id_from_init_data
+from ..utils.request_auth import get_validated_user
 from ..utils.product_snapshot import create_product_snapshot, get_product_display_info_from_snapshot
 
 # Загружаем переменные окружения из .env файла
@@ -261,24 +262,10 @@ async def create_purchase(
     organization: Optional[str] = Form(None),
     video: Optional[UploadFile] = File(None),
     images: List[UploadFile] = File(None),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    purchased_by_user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Создать заявку на покупку товара"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        purchased_by_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Проверяем, что товар существует и имеет функцию покупки
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not product:
@@ -523,24 +510,10 @@ async def create_purchase(
 
 @router.get("/my", response_model=List[schemas.Purchase])
 async def get_my_purchases(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    purchased_by_user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить мои заявки на покупку (как покупатель)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        purchased_by_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем только активные покупки (не завершенные и не отмененные)
     # Теперь не фильтруем по product_id, так как товар может быть удален, но snapshot сохранится
     purchases = db.query(models.Purchase).options(
@@ -594,24 +567,10 @@ async def get_my_purchases(
 
 @router.get("/history", response_model=List[schemas.Purchase])
 async def get_purchases_history(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    purchased_by_user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить всю историю покупок пользователя (включая завершенные и отмененные)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        purchased_by_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем только завершенные или отмененные покупки (история = неактивные)
     # Активные покупки показываются в разделе "Активные", а не в истории
     purchases = db.query(models.Purchase).options(
@@ -668,24 +627,10 @@ async def get_purchases_history(
 @router.get("/all", response_model=List[schemas.Purchase])
 async def get_all_purchases(
     user_id: int = Query(...),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    viewer_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить все заявки на покупку для владельца магазина (админка)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        viewer_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Проверяем, что пользователь является владельцем магазина
     if viewer_id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
@@ -743,24 +688,10 @@ async def update_purchase(
     purchase_id: int,
     purchase_update: schemas.PurchaseUpdate,
     user_id: int = Query(...),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    viewer_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Обновить статус заявки на покупку (для владельца магазина)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        viewer_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     if viewer_id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
@@ -820,24 +751,10 @@ async def update_purchase(
 
 @router.delete("/history/clear")
 async def clear_purchases_history(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Очистить всю историю покупок пользователя (удалить все завершенные и отмененные покупки)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Удаляем все завершенные и отмененные покупки пользователя (история)
     deleted_count = db.query(models.Purchase).filter(
         and_(
@@ -856,24 +773,10 @@ async def clear_purchases_history(
 @router.delete("/{purchase_id}")
 async def cancel_purchase(
     purchase_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Отменить покупку (владелец магазина или покупатель)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     purchase = db.query(models.Purchase).filter(models.Purchase.id == purchase_id).first()
     if not purchase:
         raise HTTPException(status_code=404, detail="Purchase not found")
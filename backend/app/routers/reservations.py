@@ -2,13 +2,17 @@ import os
 import requests
 from fastapi import APIRouter, Depends, HTTPException, Query, Header, BackgroundTasks
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func
 from typing import List, Optional
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from ..db import models, database
 from ..models import reservation as schemas
-from ..utils.telegram_auth import get_user_id_from_init_data, validate_init_data_multi_bot
+from ..utils.telegram_auth import get_user_id_from_init_data
+from ..utils.request_auth import get_validated_user, validate_request_init_data
+from ..utils.catalog_cache import bump_shop_version
+from ..utils.storefront_projection import mark_storefront_dirty
+from ..utils.shop_settings_sync import default_shop_settings
 
 # Загружаем переменные окружения из .env файла
 load_dotenv()
@@ -52,25 +56,10 @@ async def create_reservation(
     product_id: int = Query(...),
     hours: int = Query(..., ge=1, le=3),  # От 1 до 3 часов
     quantity: int = Query(1, ge=1),  # Количество для резервации (по умолчанию 1)
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    reserved_by_user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Создать резервацию товара (reserved_by_user_id определяется из валидированного Telegram initData)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        # Используем функцию для валидации с любым ботом
-        reserved_by_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     print(f"DEBUG: create_reservation called - product_id={product_id}, reserved_by_user_id={reserved_by_user_id} (from initData), hours={hours}, quantity={quantity}")
     
     # Получаем товар
@@ -86,16 +75,9 @@ async def create_reservation(
         models.ShopSettings.user_id == product.user_id
     ).first()
     
-    # Если настройки не существуют, создаем с дефолтными значениями (резервация включена)
+    # Если настройки не существуют, используем дефолтные значения (резервация включена), без записи
     if not shop_settings:
-        shop_settings = models.ShopSettings(
-            user_id=product.user_id,
-            reservations_enabled=True,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-        db.add(shop_settings)
-        db.commit()
+        shop_settings = default_shop_settings(product.user_id, None)
     
     # Проверяем, включена ли резервация для этого магазина
     if not shop_settings.reservations_enabled:
@@ -202,28 +184,21 @@ async def create_reservation(
                 detail=f"Вы не можете зарезервировать этот товар повторно. Подождите еще {hours_text}."
             )
     
-    # Подсчитываем количество активных резерваций для этого товара (от всех пользователей)
+    # Зарезервированное количество товара (от всех пользователей): SUM по индексу резерваций
     print(f"DEBUG: Checking active reservations for product {product_id} (all users)")
-    active_reservations = db.query(models.Reservation).filter(
+    active_reservations_count = db.query(
+        func.coalesce(func.sum(models.Reservation.quantity), 0)
+    ).filter(
         and_(
             models.Reservation.product_id == product_id,
             models.Reservation.is_active == True,
             models.Reservation.reserved_until > datetime.utcnow()
         )
-    ).all()
+    ).scalar()
     
-    active_reservations_count = len(active_reservations)
-    
-    # Логируем информацию о резервациях
-    print(f"DEBUG: Active reservations count: {active_reservations_count}, Product quantity: {product.quantity}")
-    if active_reservations:
-        reserved_by_users = [r.reserved_by_user_id for r in active_reservations]
-        print(f"DEBUG: Active reservations by users: {reserved_by_users}")
-        print(f"DEBUG: Current user {reserved_by_user_id} trying to reserve - will be allowed if count < quantity")
-    else:
-        print(f"DEBUG: No active reservations found, allowing reservation")
+    print(f"DEBUG: Active reserved quantity: {active_reservations_count}, Product quantity: {product.quantity}")
     
-    # Проверяем, не превышает ли количество активных резерваций quantity товара
+    # Проверяем, не превышает ли зарезервированное количество quantity товара
     # Если quantity = 0, то резервация недоступна (товар закончился)
     if product.quantity <= 0:
         print(f"ERROR: Product {product_id} has quantity 0 or less")
@@ -253,32 +228,24 @@ async def create_reservation(
     print(f"DEBUG: All checks passed! Creating reservation for user {reserved_by_user_id}, product {product_id}, quantity={quantity}")
     print(f"DEBUG: Creating reservation - reserved_until={reserved_until}, quantity={quantity}")
     
-    # Создаем резервации
-    # ВСЕГДА создаем резервации только для выбранного товара (product_id) в количестве quantity
+    # Одна резервация на quantity единиц
+    # ВСЕГДА резервируем только выбранный товар (product_id)
     # Не создаем резервации для всех синхронизированных продуктов, так как пользователь выбрал конкретный товар
-    created_reservations = []
-    
-    # Создаем quantity резерваций только для выбранного товара
-    for i in range(quantity):
-        reservation = models.Reservation(
-            product_id=product.id,  # Используем выбранный товар
-            user_id=product.user_id,
-            reserved_by_user_id=reserved_by_user_id,
-            reserved_until=reserved_until,
-            is_active=True
-        )
-        db.add(reservation)
-        created_reservations.append(reservation)
-        print(f"DEBUG: Created reservation {i+1}/{quantity} for product_id={product.id} (bot_id={product.bot_id})")
+    reservation = models.Reservation(
+        product_id=product.id,  # Используем выбранный товар
+        user_id=product.user_id,
+        reserved_by_user_id=reserved_by_user_id,
+        reserved_until=reserved_until,
+        is_active=True,
+        quantity=quantity
+    )
+    db.add(reservation)
     
     db.commit()
-    for res in created_reservations:
-        db.refresh(res)
-    
-    # Используем первую резервацию для возврата (оригинальный товар)
-    reservation = created_reservations[0] if created_reservations else None
+    bump_shop_version(product.user_id)
+    db.refresh(reservation)
     
-    print(f"DEBUG: Reservation created successfully - {len(created_reservations)} reservations for product_id={product.id}, main reservation_id={reservation.id if reservation else None}, reserved_until={reserved_until}")
+    print(f"DEBUG: Reservation created successfully - reservation_id={reservation.id}, quantity={quantity} for product_id={product.id} (bot_id={product.bot_id}), reserved_until={reserved_until}")
     print(f"DEBUG: Notification check - TELEGRAM_BOT_TOKEN={'SET' if TELEGRAM_BOT_TOKEN else 'NOT SET'}, WEBAPP_URL={WEBAPP_URL}")
     
     # Отправляем уведомление владельцу магазина через Telegram Bot API (в фоне)
@@ -438,26 +405,13 @@ def get_product_reservation(
 @router.delete("/{reservation_id}")
 async def cancel_reservation(
     reservation_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Отменить резервацию (user_id определяется из валидированного Telegram initData)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
     if not TELEGRAM_BOT_TOKEN:
         raise HTTPException(status_code=500, detail="Bot token is not configured")
     
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
     reservation = db.query(models.Reservation).filter(
         and_(
             models.Reservation.id == reservation_id,
@@ -520,6 +474,8 @@ async def cancel_reservation(
                 models.Reservation.is_active == True
             )
         ).update({"is_active": False}, synchronize_session=False)
+        # Массовый UPDATE идет в обход ORM - витрину пересобираем явно
+        mark_storefront_dirty(db, original_product.user_id, product_ids=[p.id for p in synced_products])
         
         print(f"DEBUG: Canceled {canceled_count} reservations for synced products (name='{original_product.name}', price={original_product.price})")
     else:
@@ -529,6 +485,7 @@ async def cancel_reservation(
         print(f"DEBUG: Original product not found, canceling only reservation {reservation_id}")
     
     db.commit()
+    bump_shop_version(product.user_id)
     
     print(f"DEBUG: Reservation {reservation_id} canceled successfully (total: {canceled_count} reservations)")
     
@@ -536,7 +493,7 @@ async def cancel_reservation(
 
 @router.get("/user/me", response_model=List[schemas.Reservation])
 async def get_user_reservations(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить все резервации текущего пользователя (user_id определяется из валидированного Telegram initData)
@@ -545,23 +502,9 @@ async def get_user_reservations(
     - владелец магазина (user_id) - для уведомлений
     - резервирующий (reserved_by_user_id) - для корзины
     """
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
     if not TELEGRAM_BOT_TOKEN:
         raise HTTPException(status_code=500, detail="Bot token is not configured")
     
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     print(f"🛒 ========== get_user_reservations START ==========")
     print(f"🛒 Requested user_id: {user_id} (type: {type(user_id)})")
     
@@ -623,27 +566,13 @@ async def get_user_reservations(
 
 @router.get("/cart", response_model=List[schemas.Reservation])
 async def get_cart_reservations(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить резервации для корзины (только те, где текущий пользователь - резервирующий)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
     if not TELEGRAM_BOT_TOKEN:
         raise HTTPException(status_code=500, detail="Bot token is not configured")
     
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем только резервации, где текущий пользователь - резервирующий
     # Backend уже фильтрует по is_active и reserved_until
     reservations = db.query(models.Reservation).filter(
@@ -685,24 +614,10 @@ async def get_cart_reservations(
 
 @router.get("/history", response_model=List[schemas.Reservation])
 async def get_reservations_history(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить историю резерваций пользователя (только завершенные и отмененные, неактивные)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем только неактивные резервации пользователя (история = завершенные и отмененные)
     # Активные резервации показываются в разделе "Активные", а не в истории
     reservations = db.query(models.Reservation).filter(
@@ -723,24 +638,10 @@ async def get_reservations_history(
 
 @router.delete("/history/clear")
 async def clear_reservations_history(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Очистить всю историю резерваций пользователя (удалить все неактивные резервации)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Удаляем все неактивные резервации пользователя (история)
     deleted_count = db.query(models.Reservation).filter(
         and_(
@@ -765,23 +666,13 @@ async def get_user_reservations_legacy(
     
     # Если есть initData, используем его для валидации
     if x_telegram_init_data and TELEGRAM_BOT_TOKEN:
-        try:
-            validated_user_id, _, _ = await validate_init_data_multi_bot(
-                x_telegram_init_data,
-                db,
-                default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
+        validated_user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
+        # Проверяем, что запрашиваемый user_id совпадает с валидированным
+        if validated_user_id != user_id:
+            raise HTTPException(
+                status_code=403,
+                detail="You can only access your own reservations"
             )
-            # Проверяем, что запрашиваемый user_id совпадает с валидированным
-            if validated_user_id != user_id:
-                raise HTTPException(
-                    status_code=403,
-                    detail="You can only access your own reservations"
-                )
-        except HTTPException:
-            raise
-        except Exception:
-            # Если валидация не прошла, продолжаем без проверки (для обратной совместимости)
-            pass
     
     # Возвращаем резервации как раньше
     reservations = db.query(models.Reservation).filter(
@@ -1,7 +1,7 @@
 import os
 import json
 import requests
-from fastapi import APIRouter, Depends, HTTPException, Query, Header, Body
+from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_
 from typing import List, Optional
@@ -9,7 +9,7 @@ from datetime import datetime
 from dotenv import load_dotenv
 from ..db import models, database
 from ..models import sale as schemas
-from ..utils.telegram_auth import validate_init_data_multi_bot
+from ..utils.request_auth import get_validated_user
 from ..utils.product_snapshot import create_product_snapshot, get_product_display_info_from_snapshot
 from ..utils.products_utils import make_full_url
 from sqlalchemy.orm import joinedload
@@ -87,24 +87,10 @@ async def create_sale(
     sale_data: Optional[schemas.SaleCreate] = Body(None),
     product_id: Optional[int] = Query(None),
     quantity: Optional[int] = Query(None, ge=1),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    sold_by_user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Создать продажу товара (sold_by_user_id определяется из валидированного Telegram initData)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        sold_by_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Поддерживаем старый формат (query параметры) и новый формат (body)
     if sale_data and sale_data.product_id:
         product_id = sale_data.product_id
@@ -314,24 +300,10 @@ async def create_sale(
 
 @router.get("/shop", response_model=List[schemas.Sale])
 async def get_shop_sales(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить все продажи для магазина текущего пользователя (только для владельца магазина)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем продажи, где пользователь - владелец магазина, и продажа не отменена
     sales = db.query(models.Sale).options(
         joinedload(models.Sale.product)
@@ -442,24 +414,10 @@ async def get_shop_sales(
 
 @router.get("/my", response_model=List[schemas.Sale])
 async def get_my_sales(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Получить все продажи текущего пользователя (где он продавец)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем продажи, где пользователь - продавец, продажа не отменена и не завершена
     sales = db.query(models.Sale).options(
         joinedload(models.Sale.product)
@@ -572,24 +530,10 @@ async def get_my_sales(
 @router.patch("/{sale_id}/complete")
 async def complete_sale(
     sale_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Выполнить продажу (только владелец магазина)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     sale = db.query(models.Sale).filter(models.Sale.id == sale_id).first()
     if not sale:
         raise HTTPException(status_code=404, detail="Sale not found")
@@ -623,24 +567,10 @@ async def complete_sale(
 @router.delete("/{sale_id}")
 async def cancel_sale(
     sale_id: int,
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """Отменить продажу (владелец магазина или продавец)"""
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     sale = db.query(models.Sale).filter(models.Sale.id == sale_id).first()
     if not sale:
         raise HTTPException(status_code=404, detail="Sale not found")
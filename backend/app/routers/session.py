@@ -0,0 +1,41 @@
+"""
+Роутер токенов сессии WebApp: initData проверяется один раз, дальше запросы
+авторизуются подписанным токеном (utils/session_tokens.py)
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Request
+from sqlalchemy.orm import Session
+from ..db import database
+from ..utils.request_auth import validate_request_init_data
+from ..utils.session_tokens import SESSION_TOKEN_TTL_SECONDS, issue_session_token
+
+router = APIRouter(prefix="/api", tags=["session"])
+
+
+@router.post("/session")
+async def create_session(
+    request: Request,
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Выдать токен сессии по initData.
+    WebApp отправляет его в заголовке X-Session-Token вместе с тем же initData; пока токен
+    действует, подпись initData не проверяется (токен привязан к initData и боту).
+    
+    Returns:
+        token, expires_at (unix time), expires_in (секунд), user_id и bot_id
+    """
+    # Токен выдается только по initData: присланный токен сессии не продлевает сам себя
+    request.state.auth.session_token = None
+    user_id, _, bot_id = await validate_request_init_data(x_telegram_init_data, db)
+    
+    token, expires_at = issue_session_token(user_id, bot_id, x_telegram_init_data)
+    print(f"🔑 POST /api/session - user_id={user_id}, bot_id={bot_id}, expires_at={expires_at}")
+    return {
+        "token": token,
+        "expires_at": expires_at,
+        "expires_in": SESSION_TOKEN_TTL_SECONDS,
+        "user_id": user_id,
+        "bot_id": bot_id
+    }
@@ -10,7 +10,8 @@ from datetime import datetime
 from dotenv import load_dotenv
 from ..db import database, models
 from ..models import shop_settings as schemas
-from ..utils.telegram_auth import validate_telegram_init_data, validate_init_data_multi_bot
+from ..utils.request_auth import validate_request_init_data, get_optional_validated_user_and_bot
+from ..utils.shop_settings_sync import find_shop_settings, default_shop_settings, propagate_shop_settings_changes
 
 load_dotenv()
 
@@ -20,155 +21,28 @@ API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", "https://unmaneuvered-chronogrammat
 router = APIRouter(prefix="/api/shop-settings", tags=["shop-settings"])
 
 
-def sync_shop_settings_to_all_bots(db_settings: models.ShopSettings, db: Session, action: str = "update"):
-    """
-    Синхронизирует настройки магазина во все боты пользователя (двусторонняя синхронизация).
-    
-    action: "update"
-    """
-    user_id = db_settings.user_id
-    
-    # Находим все подключенные боты пользователя
-    connected_bots = db.query(models.Bot).filter(
-        models.Bot.owner_user_id == user_id,
-        models.Bot.is_active == True
-    ).all()
-    
-    if db_settings.bot_id is None:
-        # Настройки в основном боте - синхронизируем во все подключенные боты
-        for bot in connected_bots:
-            # Находим или создаем настройки для этого бота
-            bot_settings = db.query(models.ShopSettings).filter(
-                models.ShopSettings.user_id == user_id,
-                models.ShopSettings.bot_id == bot.id
-            ).first()
-            
-            if not bot_settings:
-                # Создаем настройки для этого бота
-                bot_settings = models.ShopSettings(
-                    user_id=user_id,
-                    bot_id=bot.id,
-                    reservations_enabled=db_settings.reservations_enabled,
-                    quantity_enabled=db_settings.quantity_enabled,
-                    shop_name=db_settings.shop_name,
-                    welcome_image_url=db_settings.welcome_image_url,
-                    welcome_description=db_settings.welcome_description,
-                    created_at=datetime.utcnow(),
-                    updated_at=datetime.utcnow()
-                )
-                db.add(bot_settings)
-                print(f"🔄 Synced shop settings to bot {bot.id} (CREATE)")
-            else:
-                # Обновляем существующие настройки
-                bot_settings.reservations_enabled = db_settings.reservations_enabled
-                bot_settings.quantity_enabled = db_settings.quantity_enabled
-                bot_settings.shop_name = db_settings.shop_name
-                bot_settings.welcome_image_url = db_settings.welcome_image_url
-                bot_settings.welcome_description = db_settings.welcome_description
-                bot_settings.updated_at = datetime.utcnow()
-                print(f"🔄 Synced shop settings to bot {bot.id} (UPDATE)")
-    
-    else:
-        # Настройки в подключенном боте - синхронизируем в основной бот И во все другие подключенные боты
-        # 1. Синхронизируем в основной бот
-        main_settings = db.query(models.ShopSettings).filter(
-            models.ShopSettings.user_id == user_id,
-            models.ShopSettings.bot_id == None
-        ).first()
-        
-        if not main_settings:
-            # Создаем настройки в основном боте
-            main_settings = models.ShopSettings(
-                user_id=user_id,
-                bot_id=None,
-                reservations_enabled=db_settings.reservations_enabled,
-                quantity_enabled=db_settings.quantity_enabled,
-                shop_name=db_settings.shop_name,
-                welcome_image_url=db_settings.welcome_image_url,
-                welcome_description=db_settings.welcome_description,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
-            )
-            db.add(main_settings)
-            print(f"🔄 Synced shop settings to main bot (CREATE)")
-        else:
-            # Обновляем настройки в основном боте
-            main_settings.reservations_enabled = db_settings.reservations_enabled
-            main_settings.quantity_enabled = db_settings.quantity_enabled
-            main_settings.shop_name = db_settings.shop_name
-            main_settings.welcome_image_url = db_settings.welcome_image_url
-            main_settings.welcome_description = db_settings.welcome_description
-            main_settings.updated_at = datetime.utcnow()
-            print(f"🔄 Synced shop settings to main bot (UPDATE)")
-        
-        # 2. Синхронизируем во все другие подключенные боты (кроме текущего)
-        for bot in connected_bots:
-            if bot.id == db_settings.bot_id:
-                continue  # Пропускаем текущий бот
-            
-            bot_settings = db.query(models.ShopSettings).filter(
-                models.ShopSettings.user_id == user_id,
-                models.ShopSettings.bot_id == bot.id
-            ).first()
-            
-            if not bot_settings:
-                # Создаем настройки для этого бота
-                bot_settings = models.ShopSettings(
-                    user_id=user_id,
-                    bot_id=bot.id,
-                    reservations_enabled=db_settings.reservations_enabled,
-                    quantity_enabled=db_settings.quantity_enabled,
-                    shop_name=db_settings.shop_name,
-                    welcome_image_url=db_settings.welcome_image_url,
-                    welcome_description=db_settings.welcome_description,
-                    created_at=datetime.utcnow(),
-                    updated_at=datetime.utcnow()
-                )
-                db.add(bot_settings)
-                print(f"🔄 Synced shop settings to bot {bot.id} (CREATE)")
-            else:
-                # Обновляем существующие настройки
-                bot_settings.reservations_enabled = db_settings.reservations_enabled
-                bot_settings.quantity_enabled = db_settings.quantity_enabled
-                bot_settings.shop_name = db_settings.shop_name
-                bot_settings.welcome_image_url = db_settings.welcome_image_url
-                bot_settings.welcome_description = db_settings.welcome_description
-                bot_settings.updated_at = datetime.utcnow()
-                print(f"🔄 Synced shop settings to bot {bot.id} (UPDATE)")
-
-
-async def get_validated_user(
+async def get_settings_user_and_bot(
     request: Request,
     x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
     user_id: Optional[int] = Query(None, description="User ID для внутренних запросов от бота (только localhost)"),
     db: Session = Depends(database.get_db)
-):
+) -> tuple[int, Optional[int]]:
     """
-    Dependency для валидации Telegram initData и извлечения user_id.
-    Также поддерживает авторизацию через user_id в query для внутренних запросов от бота (localhost).
-    Поддерживает множественные боты через validate_init_data_multi_bot.
+    Dependency для валидации Telegram initData: (user_id, bot_id).
+    Также поддерживает авторизацию через user_id в query для внутренних запросов от бота (localhost),
+    для них bot_id = None (общие настройки).
     """
     # Если есть initData - используем его (основной способ для WebApp)
     if x_telegram_init_data:
-        try:
-            # Используем функцию для валидации с любым ботом
-            validated_user_id, _, _ = await validate_init_data_multi_bot(
-                x_telegram_init_data,
-                db,
-                default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-            )
-            return validated_user_id
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+        validated_user_id, _, bot_id = await validate_request_init_data(x_telegram_init_data, db)
+        return (validated_user_id, bot_id)
     
     # Если нет initData, но есть user_id в query - проверяем, что запрос с localhost (для бота)
     if user_id is not None:
         client_host = request.client.host if request.client else None
         # Разрешаем только localhost/127.0.0.1 для безопасности
         if client_host in ("127.0.0.1", "localhost", "::1") or client_host.startswith("127."):
-            return user_id
+            return (user_id, None)
         else:
             raise HTTPException(
                 status_code=403,
@@ -181,36 +55,16 @@ async def get_validated_user(
         detail="Telegram initData is required. Open the app through Telegram bot."
     )
 
-async def get_optional_validated_user(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
-    db: Session = Depends(database.get_db)
-) -> Optional[int]:
-    """
-    Dependency для опциональной валидации Telegram initData и извлечения user_id
-    Возвращает None, если initData не предоставлен
-    Поддерживает множественные боты через validate_init_data_multi_bot.
-    """
-    if not x_telegram_init_data:
-        return None
-    
-    try:
-        # Используем функцию для валидации с любым ботом
-        validated_user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-        return validated_user_id
-    except:
-        # Игнорируем ошибки валидации, возвращаем None
-        return None
+
+async def get_validated_user(auth: tuple = Depends(get_settings_user_and_bot)) -> int:
+    """Dependency: user_id из initData или из query для внутренних запросов от бота"""
+    return auth[0]
 
 
 @router.get("", response_model=schemas.ShopSettings)
 async def get_shop_settings(
     shop_owner_id: Optional[int] = Query(None, description="ID владельца магазина (для клиентов, просмотр чужих настроек)"),
-    user_id: Optional[int] = Depends(get_optional_validated_user),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    auth: tuple = Depends(get_optional_validated_user_and_bot),
     db: Session = Depends(database.get_db)
 ):
     """
@@ -219,15 +73,8 @@ async def get_shop_settings(
     Если shop_owner_id не указан, но пользователь авторизован - возвращает настройки текущего пользователя (свои настройки).
     Использует индивидуальные настройки бота (bot_id), если они есть, иначе общие настройки (bot_id = None).
     """
-    from ..routers.context import get_validated_user_and_bot
-    
-    # Получаем bot_id из initData для индивидуальных настроек
-    bot_id_from_init = None
-    if x_telegram_init_data:
-        try:
-            _, bot_id_from_init = await get_validated_user_and_bot(x_telegram_init_data, db)
-        except:
-            bot_id_from_init = None
+    # user_id и bot_id из initData (bot_id - для индивидуальных настроек бота)
+    user_id, bot_id_from_init = auth
     
     # Определяем, чьи настройки нужно получить
     # ВАЖНО: Приоритет shop_owner_id - если он указан, всегда используем его (клиент смотрит чужой магазин)
@@ -247,7 +94,7 @@ async def get_shop_settings(
                 target_bot_id = None
         else:
             target_bot_id = None
-    elif user_id is not None and x_telegram_init_data:
+    elif user_id is not None:
         # shop_owner_id не указан, но пользователь авторизован - используем его настройки (свой магазин)
         target_user_id = user_id
         # Используем bot_id из initData для индивидуальных настроек владельца бота
@@ -261,38 +108,19 @@ async def get_shop_settings(
     
     print(f"📋 GET /api/shop-settings - user_id={user_id}, shop_owner_id={shop_owner_id}, target_user_id={target_user_id}, target_bot_id={target_bot_id}")
     
-    # Ищем индивидуальные настройки бота (если bot_id указан)
-    settings = None
-    if target_bot_id is not None:
-        settings = db.query(models.ShopSettings).filter(
-            models.ShopSettings.user_id == target_user_id,
-            models.ShopSettings.bot_id == target_bot_id
-        ).first()
-    
-    # Если индивидуальных настроек нет, используем общие настройки (bot_id = None)
+    return load_shop_settings(target_user_id, target_bot_id, db)
+
+
+def load_shop_settings(target_user_id: int, target_bot_id: Optional[int], db: Session) -> dict:
+    """
+    Возвращает настройки магазина (логика GET /api/shop-settings): индивидуальные настройки бота,
+    если они есть, иначе общие. Если настроек нет - дефолтные, без записи в БД
+    (чтение не берет блокировку записи; строка появится при первом изменении настроек).
+    Используется также в GET /api/bootstrap.
+    """
+    settings = find_shop_settings(target_user_id, target_bot_id, db)
     if not settings:
-        settings = db.query(models.ShopSettings).filter(
-            models.ShopSettings.user_id == target_user_id,
-            models.ShopSettings.bot_id == None
-        ).first()
-    
-    # Если настройки не существуют, создаем с дефолтными значениями
-    if not settings:
-        print(f"📋 Creating default settings for user {target_user_id}, bot_id={target_bot_id}")
-        settings = models.ShopSettings(
-            user_id=target_user_id,
-            bot_id=target_bot_id,  # Сохраняем bot_id для индивидуальных настроек
-            reservations_enabled=True,
-            quantity_enabled=True,
-            shop_name=None,
-            welcome_image_url=None,
-            welcome_description=None,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
+        settings = default_shop_settings(target_user_id, target_bot_id)
     
     # Преобразуем относительный путь в полный HTTPS URL для welcome_image_url
     welcome_image_url_full = None
@@ -321,42 +149,22 @@ async def get_shop_settings(
 @router.put("", response_model=schemas.ShopSettings)
 async def update_shop_settings(
     settings_update: schemas.ShopSettingsUpdate,
-    user_id: int = Depends(get_validated_user),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    auth: tuple = Depends(get_settings_user_and_bot),
     db: Session = Depends(database.get_db)
 ):
     """
     Обновить настройки магазина текущего пользователя.
     Использует индивидуальные настройки бота (bot_id), если они есть.
     """
-    from ..routers.context import get_validated_user_and_bot
-    
-    # Получаем bot_id из initData для индивидуальных настроек
-    bot_id = None
-    if x_telegram_init_data:
-        try:
-            _, bot_id = await get_validated_user_and_bot(x_telegram_init_data, db)
-        except:
-            bot_id = None
+    # bot_id из initData - для индивидуальных настроек
+    user_id, bot_id = auth
     
     # Используем model_dump(exclude_unset=True) чтобы получить только переданные поля
     update_data = settings_update.model_dump(exclude_unset=True)
     print(f"📋 PUT /api/shop-settings - user_id={user_id}, bot_id={bot_id}, update_data={update_data}")
     
-    # Ищем индивидуальные настройки бота (если bot_id указан)
-    settings = None
-    if bot_id is not None:
-        settings = db.query(models.ShopSettings).filter(
-            models.ShopSettings.user_id == user_id,
-            models.ShopSettings.bot_id == bot_id
-        ).first()
-    
-    # Если индивидуальных настроек нет, используем общие настройки (bot_id = None)
-    if not settings:
-        settings = db.query(models.ShopSettings).filter(
-            models.ShopSettings.user_id == user_id,
-            models.ShopSettings.bot_id == None
-        ).first()
+    # Индивидуальные настройки бота (если bot_id указан), иначе общие настройки (bot_id = None)
+    settings = find_shop_settings(user_id, bot_id, db)
     
     # Если настройки не существуют, создаем
     if not settings:
@@ -392,8 +200,8 @@ async def update_shop_settings(
             settings.welcome_description = update_data['welcome_description']
         settings.updated_at = datetime.utcnow()
     
-    # Синхронизируем настройки во все боты
-    sync_shop_settings_to_all_bots(settings, db, action="update")
+    # Переносим измененные поля в настройки остальных магазинов
+    propagate_shop_settings_changes(settings, db)
     
     db.commit()
     db.refresh(settings)
@@ -424,13 +232,14 @@ async def update_shop_settings(
 @router.post("/welcome-image", response_model=schemas.ShopSettings)
 async def upload_welcome_image(
     image: UploadFile = File(...),
-    user_id: int = Depends(get_validated_user),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    auth: tuple = Depends(get_settings_user_and_bot),
     db: Session = Depends(database.get_db)
 ):
     """
     Загрузить приветственное изображение/логотип магазина.
     """
+    # bot_id из initData - для индивидуальных настроек
+    user_id, bot_id = auth
     print(f"📷 POST /api/shop-settings/welcome-image - user_id={user_id}")
     
     # Проверяем, что это изображение
@@ -458,29 +267,8 @@ async def upload_welcome_image(
     # Формируем путь к изображению
     image_url_path = f"/static/uploads/{unique_filename}"
     
-    # Получаем bot_id из initData для индивидуальных настроек
-    bot_id = None
-    if x_telegram_init_data:
-        try:
-            from ..routers.context import get_validated_user_and_bot
-            _, bot_id = await get_validated_user_and_bot(x_telegram_init_data, db)
-        except:
-            bot_id = None
-    
-    # Ищем индивидуальные настройки бота (если bot_id указан)
-    settings = None
-    if bot_id is not None:
-        settings = db.query(models.ShopSettings).filter(
-            models.ShopSettings.user_id == user_id,
-            models.ShopSettings.bot_id == bot_id
-        ).first()
-    
-    # Если индивидуальных настроек нет, используем общие настройки (bot_id = None)
-    if not settings:
-        settings = db.query(models.ShopSettings).filter(
-            models.ShopSettings.user_id == user_id,
-            models.ShopSettings.bot_id == None
-        ).first()
+    # Индивидуальные настройки бота (если bot_id указан), иначе общие настройки (bot_id = None)
+    settings = find_shop_settings(user_id, bot_id, db)
     
     if not settings:
         settings = models.ShopSettings(
@@ -509,8 +297,8 @@ async def upload_welcome_image(
         settings.welcome_image_url = image_url_path
         settings.updated_at = datetime.utcnow()
     
-    # Синхронизируем настройки во все боты
-    sync_shop_settings_to_all_bots(settings, db, action="update")
+    # Переносим измененные поля в настройки остальных магазинов
+    propagate_shop_settings_changes(settings, db)
     
     db.commit()
     db.refresh(settings)
@@ -564,8 +352,8 @@ async def delete_welcome_image(
         settings.welcome_image_url = None
         settings.updated_at = datetime.utcnow()
         
-        # Синхронизируем настройки во все боты
-        sync_shop_settings_to_all_bots(settings, db, action="update")
+        # Переносим измененные поля в настройки остальных магазинов
+        propagate_shop_settings_changes(settings, db)
         
         db.commit()
         db.refresh(settings)
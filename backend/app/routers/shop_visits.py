@@ -2,7 +2,7 @@
 Роутер для отслеживания посещений магазина и просмотров товаров
 """
 import os
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, distinct, and_, desc
 from typing import Optional, List
@@ -10,7 +10,8 @@ from datetime import datetime, timedelta
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from ..db import models, database
-from ..utils.telegram_auth import get_user_id_from_init_data, validate_init_data_multi_bot
+from ..utils.telegram_auth import get_user_id_from_init_data
+from ..utils.request_auth import get_validated_user
 
 load_dotenv()
 
@@ -48,7 +49,7 @@ class ProductViewStats(BaseModel):
 async def track_visit(
     shop_owner_id: int = Query(..., description="ID владельца магазина"),
     product_id: Optional[int] = Query(None, description="ID товара (если null - общее посещение магазина)"),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    visitor_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """
@@ -56,20 +57,6 @@ async def track_visit(
     Если product_id указан - это просмотр конкретного товара (модальное окно).
     Если product_id не указан - это общее посещение магазина (просмотр списка товаров).
     """
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        visitor_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Не отслеживаем посещения владельца своего магазина
     if visitor_id == shop_owner_id:
         print(f"📊 Shop visit: Owner {visitor_id} visiting own shop {shop_owner_id} - not tracked")
@@ -132,26 +119,12 @@ async def track_visit(
 
 @router.get("/stats", response_model=VisitStats)
 async def get_visit_stats(
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """
     Получить статистику посещений магазина для владельца.
     """
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем статистику посещений
     total_visits = db.query(func.count(models.ShopVisit.id)).filter(
         models.ShopVisit.shop_owner_id == user_id
@@ -187,26 +160,12 @@ async def get_visit_stats(
 async def get_visits_list(
     limit: int = Query(50, ge=1, le=200, description="Количество записей"),
     offset: int = Query(0, ge=0, description="Смещение для пагинации"),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """
     Получить список посещений магазина для владельца.
     """
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем список посещений с информацией о товарах
     visits = db.query(models.ShopVisit).options(
         joinedload(models.ShopVisit.product)
@@ -234,26 +193,12 @@ async def get_visits_list(
 @router.get("/product-stats", response_model=List[ProductViewStats])
 async def get_product_view_stats(
     limit: int = Query(20, ge=1, le=100, description="Количество товаров"),
-    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    user_id: int = Depends(get_validated_user),
     db: Session = Depends(database.get_db)
 ):
     """
     Получить статистику просмотров товаров (топ товаров по просмотрам).
     """
-    if not x_telegram_init_data:
-        raise HTTPException(status_code=401, detail="Telegram initData is required")
-    
-    try:
-        user_id, _, _ = await validate_init_data_multi_bot(
-            x_telegram_init_data,
-            db,
-            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-    
     # Получаем статистику по товарам
     product_stats = db.query(
         models.ShopVisit.product_id,
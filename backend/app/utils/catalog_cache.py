@@ -0,0 +1,136 @@
+"""
+Кэш готовых ответов витрины (список товаров и категорий) в памяти процесса.
+
+Каталог магазина меняется только при правках владельца, а читается каждым посетителем.
+Ключ кэша - (тип ответа, user_id, bot_id, category_id, класс зрителя, доп. параметры).
+Инвалидация - через версию магазина: каждая операция записи вызывает bump_shop_version(user_id),
+и записи, построенные для старой версии, больше не выдаются.
+Размер кэша ограничен (LRU), ведутся счетчики попаданий и промахов.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Максимальное количество ответов в кэше
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "512"))
+# Максимальное время жизни записи (страховка от изменений в обход версий)
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+
+class CatalogCache:
+    """LRU-кэш ответов витрины с версионированием по магазину"""
+
+    def __init__(self, max_entries: int = CATALOG_CACHE_MAX_ENTRIES, ttl_seconds: float = CATALOG_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def shop_version(self, user_id: int) -> int:
+        """Текущая версия каталога магазина"""
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def bump_shop_version(self, user_id: int):
+        """Инвалидирует все закэшированные ответы магазина"""
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def get(self, key: Hashable, user_id: int) -> Optional[Any]:
+        """
+        Возвращает закэшированное значение, если оно построено для текущей версии магазина
+        и не истекло. Иначе None.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, expires_at, value = entry
+                if version == self._versions.get(user_id, 0) and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, version: int, value: Any, expires_at: Optional[float] = None):
+        """
+        Сохраняет значение, построенное для версии магазина version.
+
+        Args:
+            key: Ключ кэша
+            version: Версия магазина, прочитанная ДО построения значения
+            value: Значение
+            expires_at: Время истечения (unix time), не позже TTL кэша
+        """
+        max_expires_at = time.time() + self.ttl_seconds
+        expires_at = min(expires_at, max_expires_at) if expires_at is not None else max_expires_at
+        with self._lock:
+            self._entries[key] = (version, expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_build(self, key: Hashable, user_id: int, build: Callable[[], Tuple[Any, Optional[float]]]) -> Any:
+        """
+        Возвращает значение из кэша или строит его через build() и сохраняет.
+
+        Args:
+            key: Ключ кэша
+            user_id: ID владельца магазина (для версии)
+            build: Функция без аргументов, возвращающая (значение, expires_at или None)
+        """
+        value = self.get(key, user_id)
+        if value is not None:
+            return value
+        # Версию читаем до построения: если запись произойдет во время построения,
+        # значение сохранится под старой версией и не будет выдано
+        version = self.shop_version(user_id)
+        value, expires_at = build()
+        self.put(key, version, value, expires_at)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша для мониторинга"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "shops_tracked": len(self._versions)
+            }
+
+
+catalog_cache = CatalogCache()
+
+
+def bump_shop_version(user_id: Optional[int]):
+    """
+    Сообщает кэшу, что каталог магазина изменился.
+    Вызывается из всех операций записи товаров, категорий и резерваций.
+    """
+    if user_id is None:
+        return
+    catalog_cache.bump_shop_version(int(user_id))
+
+
+def viewer_class(user_id: int, viewer_id: Optional[int]) -> str:
+    """
+    Класс зрителя для ключа кэша: владелец видит скрытые товары, клиент - нет.
+    Совпадает с правилом фильтрации в get_products.
+    """
+    if viewer_id is not None and viewer_id != user_id:
+        return "client"
+    return "owner"
@@ -0,0 +1,424 @@
+"""
+Контрольные суммы каталогов магазинов (основного и ботов) для быстрой проверки расхождений.
+
+Сверка (catalog_reconciler, reconcile_catalog.py) раньше всегда загружала все товары
+владельца и сравнивала магазины построчно, хотя почти всегда копии уже совпадают.
+Теперь у каждого магазина есть сумма (таблица catalog_digests): хэши строк по
+синхронизируемым полям, сложенные по модулю 2^64. Сумма не зависит от порядка строк
+и от id, поэтому у одинаковых каталогов разных магазинов она одинакова:
+
+- товар: группа синхронизации, поля SYNCED_PRODUCT_FIELDS и имя категории
+  (проданные товары не копируются и в сумму не входят)
+- категория: имя и имя родителя
+
+Суммы обновляются при записи, в той же транзакции (как проекция витрины), без
+пересчета каталога: сумма по модулю 2^64 позволяет вычесть старый хэш строки и прибавить
+новый. before_flush читает из БД хэши строк, которые изменит flush (измененные и удаленные
+товары и категории, товары их категорий и дочерние категории), after_flush читает хэши
+тех же строк и новых строк после записи, разница копится по магазинам, а before_commit
+прибавляет ее к сохраненным суммам. Запросы затрагивают только эти строки.
+
+Массовые UPDATE/INSERT в обход flush вызывают mark_catalog_digest_dirty(db, user_id) явно:
+суммы такого владельца пересчитываются целиком (compute_shop_digests), как и при очень
+большом flush или когда сумм владельца еще нет.
+
+Сверка сначала сравнивает суммы (drifted_bot_ids) и спускается к товарам только
+для ботов, чья сумма отличается от суммы основного магазина.
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event, inspect, or_, select
+from sqlalchemy.orm import Session, aliased
+from ..db import models, database
+from .sync_groups import SYNCED_PRODUCT_FIELDS
+from .shared_catalog import copied_bot_filter
+
+_DIRTY_KEY = "catalog_digest_dirty_owners"
+_DELTA_KEY = "catalog_digest_deltas"
+_FLUSH_KEY = "catalog_digest_flush"
+
+# Больше измененных строк за один flush - суммы владельцев пересчитываются целиком
+DIGEST_INCREMENTAL_LIMIT = 500
+
+_DIGEST_MODULUS = 2 ** 64
+
+# Поля товара в сумме: проданность задает фильтр (is_sold = False), а не значение
+_DIGEST_PRODUCT_FIELDS = tuple(field for field in SYNCED_PRODUCT_FIELDS if field != "is_sold")
+
+_stats_lock = threading.Lock()
+_stats = {"checks": 0, "in_sync": 0, "drifted": 0, "untrusted": 0, "refreshed_shops": 0}
+
+
+def _row_hash(*values) -> int:
+    """64-битный хэш значений строки (одинаковые значения - одинаковый хэш в любом процессе)"""
+    encoded = json.dumps(values, ensure_ascii=False, default=str).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "big")
+
+
+def _count(key: str, amount: int = 1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def digest_stats() -> Dict[str, int]:
+    """Счетчики проверок по суммам для мониторинга (in_sync - сверка пропущена)"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def mark_catalog_digest_dirty(db: Session, user_id: Optional[int]):
+    """
+    Помечает суммы каталогов владельца для пересчета при коммите текущей транзакции.
+    Нужно только для массовых операций с товарами в обход ORM (query.update / insert).
+    """
+    if user_id is None:
+        return
+    db.info.setdefault(_DIRTY_KEY, set()).add(int(user_id))
+
+
+def _product_rows(*conditions):
+    """Запрос строк товаров для сумм: владелец, магазин и все, от чего зависит хэш строки"""
+    product_columns = [getattr(models.Product, field) for field in _DIGEST_PRODUCT_FIELDS]
+    return select(
+        models.Product.user_id, models.Product.bot_id, models.Product.id, models.Product.sync_group_id,
+        models.Category.bot_id, models.Category.name, *product_columns
+    ).outerjoin(
+        models.Category, models.Category.id == models.Product.category_id
+    ).where(
+        models.Product.is_sold == False,
+        *conditions
+    )
+
+
+def _category_rows(*conditions):
+    """Запрос строк категорий для сумм: владелец, магазин, имя и родитель"""
+    parent = aliased(models.Category)
+    return select(
+        models.Category.user_id, models.Category.bot_id, models.Category.id, models.Category.name,
+        parent.bot_id, parent.name
+    ).outerjoin(
+        parent, parent.id == models.Category.parent_id
+    ).where(*conditions)
+
+
+def _product_row_hash(bot_id, product_id, sync_group_id, category_bot_id, category_name, values) -> int:
+    # Товар без группы не совпадает ни с чем: сверка назначит группу.
+    # Категория чужого магазина тоже дает расхождение (ее исправляет сверка)
+    group = sync_group_id if sync_group_id is not None else f"product:{product_id}"
+    category = category_name if category_name is None or category_bot_id == bot_id else f"foreign:{category_name}"
+    return _row_hash("product", group, category, *values)
+
+
+def _category_row_hash(bot_id, name, parent_bot_id, parent_name) -> int:
+    parent_name = parent_name if parent_bot_id == bot_id else None
+    return _row_hash("category", name, parent_name)
+
+
+def _add_rows(totals: Dict, product_rows, category_rows, sign: int = 1):
+    """Прибавляет (sign=-1 - вычитает) строки к суммам {(user_id, bot_id): [сумма, товаров, категорий]}"""
+    for user_id, bot_id, product_id, sync_group_id, category_bot_id, category_name, *values in product_rows:
+        shop = totals.setdefault((user_id, bot_id), [0, 0, 0])
+        row_hash = _product_row_hash(bot_id, product_id, sync_group_id, category_bot_id, category_name, values)
+        shop[0] = (shop[0] + sign * row_hash) % _DIGEST_MODULUS
+        shop[1] += sign
+    for user_id, bot_id, _, name, parent_bot_id, parent_name in category_rows:
+        shop = totals.setdefault((user_id, bot_id), [0, 0, 0])
+        shop[0] = (shop[0] + sign * _category_row_hash(bot_id, name, parent_bot_id, parent_name)) % _DIGEST_MODULUS
+        shop[2] += sign
+
+
+def compute_shop_digests(user_id: int, db: Session) -> Dict[Optional[int], Tuple[int, int, int]]:
+    """
+    Считает суммы всех магазинов владельца по текущим данным. Два запроса.
+
+    Returns:
+        Словарь bot_id -> (сумма, товаров, категорий); основной магазин и активные боты есть всегда
+    """
+    totals: Dict[Tuple[int, Optional[int]], List[int]] = {(user_id, None): [0, 0, 0]}
+    for (bot_id,) in db.query(models.Bot.id).filter(
+        models.Bot.owner_user_id == user_id,
+        models.Bot.is_active == True,
+        copied_bot_filter()
+    ).all():
+        totals[(user_id, bot_id)] = [0, 0, 0]
+
+    _add_rows(
+        totals,
+        db.execute(_product_rows(models.Product.user_id == user_id)).all(),
+        db.execute(_category_rows(models.Category.user_id == user_id)).all()
+    )
+    return {bot_id: tuple(values) for (_, bot_id), values in totals.items()}
+
+
+def refresh_catalog_digests(user_id: int, db: Session) -> int:
+    """
+    Пересчитывает суммы магазинов владельца и пишет только изменившиеся строки.
+    Коммит выполняет вызывающий код.
+
+    Returns:
+        Количество записанных (созданных, измененных или удаленных) строк
+    """
+    computed = compute_shop_digests(user_id, db)
+    existing = {
+        row.bot_id: row
+        for row in db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == user_id).all()
+    }
+    now = datetime.utcnow()
+    written = 0
+    for bot_id, (digest, products_count, categories_count) in computed.items():
+        values = {"digest": f"{digest:016x}", "products_count": products_count, "categories_count": categories_count}
+        row = existing.pop(bot_id, None)
+        if row is None:
+            db.add(models.CatalogDigest(user_id=user_id, bot_id=bot_id, updated_at=now, **values))
+            written += 1
+        elif any(getattr(row, key) != value for key, value in values.items()):
+            for key, value in values.items():
+                setattr(row, key, value)
+            row.updated_at = now
+            written += 1
+    # Магазины без данных и без активного бота
+    for row in existing.values():
+        db.delete(row)
+        written += 1
+    if written:
+        _count("refreshed_shops", written)
+    return written
+
+
+def _has_pending_changes(user_id: int, db: Session) -> bool:
+    """Есть ли в сессии незакоммиченные изменения каталога владельца (суммы в БД еще старые)"""
+    if user_id in db.info.get(_DIRTY_KEY, ()):
+        return True
+    if any(owner_id == user_id for owner_id, _ in db.info.get(_DELTA_KEY, {})):
+        return True
+    return any(
+        isinstance(obj, (models.Product, models.Category)) and obj.user_id == user_id
+        for obj in list(db.new) + list(db.dirty) + list(db.deleted)
+    )
+
+
+def apply_catalog_digest_deltas(user_id: int, deltas: Dict[Optional[int], List[int]], db: Session) -> int:
+    """
+    Прибавляет изменения строк к сохраненным суммам магазинов владельца.
+    Если сумм владельца еще нет, они считаются целиком. Коммит выполняет вызывающий код.
+
+    Args:
+        deltas: bot_id -> [изменение суммы, товаров, категорий]
+
+    Returns:
+        Количество записанных (созданных, измененных или удаленных) строк
+    """
+    existing = {
+        row.bot_id: row
+        for row in db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == user_id).all()
+    }
+    if None not in existing:
+        return refresh_catalog_digests(user_id, db)
+
+    now = datetime.utcnow()
+    written = 0
+    emptied = []
+    for bot_id, (digest_delta, products_delta, categories_delta) in deltas.items():
+        if not (digest_delta or products_delta or categories_delta):
+            continue
+        row = existing.get(bot_id)
+        if row is None:
+            row = models.CatalogDigest(user_id=user_id, bot_id=bot_id, digest=f"{0:016x}", products_count=0, categories_count=0)
+            db.add(row)
+        row.digest = f"{(int(row.digest, 16) + digest_delta) % _DIGEST_MODULUS:016x}"
+        row.products_count += products_delta
+        row.categories_count += categories_delta
+        row.updated_at = now
+        written += 1
+        if bot_id is not None and not row.products_count and not row.categories_count:
+            emptied.append(row)
+    if emptied:
+        # Магазины без данных и без активного бота (как в compute_shop_digests)
+        active_bot_ids = {bot_id for (bot_id,) in db.query(models.Bot.id).filter(
+            models.Bot.owner_user_id == user_id,
+            models.Bot.is_active == True,
+            copied_bot_filter()
+        ).all()}
+        for row in emptied:
+            if row.bot_id not in active_bot_ids:
+                db.delete(row)
+    if written:
+        _count("refreshed_shops", written)
+    return written
+
+
+def drifted_bot_ids(user_id: int, bot_ids: Iterable[int], db: Session) -> Set[int]:
+    """
+    Боты, каталог которых может отличаться от основного магазина. Один запрос.
+
+    Бот считается совпадающим, только если его сумма и сумма основного магазина есть
+    и равны. Без сумм (еще не посчитаны) или при незакоммиченных изменениях владельца
+    в этой сессии расходящимися считаются все боты.
+
+    Args:
+        user_id: ID владельца магазина
+        bot_ids: Проверяемые боты
+        db: Сессия базы данных
+
+    Returns:
+        Множество ID ботов, которые нужно сверять построчно
+    """
+    bot_ids = set(bot_ids)
+    if not bot_ids:
+        return set()
+    _count("checks")
+    if _has_pending_changes(user_id, db):
+        _count("untrusted")
+        return bot_ids
+
+    digests = dict(db.query(models.CatalogDigest.bot_id, models.CatalogDigest.digest).filter(
+        models.CatalogDigest.user_id == user_id
+    ).all())
+    main_digest = digests.get(None)
+    if main_digest is None:
+        _count("untrusted")
+        return bot_ids
+    drifted = {bot_id for bot_id in bot_ids if digests.get(bot_id) != main_digest}
+    _count("drifted" if drifted else "in_sync")
+    return drifted
+
+
+def backfill_catalog_digests(db: Session) -> int:
+    """
+    Считает суммы владельцев, у которых их еще нет (первый запуск после добавления таблицы).
+
+    Returns:
+        Количество владельцев, для которых посчитаны суммы
+    """
+    owners = set()
+    for column in (models.Product.user_id, models.Category.user_id, models.Bot.owner_user_id):
+        owners.update(owner_id for (owner_id,) in db.query(column).distinct().all() if owner_id is not None)
+    known = {user_id for (user_id,) in db.query(models.CatalogDigest.user_id).distinct().all()}
+
+    missing = sorted(owners - known)
+    for owner_id in missing:
+        refresh_catalog_digests(owner_id, db)
+    db.commit()
+    if missing:
+        print(f"✅ Catalog digests computed for {len(missing)} shops")
+    return len(missing)
+
+
+def _owners_of(objects: Iterable) -> Set[int]:
+    owners = set()
+    for obj in objects:
+        if isinstance(obj, (models.Product, models.Category)):
+            for owner_id in (obj.user_id, inspect(obj).committed_state.get("user_id")):
+                if owner_id is not None:
+                    owners.add(int(owner_id))
+    return owners
+
+
+def _changed_ids(objects: Iterable) -> Tuple[Set[int], Set[int]]:
+    """id товаров и категорий среди объектов сессии (у новых id появляется после flush)"""
+    product_ids, category_ids = set(), set()
+    for obj in objects:
+        if isinstance(obj, models.Product) and obj.id is not None:
+            product_ids.add(obj.id)
+        elif isinstance(obj, models.Category) and obj.id is not None:
+            category_ids.add(obj.id)
+    return product_ids, category_ids
+
+
+def _affected_rows(connection, product_ids: Set[int], category_ids: Set[int], read_product_ids=(), read_category_ids=()):
+    """
+    Строки, хэш которых зависит от измененных товаров и категорий
+    (и строки read_*_ids, прочитанные до flush: ссылку на удаленную категорию могла обнулить БД)
+    """
+    product_rows = connection.execute(_product_rows(or_(
+        models.Product.id.in_(product_ids | set(read_product_ids)),
+        models.Product.category_id.in_(category_ids)
+    ))).all() if product_ids or category_ids else []
+    category_rows = connection.execute(_category_rows(or_(
+        models.Category.id.in_(category_ids | set(read_category_ids)),
+        models.Category.parent_id.in_(category_ids)
+    ))).all() if category_ids else []
+    return product_rows, category_rows
+
+
+@event.listens_for(database.SessionLocal, "before_flush")
+def _read_rows_before_flush(session: Session, flush_context, instances):
+    changed = [obj for obj in list(session.dirty) + list(session.deleted)
+               if isinstance(obj, (models.Product, models.Category))]
+    new = [obj for obj in session.new if isinstance(obj, (models.Product, models.Category))]
+    session.info.pop(_FLUSH_KEY, None)
+    if not changed and not new:
+        return
+    if len(changed) + len(new) > DIGEST_INCREMENTAL_LIMIT:
+        session.info.setdefault(_DIRTY_KEY, set()).update(_owners_of(changed + new))
+        return
+    product_ids, category_ids = _changed_ids(changed)
+    # Старые хэши вычитаются: строки до записи
+    product_rows, category_rows = _affected_rows(session.connection(), product_ids, category_ids)
+    deltas: Dict[Tuple[int, Optional[int]], List[int]] = {}
+    _add_rows(deltas, product_rows, category_rows, sign=-1)
+    session.info[_FLUSH_KEY] = (
+        product_ids, category_ids,
+        {row[2] for row in product_rows}, {row[2] for row in category_rows},
+        deltas
+    )
+
+
+@event.listens_for(database.SessionLocal, "after_flush")
+def _collect_row_deltas(session: Session, flush_context):
+    pending = session.info.pop(_FLUSH_KEY, None)
+    if pending is None:
+        return
+    product_ids, category_ids, read_product_ids, read_category_ids, deltas = pending
+    new_product_ids, new_category_ids = _changed_ids(session.new)
+    product_ids |= new_product_ids
+    category_ids |= new_category_ids
+    # Новые хэши прибавляются: те же строки после записи и новые строки
+    product_rows, category_rows = _affected_rows(
+        session.connection(), product_ids, category_ids, read_product_ids, read_category_ids
+    )
+    _add_rows(deltas, product_rows, category_rows)
+    # Неизмененная строка, которой не было в чтении до flush, ссылается на id новой категории
+    # (раньше висячий): до flush ее хэш считался без категории или родителя
+    _add_rows(deltas, [
+        tuple(row[:4]) + (None, None) + tuple(row[6:]) for row in product_rows
+        if row[2] not in product_ids and row[2] not in read_product_ids
+    ], [
+        tuple(row[:4]) + (None, None) for row in category_rows
+        if row[2] not in category_ids and row[2] not in read_category_ids
+    ], sign=-1)
+    session_deltas = session.info.setdefault(_DELTA_KEY, {})
+    for shop, (digest_delta, products_delta, categories_delta) in deltas.items():
+        total = session_deltas.setdefault(shop, [0, 0, 0])
+        total[0] = (total[0] + digest_delta) % _DIGEST_MODULUS
+        total[1] += products_delta
+        total[2] += categories_delta
+
+
+@event.listens_for(database.SessionLocal, "before_commit")
+def _refresh_dirty_digests(session: Session):
+    # Сначала отправляем ожидающие изменения, чтобы flush учел их строки
+    session.flush()
+    owners = session.info.pop(_DIRTY_KEY, set())
+    deltas = session.info.pop(_DELTA_KEY, {})
+    if not owners and not deltas:
+        return
+    for owner_id in owners:
+        refresh_catalog_digests(owner_id, session)
+    by_owner: Dict[int, Dict[Optional[int], List[int]]] = {}
+    for (owner_id, bot_id), delta in deltas.items():
+        if owner_id is not None and owner_id not in owners:
+            by_owner.setdefault(owner_id, {})[bot_id] = delta
+    for owner_id, owner_deltas in by_owner.items():
+        apply_catalog_digest_deltas(owner_id, owner_deltas, session)
+    session.flush()
+
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _forget_dirty_owners(session: Session):
+    session.info.pop(_DIRTY_KEY, None)
+    session.info.pop(_DELTA_KEY, None)
+    session.info.pop(_FLUSH_KEY, None)
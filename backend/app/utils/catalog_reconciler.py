@@ -0,0 +1,276 @@
+"""
+Фоновая сверка товаров между основным магазином и магазинами ботов.
+
+Раньше сверка выполнялась прямо в GET /api/products/ при каждом открытии витрины:
+чтение брало блокировку записи SQLite и делало O(товары × боты) запросов.
+Теперь операции записи помечают магазин владельца как "грязный" (mark_shop_dirty),
+а фоновый поток периодически сверяет только помеченные магазины.
+Перед построчной сверкой сравниваются суммы каталогов (catalog_digest): боты,
+совпадающие с основным магазином, пропускаются.
+"""
+import os
+import threading
+from typing import Dict, Optional, Set
+from sqlalchemy.orm import Session
+from ..db import models, database
+from .catalog_cache import bump_shop_version
+from .sync_groups import assign_sync_groups
+from .category_resolver import get_category_resolver
+from .catalog_digest import drifted_bot_ids
+from .shared_catalog import copied_bot_filter
+
+# Задержка перед сверкой: серия правок владельца схлопывается в одну сверку
+RECONCILE_DELAY_SECONDS = float(os.getenv("CATALOG_RECONCILE_DELAY", "2"))
+
+_dirty_owners: Set[int] = set()
+_dirty_lock = threading.Lock()
+_wakeup = threading.Event()
+_stop = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+
+def mark_shop_dirty(user_id: Optional[int]):
+    """
+    Помечает магазин владельца как требующий сверки основного магазина и ботов.
+    Вызывается из операций записи; сама сверка выполняется в фоне.
+
+    Args:
+        user_id: ID владельца магазина
+    """
+    if user_id is None:
+        return
+    with _dirty_lock:
+        _dirty_owners.add(int(user_id))
+    _wakeup.set()
+
+
+def copy_product_for_shop(
+    source: models.Product,
+    bot_id: Optional[int],
+    sync_product_id: Optional[int],
+    category_id: Optional[int],
+    sync_group_id: Optional[int]
+) -> models.Product:
+    """
+    Создает копию товара для другого магазина (основного или магазина бота).
+
+    Args:
+        source: Исходный товар
+        bot_id: ID бота целевого магазина (None для основного)
+        sync_product_id: ID товара основного магазина, с которым связана копия
+        category_id: ID категории в целевом магазине
+        sync_group_id: Группа синхронизации (та же, что у исходного товара)
+
+    Returns:
+        Новый (еще не добавленный в сессию) товар
+    """
+    return models.Product(
+        name=source.name,
+        description=source.description,
+        price=source.price,
+        image_url=source.image_url,
+        images_urls=source.images_urls,
+        discount=source.discount,
+        user_id=source.user_id,
+        bot_id=bot_id,
+        sync_product_id=sync_product_id,
+        sync_group_id=sync_group_id,
+        is_hot_offer=source.is_hot_offer,
+        quantity=source.quantity,
+        is_sold=source.is_sold,
+        is_made_to_order=source.is_made_to_order,
+        is_for_sale=source.is_for_sale,
+        price_from=source.price_from,
+        price_to=source.price_to,
+        price_fixed=source.price_fixed,
+        price_type=source.price_type,
+        quantity_from=source.quantity_from,
+        quantity_unit=source.quantity_unit,
+        quantity_show_enabled=source.quantity_show_enabled,
+        is_hidden=source.is_hidden,
+        category_id=category_id
+    )
+
+
+def reconcile_owner_catalog(user_id: int, db: Session, commit: bool = True) -> Dict[str, int]:
+    """
+    Сверяет товары основного магазина и всех подключенных ботов владельца.
+
+    - Товары ботов, которых нет в основном магазине, копируются в основной магазин
+    - Товары основного магазина, которых нет в боте, копируются в бот
+
+    Старые дубликаты (товар с тем же именем и ценой уже есть в целевом магазине, но
+    в другой группе) не копируются и не удаляются: копия размножила бы дубликат
+    по всем магазинам, а удалять товары по имени и цене небезопасно.
+    Соответствие ищется по группе синхронизации (Product.sync_group_id): копия товара
+    есть в магазине, если в нем есть товар той же группы. Товарам без группы группа
+    назначается перед сверкой (assign_sync_groups).
+    Все данные загружаются фиксированным числом запросов и сравниваются в памяти,
+    и только для ботов, чья сумма каталога отличается от суммы основного магазина.
+
+    Args:
+        user_id: ID владельца магазина
+        db: Сессия базы данных
+        commit: Коммитить сразу; False - только flush (коммит и bump_shop_version
+                делает вызывающий код, например пакетная сверка reconcile_catalog.py)
+
+    Returns:
+        Словарь со счетчиками созданных копий
+    """
+    stats = {"created_in_main": 0, "created_in_bots": 0}
+
+    connected_bots = db.query(models.Bot).filter(
+        models.Bot.owner_user_id == user_id,
+        models.Bot.is_active == True,
+        copied_bot_filter()
+    ).all()
+    # Сначала суммы каталогов: совпавшие с основным магазином боты построчно не сверяются
+    drifted = drifted_bot_ids(user_id, [bot.id for bot in connected_bots], db)
+    connected_bots = [bot for bot in connected_bots if bot.id in drifted]
+    if not connected_bots:
+        return stats
+
+    all_products = db.query(models.Product).filter(
+        models.Product.user_id == user_id
+    ).order_by(models.Product.id).all()
+    if any(product.sync_group_id is None for product in all_products):
+        assign_sync_groups(user_id, db, all_products)
+
+    # Категории владельца загружаются один раз на всю сверку
+    category_for_shop = get_category_resolver(user_id, db).resolve
+
+    # Занятые места (группа, bot_id): в каждом магазине не больше одной копии группы
+    occupied = {(product.sync_group_id, product.bot_id) for product in all_products}
+    # Старая связь по имени и цене: (bot_id, имя, цена) непроданных товаров
+    name_price = {(product.bot_id, product.name, product.price) for product in all_products if not product.is_sold}
+
+    products_by_bot = {bot.id: [] for bot in connected_bots}
+    for product in all_products:
+        if product.bot_id in products_by_bot:
+            products_by_bot[product.bot_id].append(product)
+
+    # 1. Товары ботов, которых нет в основном магазине
+    created_in_main = []
+    for bot in connected_bots:
+        for bot_product in products_by_bot[bot.id]:
+            if bot_product.is_sold or (bot_product.sync_group_id, None) in occupied:
+                continue
+            if (None, bot_product.name, bot_product.price) in name_price:
+                continue
+
+            print(f"🔄 Reconcile: copying product '{bot_product.name}' from bot {bot.id} to main shop")
+            new_main_product = copy_product_for_shop(
+                bot_product, None, None, category_for_shop(bot_product.category_id, None), bot_product.sync_group_id
+            )
+            db.add(new_main_product)
+            db.flush()
+            new_main_product.sync_product_id = new_main_product.id
+            if not bot_product.sync_product_id:
+                bot_product.sync_product_id = new_main_product.id
+            occupied.add((bot_product.sync_group_id, None))
+            name_price.add((None, bot_product.name, bot_product.price))
+            created_in_main.append(new_main_product)
+            stats["created_in_main"] += 1
+
+    # 2. Товары основного магазина, которых нет в ботах (и только что скопированные из других ботов)
+    main_products = [p for p in all_products if p.bot_id is None and not p.is_sold] + created_in_main
+    for main_product in main_products:
+        if not main_product.sync_product_id:
+            main_product.sync_product_id = main_product.id
+
+        for bot in connected_bots:
+            if (main_product.sync_group_id, bot.id) in occupied:
+                continue
+            if (bot.id, main_product.name, main_product.price) in name_price:
+                continue
+
+            print(f"🔄 Reconcile: copying product '{main_product.name}' from main shop to bot {bot.id}")
+            db.add(copy_product_for_shop(
+                main_product, bot.id, main_product.sync_product_id,
+                category_for_shop(main_product.category_id, bot.id), main_product.sync_group_id
+            ))
+            occupied.add((main_product.sync_group_id, bot.id))
+            name_price.add((bot.id, main_product.name, main_product.price))
+            stats["created_in_bots"] += 1
+
+    if not commit:
+        db.flush()
+        return stats
+    db.commit()
+    if stats["created_in_main"] or stats["created_in_bots"]:
+        bump_shop_version(user_id)
+    return stats
+
+
+def reconcile_dirty_shops() -> int:
+    """
+    Сверяет все магазины, помеченные как "грязные", каждый в своей сессии.
+
+    Returns:
+        Количество сверенных магазинов
+    """
+    with _dirty_lock:
+        owners = list(_dirty_owners)
+        _dirty_owners.clear()
+
+    for user_id in owners:
+        db = database.SessionLocal()
+        try:
+            stats = reconcile_owner_catalog(user_id, db)
+            if stats["created_in_main"] or stats["created_in_bots"]:
+                print(f"✅ Reconciled catalog of user {user_id}: {stats}")
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Catalog reconciliation failed for user {user_id}: {type(e).__name__} - {e}")
+        finally:
+            db.close()
+
+    return len(owners)
+
+
+def run_reconciler():
+    """Цикл фонового потока: ждет пометок и сверяет грязные магазины"""
+    while not _stop.is_set():
+        _wakeup.wait()
+        if _stop.is_set():
+            break
+        # Даем серии записей завершиться, чтобы сверить магазин один раз
+        _stop.wait(RECONCILE_DELAY_SECONDS)
+        _wakeup.clear()
+        reconcile_dirty_shops()
+
+
+def start_reconciler():
+    """
+    Запускает фоновый поток сверки.
+    При старте помечает магазины всех владельцев с активными ботами,
+    чтобы расхождения, накопленные до запуска, были исправлены один раз.
+    """
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+
+    db = database.SessionLocal()
+    try:
+        owner_ids = db.query(models.Bot.owner_user_id).filter(
+            models.Bot.is_active == True
+        ).distinct().all()
+    finally:
+        db.close()
+    for (owner_id,) in owner_ids:
+        mark_shop_dirty(owner_id)
+
+    _stop.clear()
+    _worker = threading.Thread(target=run_reconciler, name="catalog-reconciler", daemon=True)
+    _worker.start()
+    print(f"✅ Catalog reconciler started ({len(owner_ids)} shops queued)")
+
+
+def stop_reconciler():
+    """Останавливает фоновый поток сверки"""
+    global _worker
+    _stop.set()
+    _wakeup.set()
+    if _worker is not None:
+        _worker.join(timeout=5)
+        _worker = None
@@ -0,0 +1,165 @@
+"""
+Сопоставление категорий между магазинами владельца (основной магазин и боты).
+
+Копия товара в другом магазине должна ссылаться на категорию своего магазина с тем же
+именем (инвариант product.bot_id === category.bot_id). Раньше normalize_category_id делал
+1-2 запроса на каждый товар и каждый бот и печатал предупреждение на каждое расхождение,
+поэтому полная синхронизация большого магазина выполняла O(товаров × ботов) запросов
+к categories, снова и снова разрешая одни и те же несколько имен.
+
+CategoryResolver загружает все категории владельца одним запросом в словари
+id -> (bot_id, имя) и (bot_id, имя) -> id и дальше отвечает из памяти. Расхождения
+копятся в счетчиках и выводятся одной строкой (report).
+
+Резолвер живет в пределах сессии (запрос API или пачка фоновой задачи):
+get_category_resolver хранит его в db.info. Он сбрасывается при flush, изменившем
+категории, и при commit/rollback - тогда же печатается сводка расхождений.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..db import models, database
+
+_RESOLVERS_KEY = "category_resolvers"
+
+
+class CategoryResolver:
+    """Сопоставление категорий владельца по имени между магазинами, один запрос на резолвер"""
+
+    def __init__(self, user_id: int, db: Session):
+        self.user_id = user_id
+        self.db = db
+        self._categories: Optional[Dict[int, Tuple[Optional[int], str]]] = None
+        self._by_name: Dict[Tuple[Optional[int], str], int] = {}
+        self.lookups = 0
+        self.remapped = 0
+        self.unknown_ids = set()
+        self.missing = {}  # (имя, bot_id) -> сколько раз не нашлась
+
+    def _load(self):
+        if self._categories is not None:
+            return
+        rows = self.db.query(models.Category.id, models.Category.bot_id, models.Category.name).filter(
+            models.Category.user_id == self.user_id
+        ).order_by(models.Category.id).all()
+        self._categories = {}
+        for category_id, bot_id, name in rows:
+            self._categories[category_id] = (bot_id, name)
+            # При повторе имени в магазине берется первая категория (как normalize_category_ids)
+            self._by_name.setdefault((bot_id, name), category_id)
+
+    def get(self, category_id: int) -> Optional[Tuple[Optional[int], str]]:
+        """(bot_id, имя) категории владельца или None, если такой категории нет"""
+        self._load()
+        return self._categories.get(int(category_id))
+
+    def resolve(self, category_id: Optional[int], target_bot_id: Optional[int]) -> Optional[int]:
+        """
+        Категория для копии товара в целевом магазине.
+
+        Args:
+            category_id: ID категории исходного товара (может быть None)
+            target_bot_id: ID целевого бота (None для основного бота)
+
+        Returns:
+            category_id, если категория уже в целевом магазине; иначе категория с тем же
+            именем в целевом магазине; None, если категории нет
+        """
+        if category_id is None:
+            return None
+        category_id = int(category_id)
+        if target_bot_id is not None:
+            target_bot_id = int(target_bot_id)
+
+        self._load()
+        self.lookups += 1
+        category = self._categories.get(category_id)
+        if category is None:
+            self.unknown_ids.add(category_id)
+            return None
+
+        bot_id, name = category
+        if bot_id == target_bot_id:
+            return category_id
+
+        matching_id = self._by_name.get((target_bot_id, name))
+        if matching_id is None:
+            key = (name, target_bot_id)
+            self.missing[key] = self.missing.get(key, 0) + 1
+        else:
+            self.remapped += 1
+        return matching_id
+
+    def resolve_many(self, category_id: Optional[int], target_bot_ids: Iterable[Optional[int]]) -> Dict[Optional[int], Optional[int]]:
+        """
+        Категории для копий товара в нескольких магазинах сразу.
+
+        Returns:
+            Словарь target_bot_id -> category_id (None, если категория не найдена)
+        """
+        return {
+            int(bot_id) if bot_id is not None else None: self.resolve(category_id, bot_id)
+            for bot_id in target_bot_ids
+        }
+
+    def report(self):
+        """Печатает одну строку со сводкой расхождений (если они были)"""
+        if not (self.remapped or self.missing or self.unknown_ids):
+            return
+        line = f"📂 Categories for user {self.user_id}: {self.lookups} lookups, {self.remapped} mapped by name"
+        if self.missing:
+            missing = ", ".join(
+                f"'{name}' in {'main bot' if bot_id is None else f'bot {bot_id}'} x{count}"
+                for (name, bot_id), count in sorted(self.missing.items(), key=lambda item: -item[1])
+            )
+            line += f"; ⚠️ not found: {missing}"
+        if self.unknown_ids:
+            line += f"; ⚠️ unknown category ids: {sorted(self.unknown_ids)}"
+        print(line)
+        self.lookups = self.remapped = 0
+        self.unknown_ids = set()
+        self.missing = {}
+
+
+def get_category_resolver(user_id: int, db: Session) -> CategoryResolver:
+    """
+    Резолвер категорий владельца для текущей сессии (создается при первом обращении).
+
+    Args:
+        user_id: ID владельца магазина
+        db: Сессия базы данных
+
+    Returns:
+        CategoryResolver, общий для всех вызовов в этой сессии до commit/rollback
+    """
+    resolvers = db.info.setdefault(_RESOLVERS_KEY, {})
+    resolver = resolvers.get(user_id)
+    if resolver is None:
+        resolver = resolvers[user_id] = CategoryResolver(user_id, db)
+    return resolver
+
+
+def _drop_resolvers(session: Session):
+    for resolver in session.info.pop(_RESOLVERS_KEY, {}).values():
+        resolver.report()
+
+
+@event.listens_for(database.SessionLocal, "after_flush")
+def _drop_after_category_changes(session: Session, flush_context):
+    """Категории изменились в этой сессии - следующее обращение перечитает их"""
+    if _RESOLVERS_KEY not in session.info:
+        return
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Category):
+            _drop_resolvers(session)
+            return
+
+
+@event.listens_for(database.SessionLocal, "after_commit")
+def _drop_after_commit(session: Session):
+    _drop_resolvers(session)
+
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _drop_after_rollback(session: Session):
+    _drop_resolvers(session)
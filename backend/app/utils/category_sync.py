@@ -0,0 +1,210 @@
+"""
+Синхронизация дерева категорий между магазинами владельца (основной магазин и боты).
+
+Раньше sync_category_to_all_bots обрабатывал одну категорию за раз: для каждого бота
+отдельными запросами искал категорию и ее родителя по имени, а скрипты сверки
+(sync_all_categories.py) вызывали такую логику в цикле - O(категорий × ботов × глубина)
+запросов. Теперь дерево магазина-источника сравнивается с деревом каждого целевого
+магазина в памяти, и применяется минимальный набор изменений в одной транзакции:
+
+- вставка категорий, которых нет в целевом магазине
+- переименование: категория источника без пары по имени и категория цели без пары,
+  в которых лежат копии одних и тех же товаров (по группам синхронизации)
+- перенос под другого родителя, если родитель по имени отличается от источника
+- удаление категорий цели без пары (только при prune, по умолчанию сверка добавляет)
+
+Категории сопоставляются по имени, как и раньше (при повторе имени - первая по id).
+Запросов - постоянное число: боты, все категории владельца, при поиске переименований -
+группы товаров, плюс один flush на вставки.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from ..db import models
+from .shared_catalog import copied_bot_filter
+
+# (bot_id, category_id) -> группы синхронизации товаров в категории
+GroupsByCategory = Dict[Tuple[Optional[int], int], Set[int]]
+
+
+def _first_by_name(categories: List[models.Category]) -> Dict[str, models.Category]:
+    """Имя -> первая по id категория магазина с этим именем"""
+    by_name = {}
+    for category in sorted(categories, key=lambda c: c.id):
+        by_name.setdefault(category.name, category)
+    return by_name
+
+
+def _pair_renames(
+    source_unmatched: List[models.Category],
+    target_unmatched: List[models.Category],
+    groups: GroupsByCategory
+) -> List[Tuple[models.Category, models.Category]]:
+    """
+    Пары (категория источника, категория цели) для переименования: жадно по числу
+    общих товаров (групп синхронизации), пары без общих товаров не образуются.
+    """
+    candidates = []
+    for source in source_unmatched:
+        source_groups = groups.get((source.bot_id, source.id))
+        if not source_groups:
+            continue
+        for target in target_unmatched:
+            common = len(source_groups & groups.get((target.bot_id, target.id), set()))
+            if common:
+                candidates.append((common, source.id, target.id, source, target))
+
+    pairs = []
+    used_sources, used_targets = set(), set()
+    for _, source_id, target_id, source, target in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        if source_id in used_sources or target_id in used_targets:
+            continue
+        used_sources.add(source_id)
+        used_targets.add(target_id)
+        pairs.append((source, target))
+    return pairs
+
+
+def sync_category_tree(
+    user_id: int,
+    source_bot_id: Optional[int],
+    db: Session,
+    prune: bool = False,
+    prune_names: Optional[Iterable[str]] = None,
+    detect_renames: bool = True,
+    target_bot_ids: Optional[Iterable[Optional[int]]] = None
+) -> Dict[str, int]:
+    """
+    Приводит деревья категорий целевых магазинов к дереву магазина-источника.
+    Не коммитит.
+
+    Args:
+        user_id: ID владельца магазина
+        source_bot_id: Магазин-источник (None - основной)
+        db: Сессия базы данных
+        prune: Удалять категории целевых магазинов, которых нет в источнике
+               (вместе с их товарами - каскадно, как при удалении категории)
+        prune_names: Если задано, удаляются только категории с этими именами
+        detect_renames: Искать переименования по общим товарам (иначе - вставка новой категории)
+        target_bot_ids: Целевые магазины (по умолчанию основной и все активные боты, кроме источника)
+
+    Returns:
+        Счетчики: inserted, renamed, reparented, deleted
+    """
+    stats = {"inserted": 0, "renamed": 0, "reparented": 0, "deleted": 0}
+
+    if target_bot_ids is None:
+        active_bot_ids = [bot_id for (bot_id,) in db.query(models.Bot.id).filter(
+            models.Bot.owner_user_id == user_id,
+            models.Bot.is_active == True,
+            copied_bot_filter()
+        ).order_by(models.Bot.id).all()]
+        target_bot_ids = [None] + active_bot_ids
+    targets = [bot_id for bot_id in dict.fromkeys(target_bot_ids) if bot_id != source_bot_id]
+    if not targets:
+        return stats
+    prune_names = set(prune_names) if prune_names is not None else None
+
+    categories = db.query(models.Category).filter(
+        models.Category.user_id == user_id
+    ).order_by(models.Category.id).all()
+    by_shop: Dict[Optional[int], List[models.Category]] = {}
+    for category in categories:
+        by_shop.setdefault(category.bot_id, []).append(category)
+    by_id = {category.id: category for category in categories}
+
+    source_by_name = _first_by_name(by_shop.get(source_bot_id, []))
+
+    def parent_name(category: models.Category) -> Optional[str]:
+        parent = by_id.get(category.parent_id) if category.parent_id is not None else None
+        return parent.name if parent is not None else None
+
+    # Желаемое дерево: имя -> имя родителя (родитель из другого магазина считается отсутствующим)
+    source_parent = {
+        name: (parent_name(category) if by_id.get(category.parent_id) is not None
+               and by_id[category.parent_id].bot_id == source_bot_id else None)
+        for name, category in source_by_name.items()
+    }
+
+    # Первый проход: пары по имени и кандидаты на переименование в каждом магазине
+    plans = []
+    need_groups = False
+    for bot_id in targets:
+        target_by_name = _first_by_name(by_shop.get(bot_id, []))
+        source_unmatched = [c for name, c in source_by_name.items() if name not in target_by_name]
+        target_unmatched = [c for name, c in target_by_name.items() if name not in source_by_name]
+        need_groups = need_groups or bool(detect_renames and source_unmatched and target_unmatched)
+        plans.append((bot_id, target_by_name, source_unmatched, target_unmatched))
+
+    # Переименования определяются по товарам: копии одних товаров в категориях с разными именами
+    groups: GroupsByCategory = {}
+    if need_groups:
+        shops = [source_bot_id] + targets
+        rows = db.query(models.Product.bot_id, models.Product.category_id, models.Product.sync_group_id).filter(
+            models.Product.user_id == user_id,
+            models.Product.category_id != None,
+            models.Product.sync_group_id != None
+        ).all()
+        for bot_id, category_id, sync_group_id in rows:
+            if bot_id in shops:
+                groups.setdefault((bot_id, category_id), set()).add(sync_group_id)
+
+    new_categories = []
+    reparents = []  # (категория цели, имя родителя в источнике, словарь имя -> категория цели)
+    deleted = []
+    for bot_id, target_by_name, source_unmatched, target_unmatched in plans:
+        shop = "main bot" if bot_id is None else f"bot {bot_id}"
+
+        for source, target in _pair_renames(source_unmatched, target_unmatched, groups):
+            print(f"🔄 Synced category rename '{target.name}' -> '{source.name}' to {shop} (RENAME)")
+            del target_by_name[target.name]
+            target.name = source.name
+            target_by_name[source.name] = target
+            stats["renamed"] += 1
+
+        for name in source_by_name:
+            if name not in target_by_name:
+                category = models.Category(name=name, user_id=user_id, bot_id=bot_id)
+                target_by_name[name] = category
+                new_categories.append(category)
+                print(f"🔄 Synced category '{name}' to {shop} (CREATE)")
+                stats["inserted"] += 1
+
+        for name, desired_parent in source_parent.items():
+            reparents.append((target_by_name[name], desired_parent, target_by_name))
+
+        if prune:
+            for name, category in list(target_by_name.items()):
+                if name in source_by_name or (prune_names is not None and name not in prune_names):
+                    continue
+                deleted.append(category)
+                print(f"🔄 Synced deletion of category '{name}' to {shop} (DELETE)")
+
+    # Родители: существующие категории ссылаются по id, новые - через связь parent,
+    # поэтому все вставки уходят одним flush в порядке зависимостей
+    for category, desired_parent, target_by_name in reparents:
+        parent = target_by_name.get(desired_parent) if desired_parent is not None else None
+        current_parent = category.parent if category.id is None else by_id.get(category.parent_id)
+        if current_parent is parent:
+            continue
+        category.parent = parent
+        if category.id is not None:
+            stats["reparented"] += 1
+            print(f"🔄 Synced category '{category.name}' parent -> '{desired_parent}' (bot_id={category.bot_id}, REPARENT)")
+
+    if new_categories:
+        db.add_all(new_categories)
+
+    if deleted:
+        deleted_ids = [category.id for category in deleted]
+        # Исторические продажи сохраняются без категории (как в DELETE /api/categories/{id})
+        db.query(models.SoldProduct).filter(
+            models.SoldProduct.category_id.in_(deleted_ids)
+        ).update({models.SoldProduct.category_id: None}, synchronize_session=False)
+        for category in deleted:
+            db.delete(category)
+        stats["deleted"] = len(deleted)
+
+    db.flush()
+    if any(stats.values()):
+        print(f"✅ Category tree sync from {'main bot' if source_bot_id is None else f'bot {source_bot_id}'} for user {user_id}: {stats}")
+    return stats
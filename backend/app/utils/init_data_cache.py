@@ -0,0 +1,113 @@
+"""
+Кэш результатов проверки Telegram initData в памяти процесса.
+
+WebApp отправляет один и тот же заголовок X-Telegram-Init-Data во всех запросах сессии,
+поэтому повторная проверка (разбор, HMAC, поиск бота) дает тот же результат.
+Ключ кэша - SHA-256 от initData и токена главного бота (сама строка initData не хранится),
+значение - (user_id, bot_token, bot_id). Запись живет INIT_DATA_CACHE_TTL секунд от auth_date
+из initData; записи бота удаляются при его деактивации (forget_bot).
+Размер ограничен (LRU), ведутся счетчики попаданий и промахов.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Максимальное количество записей (примерно число одновременных сессий)
+INIT_DATA_CACHE_MAX_ENTRIES = int(os.getenv("INIT_DATA_CACHE_MAX_ENTRIES", "10000"))
+# Сколько секунд после auth_date результат проверки выдается из кэша
+INIT_DATA_CACHE_TTL_SECONDS = float(os.getenv("INIT_DATA_CACHE_TTL", "86400"))
+
+ValidatedInitData = Tuple[int, Optional[str], Optional[int]]
+
+
+class InitDataCache:
+    """LRU-кэш проверенных initData со сроком жизни от auth_date"""
+
+    def __init__(self, max_entries: int = INIT_DATA_CACHE_MAX_ENTRIES, ttl_seconds: float = INIT_DATA_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[bytes, Tuple[float, ValidatedInitData]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.not_cached = 0
+
+    @staticmethod
+    def make_key(init_data: str, default_bot_token: Optional[str]) -> bytes:
+        """Ключ записи: результат зависит и от initData, и от токена главного бота"""
+        return hashlib.sha256(f"{default_bot_token or ''}\n{init_data}".encode()).digest()
+
+    def get(self, key: bytes) -> Optional[ValidatedInitData]:
+        """Результат проверки, если он есть и не истек. Иначе None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: bytes, value: ValidatedInitData, auth_date: Optional[str]):
+        """
+        Сохраняет результат проверки до auth_date + ttl.
+        initData без auth_date или уже старше ttl не кэшируется.
+        """
+        try:
+            expires_at = int(auth_date) + self.ttl_seconds
+        except (TypeError, ValueError):
+            expires_at = 0
+        with self._lock:
+            if expires_at <= time.time():
+                self.not_cached += 1
+                return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def forget_bot(self, bot_id: int) -> int:
+        """
+        Удаляет записи сессий, подписанных ботом (при его деактивации).
+
+        Returns:
+            Количество удаленных записей
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if value[2] == bot_id]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша для мониторинга"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "not_cached": self.not_cached,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+init_data_cache = InitDataCache()
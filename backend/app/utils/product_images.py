@@ -0,0 +1,223 @@
+"""
+Изображения товаров: таблица product_images и общий загрузчик.
+
+Раньше каждый обработчик сам разбирал JSON из Product.images_urls и сам делал
+fallback на image_url. Теперь изображения лежат строками в product_images
+(product_id, position, path, width, height, size_bytes), а списки товаров получают
+их одним запросом через load_product_image_paths.
+
+Переход онлайн:
+- обработчики по-прежнему пишут Product.images_urls / image_url
+- after_flush запоминает товары с измененными изображениями, before_commit
+  пересобирает их строки в product_images в той же транзакции
+- загрузчик для товаров без строк (еще не перенесенных migrate_add_product_images.py)
+  разбирает JSON-колонку, так что чтение корректно на любом этапе миграции
+"""
+import json
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from ..db import models, database
+from .products_utils import make_full_url
+
+_PENDING_KEY = "product_images_pending"
+_DELETED_KEY = "product_images_deleted"
+
+# Ограничение на количество параметров в одном IN (SQLite)
+_IN_CHUNK_SIZE = 500
+
+UPLOADS_DIR = "static/uploads"
+
+
+def parse_product_images(product) -> List[str]:
+    """
+    Список путей изображений товара из JSON-колонки images_urls.
+    Для обратной совместимости: если images_urls пуст, но есть image_url, возвращает [image_url].
+
+    Args:
+        product: Товар (или любой объект с полями images_urls и image_url)
+    """
+    images_list = []
+    if product.images_urls:
+        try:
+            images_list = json.loads(product.images_urls) if isinstance(product.images_urls, str) else product.images_urls
+        except (json.JSONDecodeError, TypeError):
+            images_list = []
+    if not images_list and product.image_url:
+        images_list = [product.image_url]
+    return [path for path in (images_list or []) if path]
+
+
+def load_product_image_paths(products: Iterable[models.Product], db: Session) -> Dict[int, List[str]]:
+    """
+    Загружает пути изображений для списка товаров одним запросом (на каждые 500 товаров).
+
+    Returns:
+        Словарь {product.id: [путь, ...]} в порядке position
+    """
+    products = list(products)
+    product_ids = [prod.id for prod in products]
+    paths_by_product: Dict[int, List[str]] = {}
+    for start in range(0, len(product_ids), _IN_CHUNK_SIZE):
+        chunk = product_ids[start:start + _IN_CHUNK_SIZE]
+        rows = db.query(models.ProductImage.product_id, models.ProductImage.path).filter(
+            models.ProductImage.product_id.in_(chunk)
+        ).order_by(models.ProductImage.product_id, models.ProductImage.position).all()
+        for product_id, path in rows:
+            paths_by_product.setdefault(product_id, []).append(path)
+
+    # Товары, еще не перенесенные в product_images (или без изображений)
+    for prod in products:
+        if prod.id not in paths_by_product:
+            paths_by_product[prod.id] = parse_product_images(prod)
+    return paths_by_product
+
+
+def load_product_image_urls(products: Iterable[models.Product], db: Session) -> Dict[int, List[str]]:
+    """То же, что load_product_image_paths, но с полными HTTPS URL (через /api/images/)"""
+    return {
+        product_id: [make_full_url(path) for path in paths]
+        for product_id, paths in load_product_image_paths(products, db).items()
+    }
+
+
+def local_file_path(path: str) -> Optional[str]:
+    """Путь к файлу загрузки на диске для пути /static/uploads/<файл> (или полного URL с ним)"""
+    if '/static/uploads/' not in path:
+        return None
+    filename = path.split('/static/uploads/')[-1]
+    return os.path.join(UPLOADS_DIR, filename)
+
+
+def read_image_size(file_path: str) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Читает ширину и высоту из заголовка PNG, GIF, JPEG или WebP без декодирования изображения.
+
+    Returns:
+        (width, height) или (None, None), если формат не распознан
+    """
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(32)
+            if head.startswith(b"\x89PNG\r\n\x1a\n"):
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                chunk = head[12:16]
+                if chunk == b"VP8 ":
+                    width, height = struct.unpack("<HH", head[26:30])
+                    return width & 0x3FFF, height & 0x3FFF
+                if chunk == b"VP8L":
+                    bits = struct.unpack("<I", head[21:25])[0]
+                    return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+                if chunk == b"VP8X":
+                    width = int.from_bytes(head[24:27], "little") + 1
+                    height = int.from_bytes(head[27:30], "little") + 1
+                    return width, height
+            if head[:2] == b"\xff\xd8":
+                # JPEG: ищем маркер SOFn с размерами кадра
+                f.seek(2)
+                while True:
+                    marker = f.read(2)
+                    if len(marker) < 2 or marker[0] != 0xFF:
+                        break
+                    length = struct.unpack(">H", f.read(2))[0]
+                    if marker[1] in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                        height, width = struct.unpack(">xHH", f.read(5))
+                        return width, height
+                    f.seek(length - 2, 1)
+    except (OSError, struct.error):
+        pass
+    return None, None
+
+
+def build_product_image_rows(product: models.Product) -> List[models.ProductImage]:
+    """Строки product_images для товара по его images_urls / image_url"""
+    rows = []
+    for position, path in enumerate(parse_product_images(product)):
+        width = height = size_bytes = None
+        file_path = local_file_path(path)
+        if file_path and os.path.exists(file_path):
+            size_bytes = os.path.getsize(file_path)
+            width, height = read_image_size(file_path)
+        rows.append(models.ProductImage(
+            product_id=product.id,
+            position=position,
+            path=path,
+            width=width,
+            height=height,
+            size_bytes=size_bytes
+        ))
+    return rows
+
+
+def replace_product_images(products: List[models.Product], db: Session):
+    """Заменяет строки product_images указанных товаров (коммит выполняет вызывающий код)"""
+    product_ids = [prod.id for prod in products]
+    for start in range(0, len(product_ids), _IN_CHUNK_SIZE):
+        db.query(models.ProductImage).filter(
+            models.ProductImage.product_id.in_(product_ids[start:start + _IN_CHUNK_SIZE])
+        ).delete(synchronize_session=False)
+    for prod in products:
+        db.add_all(build_product_image_rows(prod))
+
+
+def sync_pending_product_images(session: Session):
+    """
+    Переносит в product_images изменения изображений, накопленные в транзакции.
+    Вызывается в before_commit (и проекцией витрины перед ее пересборкой).
+    """
+    session.flush()
+    pending = session.info.pop(_PENDING_KEY, None)
+    deleted = session.info.pop(_DELETED_KEY, None)
+    if deleted:
+        deleted_ids = list(deleted)
+        for start in range(0, len(deleted_ids), _IN_CHUNK_SIZE):
+            session.query(models.ProductImage).filter(
+                models.ProductImage.product_id.in_(deleted_ids[start:start + _IN_CHUNK_SIZE])
+            ).delete(synchronize_session=False)
+    if pending:
+        pending_ids = list(pending - (deleted or set()))
+        products = []
+        for start in range(0, len(pending_ids), _IN_CHUNK_SIZE):
+            products.extend(session.query(models.Product).filter(
+                models.Product.id.in_(pending_ids[start:start + _IN_CHUNK_SIZE])
+            ).all())
+        replace_product_images(products, session)
+    if pending or deleted:
+        session.flush()
+
+
+def _images_changed(product: models.Product) -> bool:
+    state = inspect(product)
+    return state.attrs.images_urls.history.has_changes() or state.attrs.image_url.history.has_changes()
+
+
+@event.listens_for(database.SessionLocal, "after_flush")
+def _collect_changed_images(session: Session, flush_context):
+    pending = set()
+    for obj in session.new:
+        if isinstance(obj, models.Product) and (obj.images_urls or obj.image_url):
+            pending.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, models.Product) and _images_changed(obj):
+            pending.add(obj.id)
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, models.Product)}
+    if pending:
+        session.info.setdefault(_PENDING_KEY, set()).update(pending)
+    if deleted:
+        session.info.setdefault(_DELETED_KEY, set()).update(deleted)
+
+
+@event.listens_for(database.SessionLocal, "before_commit")
+def _sync_changed_images(session: Session):
+    sync_pending_product_images(session)
+
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _forget_changed_images(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_DELETED_KEY, None)
@@ -3,6 +3,7 @@ import uuid
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 from ..db import models
+from .product_images import load_product_image_paths
 
 
 def create_product_snapshot(
@@ -28,16 +29,8 @@ def create_product_snapshot(
     # Генерируем уникальный ID для snapshot
     snapshot_id = str(uuid.uuid4())
     
-    # Парсим images_urls если это строка
-    images_urls_list = []
-    if product.images_urls:
-        try:
-            if isinstance(product.images_urls, str):
-                images_urls_list = json.loads(product.images_urls)
-            else:
-                images_urls_list = product.images_urls
-        except (json.JSONDecodeError, TypeError):
-            images_urls_list = []
+    # Изображения из product_images (с fallback на images_urls / image_url)
+    images_urls_list = load_product_image_paths([product], db)[product.id]
     
     # Формируем JSON с данными товара на момент операции
     product_data = {
@@ -0,0 +1,110 @@
+"""
+Массовые изменения товаров набором UPDATE вместо правки каждого товара через ORM.
+
+Раньше массовое обновление загружало все товары магазина, меняло их по одному и для
+каждого вызывало sync_product_to_all_bots: для магазина на 2000 товаров и 5 ботов это
+десятки тысяч запросов в одной транзакции. Теперь изменение применяется ко всем копиям
+выбранных товаров (по группам синхронизации) одним UPDATE:
+
+    UPDATE products SET ... WHERE user_id = ? AND sync_group_id IN (SELECT ... товары по фильтру)
+
+Перенос в категорию в каждом магазине ставит категорию с тем же именем (как normalize_category_id),
+коррелированным подзапросом в том же UPDATE.
+"""
+from typing import Any, Dict, Optional
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session, aliased
+from ..db import models
+from .storefront_projection import mark_storefront_dirty
+from .catalog_digest import mark_catalog_digest_dirty
+from .shared_catalog import catalog_bot_id, copied_bot_filter
+from .products_utils import validate_discount
+
+# Поля, которые можно менять массово
+BULK_PATCH_FIELDS = ("is_made_to_order", "is_hidden", "discount", "is_hot_offer", "category_id")
+
+
+def apply_bulk_product_patch(
+    user_id: int,
+    bot_id: Optional[int],
+    product_filter: Dict[str, Any],
+    changes: Dict[str, Any],
+    db: Session
+) -> Dict[str, int]:
+    """
+    Меняет поля выбранных товаров и всех их копий в основном магазине и подключенных ботах.
+    Не коммитит: коммит и bump_shop_version делает вызывающий код.
+
+    Args:
+        user_id: ID владельца магазина
+        bot_id: Магазин, в котором выбираются товары (None - основной)
+        product_filter: Условия выбора (поля BulkProductFilter)
+        changes: Новые значения полей (только заданные, из BULK_PATCH_FIELDS)
+        db: Сессия базы данных
+
+    Returns:
+        {"matched_count": товаров выбрано в магазине, "updated_count": строк изменено вместе с копиями}
+
+    Raises:
+        HTTPException: Нет изменений, скидка вне 0-100 или категория для переноса не найдена в магазине
+    """
+    changes = {field: value for field, value in changes.items() if field in BULK_PATCH_FIELDS and value is not None}
+    if not changes:
+        raise HTTPException(status_code=400, detail="No changes to apply")
+    # UPDATE записал бы значение как есть, поэтому диапазон проверяется до запроса
+    validate_discount(changes.get("discount"))
+    # Бот с общим каталогом меняет общие товары основного магазина (переопределения - отдельным запросом)
+    bot_id = catalog_bot_id(bot_id, db)
+
+    # Выбор товаров магазина по фильтру (алиас: подзапрос по той же таблице, что и UPDATE)
+    source = aliased(models.Product)
+    conditions = [
+        source.user_id == user_id,
+        source.bot_id.is_(None) if bot_id is None else source.bot_id == bot_id
+    ]
+    if not product_filter.get("include_sold"):
+        conditions.append(source.is_sold == False)
+    if product_filter.get("product_ids") is not None:
+        conditions.append(source.id.in_(product_filter["product_ids"]))
+    for field in ("category_id", "is_hidden", "is_hot_offer", "is_made_to_order"):
+        if product_filter.get(field) is not None:
+            conditions.append(getattr(source, field) == product_filter[field])
+
+    matched_count = db.query(func.count(source.id)).filter(*conditions).scalar()
+    if not matched_count:
+        return {"matched_count": 0, "updated_count": 0}
+
+    values = {getattr(models.Product, field): value for field, value in changes.items() if field != "category_id"}
+    if "category_id" in changes:
+        target_category = db.query(models.Category).filter(
+            models.Category.id == changes["category_id"],
+            models.Category.user_id == user_id,
+            models.Category.bot_id.is_(None) if bot_id is None else models.Category.bot_id == bot_id
+        ).first()
+        if not target_category:
+            raise HTTPException(status_code=404, detail="Category not found in this shop")
+        # Категория с тем же именем в магазине каждой копии (первая по id, как normalize_category_id)
+        values[models.Product.category_id] = select(models.Category.id).where(
+            models.Category.user_id == models.Product.user_id,
+            models.Category.bot_id.is_(models.Product.bot_id),
+            models.Category.name == target_category.name
+        ).order_by(models.Category.id).limit(1).scalar_subquery()
+
+    # Копии синхронизируются только в основной магазин и активные боты (как sync_product_to_all_bots)
+    active_bot_ids = select(models.Bot.id).where(
+        models.Bot.owner_user_id == user_id,
+        models.Bot.is_active == True,
+        copied_bot_filter()
+    )
+    updated_count = db.query(models.Product).filter(
+        models.Product.user_id == user_id,
+        models.Product.sync_group_id.in_(select(source.sync_group_id).where(*conditions)),
+        or_(models.Product.bot_id.is_(None), models.Product.bot_id.in_(active_bot_ids))
+    ).update(values, synchronize_session=False)
+
+    # UPDATE в обход flush: витрину и суммы каталогов владельца пересчитываем при коммите явно
+    mark_storefront_dirty(db, user_id)
+    mark_catalog_digest_dirty(db, user_id)
+    print(f"✅ Bulk patch - user_id={user_id}, bot_id={bot_id}, changes={changes}, matched={matched_count}, updated={updated_count}")
+    return {"matched_count": matched_count, "updated_count": updated_count}
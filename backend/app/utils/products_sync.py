@@ -3,745 +3,164 @@
 
 Этот модуль содержит функции для синхронизации товаров между основным ботом
 и подключенными ботами пользователя.
+
+Копии товара в разных магазинах связаны группой синхронизации (Product.sync_group_id):
+все копии находятся одним индексным запросом (load_sync_group_copies), без поиска
+по имени и цене в каждом боте.
 """
 
+from typing import Optional
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from ..db import models
-from .products_utils import normalize_category_id
+from .products_utils import normalize_category_ids
+from .catalog_reconciler import mark_shop_dirty, copy_product_for_shop
+from .sync_groups import SYNCED_PRODUCT_FIELDS, ensure_sync_group, load_sync_group_copies
+from .storefront_projection import mark_storefront_dirty
+from .catalog_digest import mark_catalog_digest_dirty
+from .shared_catalog import copied_bot_filter
 
 
-def sync_product_to_all_bots_with_rename(db_product: models.Product, db: Session, old_name: str, old_price: float):
+def _apply_synced_fields(target: models.Product, source: models.Product, category_id: Optional[int]):
+    """Переносит синхронизируемые поля товара в его копию"""
+    for field in SYNCED_PRODUCT_FIELDS:
+        setattr(target, field, getattr(source, field))
+    target.category_id = category_id
+
+
+def _sync_copies(db_product: models.Product, db: Session, create_missing: bool, label: str):
     """
-    Синхронизирует товар во все боты пользователя при переименовании.
-    Использует sync_product_id для надежной связи товаров.
-    
+    Обновляет копии товара во всех магазинах владельца (основном и подключенных ботах).
+
+    Число запросов не зависит от числа ботов: боты, копии товара (по группе) и категории
+    целевых магазинов загружаются по одному запросу; изменения копий уходят при flush
+    одним executemany UPDATE, недостающие копии - одним пакетным INSERT.
+
     Args:
-        db_product: Товар с новым именем
+        db_product: Измененный товар
         db: Сессия базы данных
-        old_name: Старое имя товара (для fallback поиска)
-        old_price: Старая цена товара (для fallback поиска)
+        create_missing: Создавать копии в магазинах, где их нет
+        label: Описание операции для лога
     """
     user_id = db_product.user_id
-    
+
     # Находим все подключенные боты пользователя
     connected_bots = db.query(models.Bot).filter(
         models.Bot.owner_user_id == user_id,
-        models.Bot.is_active == True
+        models.Bot.is_active == True,
+        copied_bot_filter()
     ).all()
-    
-    # Используем sync_product_id для надежной синхронизации
-    sync_id = db_product.sync_product_id or db_product.id
-    
+
+    sync_group_id = ensure_sync_group(db_product, db)
+    copies = load_sync_group_copies(sync_group_id, db)
+
+    # Целевые магазины: основной и все подключенные боты, кроме магазина самого товара
+    target_shops = [shop for shop in [None] + [bot.id for bot in connected_bots] if shop != db_product.bot_id]
+    # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
+    category_by_shop = normalize_category_ids(db_product.category_id, target_shops, user_id, db)
+
     if db_product.bot_id is None:
-        # Товар в основном боте - синхронизируем во все подключенные боты
-        for bot in connected_bots:
-            # Ищем товар по sync_product_id (надежный способ)
-            matching = None
-            if sync_id:
-                matching = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-            
-            # Fallback: если не нашли по sync_product_id, ищем по старому имени и цене
-            if not matching:
-                matching = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.name == old_name,
-                    models.Product.price == old_price
-                ).first()
-            
-            if matching:
-                # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                
-                # Обновляем товар, включая новое имя
-                matching.name = db_product.name
-                matching.description = db_product.description
-                matching.price = db_product.price
-                matching.image_url = db_product.image_url
-                matching.images_urls = db_product.images_urls
-                matching.discount = db_product.discount
-                matching.is_hot_offer = db_product.is_hot_offer
-                matching.quantity = db_product.quantity
-                matching.is_sold = db_product.is_sold
-                matching.is_made_to_order = db_product.is_made_to_order
-                matching.is_for_sale = db_product.is_for_sale
-                matching.price_from = db_product.price_from
-                matching.price_to = db_product.price_to
-                matching.price_fixed = db_product.price_fixed
-                matching.price_type = db_product.price_type
-                matching.quantity_from = db_product.quantity_from
-                matching.quantity_unit = db_product.quantity_unit
-                matching.quantity_show_enabled = db_product.quantity_show_enabled
-                matching.is_hidden = db_product.is_hidden
-                matching.category_id = category_id_for_bot
-                # Обновляем sync_product_id если он не был установлен
-                if not matching.sync_product_id:
-                    matching.sync_product_id = sync_id
-                print(f"🔄 Synced renamed product '{old_name}' -> '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (UPDATE)")
-            else:
-                # Товар не найден - проверяем, не существует ли уже товар с новым именем и sync_product_id
-                existing = None
-                if sync_id:
-                    existing = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.sync_product_id == sync_id
-                    ).first()
-                
-                # Fallback: ищем по новому имени
-                if not existing:
-                    existing = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.name == db_product.name
-                    ).first()
-                
-                if not existing:
-                    # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                    category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                    
-                    # Создаем новый товар
-                    new_product = models.Product(
-                        name=db_product.name,
-                        description=db_product.description,
-                        price=db_product.price,
-                        image_url=db_product.image_url,
-                        images_urls=db_product.images_urls,
-                        discount=db_product.discount,
-                        user_id=user_id,
-                        bot_id=bot.id,
-                        sync_product_id=sync_id,  # Связываем с оригинальным товаром
-                        is_hot_offer=db_product.is_hot_offer,
-                        quantity=db_product.quantity,
-                        is_sold=db_product.is_sold,
-                        is_made_to_order=db_product.is_made_to_order,
-                        is_for_sale=db_product.is_for_sale,
-                        price_from=db_product.price_from,
-                        price_to=db_product.price_to,
-                        price_fixed=db_product.price_fixed,
-                        price_type=db_product.price_type,
-                        quantity_from=db_product.quantity_from,
-                        quantity_unit=db_product.quantity_unit,
-                        quantity_show_enabled=db_product.quantity_show_enabled,
-                        is_hidden=db_product.is_hidden,
-                        category_id=category_id_for_bot
-                    )
-                    db.add(new_product)
-                    print(f"🔄 Synced renamed product '{old_name}' -> '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (CREATE)")
-    
+        # Товар в основном боте - он и есть оригинал (sync_product_id = id)
+        if not db_product.sync_product_id:
+            db_product.sync_product_id = db_product.id
     else:
-        # Товар в подключенном боте - синхронизируем в основной бот И во все другие подключенные боты
-        # Используем sync_product_id для надежной синхронизации
-        if not sync_id:
-            sync_id = db_product.sync_product_id
-        
-        # 1. Обновляем товар в основном боте (ищем по sync_product_id)
-        matching_main = None
-        if sync_id:
-            matching_main = db.query(models.Product).filter(
-                models.Product.user_id == user_id,
-                models.Product.bot_id == None,
-                models.Product.sync_product_id == sync_id
-            ).first()
-        
-        # Fallback: если не нашли по sync_product_id, ищем по старому имени и цене
-        if not matching_main:
-            matching_main = db.query(models.Product).filter(
-                models.Product.user_id == user_id,
-                models.Product.bot_id == None,
-                models.Product.name == old_name,
-                models.Product.price == old_price
-            ).first()
-        
-        if matching_main:
-            # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-            category_id_for_main = normalize_category_id(db_product.category_id, None, user_id, db)
-            
-            # Обновляем товар, включая новое имя
-            matching_main.name = db_product.name
-            matching_main.description = db_product.description
-            matching_main.price = db_product.price
-            matching_main.image_url = db_product.image_url
-            matching_main.images_urls = db_product.images_urls
-            matching_main.discount = db_product.discount
-            matching_main.is_hot_offer = db_product.is_hot_offer
-            matching_main.quantity = db_product.quantity
-            matching_main.is_sold = db_product.is_sold
-            matching_main.is_made_to_order = db_product.is_made_to_order
-            matching_main.quantity_show_enabled = db_product.quantity_show_enabled
-            matching_main.is_hidden = db_product.is_hidden
-            # Обновляем поля для продажи
-            matching_main.is_for_sale = db_product.is_for_sale
-            matching_main.price_from = db_product.price_from
-            matching_main.price_to = db_product.price_to
-            matching_main.price_fixed = db_product.price_fixed
-            matching_main.price_type = db_product.price_type
-            matching_main.quantity_from = db_product.quantity_from
-            matching_main.quantity_unit = db_product.quantity_unit
-            matching_main.category_id = category_id_for_main
-            # Устанавливаем sync_product_id если он не был установлен
-            if not matching_main.sync_product_id:
-                matching_main.sync_product_id = matching_main.id
-            if not db_product.sync_product_id:
-                db_product.sync_product_id = matching_main.sync_product_id
-            sync_id = matching_main.sync_product_id
-            print(f"🔄 Synced renamed product '{old_name}' -> '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to main bot (UPDATE)")
-        
-        # 2. Обновляем товар во всех других подключенных ботах (кроме текущего)
-        for bot in connected_bots:
-            if bot.id == db_product.bot_id:
-                continue  # Пропускаем текущий бот
-            
-            # Ищем товар по sync_product_id (надежный способ)
-            matching = None
-            if sync_id:
-                matching = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-            
-            # Fallback: если не нашли по sync_product_id, ищем по старому имени и цене
-            if not matching:
-                matching = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.name == old_name,
-                    models.Product.price == old_price
-                ).first()
-            
-            if matching:
-                # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                
-                # Обновляем товар, включая новое имя
-                matching.name = db_product.name
-                matching.description = db_product.description
-                matching.price = db_product.price
-                matching.image_url = db_product.image_url
-                matching.images_urls = db_product.images_urls
-                matching.discount = db_product.discount
-                matching.is_hot_offer = db_product.is_hot_offer
-                matching.quantity = db_product.quantity
-                matching.is_sold = db_product.is_sold
-                matching.is_made_to_order = db_product.is_made_to_order
-                matching.quantity_show_enabled = db_product.quantity_show_enabled
-                matching.is_hidden = db_product.is_hidden
-                # Обновляем поля для продажи
-                matching.is_for_sale = db_product.is_for_sale
-                matching.price_from = db_product.price_from
-                matching.price_to = db_product.price_to
-                matching.price_fixed = db_product.price_fixed
-                matching.price_type = db_product.price_type
-                matching.quantity_from = db_product.quantity_from
-                matching.quantity_unit = db_product.quantity_unit
-                matching.category_id = category_id_for_bot
-                # Обновляем sync_product_id если он не был установлен
-                if sync_id and not matching.sync_product_id:
-                    matching.sync_product_id = sync_id
-                print(f"🔄 Synced renamed product '{old_name}' -> '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (UPDATE)")
+        # Товар в подключенном боте - сначала основной магазин, он задает sync_product_id
+        main_copy = copies.get(None)
+        if main_copy is not None:
+            _apply_synced_fields(main_copy, db_product, category_by_shop[None])
+            if not main_copy.sync_product_id:
+                main_copy.sync_product_id = main_copy.id
+            print(f"🔄 Synced product {label} '{db_product.name}' (id={db_product.id}, sync_id={main_copy.sync_product_id}) to main bot (UPDATE)")
+        elif create_missing:
+            main_copy = copy_product_for_shop(db_product, None, None, category_by_shop[None], sync_group_id)
+            db.add(main_copy)
+            db.flush()  # Получаем ID нового товара
+            # Устанавливаем sync_product_id = id (сам на себя)
+            main_copy.sync_product_id = main_copy.id
+            print(f"🔄 Synced product {label} '{db_product.name}' (id={main_copy.id}, sync_id={main_copy.id}) to main bot (CREATE)")
+        if main_copy is not None and not db_product.sync_product_id:
+            db_product.sync_product_id = main_copy.sync_product_id
+
+    sync_id = db_product.sync_product_id
+
+    new_copy_rows = []
+    for bot_id in target_shops:
+        if bot_id is None:
+            continue  # Основной магазин обработан выше
+
+        matching = copies.get(bot_id)
+        if matching is not None:
+            _apply_synced_fields(matching, db_product, category_by_shop[bot_id])
+            # Обновляем sync_product_id если он не был установлен
+            if sync_id and not matching.sync_product_id:
+                matching.sync_product_id = sync_id
+            print(f"🔄 Synced product {label} '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot_id} (UPDATE)")
+        elif create_missing:
+            row = {field: getattr(db_product, field) for field in SYNCED_PRODUCT_FIELDS}
+            row.update(
+                user_id=user_id,
+                bot_id=bot_id,
+                sync_product_id=sync_id,  # Связываем с оригинальным товаром
+                sync_group_id=sync_group_id,
+                category_id=category_by_shop[bot_id]
+            )
+            new_copy_rows.append(row)
+            print(f"🔄 Synced product {label} '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot_id} (CREATE)")
+
+    if new_copy_rows:
+        # Один пакетный INSERT (executemany) вместо INSERT на каждую копию при flush.
+        # Такой INSERT идет в обход flush, поэтому витрину владельца помечаем явно;
+        # изображения новых копий читаются из images_urls, пока для них нет строк product_images
+        db.execute(insert(models.Product), new_copy_rows)
+        mark_storefront_dirty(db, user_id, sync_group_ids=[sync_group_id])
+        mark_catalog_digest_dirty(db, user_id)
+
+
+def sync_product_to_all_bots_with_rename(db_product: models.Product, db: Session, old_name: str, old_price: float):
+    """
+    Синхронизирует товар во все боты пользователя при переименовании.
+    Копии находятся по группе синхронизации, поэтому старое имя и цена нужны только для лога.
+
+    Args:
+        db_product: Товар с новым именем
+        db: Сессия базы данных
+        old_name: Старое имя товара
+        old_price: Старая цена товара
+    """
+    # Запись в каталог: после нее магазин владельца сверяется в фоне
+    mark_shop_dirty(db_product.user_id)
+    # Для товара основного магазина недостающие копии в ботах создаются (как и раньше)
+    _sync_copies(db_product, db, create_missing=db_product.bot_id is None, label=f"'{old_name}' ->")
 
 
 def sync_product_to_all_bots(db_product: models.Product, db: Session, action: str = "create"):
     """
     Синхронизирует товар во все боты пользователя (двусторонняя синхронизация).
-    Использует sync_product_id для надежной связи товаров между магазинами.
-    
+    Копии товара находятся по группе синхронизации (sync_group_id).
+
     action: "create", "update", "delete"
     """
     user_id = db_product.user_id
-    
-    # Находим все подключенные боты пользователя
-    connected_bots = db.query(models.Bot).filter(
-        models.Bot.owner_user_id == user_id,
-        models.Bot.is_active == True
-    ).all()
-    
-    if db_product.bot_id is None:
-        # Товар в основном боте - синхронизируем во все подключенные боты
-        # sync_product_id уже установлен на id товара (сам на себя)
-        sync_id = db_product.sync_product_id or db_product.id
-        
-        for bot in connected_bots:
-            if action == "create":
-                # Ищем существующий синхронизированный товар по sync_product_id
-                existing = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-                
-                # Fallback: если sync_product_id не установлен, ищем по имени и цене (для обратной совместимости)
-                if not existing:
-                    existing = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.name == db_product.name,
-                        models.Product.price == db_product.price
-                    ).first()
-                
-                if not existing:
-                    # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                    category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                    
-                    # Создаем копию товара для этого бота
-                    new_product = models.Product(
-                        name=db_product.name,
-                        description=db_product.description,
-                        price=db_product.price,
-                        image_url=db_product.image_url,
-                        images_urls=db_product.images_urls,
-                        discount=db_product.discount,
-                        user_id=user_id,
-                        bot_id=bot.id,
-                        sync_product_id=sync_id,  # Связываем с оригинальным товаром
-                        is_hot_offer=db_product.is_hot_offer,
-                        quantity=db_product.quantity,
-                        is_sold=db_product.is_sold,
-                        is_made_to_order=db_product.is_made_to_order,
-                        is_for_sale=db_product.is_for_sale,
-                        price_from=db_product.price_from,
-                        price_to=db_product.price_to,
-                        price_fixed=db_product.price_fixed,
-                        price_type=db_product.price_type,
-                        quantity_from=db_product.quantity_from,
-                        quantity_unit=db_product.quantity_unit,
-                        quantity_show_enabled=db_product.quantity_show_enabled,
-                        is_hidden=db_product.is_hidden,
-                        category_id=category_id_for_bot
-                    )
-                    db.add(new_product)
-                    print(f"🔄 Synced product '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (CREATE)")
-            
-            elif action == "update":
-                # Ищем синхронизированный товар по sync_product_id (надежный способ)
-                matching = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-                
-                # Fallback: если sync_product_id не установлен, ищем по имени и цене (для обратной совместимости)
-                if not matching:
-                    matching = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.name == db_product.name,
-                        models.Product.price == db_product.price
-                    ).first()
-                
-                if matching:
-                    # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                    category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                    
-                    matching.name = db_product.name  # Обновляем название
-                    matching.description = db_product.description
-                    matching.price = db_product.price  # Обновляем цену при синхронизации
-                    matching.image_url = db_product.image_url
-                    matching.images_urls = db_product.images_urls
-                    matching.discount = db_product.discount
-                    matching.is_hot_offer = db_product.is_hot_offer
-                    matching.quantity = db_product.quantity
-                    matching.is_sold = db_product.is_sold
-                    matching.is_made_to_order = db_product.is_made_to_order
-                    matching.quantity_show_enabled = db_product.quantity_show_enabled
-                    matching.is_hidden = db_product.is_hidden
-                    # Обновляем поля для продажи
-                    matching.is_for_sale = db_product.is_for_sale
-                    matching.price_from = db_product.price_from
-                    matching.price_to = db_product.price_to
-                    matching.price_fixed = db_product.price_fixed
-                    matching.price_type = db_product.price_type
-                    matching.quantity_from = db_product.quantity_from
-                    matching.quantity_unit = db_product.quantity_unit
-                    matching.category_id = category_id_for_bot
-                    # Обновляем sync_product_id если он не был установлен
-                    if not matching.sync_product_id:
-                        matching.sync_product_id = sync_id
-                    print(f"🔄 Synced product '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (UPDATE)")
-    
-    else:
-        # Товар в подключенном боте - синхронизируем в основной бот И во все другие подключенные боты
-        # Определяем sync_product_id: если товар уже связан, используем его, иначе ищем оригинальный товар
-        sync_id = db_product.sync_product_id
-        
-        if action == "create":
-            # Если sync_product_id не установлен, ищем оригинальный товар по имени и цене
-            if not sync_id:
-                existing_main = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.name == db_product.name,
-                    models.Product.price == db_product.price
-                ).first()
-                if existing_main:
-                    sync_id = existing_main.sync_product_id or existing_main.id
-                    db_product.sync_product_id = sync_id
-            
-            # 1. Синхронизируем в основной бот (ищем по sync_product_id)
-            if sync_id:
-                existing_main = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-                
-                # Fallback: если не нашли по sync_product_id, ищем по имени и цене
-                if not existing_main:
-                    existing_main = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == None,
-                        models.Product.name == db_product.name,
-                        models.Product.price == db_product.price
-                    ).first()
-            else:
-                # Если sync_product_id не установлен, ищем по имени и цене
-                existing_main = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.name == db_product.name,
-                    models.Product.price == db_product.price
-                ).first()
-            
-            if existing_main:
-                # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                category_id_for_main = normalize_category_id(db_product.category_id, None, user_id, db)
-                
-                existing_main.name = db_product.name  # Обновляем название
-                existing_main.description = db_product.description
-                existing_main.price = db_product.price
-                existing_main.image_url = db_product.image_url
-                existing_main.images_urls = db_product.images_urls
-                existing_main.discount = db_product.discount
-                existing_main.is_hot_offer = db_product.is_hot_offer
-                existing_main.quantity = db_product.quantity
-                existing_main.is_sold = db_product.is_sold
-                existing_main.is_made_to_order = db_product.is_made_to_order
-                existing_main.quantity_show_enabled = db_product.quantity_show_enabled
-                # Обновляем поля для продажи
-                existing_main.is_for_sale = db_product.is_for_sale
-                existing_main.price_from = db_product.price_from
-                existing_main.price_to = db_product.price_to
-                existing_main.price_fixed = db_product.price_fixed
-                existing_main.price_type = db_product.price_type
-                existing_main.quantity_from = db_product.quantity_from
-                existing_main.quantity_unit = db_product.quantity_unit
-                existing_main.category_id = category_id_for_main
-                # Устанавливаем sync_product_id если он не был установлен
-                if not existing_main.sync_product_id:
-                    existing_main.sync_product_id = existing_main.id
-                # Обновляем sync_product_id у товара в боте
-                if not db_product.sync_product_id:
-                    db_product.sync_product_id = existing_main.sync_product_id
-                print(f"🔄 Synced product '{db_product.name}' (id={db_product.id}, sync_id={existing_main.sync_product_id}) to main bot (UPDATE existing)")
-            elif not existing_main:
-                # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                category_id_for_main = normalize_category_id(db_product.category_id, None, user_id, db)
-                
-                # Создаем копию товара в основном боте
-                new_product = models.Product(
-                    name=db_product.name,
-                    description=db_product.description,
-                    price=db_product.price,
-                    image_url=db_product.image_url,
-                    images_urls=db_product.images_urls,
-                    discount=db_product.discount,
-                    user_id=user_id,
-                    bot_id=None,
-                    sync_product_id=None,  # Будет установлен после получения ID
-                    is_hot_offer=db_product.is_hot_offer,
-                    quantity=db_product.quantity,
-                    is_sold=db_product.is_sold,
-                    is_made_to_order=db_product.is_made_to_order,
-                    is_for_sale=db_product.is_for_sale,
-                    price_from=db_product.price_from,
-                    price_to=db_product.price_to,
-                    price_fixed=db_product.price_fixed,
-                    price_type=db_product.price_type,
-                    quantity_from=db_product.quantity_from,
-                    quantity_unit=db_product.quantity_unit,
-                    quantity_show_enabled=db_product.quantity_show_enabled,
-                    category_id=category_id_for_main
-                )
-                db.add(new_product)
-                db.flush()  # Получаем ID нового товара
-                # Устанавливаем sync_product_id = id (сам на себя)
-                new_product.sync_product_id = new_product.id
-                # Обновляем sync_product_id у товара в боте
-                if not db_product.sync_product_id:
-                    db_product.sync_product_id = new_product.id
-                sync_id = new_product.id
-                print(f"🔄 Synced product '{db_product.name}' (id={new_product.id}, sync_id={sync_id}) to main bot (CREATE)")
-            
-            # 2. Синхронизируем во все другие подключенные боты (кроме текущего)
-            # Используем sync_id для надежной синхронизации
-            if not sync_id:
-                sync_id = db_product.sync_product_id
-            
-            for bot in connected_bots:
-                if bot.id == db_product.bot_id:
-                    continue  # Пропускаем текущий бот
-                
-                # Ищем синхронизированный товар по sync_product_id (надежный способ)
-                existing = None
-                if sync_id:
-                    existing = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.sync_product_id == sync_id
-                    ).first()
-                
-                # Fallback: если не нашли по sync_product_id, ищем по имени и цене
-                if not existing:
-                    existing = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.name == db_product.name,
-                        models.Product.price == db_product.price
-                    ).first()
-                
-                if existing:
-                    # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                    category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                    
-                    existing.description = db_product.description
-                    existing.price = db_product.price  # Обновляем цену при синхронизации
-                    existing.image_url = db_product.image_url
-                    existing.images_urls = db_product.images_urls
-                    existing.discount = db_product.discount
-                    existing.is_hot_offer = db_product.is_hot_offer
-                    existing.quantity = db_product.quantity
-                    existing.is_sold = db_product.is_sold
-                    existing.is_made_to_order = db_product.is_made_to_order
-                    existing.is_for_sale = db_product.is_for_sale
-                    existing.price_from = db_product.price_from
-                    existing.price_to = db_product.price_to
-                    existing.price_fixed = db_product.price_fixed
-                    existing.price_type = db_product.price_type
-                    existing.quantity_from = db_product.quantity_from
-                    existing.quantity_unit = db_product.quantity_unit
-                    existing.category_id = category_id_for_bot
-                    # Обновляем sync_product_id если он не был установлен
-                    if sync_id and not existing.sync_product_id:
-                        existing.sync_product_id = sync_id
-                    print(f"🔄 Synced product '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (UPDATE existing)")
-                elif not existing:
-                    # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                    category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                    
-                    new_product = models.Product(
-                        name=db_product.name,
-                        description=db_product.description,
-                        price=db_product.price,
-                        image_url=db_product.image_url,
-                        images_urls=db_product.images_urls,
-                        discount=db_product.discount,
-                        user_id=user_id,
-                        bot_id=bot.id,
-                        sync_product_id=sync_id if sync_id else None,  # Связываем с оригинальным товаром
-                        is_hot_offer=db_product.is_hot_offer,
-                        quantity=db_product.quantity,
-                        is_sold=db_product.is_sold,
-                        is_made_to_order=db_product.is_made_to_order,
-                        is_for_sale=db_product.is_for_sale,
-                        price_from=db_product.price_from,
-                        price_to=db_product.price_to,
-                        price_fixed=db_product.price_fixed,
-                        price_type=db_product.price_type,
-                        quantity_from=db_product.quantity_from,
-                        quantity_unit=db_product.quantity_unit,
-                        quantity_show_enabled=db_product.quantity_show_enabled,
-                        is_hidden=db_product.is_hidden,
-                        category_id=category_id_for_bot
-                    )
-                    db.add(new_product)
-                    print(f"🔄 Synced product '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (CREATE)")
-        
-        elif action == "update":
-            # Используем sync_product_id для надежной синхронизации
-            sync_id = db_product.sync_product_id
-            
-            # 1. Обновляем товар в основном боте (ищем по sync_product_id)
-            matching_main = None
-            if sync_id:
-                matching_main = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.sync_product_id == sync_id
-                ).first()
-            
-            # Fallback: если не нашли по sync_product_id, ищем по имени и цене
-            if not matching_main:
-                matching_main = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.name == db_product.name,
-                    models.Product.price == db_product.price
-                ).first()
-                # Если нашли по имени и цене, устанавливаем sync_product_id
-                if matching_main:
-                    if not matching_main.sync_product_id:
-                        matching_main.sync_product_id = matching_main.id
-                    if not db_product.sync_product_id:
-                        db_product.sync_product_id = matching_main.sync_product_id
-                    sync_id = matching_main.sync_product_id
-            
-            if matching_main:
-                # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                category_id_for_main = normalize_category_id(db_product.category_id, None, user_id, db)
-                
-                matching_main.name = db_product.name  # Обновляем название
-                matching_main.description = db_product.description
-                matching_main.price = db_product.price  # Обновляем цену при синхронизации
-                matching_main.image_url = db_product.image_url
-                matching_main.images_urls = db_product.images_urls
-                matching_main.discount = db_product.discount
-                matching_main.is_hot_offer = db_product.is_hot_offer
-                matching_main.quantity = db_product.quantity
-                matching_main.is_sold = db_product.is_sold
-                matching_main.is_made_to_order = db_product.is_made_to_order
-                matching_main.quantity_show_enabled = db_product.quantity_show_enabled
-                matching_main.is_hidden = db_product.is_hidden
-                # Обновляем поля для продажи
-                matching_main.is_for_sale = db_product.is_for_sale
-                matching_main.price_from = db_product.price_from
-                matching_main.price_to = db_product.price_to
-                matching_main.price_fixed = db_product.price_fixed
-                matching_main.price_type = db_product.price_type
-                matching_main.quantity_from = db_product.quantity_from
-                matching_main.quantity_unit = db_product.quantity_unit
-                matching_main.category_id = category_id_for_main
-                print(f"🔄 Synced product '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to main bot (UPDATE)")
-            
-            # 2. Обновляем товар во всех других подключенных ботах (кроме текущего)
-            # Используем sync_id для надежной синхронизации
-            if not sync_id:
-                sync_id = db_product.sync_product_id
-            
-            for bot in connected_bots:
-                if bot.id == db_product.bot_id:
-                    continue  # Пропускаем текущий бот
-                
-                # Ищем синхронизированный товар по sync_product_id (надежный способ)
-                matching = None
-                if sync_id:
-                    matching = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.sync_product_id == sync_id
-                    ).first()
-                
-                # Fallback: если не нашли по sync_product_id, ищем по имени и цене
-                if not matching:
-                    matching = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.name == db_product.name,
-                        models.Product.price == db_product.price
-                    ).first()
-                
-                if matching:
-                    # Нормализуем category_id для гарантии инварианта product.bot_id === category.bot_id
-                    category_id_for_bot = normalize_category_id(db_product.category_id, bot.id, user_id, db)
-                    
-                    matching.name = db_product.name  # Обновляем название
-                    matching.description = db_product.description
-                    matching.price = db_product.price  # Обновляем цену при синхронизации
-                    matching.image_url = db_product.image_url
-                    matching.images_urls = db_product.images_urls
-                    matching.discount = db_product.discount
-                    matching.is_hot_offer = db_product.is_hot_offer
-                    matching.quantity = db_product.quantity
-                    matching.is_sold = db_product.is_sold
-                    matching.is_made_to_order = db_product.is_made_to_order
-                    matching.quantity_show_enabled = db_product.quantity_show_enabled
-                    matching.is_hidden = db_product.is_hidden
-                    # Обновляем поля для продажи
-                    matching.is_for_sale = db_product.is_for_sale
-                    matching.price_from = db_product.price_from
-                    matching.price_to = db_product.price_to
-                    matching.price_fixed = db_product.price_fixed
-                    matching.price_type = db_product.price_type
-                    matching.quantity_from = db_product.quantity_from
-                    matching.quantity_unit = db_product.quantity_unit
-                    matching.category_id = category_id_for_bot
-                    # Обновляем sync_product_id если он не был установлен
-                    if sync_id and not matching.sync_product_id:
-                        matching.sync_product_id = sync_id
-                    print(f"🔄 Synced product '{db_product.name}' (id={db_product.id}, sync_id={sync_id}) to bot {bot.id} (UPDATE)")
-        
-        elif action == "delete":
-            # Используем sync_product_id для надежного удаления всех связанных товаров
-            sync_id = db_product.sync_product_id
-            
-            # 1. Удаляем товар в основном боте по sync_product_id
-            if sync_id:
-                matching_main_products = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.sync_product_id == sync_id
-                ).all()
-            else:
-                # Fallback: если sync_product_id не установлен, удаляем по имени
-                matching_main_products = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == None,
-                    models.Product.name == db_product.name
-                ).all()
-            
-            for matching_main in matching_main_products:
-                db.delete(matching_main)
-                print(f"🔄 Synced deletion of product '{db_product.name}' (id={matching_main.id}, sync_id={sync_id}) to main bot (DELETE)")
-            
-            # 2. Удаляем все связанные товары из всех других подключенных ботов (кроме текущего)
-            for bot in connected_bots:
-                if bot.id == db_product.bot_id:
-                    continue  # Пропускаем текущий бот
-                
-                if sync_id:
-                    # Удаляем по sync_product_id (надежный способ)
-                    matching_products = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.sync_product_id == sync_id
-                    ).all()
-                else:
-                    # Fallback: удаляем по имени
-                    matching_products = db.query(models.Product).filter(
-                        models.Product.user_id == user_id,
-                        models.Product.bot_id == bot.id,
-                        models.Product.name == db_product.name
-                    ).all()
-                
-                for matching in matching_products:
-                    db.delete(matching)
-                    print(f"🔄 Synced deletion of product '{db_product.name}' (id={matching.id}, sync_id={sync_id}) to bot {bot.id} (DELETE)")
-    
-    # Также обрабатываем удаление из основного бота во все подключенные боты
-    if db_product.bot_id is None and action == "delete":
-        sync_id = db_product.sync_product_id or db_product.id
-        
-        for bot in connected_bots:
-            # Удаляем все товары с таким же sync_product_id (надежный способ)
-            if sync_id:
-                matching_products = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.sync_product_id == sync_id
-                ).all()
-            else:
-                # Fallback: удаляем по имени
-                matching_products = db.query(models.Product).filter(
-                    models.Product.user_id == user_id,
-                    models.Product.bot_id == bot.id,
-                    models.Product.name == db_product.name
-                ).all()
-            
-            for matching in matching_products:
-                db.delete(matching)
-                print(f"🔄 Synced deletion of product '{db_product.name}' (id={matching.id}, sync_id={sync_id}) from main bot to bot {bot.id} (DELETE)")
+    # Запись в каталог: после нее магазин владельца сверяется в фоне
+    mark_shop_dirty(user_id)
 
+    if action != "delete":
+        _sync_copies(db_product, db, create_missing=action == "create", label=action)
+        return
+
+    # Удаление: удаляем копии товара в основном магазине и подключенных ботах (сам товар удаляет вызывающий код)
+    if not db_product.sync_group_id:
+        return
+    active_bot_ids = {bot_id for (bot_id,) in db.query(models.Bot.id).filter(
+        models.Bot.owner_user_id == user_id,
+        models.Bot.is_active == True,
+        copied_bot_filter()
+    ).all()}
+    for bot_id, matching in load_sync_group_copies(db_product.sync_group_id, db).items():
+        if matching.id == db_product.id:
+            continue
+        if bot_id is not None and bot_id not in active_bot_ids:
+            continue
+        db.delete(matching)
+        shop = "main bot" if bot_id is None else f"bot {bot_id}"
+        print(f"🔄 Synced deletion of product '{db_product.name}' (id={matching.id}, sync_id={db_product.sync_product_id}) to {shop} (DELETE)")
@@ -1,7 +1,9 @@
 import os
-from typing import Optional
+from typing import Dict, Iterable, Optional
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from ..db import models
+from .category_resolver import get_category_resolver
 
 # Telegram Bot Token для отправки уведомлений (основной бот)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
@@ -87,12 +89,26 @@ def str_to_bool(value: str) -> bool:
     return value.lower() in ('true', '1', 'yes', 'on')
 
 
+def validate_discount(discount: Optional[float]):
+    """
+    Проверяет скидку в процентах: от 0 до 100 (None - скидка не меняется).
+    Общая проверка массовой правки и переопределений бота.
+
+    Raises:
+        HTTPException: 400, если скидка вне диапазона
+    """
+    if discount is not None and not 0 <= discount <= 100:
+        raise HTTPException(status_code=400, detail="Discount must be between 0 and 100")
+
+
 def normalize_category_id(category_id: Optional[int], target_bot_id: Optional[int], user_id: int, db: Session) -> Optional[int]:
     """
     Нормализует category_id для гарантии инварианта product.bot_id === category.bot_id.
     
     Гарантирует, что category_id (если указан) принадлежит целевому боту (target_bot_id).
     Если категория не принадлежит целевому боту, ищет категорию с тем же именем в целевом боте.
+    Категории владельца загружаются один раз на сессию (get_category_resolver), расхождения
+    выводятся одной сводкой при commit/rollback.
     
     Args:
         category_id: ID категории для нормализации (может быть None)
@@ -103,45 +119,27 @@ def normalize_category_id(category_id: Optional[int], target_bot_id: Optional[in
     Returns:
         Правильный category_id для целевого бота, или None если категория не найдена
     """
-    # Если category_id не указан, возвращаем None
-    if category_id is None:
-        return None
-    
-    # Нормализуем типы: приводим к int
-    category_id = int(category_id)
-    if target_bot_id is not None:
-        target_bot_id = int(target_bot_id)
-    
-    # Проверяем, что категория существует и принадлежит целевому боту
-    category = db.query(models.Category).filter(
-        models.Category.id == category_id,
-        models.Category.user_id == user_id
-    ).first()
-    
-    if not category:
-        # Категория не найдена - возвращаем None
-        print(f"⚠️ WARNING: Category with id={category_id} not found for user_id={user_id}, returning None")
-        return None
-    
-    # Проверяем соответствие bot_id
-    if category.bot_id == target_bot_id:
-        # Категория принадлежит целевому боту - всё правильно
-        return category_id
-    else:
-        # Категория не принадлежит целевому боту - ищем категорию с тем же именем в целевом боте
-        print(f"⚠️ WARNING: Category id={category_id} (bot_id={category.bot_id}) does not match target_bot_id={target_bot_id}, searching by name")
-        
-        matching_category = db.query(models.Category).filter(
-            models.Category.user_id == user_id,
-            models.Category.bot_id == target_bot_id,
-            models.Category.name == category.name
-        ).first()
-        
-        if matching_category:
-            print(f"✅ Found matching category id={matching_category.id} (name='{category.name}') for target_bot_id={target_bot_id}")
-            return matching_category.id
-        else:
-            # Категория с таким именем не найдена в целевом боте
-            print(f"⚠️ WARNING: Category with name='{category.name}' not found in target_bot_id={target_bot_id}, returning None")
-            return None
+    return get_category_resolver(user_id, db).resolve(category_id, target_bot_id)
 
+
+def normalize_category_ids(
+    category_id: Optional[int],
+    target_bot_ids: Iterable[Optional[int]],
+    user_id: int,
+    db: Session
+) -> Dict[Optional[int], Optional[int]]:
+    """
+    Пакетный вариант normalize_category_id для нескольких целевых магазинов сразу.
+
+    Запросов к categories нет, кроме первой загрузки категорий владельца в сессии.
+
+    Args:
+        category_id: ID категории для нормализации (может быть None)
+        target_bot_ids: ID целевых ботов (None для основного бота)
+        user_id: ID пользователя (владельца магазина)
+        db: Сессия базы данных
+
+    Returns:
+        Словарь target_bot_id -> правильный category_id (None, если категория не найдена)
+    """
+    return get_category_resolver(user_id, db).resolve_many(category_id, target_bot_ids)
@@ -0,0 +1,97 @@
+"""
+Общие зависимости авторизации по Telegram initData для всех роутеров.
+
+initData проверяется один раз на HTTP-запрос: middleware (main.py) создает request.state.auth
+(RequestAuthState), первая проверка сохраняет в нем user_id, bot_token и bot_id, а остальные
+зависимости и прямые вызовы в обработчиках того же запроса получают готовый результат.
+Сколько проверок выполнено на запрос - telegram_auth.request_auth_stats().
+
+Зависимости принимают заголовок и сессию обычными параметрами, поэтому их можно вызывать
+и напрямую: get_validated_user_and_bot(x_telegram_init_data, db).
+"""
+import os
+from typing import Optional
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from ..db import database
+from .telegram_auth import validate_init_data_multi_bot
+
+load_dotenv()
+
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+
+
+async def validate_request_init_data(
+    x_telegram_init_data: Optional[str],
+    db: Session
+) -> tuple[int, Optional[str], Optional[int]]:
+    """
+    Проверяет initData запроса (главный бот или любой подключенный).
+
+    initData обязателен и при токене сессии (X-Session-Token): токен привязан к initData,
+    по которому выдан, - только так видно, что запрос пришел из WebApp того же бота.
+    С действительным токеном подпись initData не проверяется.
+
+    Returns:
+        (user_id, bot_token, bot_id) - bot_id None для главного бота
+    """
+    if not x_telegram_init_data:
+        raise HTTPException(
+            status_code=401,
+            detail="Telegram initData is required. Open the app through Telegram bot."
+        )
+
+    try:
+        return await validate_init_data_multi_bot(
+            x_telegram_init_data,
+            db,
+            default_bot_token=TELEGRAM_BOT_TOKEN if TELEGRAM_BOT_TOKEN else None
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
+
+
+async def get_validated_user(
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+) -> int:
+    """Dependency: user_id из проверенного initData (401 без него)"""
+    user_id, _, _ = await validate_request_init_data(x_telegram_init_data, db)
+    return user_id
+
+
+async def get_validated_user_and_bot(
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+) -> tuple[int, Optional[int]]:
+    """Dependency: (user_id, bot_id) из проверенного initData (401 без него)"""
+    user_id, _, bot_id = await validate_request_init_data(x_telegram_init_data, db)
+    return (user_id, bot_id)
+
+
+async def get_optional_validated_user_and_bot(
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+) -> tuple[Optional[int], Optional[int]]:
+    """
+    Dependency: (user_id, bot_id) или (None, None), если initData нет или он не прошел проверку
+    """
+    if not x_telegram_init_data:
+        return (None, None)
+    try:
+        user_id, _, bot_id = await validate_request_init_data(x_telegram_init_data, db)
+    except HTTPException:
+        return (None, None)
+    return (user_id, bot_id)
+
+
+async def get_optional_validated_user(
+    x_telegram_init_data: Optional[str] = Header(None, alias="X-Telegram-Init-Data"),
+    db: Session = Depends(database.get_db)
+) -> Optional[int]:
+    """Dependency: user_id или None, если initData нет или он не прошел проверку"""
+    user_id, _ = await get_optional_validated_user_and_bot(x_telegram_init_data, db)
+    return user_id
@@ -0,0 +1,106 @@
+"""
+Короткоживущие подписанные токены сессии WebApp (POST /api/session).
+
+initData проверяется один раз при выдаче токена; дальше WebApp отправляет токен в заголовке
+X-Session-Token, и проверка запроса - один HMAC без обращения к БД (telegram_auth).
+Токен не хранится на сервере: в нем user_id, bot_id, срок действия и отпечаток initData,
+подписанные ключом сервера.
+
+Формат: v2.<user_id>.<bot_id или пусто для главного бота>.<expires_at>.<отпечаток>.<подпись base64url>
+
+Токен действует только вместе с тем initData, по которому выдан (отпечаток - SHA-256 строки
+initData). Поэтому initData по-прежнему отправляется в каждом запросе: он определяет бота,
+через которого открыт WebApp, и токен другого бота в той же WebView не подходит к чужому initData.
+Проверка отпечатка - один SHA-256 без ключей ботов и без обращения к БД.
+
+Ключ подписи - SESSION_TOKEN_SECRET; если он не задан, ключ выводится из токена главного бота
+(одинаков во всех процессах). Смена ключа отзывает все выданные токены.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SESSION_HEADER = "X-Session-Token"
+# Срок действия токена, секунд
+SESSION_TOKEN_TTL_SECONDS = int(os.getenv("SESSION_TOKEN_TTL", "3600"))
+
+_TOKEN_VERSION = "v2"
+
+
+def _signing_key() -> bytes:
+    secret = os.getenv("SESSION_TOKEN_SECRET", "")
+    if secret:
+        return hashlib.sha256(secret.encode()).digest()
+    bot_token = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    if bot_token:
+        return hmac.new(key=b"PriseSessionToken", msg=bot_token.encode(), digestmod=hashlib.sha256).digest()
+    # Без ключей токены действуют только до перезапуска процесса
+    print("⚠️ SESSION_TOKEN_SECRET and TELEGRAM_BOT_TOKEN are not set, session tokens are process-local")
+    return os.urandom(32)
+
+
+_SIGNING_KEY = _signing_key()
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(key=_SIGNING_KEY, msg=payload.encode(), digestmod=hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def _init_data_fingerprint(init_data: str) -> str:
+    digest = hashlib.sha256(init_data.encode()).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue_session_token(
+    user_id: int,
+    bot_id: Optional[int],
+    init_data: str,
+    ttl_seconds: Optional[int] = None
+) -> Tuple[str, int]:
+    """
+    Выдает токен сессии для проверенного initData (токен привязан к этому initData).
+
+    Returns:
+        (токен, срок действия - unix time)
+    """
+    expires_at = int(time.time()) + (ttl_seconds if ttl_seconds is not None else SESSION_TOKEN_TTL_SECONDS)
+    payload = (
+        f"{_TOKEN_VERSION}.{user_id}.{bot_id if bot_id is not None else ''}.{expires_at}."
+        f"{_init_data_fingerprint(init_data)}"
+    )
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def read_session_token(token: Optional[str], init_data: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    Проверяет подпись и срок токена и то, что он выдан для этого initData.
+
+    Returns:
+        (user_id, bot_id) или None, если токен некорректен, подделан, истек или выдан для другого initData
+    """
+    if not token or not init_data:
+        return None
+    payload, _, signature = token.rpartition(".")
+    parts = payload.split(".")
+    if len(parts) != 5 or parts[0] != _TOKEN_VERSION:
+        return None
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    if not hmac.compare_digest(parts[4], _init_data_fingerprint(init_data)):
+        return None
+    try:
+        user_id = int(parts[1])
+        bot_id = int(parts[2]) if parts[2] else None
+        expires_at = int(parts[3])
+    except ValueError:
+        return None
+    if expires_at <= time.time():
+        return None
+    return user_id, bot_id
@@ -0,0 +1,205 @@
+"""
+Общий каталог (Bot.catalog_mode = "shared"): бот показывает товары и категории основного
+магазина, а в bot_product_overrides хранятся только поля, которые бот изменил.
+
+В режиме копий ("copied", по умолчанию) регистрация бота копирует все категории, товары
+и настройки (routers/bots.register_bot), а каждая правка записывается N+1 раз (движок
+синхронизации, сверка). Для бота с общим каталогом:
+
+- при регистрации ничего не копируется, настройки наследуются от основного магазина
+  (find_shop_settings)
+- чтение с bot_id бота идет по строкам основного магазина (catalog_bot_id), поля
+  переопределений подставляются при чтении: в SQL - для фильтров и сортировки
+  (скрытость, горящее предложение, цена со скидкой), в Python - в элементы списка
+- создание товаров и категорий из такого бота пишет в основной магазин
+- движок синхронизации, сверка и суммы каталогов такие боты пропускают (copied_bot_filter)
+
+Бот с копиями переводится в общий каталог convert_bot_to_shared_catalog: отличия копий от
+товаров основного магазина становятся переопределениями, ссылки на копии переносятся
+на товары основного магазина, копии и категории бота удаляются (строка настроек бота
+остается: ее поля и так синхронизируются с основным магазином).
+"""
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session, aliased
+from ..db import models
+
+CATALOG_MODE_COPIED = "copied"
+CATALOG_MODE_SHARED = "shared"
+CATALOG_MODES = (CATALOG_MODE_COPIED, CATALOG_MODE_SHARED)
+
+# Поля товара, которые бот с общим каталогом может переопределить (None - как в основном магазине)
+OVERRIDE_FIELDS = ("name", "description", "price", "discount", "is_hidden", "is_hot_offer")
+
+# Ссылки на товар: при переводе бота ссылки на копии переносятся на товар основного магазина
+_PRODUCT_REFERENCES = (
+    (models.Reservation, models.Reservation.product_id),
+    (models.Sale, models.Sale.product_id),
+    (models.Order, models.Order.product_id),
+    (models.Purchase, models.Purchase.product_id),
+    (models.SoldProduct, models.SoldProduct.product_id),
+    (models.ShopVisit, models.ShopVisit.product_id),
+    (models.UserProductSnapshot, models.UserProductSnapshot.product_id),
+    (models.Product, models.Product.sync_product_id),
+)
+
+
+def copied_bot_filter():
+    """Условие для ботов со своими копиями каталога (их сверяет и синхронизирует движок копий)"""
+    return models.Bot.catalog_mode.is_not(CATALOG_MODE_SHARED)
+
+
+def is_shared_catalog_bot(bot_id: Optional[int], db: Session) -> bool:
+    """Бот с общим каталогом (для основного магазина - False)"""
+    if bot_id is None:
+        return False
+    bot = db.get(models.Bot, bot_id)
+    return bot is not None and bot.catalog_mode == CATALOG_MODE_SHARED
+
+
+def catalog_bot_id(bot_id: Optional[int], db: Session) -> Optional[int]:
+    """
+    Магазин, в котором лежат товары и категории бота: для бота с общим каталогом -
+    основной (None), иначе сам бот.
+    """
+    return None if is_shared_catalog_bot(bot_id, db) else bot_id
+
+
+def resolve_catalog_shop(bot_id: Optional[int], db: Session) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Returns:
+        (bot_id магазина со строками каталога, bot_id для переопределений или None)
+    """
+    if is_shared_catalog_bot(bot_id, db):
+        return None, bot_id
+    return bot_id, None
+
+
+def apply_product_override(values: Dict[str, Any], override: Optional[models.BotProductOverride]) -> Dict[str, Any]:
+    """Подставляет переопределенные ботом поля в элемент товара (словарь меняется на месте)"""
+    if override is None:
+        return values
+    for field in OVERRIDE_FIELDS:
+        value = getattr(override, field)
+        if value is not None and field in values:
+            values[field] = value
+    return values
+
+
+def set_product_override(
+    product: models.Product,
+    bot_id: int,
+    changes: Dict[str, Any],
+    db: Session
+) -> Optional[models.BotProductOverride]:
+    """
+    Изменяет переопределение товара основного магазина для бота с общим каталогом.
+    Значение None (или равное значению основного магазина) снимает переопределение поля;
+    переопределение без полей удаляется. Не коммитит.
+
+    Returns:
+        Переопределение или None, если бот показывает товар без изменений
+    """
+    override = db.query(models.BotProductOverride).filter(
+        models.BotProductOverride.bot_id == bot_id,
+        models.BotProductOverride.product_id == product.id
+    ).first()
+    if override is None:
+        override = models.BotProductOverride(user_id=product.user_id, bot_id=bot_id, product_id=product.id)
+        db.add(override)
+    for field, value in changes.items():
+        setattr(override, field, None if value == getattr(product, field) else value)
+
+    if all(getattr(override, field) is None for field in OVERRIDE_FIELDS):
+        if override.id is not None:
+            db.delete(override)
+        else:
+            db.expunge(override)
+        return None
+    return override
+
+
+def convert_bot_to_shared_catalog(bot: models.Bot, db: Session) -> Dict[str, int]:
+    """
+    Переводит бота с копиями каталога в общий каталог. Не коммитит.
+
+    Перед вызовом магазин должен быть сверен (reconcile_owner_catalog): у каждой копии бота
+    должен быть товар основного магазина той же группы синхронизации, иначе перевод
+    не выполняется (ValueError).
+
+    Returns:
+        Счетчики: overrides (созданные переопределения), references (перенесенные ссылки),
+        products и categories (удаленные копии бота)
+    """
+    stats = {"overrides": 0, "references": 0, "products": 0, "categories": 0}
+    if bot.catalog_mode == CATALOG_MODE_SHARED:
+        return stats
+
+    user_id = bot.owner_user_id
+    copies = db.query(models.Product).filter(models.Product.bot_id == bot.id).all()
+    main_by_group = {
+        product.sync_group_id: product
+        for product in db.query(models.Product).filter(
+            models.Product.user_id == user_id,
+            models.Product.bot_id == None,
+            models.Product.sync_group_id != None
+        ).all()
+    }
+    orphans = [copy for copy in copies if copy.sync_group_id not in main_by_group]
+    if orphans:
+        raise ValueError(
+            f"{len(orphans)} products of bot {bot.id} have no copy in the main shop "
+            f"(e.g. #{orphans[0].id} '{orphans[0].name}'), reconcile the catalog first"
+        )
+
+    # Отличия копий становятся переопределениями (проданную копию бот не показывает - ее отличия не нужны)
+    for copy in copies:
+        if copy.is_sold:
+            continue
+        main_product = main_by_group[copy.sync_group_id]
+        changes = {
+            field: getattr(copy, field) for field in OVERRIDE_FIELDS
+            if getattr(copy, field) != getattr(main_product, field)
+        }
+        if changes:
+            # У бота с копиями переопределений еще нет - создаем без поиска существующих
+            db.add(models.BotProductOverride(user_id=user_id, bot_id=bot.id, product_id=main_product.id, **changes))
+            stats["overrides"] += 1
+
+    # Ссылки на копии (резервации, продажи, заказы, история) - на товар основного магазина
+    # той же группы: один UPDATE с коррелированным подзапросом на таблицу
+    if copies:
+        # Псевдоним: в UPDATE products подзапрос по той же таблице иначе сольется с целью UPDATE
+        bot_products = aliased(models.Product)
+        bot_product_ids = select(bot_products.id).where(bot_products.bot_id == bot.id)
+        for model, column in _PRODUCT_REFERENCES:
+            bot_product = aliased(models.Product)
+            main_product = aliased(models.Product)
+            main_product_id = select(main_product.id).join(
+                bot_product, bot_product.sync_group_id == main_product.sync_group_id
+            ).where(bot_product.id == column, main_product.bot_id.is_(None)).scalar_subquery()
+            stats["references"] += db.query(model).filter(column.in_(bot_product_ids)).update(
+                {column: main_product_id}, synchronize_session=False
+            )
+
+    for copy in copies:
+        db.delete(copy)
+    stats["products"] = len(copies)
+
+    bot_categories = db.query(models.Category).filter(models.Category.bot_id == bot.id).all()
+    if bot_categories:
+        # Исторические продажи сохраняются без категории (как при удалении категории)
+        db.query(models.SoldProduct).filter(
+            models.SoldProduct.category_id.in_([category.id for category in bot_categories])
+        ).update({models.SoldProduct.category_id: None}, synchronize_session=False)
+        for category in bot_categories:
+            db.delete(category)
+    stats["categories"] = len(bot_categories)
+
+    db.query(models.CatalogDigest).filter(
+        models.CatalogDigest.bot_id == bot.id
+    ).delete(synchronize_session=False)
+    bot.catalog_mode = CATALOG_MODE_SHARED
+    db.flush()
+    print(f"✅ Bot {bot.id} switched to shared catalog (user {user_id}): {stats}")
+    return stats
@@ -0,0 +1,142 @@
+"""
+Настройки магазина: чтение без записи и перенос изменений по событиям полей.
+
+Раньше любое изменение настроек переписывало строки настроек всех ботов целиком
+(sync_shop_settings_to_all_bots), а GET /api/shop-settings создавал строку
+с дефолтами, если ее не было, - чтение брало блокировку записи SQLite.
+
+Теперь:
+- магазин без своей строки наследует настройки основного магазина, а владелец без
+  настроек получает дефолтные значения виртуально (find_shop_settings/default_shop_settings),
+  ничего не записывая
+- изменение фиксируется по полям (история атрибутов сессии) в shop_settings_changes,
+  и в строки других магазинов переносятся только измененные поля, одним UPDATE на поле
+  и только там, где значение еще отличается
+"""
+import json
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import case, insert, inspect, or_
+from sqlalchemy.orm import Session
+from ..db import models
+
+# Поля, общие для всех магазинов владельца (синхронизируются между ботами)
+SHARED_SETTINGS_FIELDS = (
+    "reservations_enabled",
+    "quantity_enabled",
+    "shop_name",
+    "welcome_image_url",
+    "welcome_description",
+)
+
+DEFAULT_SHOP_SETTINGS = {
+    "reservations_enabled": True,
+    "quantity_enabled": True,
+    "shop_name": None,
+    "welcome_image_url": None,
+    "welcome_description": None,
+}
+
+
+def find_shop_settings(user_id: int, bot_id: Optional[int], db: Session) -> Optional[models.ShopSettings]:
+    """
+    Строка настроек магазина: собственная строка бота, иначе общая (bot_id = None).
+    Один запрос, без записи.
+
+    Returns:
+        Настройки или None, если у владельца нет ни одной подходящей строки
+    """
+    shop_filter = models.ShopSettings.bot_id == None
+    if bot_id is not None:
+        shop_filter = or_(models.ShopSettings.bot_id == bot_id, shop_filter)
+    return db.query(models.ShopSettings).filter(
+        models.ShopSettings.user_id == user_id,
+        shop_filter
+    ).order_by(
+        # Собственная строка бота важнее общей
+        case((models.ShopSettings.bot_id == None, 1), else_=0),
+        models.ShopSettings.id
+    ).first()
+
+
+def default_shop_settings(user_id: int, bot_id: Optional[int]) -> models.ShopSettings:
+    """
+    Дефолтные настройки для владельца без строки настроек.
+    Объект не добавляется в сессию: чтение настроек ничего не записывает.
+    """
+    now = datetime.utcnow()
+    return models.ShopSettings(
+        id=0,
+        user_id=user_id,
+        bot_id=bot_id,
+        created_at=now,
+        updated_at=now,
+        **DEFAULT_SHOP_SETTINGS
+    )
+
+
+def propagate_shop_settings_changes(db_settings: models.ShopSettings, db: Session) -> Dict[str, int]:
+    """
+    Фиксирует измененные поля настроек и переносит их в настройки основного магазина
+    и активных ботов владельца. Вызывается после изменения db_settings, до коммита
+    (изменения берутся из истории атрибутов, поэтому до любых запросов в сессии). Не коммитит.
+
+    Args:
+        db_settings: Измененные настройки магазина
+        db: Сессия базы данных
+
+    Returns:
+        Словарь поле -> сколько строк других магазинов изменено
+    """
+    state = inspect(db_settings)
+    changes = {}
+    for field in SHARED_SETTINGS_FIELDS:
+        history = state.attrs[field].history
+        if not history.added:
+            continue
+        old_value = history.deleted[0] if history.deleted else None
+        new_value = history.added[0]
+        if state.pending or old_value != new_value:
+            changes[field] = (old_value, new_value)
+    if not changes:
+        return {}
+
+    user_id = db_settings.user_id
+    source_bot_id = db_settings.bot_id
+    active_bot_ids = [bot_id for (bot_id,) in db.query(models.Bot.id).filter(
+        models.Bot.owner_user_id == user_id,
+        models.Bot.is_active == True
+    ).all()]
+
+    # Строки других магазинов: основной и активные боты, кроме магазина-источника.
+    # Магазины без своей строки наследуют основной и отдельной записи не требуют
+    target_bot_ids = [bot_id for bot_id in active_bot_ids if bot_id != source_bot_id]
+    other_shops = models.ShopSettings.bot_id.in_(target_bot_ids)
+    if source_bot_id is not None:
+        other_shops = or_(models.ShopSettings.bot_id == None, other_shops)
+    now = datetime.utcnow()
+
+    propagated = {}
+    for field, (_, new_value) in changes.items():
+        column = getattr(models.ShopSettings, field)
+        propagated[field] = db.query(models.ShopSettings).filter(
+            models.ShopSettings.user_id == user_id,
+            other_shops,
+            column.is_not(new_value)  # IS NOT: строки, где значение уже такое же, не переписываются
+        ).update({column: new_value, models.ShopSettings.updated_at: now}, synchronize_session=False)
+
+    db.execute(insert(models.ShopSettingsChange), [
+        {
+            "user_id": user_id,
+            "bot_id": source_bot_id,
+            "field": field,
+            "old_value": json.dumps(old_value, ensure_ascii=False),
+            "new_value": json.dumps(new_value, ensure_ascii=False),
+            "propagated_rows": propagated[field],
+            "changed_at": now,
+        }
+        for field, (old_value, new_value) in changes.items()
+    ])
+    shop = "main bot" if source_bot_id is None else f"bot {source_bot_id}"
+    print(f"🔄 Shop settings changes from {shop} (user {user_id}): {propagated}")
+    return propagated
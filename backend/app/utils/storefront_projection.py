@@ -0,0 +1,388 @@
+"""
+Материализованная проекция витрины: таблица storefront_items.
+
+Карточка товара в списке раньше собиралась при каждом чтении: Product, разбор JSON
+images_urls, make_full_url, поиск резерваций по всем копиям товара в ботах.
+Теперь готовая строка (payload) хранится в storefront_items и обновляется в той же
+транзакции, что и запись товара или резервации:
+
+- after_flush запоминает измененные товары и резервации: id товаров, их группы
+  синхронизации и пары (имя, цена) - до и после правки
+- before_commit пересобирает только строки, которые от них зависят: сам товар, его копии
+  в группе и товары с теми же именем и ценой (резервации считаются по копиям, а у старых
+  товаров - по имени и цене). Правка одного товара не перечитывает весь каталог владельца
+
+Массовые UPDATE/DELETE через query.update() не проходят через flush, поэтому такие
+обработчики вызывают mark_storefront_dirty(db, user_id, ...) явно - с затронутыми товарами
+или группами, а без них витрина владельца пересобирается целиком.
+
+Резервация истекает без записи в БД, поэтому в строке хранится reservation_expires_at:
+после этого момента чтение пересчитывает резервацию строки на лету.
+
+Вместе со строками витрины пересчитываются производные поля переопределений ботов
+с общим каталогом (bot_product_overrides: цена со скидкой для фильтров и сортировки).
+"""
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import and_, event, func, inspect, or_
+from sqlalchemy.orm import Session
+from ..db import models, database
+from ..handlers.products_read import get_effective_price, get_reservation_states, serialize_product_list_item
+from .product_images import load_product_image_paths, sync_pending_product_images
+
+_DIRTY_KEY = "storefront_dirty"
+
+# Поля резервации не хранятся в payload: они в отдельных колонках
+_RESERVATION_KEYS = ("is_reserved", "reservation")
+
+# Больше затронутых ключей - витрина пересобирается целиком (один проход дешевле длинных IN)
+STOREFRONT_SCOPED_REBUILD_LIMIT = 500
+
+
+class _DirtyStorefront:
+    """Что изменилось в витрине владельца за транзакцию"""
+    __slots__ = ("full", "product_ids", "sync_keys", "sync_group_ids", "name_prices")
+
+    def __init__(self):
+        self.full = False  # Пересобрать витрину целиком
+        self.product_ids: Set[int] = set()
+        self.sync_keys: Set[int] = set()  # coalesce(sync_product_id, id) - группа для резерваций
+        self.sync_group_ids: Set[int] = set()
+        self.name_prices: Set[tuple] = set()  # (имя, цена) - группа старых товаров без sync_product_id
+
+    def size(self) -> int:
+        return len(self.product_ids) + len(self.sync_keys) + len(self.sync_group_ids) + len(self.name_prices)
+
+    def add_product(self, product_id, sync_product_id, sync_group_id, name, price):
+        if product_id is not None:
+            self.product_ids.add(product_id)
+        if sync_product_id is not None or product_id is not None:
+            self.sync_keys.add(sync_product_id or product_id)
+        if sync_group_id is not None:
+            self.sync_group_ids.add(sync_group_id)
+        self.name_prices.add((name, price))
+
+
+def _dirty_storefront(db: Session, user_id: int) -> _DirtyStorefront:
+    return db.info.setdefault(_DIRTY_KEY, {}).setdefault(int(user_id), _DirtyStorefront())
+
+
+def mark_storefront_dirty(
+    db: Session,
+    user_id: Optional[int],
+    product_ids: Optional[Iterable[int]] = None,
+    sync_group_ids: Optional[Iterable[int]] = None
+):
+    """
+    Помечает витрину владельца для пересборки при коммите текущей транзакции.
+    Нужно только для массовых операций в обход ORM (query.update / query.delete / insert).
+
+    Args:
+        product_ids: Затронутые товары (или товары затронутых резерваций)
+        sync_group_ids: Затронутые группы синхронизации
+        Без product_ids и sync_group_ids витрина владельца пересобирается целиком.
+    """
+    if user_id is None:
+        return
+    dirty = _dirty_storefront(db, user_id)
+    if product_ids is None and sync_group_ids is None:
+        dirty.full = True
+        return
+    dirty.product_ids.update(product_ids or ())
+    dirty.sync_group_ids.update(sync_group_ids or ())
+
+
+def get_group_reservation_expiry(user_id: int, db: Session, now: datetime):
+    """
+    Ближайшее истечение активных резерваций по группам синхронизации и по (имя, цена).
+
+    Returns:
+        (словарь sync_id -> datetime, словарь (name, price) -> datetime)
+    """
+    base_filter = and_(
+        models.Product.user_id == user_id,
+        models.Reservation.is_active == True,
+        models.Reservation.reserved_until > now
+    )
+    by_sync = db.query(
+        func.coalesce(models.Product.sync_product_id, models.Product.id),
+        func.min(models.Reservation.reserved_until)
+    ).join(
+        models.Reservation, models.Reservation.product_id == models.Product.id
+    ).filter(base_filter).group_by(
+        func.coalesce(models.Product.sync_product_id, models.Product.id)
+    ).all()
+    by_name_price = db.query(
+        models.Product.name,
+        models.Product.price,
+        func.min(models.Reservation.reserved_until)
+    ).join(
+        models.Reservation, models.Reservation.product_id == models.Product.id
+    ).filter(base_filter).group_by(models.Product.name, models.Product.price).all()
+    return (
+        {sync_id: expires for sync_id, expires in by_sync},
+        {(name, price): expires for name, price, expires in by_name_price}
+    )
+
+
+def build_storefront_row(
+    prod: models.Product,
+    reservation_state,
+    expires_at: Optional[datetime],
+    image_paths: Optional[List[str]] = None
+) -> Dict:
+    """
+    Собирает значения колонок строки витрины для товара.
+
+    Args:
+        prod: Товар
+        reservation_state: (первая активная резервация или None, зарезервированное количество)
+        expires_at: Когда истечет ближайшая резервация группы (None - резерваций нет)
+        image_paths: Пути изображений товара (None - разобрать images_urls)
+    """
+    item = serialize_product_list_item(prod, reservation_state, image_paths=image_paths)
+    reservation = item["reservation"]
+    payload = {key: value for key, value in item.items() if key not in _RESERVATION_KEYS}
+    return {
+        "user_id": prod.user_id,
+        "bot_id": prod.bot_id,
+        "category_id": prod.category_id,
+        "is_hidden": bool(prod.is_hidden),
+        "payload": json.dumps(payload, ensure_ascii=False),
+        "reservation": json.dumps(reservation, ensure_ascii=False) if reservation else None,
+        "reservation_expires_at": expires_at if reservation else None,
+        "effective_price": get_effective_price(prod.price, prod.discount),
+        "is_hot_offer": bool(prod.is_hot_offer),
+        "is_made_to_order": bool(prod.is_made_to_order),
+        "is_for_sale": bool(prod.is_for_sale),
+        "in_stock": not prod.is_made_to_order and (prod.quantity or 0) > 0,
+        "has_discount": (prod.discount or 0) > 0
+    }
+
+
+def rebuild_storefront_items(user_id: int, db: Session, dirty: Optional[_DirtyStorefront] = None) -> Dict[str, int]:
+    """
+    Приводит строки витрины владельца в соответствие с товарами и резервациями.
+    Пишет только изменившиеся строки; коммит выполняет вызывающий код.
+
+    Args:
+        dirty: Изменения транзакции - пересобираются только зависящие от них строки
+            (None - вся витрина владельца)
+
+    Returns:
+        Счетчики {"created", "updated", "deleted"}
+    """
+    stats = {"created": 0, "updated": 0, "deleted": 0}
+    now = datetime.utcnow()
+
+    products_query = db.query(models.Product).filter(
+        models.Product.user_id == user_id,
+        models.Product.is_sold == False
+    )
+    rows_query = db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == user_id)
+    scope = None
+    if dirty is not None:
+        _add_current_keys(dirty, db)
+        products = products_query.filter(or_(*_affected_conditions(dirty))).all()
+        # Строки проданных и удаленных товаров из изменений тоже проверяются (и удаляются)
+        scope = {prod.id for prod in products} | dirty.product_ids
+        rows_query = rows_query.filter(models.StorefrontItem.product_id.in_(scope))
+    else:
+        products = products_query.all()
+    reservation_states = get_reservation_states(products, user_id, db)
+    expiry_by_sync, expiry_by_name_price = get_group_reservation_expiry(user_id, db, now)
+    image_paths = load_product_image_paths(products, db)
+
+    existing = {row.product_id: row for row in rows_query.all()}
+
+    for prod in products:
+        # Берем самое раннее из возможных истечений: строку лучше пересчитать раньше, чем позже
+        candidates = [
+            expires for expires in (
+                expiry_by_sync.get(prod.sync_product_id or prod.id),
+                expiry_by_name_price.get((prod.name, prod.price))
+            ) if expires is not None
+        ]
+        values = build_storefront_row(
+            prod, reservation_states.get(prod.id, (None, 0)), min(candidates) if candidates else None,
+            image_paths[prod.id]
+        )
+        row = existing.pop(prod.id, None)
+        if row is None:
+            db.add(models.StorefrontItem(product_id=prod.id, **values))
+            stats["created"] += 1
+        elif any(getattr(row, key) != value for key, value in values.items()):
+            for key, value in values.items():
+                setattr(row, key, value)
+            stats["updated"] += 1
+
+    # Проданные и удаленные товары уходят с витрины
+    for row in existing.values():
+        db.delete(row)
+        stats["deleted"] += 1
+
+    refresh_product_overrides(user_id, {prod.id: prod for prod in products}, db, product_ids=scope)
+    return stats
+
+
+def _add_current_keys(dirty: _DirtyStorefront, db: Session):
+    """Добавляет текущие группы и (имя, цена) измененных товаров (резервация знает только product_id)"""
+    if not dirty.product_ids:
+        return
+    for row in db.query(
+        models.Product.id,
+        models.Product.sync_product_id,
+        models.Product.sync_group_id,
+        models.Product.name,
+        models.Product.price
+    ).filter(models.Product.id.in_(dirty.product_ids)).all():
+        dirty.add_product(*row)
+
+
+def _affected_conditions(dirty: _DirtyStorefront) -> list:
+    """Условия на товары, строки витрины которых зависят от изменений"""
+    conditions = [models.Product.id.in_(dirty.product_ids)]
+    if dirty.sync_keys:
+        conditions.append(models.Product.id.in_(dirty.sync_keys))
+        conditions.append(models.Product.sync_product_id.in_(dirty.sync_keys))
+    if dirty.sync_group_ids:
+        conditions.append(models.Product.sync_group_id.in_(dirty.sync_group_ids))
+    # == None дает IS NULL: товары без цены группируются так же, как в get_reservation_states
+    conditions.extend(
+        and_(models.Product.name == name, models.Product.price == price)
+        for name, price in dirty.name_prices
+    )
+    return conditions
+
+
+def refresh_product_overrides(
+    user_id: int,
+    products_by_id: Dict[int, models.Product],
+    db: Session,
+    product_ids: Optional[Set[int]] = None
+) -> int:
+    """
+    Пересчитывает производные поля переопределений ботов с общим каталогом
+    (цена со скидкой и наличие скидки с учетом переопределенных цены и скидки)
+    и удаляет переопределения удаленных товаров. Коммит выполняет вызывающий код.
+
+    Args:
+        user_id: ID владельца магазина
+        products_by_id: Непроданные товары владельца (уже загруженные для витрины)
+        product_ids: Проверять только переопределения этих товаров (None - все переопределения владельца)
+
+    Returns:
+        Количество измененных переопределений
+    """
+    overrides_query = db.query(models.BotProductOverride, models.Product.id).outerjoin(
+        models.Product, models.Product.id == models.BotProductOverride.product_id
+    ).filter(models.BotProductOverride.user_id == user_id)
+    if product_ids is not None:
+        overrides_query = overrides_query.filter(models.BotProductOverride.product_id.in_(product_ids))
+    overrides = overrides_query.all()
+
+    changed = 0
+    for override, product_id in overrides:
+        if product_id is None:
+            db.delete(override)
+            changed += 1
+            continue
+        prod = products_by_id.get(product_id)
+        if prod is None:
+            # Проданный товар бот не показывает
+            continue
+        price = override.price if override.price is not None else prod.price
+        discount = override.discount if override.discount is not None else prod.discount
+        values = {"effective_price": get_effective_price(price, discount), "has_discount": (discount or 0) > 0}
+        if any(getattr(override, key) != value for key, value in values.items()):
+            for key, value in values.items():
+                setattr(override, key, value)
+            changed += 1
+    return changed
+
+
+def backfill_storefront_items(db: Session) -> int:
+    """
+    Пересобирает витрины владельцев, у которых есть товары без строк проекции
+    (первый запуск после добавления таблицы или правки БД вручную).
+
+    Returns:
+        Количество пересобранных витрин
+    """
+    missing_owners = db.query(models.Product.user_id).outerjoin(
+        models.StorefrontItem, models.StorefrontItem.product_id == models.Product.id
+    ).filter(
+        models.Product.is_sold == False,
+        models.StorefrontItem.id == None
+    ).distinct().all()
+
+    for (owner_id,) in missing_owners:
+        stats = rebuild_storefront_items(owner_id, db)
+        print(f"✅ Storefront projection rebuilt for user {owner_id}: {stats}")
+    db.commit()
+    return len(missing_owners)
+
+
+# Поля товара, от которых зависят чужие строки витрины (копии группы, товары с тем же именем и ценой)
+_PRODUCT_KEY_FIELDS = ("user_id", "sync_product_id", "sync_group_id", "name", "price")
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    """Слушатель нужен ради active_history: старое значение загружается и при записи в истекший атрибут"""
+
+
+for _model, _fields in ((models.Product, _PRODUCT_KEY_FIELDS), (models.Reservation, ("user_id", "product_id"))):
+    for _field in _fields:
+        event.listen(getattr(_model, _field), "set", _keep_old_value, active_history=True)
+
+
+def _old_value(obj, field: str):
+    history = inspect(obj).attrs[field].history
+    return history.deleted[0] if history.deleted else getattr(obj, field)
+
+
+def _collect_changes(session: Session, objects: Iterable):
+    for obj in objects:
+        if isinstance(obj, models.Product):
+            for owner_id, sync_product_id, sync_group_id, name, price in {
+                tuple(getattr(obj, field) for field in _PRODUCT_KEY_FIELDS),
+                tuple(_old_value(obj, field) for field in _PRODUCT_KEY_FIELDS)
+            }:
+                if owner_id is not None:
+                    _dirty_storefront(session, owner_id).add_product(obj.id, sync_product_id, sync_group_id, name, price)
+        elif isinstance(obj, models.Reservation):
+            for owner_id, product_id in {
+                (obj.user_id, obj.product_id),
+                (_old_value(obj, "user_id"), _old_value(obj, "product_id"))
+            }:
+                if owner_id is not None and product_id is not None:
+                    _dirty_storefront(session, owner_id).product_ids.add(product_id)
+
+
+@event.listens_for(database.SessionLocal, "after_flush")
+def _collect_dirty_products(session: Session, flush_context):
+    _collect_changes(session, session.new)
+    _collect_changes(session, session.dirty)
+    _collect_changes(session, session.deleted)
+
+
+@event.listens_for(database.SessionLocal, "before_commit")
+def _rebuild_dirty_storefronts(session: Session):
+    # Сначала переносим изменения изображений: витрина читает их из product_images.
+    # Заодно сбрасываются ожидающие изменения, чтобы after_flush учел их товары
+    sync_pending_product_images(session)
+    dirty_by_owner = session.info.pop(_DIRTY_KEY, None)
+    if not dirty_by_owner:
+        return
+    for owner_id, dirty in dirty_by_owner.items():
+        if dirty.full or dirty.size() > STOREFRONT_SCOPED_REBUILD_LIMIT:
+            rebuild_storefront_items(owner_id, session)
+        else:
+            rebuild_storefront_items(owner_id, session, dirty)
+    session.flush()
+
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _forget_dirty_products(session: Session):
+    session.info.pop(_DIRTY_KEY, None)
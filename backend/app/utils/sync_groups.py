@@ -0,0 +1,267 @@
+"""
+Группы синхронизации товаров (таблица sync_groups, Product.sync_group_id).
+
+Копии одного товара в основном магазине и магазинах ботов ссылаются на одну группу,
+в каждом магазине - не больше одной копии (уникальный индекс ux_products_sync_group_bot).
+Поэтому все копии товара находятся одним индексным запросом, без поиска по имени и цене.
+
+Старые товары (до появления групп) связаны только через sync_product_id или вообще
+по совпадению имени и цены: assign_sync_groups разрешает эти связи один раз
+(миграция migrate_add_sync_groups.py и проверка при старте приложения).
+Копии в ботах, оригинал которых удален, удаляет remove_orphaned_copies
+(синхронизация всех товаров, POST /api/products/sync-all).
+"""
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from ..db import models
+from .shared_catalog import copied_bot_filter
+
+# Поля товара, которые переносятся в копии при синхронизации
+# (магазин, категория и связи синхронизации у каждой копии свои)
+SYNCED_PRODUCT_FIELDS = (
+    "name",
+    "description",
+    "price",
+    "image_url",
+    "images_urls",
+    "discount",
+    "is_hot_offer",
+    "quantity",
+    "is_sold",
+    "is_made_to_order",
+    "is_for_sale",
+    "price_from",
+    "price_to",
+    "price_fixed",
+    "price_type",
+    "quantity_from",
+    "quantity_unit",
+    "quantity_show_enabled",
+    "is_hidden",
+)
+
+
+def ensure_sync_group(product: models.Product, db: Session) -> int:
+    """
+    Возвращает группу синхронизации товара, создавая ее для нового товара.
+
+    Args:
+        product: Товар (уже добавленный в сессию)
+        db: Сессия базы данных
+
+    Returns:
+        ID группы синхронизации
+    """
+    if product.sync_group_id:
+        return product.sync_group_id
+    group = models.SyncGroup(user_id=product.user_id)
+    db.add(group)
+    db.flush()
+    product.sync_group_id = group.id
+    return group.id
+
+
+def load_sync_group_copies(sync_group_id: int, db: Session) -> Dict[Optional[int], models.Product]:
+    """
+    Загружает все копии товара одним запросом по индексу группы.
+
+    Returns:
+        Словарь bot_id -> товар (None - основной магазин)
+    """
+    copies = db.query(models.Product).filter(
+        models.Product.sync_group_id == sync_group_id
+    ).all()
+    return {product.bot_id: product for product in copies}
+
+
+def assign_sync_groups(user_id: int, db: Session, products: Optional[List[models.Product]] = None) -> Dict[str, int]:
+    """
+    Назначает группы синхронизации товарам владельца, у которых группы еще нет.
+
+    - Товар основного магазина - якорь группы; sync_product_id = id, если не был задан
+    - Товар бота с sync_product_id попадает в группу товара основного магазина с тем же sync_product_id
+    - Товар бота без sync_product_id связывается с товаром основного магазина по имени и цене
+      (старая связь), если у того еще нет копии в этом боте; sync_product_id проставляется
+    - Вторая копия той же группы в том же магазине (дубликат) получает собственную группу
+
+    Уже назначенные группы не меняются, поэтому функцию можно вызывать повторно.
+    Не коммитит.
+
+    Args:
+        user_id: ID владельца магазина
+        db: Сессия базы данных
+        products: Все товары владельца, если уже загружены
+
+    Returns:
+        Словарь со счетчиками: назначено групп товарам, разрешено связей по имени и цене, дубликатов
+    """
+    stats = {"assigned": 0, "linked_by_name_price": 0, "duplicates": 0}
+    if products is None:
+        products = db.query(models.Product).filter(
+            models.Product.user_id == user_id
+        ).order_by(models.Product.id).all()
+    else:
+        products = sorted(products, key=lambda p: p.id)
+
+    # Якорь группы (sync_product_id товара основного магазина) -> группа
+    group_by_anchor = {}
+    # Занятые места: (группа, bot_id)
+    occupied = set()
+    for product in products:
+        if product.sync_group_id:
+            occupied.add((product.sync_group_id, product.bot_id))
+            if product.sync_product_id:
+                group_by_anchor.setdefault(product.sync_product_id, product.sync_group_id)
+
+    pending = [p for p in products if not p.sync_group_id]
+    if not pending:
+        return stats
+
+    main_by_name_price = {}
+    for product in products:
+        if product.bot_id is None:
+            if not product.sync_product_id:
+                product.sync_product_id = product.id
+            main_by_name_price.setdefault((product.name, product.price), []).append(product)
+
+    new_groups = []
+
+    def new_group() -> models.SyncGroup:
+        group = models.SyncGroup(user_id=user_id)
+        new_groups.append(group)
+        return group
+
+    # Группы создаются пачкой, id появятся после flush: до этого держим объекты
+    assignments = []
+    group_of = {}
+
+    def group_key(group):
+        return group if isinstance(group, int) else id(group)
+
+    def place(product: models.Product, group) -> bool:
+        key = (group_key(group), product.bot_id)
+        if key in occupied:
+            return False
+        occupied.add(key)
+        assignments.append((product, group))
+        group_of[product.id] = group
+        stats["assigned"] += 1
+        return True
+
+    def group_for_anchor(anchor: int):
+        group = group_by_anchor.get(anchor)
+        if group is None:
+            group = new_group()
+            group_by_anchor[anchor] = group
+        return group
+
+    # Сначала товары основного магазина (якоря), затем копии в ботах
+    for product in sorted(pending, key=lambda p: (p.bot_id is not None, p.id)):
+        if product.bot_id is None:
+            if not place(product, group_for_anchor(product.sync_product_id)):
+                stats["duplicates"] += 1
+                place(product, new_group())
+            continue
+
+        if product.sync_product_id:
+            if not place(product, group_for_anchor(product.sync_product_id)):
+                stats["duplicates"] += 1
+                place(product, new_group())
+            continue
+
+        linked = False
+        for main_product in main_by_name_price.get((product.name, product.price), []):
+            group = group_of.get(main_product.id) or main_product.sync_group_id or group_for_anchor(main_product.sync_product_id)
+            if place(product, group):
+                product.sync_product_id = main_product.sync_product_id
+                stats["linked_by_name_price"] += 1
+                linked = True
+                break
+        if not linked:
+            place(product, new_group())
+
+    db.add_all(new_groups)
+    db.flush()
+    for product, group in assignments:
+        product.sync_group_id = group if isinstance(group, int) else group.id
+    db.flush()
+    return stats
+
+
+def remove_orphaned_copies(user_id: int, db: Session) -> int:
+    """
+    Удаляет копии в ботах, которые сверка иначе скопировала бы обратно во все магазины.
+
+    Сирота - товар бота со sync_product_id, у группы которого нет копии в основном магазине,
+    и товара основного магазина с таким sync_product_id тоже нет (оригинал удален).
+    Товары с одинаковыми именем и ценой не удаляются: это могут быть разные товары,
+    а сверка и так не копирует их повторно.
+
+    Проданные товары и товары с активными резервациями не удаляются.
+    Группы должны быть назначены (assign_sync_groups). Не коммитит.
+
+    Args:
+        user_id: ID владельца магазина
+        db: Сессия базы данных
+
+    Returns:
+        Количество удаленных товаров
+    """
+    active_bot_ids = {bot_id for (bot_id,) in db.query(models.Bot.id).filter(
+        models.Bot.owner_user_id == user_id,
+        models.Bot.is_active == True,
+        copied_bot_filter()
+    ).all()}
+    if not active_bot_ids:
+        return 0
+
+    products = [
+        product for product in db.query(models.Product).filter(
+            models.Product.user_id == user_id,
+            models.Product.is_sold == False
+        ).order_by(models.Product.id).all()
+        if product.bot_id is None or product.bot_id in active_bot_ids
+    ]
+    reserved_ids = {product_id for (product_id,) in db.query(models.Reservation.product_id).filter(
+        models.Reservation.user_id == user_id,
+        models.Reservation.is_active == True
+    ).distinct().all()}
+
+    main_groups = {product.sync_group_id for product in products if product.bot_id is None}
+    main_sync_ids = {product.sync_product_id or product.id for product in products if product.bot_id is None}
+
+    removed = 0
+    for product in products:
+        if (
+            product.bot_id is not None
+            and product.sync_product_id
+            and product.sync_product_id not in main_sync_ids
+            and product.sync_group_id not in main_groups
+            and product.id not in reserved_ids
+        ):
+            print(f"🗑️ Deleting orphaned product '{product.name}' (id={product.id}, group={product.sync_group_id}, bot_id={product.bot_id})")
+            db.delete(product)
+            removed += 1
+
+    if removed:
+        db.flush()
+    return removed
+
+
+def backfill_sync_groups(db: Session) -> int:
+    """
+    Назначает группы синхронизации товарам без группы (первый запуск после миграции
+    или товары, созданные в обход движка синхронизации).
+
+    Returns:
+        Количество обработанных владельцев
+    """
+    owners = db.query(models.Product.user_id).filter(
+        models.Product.sync_group_id == None
+    ).distinct().all()
+
+    for (owner_id,) in owners:
+        stats = assign_sync_groups(owner_id, db)
+        print(f"✅ Sync groups assigned for user {owner_id}: {stats}")
+    db.commit()
+    return len(owners)
@@ -0,0 +1,265 @@
+"""
+Очередь синхронизации правок товаров (таблица sync_jobs).
+
+Раньше каждый PATCH товара (цена, количество, скрытие, горящее предложение, ...)
+синхронно обновлял копии во всех ботах до ответа, и серия правок одного товара
+повторяла полную синхронизацию каждый раз. Теперь:
+
+- обработчик в той же транзакции, что и запись товара, ставит задачу в sync_jobs
+  (enqueue_product_sync); ответ уходит сразу после коммита основной строки
+- задача одна на группу синхронизации: повторные правки до обработки схлопываются
+  в нее (источник - последний измененный товар, последняя запись побеждает)
+- фоновый поток забирает задачи пачками и применяет их через sync_product_to_all_bots;
+  каждая задача - в своей точке сохранения (SAVEPOINT): ошибка одной задачи не откатывает
+  остальные, у нее растет attempts, а после SYNC_QUEUE_MAX_ATTEMPTS неудач подряд она
+  откладывается (остается в таблице с last_error и больше не берется, пока товар не изменят)
+
+Задачи лежат в БД, поэтому переживают перезапуск: необработанные применяются при старте.
+Задержка синхронизации видна в GET /api/debug/metrics (sync_queue_stats).
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+from sqlalchemy import case, event, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from ..db import models, database
+from .catalog_cache import bump_shop_version
+from .products_sync import sync_product_to_all_bots
+from .sync_groups import ensure_sync_group
+
+# Задержка перед обработкой: серия правок схлопывается в одну синхронизацию
+SYNC_QUEUE_DELAY_SECONDS = float(os.getenv("SYNC_QUEUE_DELAY", "0.5"))
+# Сколько задач применяется в одной транзакции
+SYNC_QUEUE_BATCH_SIZE = int(os.getenv("SYNC_QUEUE_BATCH_SIZE", "100"))
+# После стольких неудачных попыток подряд задача откладывается
+SYNC_QUEUE_MAX_ATTEMPTS = int(os.getenv("SYNC_QUEUE_MAX_ATTEMPTS", "5"))
+
+_ENQUEUED_KEY = "sync_jobs_enqueued"
+
+_wakeup = threading.Event()
+_stop = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+_stats_lock = threading.Lock()
+_stats = {
+    "applied_jobs": 0,
+    "applied_edits": 0,
+    "dropped_jobs": 0,
+    "failed_jobs": 0,
+    "failed_batches": 0,
+    "last_lag_seconds": 0.0,
+    "max_lag_seconds": 0.0,
+}
+
+
+def enqueue_product_sync(db_product: models.Product, db: Session, action: str = "update"):
+    """
+    Ставит синхронизацию товара во все магазины владельца в очередь.
+    Вызывается вместо sync_product_to_all_bots до коммита записи товара:
+    задача сохраняется в той же транзакции.
+
+    Args:
+        db_product: Измененный товар
+        db: Сессия базы данных
+        action: "update" - обновить существующие копии, "create" - также создать недостающие
+    """
+    now = datetime.utcnow()
+    sync_group_id = ensure_sync_group(db_product, db)
+
+    insert_stmt = sqlite_insert(models.SyncJob).values(
+        sync_group_id=sync_group_id,
+        user_id=db_product.user_id,
+        product_id=db_product.id,
+        action=action,
+        edits=1,
+        enqueued_at=now,
+        updated_at=now
+    )
+    db.execute(insert_stmt.on_conflict_do_update(
+        index_elements=[models.SyncJob.sync_group_id],
+        set_={
+            "product_id": insert_stmt.excluded.product_id,
+            # 'create' не теряется, если за ним в задачу схлопнулся 'update'
+            "action": case(
+                (or_(models.SyncJob.action == "create", insert_stmt.excluded.action == "create"), "create"),
+                else_="update"
+            ),
+            "edits": models.SyncJob.edits + 1,
+            "updated_at": insert_stmt.excluded.updated_at,
+            # Новая правка может устранить причину ошибки - отложенная задача снова в очереди
+            "attempts": 0,
+            "last_error": None
+        }
+    ))
+    db.info[_ENQUEUED_KEY] = True
+
+
+@event.listens_for(database.SessionLocal, "after_commit")
+def _wake_after_commit(session: Session):
+    """Будит фоновый поток, когда задачи закоммичены вместе с записью товара"""
+    if session.info.pop(_ENQUEUED_KEY, False):
+        _wakeup.set()
+
+
+@event.listens_for(database.SessionLocal, "after_rollback")
+def _forget_enqueued(session: Session):
+    session.info.pop(_ENQUEUED_KEY, None)
+
+
+def process_sync_jobs(batch_size: int = SYNC_QUEUE_BATCH_SIZE) -> int:
+    """
+    Применяет одну пачку задач синхронизации в одной транзакции, каждую задачу - в своей
+    точке сохранения. Ошибка задачи откатывает только ее: attempts увеличивается,
+    last_error запоминается, остальные задачи пачки применяются.
+
+    Задача удаляется, только если с момента чтения в нее не схлопнулась новая правка
+    (edits не изменился); иначе она останется и будет применена в следующей пачке.
+    Отложенные задачи (attempts >= SYNC_QUEUE_MAX_ATTEMPTS) не берутся.
+
+    Returns:
+        Количество обработанных задач
+    """
+    db = database.SessionLocal()
+    try:
+        jobs = db.query(models.SyncJob).filter(
+            models.SyncJob.attempts < SYNC_QUEUE_MAX_ATTEMPTS
+        ).order_by(models.SyncJob.id).limit(batch_size).all()
+        if not jobs:
+            return 0
+        job_info = [(job.id, job.product_id, job.sync_group_id, job.action, job.edits, job.enqueued_at, job.attempts)
+                    for job in jobs]
+
+        product_ids = [job.product_id for job in jobs]
+        products = {
+            product.id: product
+            for product in db.query(models.Product).filter(models.Product.id.in_(product_ids)).all()
+        }
+
+        owners = set()
+        applied = []
+        dropped = 0
+        failed = []
+        for job_id, product_id, sync_group_id, action, edits, enqueued_at, attempts in job_info:
+            product = products.get(product_id)
+            try:
+                with db.begin_nested():
+                    if product is not None and product.sync_group_id == sync_group_id:
+                        sync_product_to_all_bots(product, db, action=action)
+                    done = db.query(models.SyncJob).filter(
+                        models.SyncJob.id == job_id,
+                        models.SyncJob.edits == edits
+                    ).delete(synchronize_session=False)
+            except Exception as e:
+                failed.append((job_id, attempts + 1, f"{type(e).__name__}: {e}"))
+                continue
+            if product is not None and product.sync_group_id == sync_group_id:
+                owners.add(product.user_id)
+            if not done:
+                continue  # В задачу схлопнулась новая правка - применится еще раз
+            if product is None or product.sync_group_id != sync_group_id:
+                # Товар удален после правки: удаление синхронизируется сразу, копировать нечего
+                dropped += 1
+            else:
+                applied.append((enqueued_at, edits))
+
+        for job_id, attempts, error in failed:
+            db.query(models.SyncJob).filter(models.SyncJob.id == job_id).update(
+                {"attempts": models.SyncJob.attempts + 1, "last_error": error[:1000]},
+                synchronize_session=False
+            )
+            if attempts >= SYNC_QUEUE_MAX_ATTEMPTS:
+                print(f"❌ Sync job {job_id} parked after {attempts} failed attempts: {error}")
+            else:
+                print(f"⚠️ Sync job {job_id} failed (attempt {attempts}/{SYNC_QUEUE_MAX_ATTEMPTS}): {error}")
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        with _stats_lock:
+            _stats["failed_batches"] += 1
+        print(f"❌ Sync queue batch failed: {type(e).__name__} - {e}")
+        return 0
+    finally:
+        db.close()
+
+    for owner_id in owners:
+        bump_shop_version(owner_id)
+
+    now = datetime.utcnow()
+    with _stats_lock:
+        for enqueued_at, edits in applied:
+            lag = round((now - enqueued_at).total_seconds(), 3)
+            _stats["last_lag_seconds"] = lag
+            _stats["max_lag_seconds"] = max(_stats["max_lag_seconds"], lag)
+            _stats["applied_edits"] += edits
+        _stats["applied_jobs"] += len(applied)
+        _stats["dropped_jobs"] += dropped
+        _stats["failed_jobs"] += len(failed)
+    return len(jobs)
+
+
+def sync_queue_stats() -> Dict[str, Any]:
+    """
+    Метрики очереди синхронизации: размер, задержка самой старой необработанной правки,
+    счетчики применения (applied_edits > applied_jobs - правки, схлопнутые в одну синхронизацию),
+    отложенные после SYNC_QUEUE_MAX_ATTEMPTS неудач задачи (parked_jobs, в задержку не входят).
+    """
+    db = database.SessionLocal()
+    try:
+        active = models.SyncJob.attempts < SYNC_QUEUE_MAX_ATTEMPTS
+        pending, pending_edits, oldest, parked = db.query(
+            func.count(case((active, models.SyncJob.id))),
+            func.coalesce(func.sum(case((active, models.SyncJob.edits), else_=0)), 0),
+            func.min(case((active, models.SyncJob.enqueued_at))),
+            func.count(case((~active, models.SyncJob.id)))
+        ).one()
+    finally:
+        db.close()
+
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update(
+        pending_jobs=pending,
+        pending_edits=pending_edits,
+        parked_jobs=parked,
+        lag_seconds=round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+        worker_alive=_worker is not None and _worker.is_alive()
+    )
+    return stats
+
+
+def run_sync_worker():
+    """Цикл фонового потока: ждет новых задач и применяет их пачками"""
+    while not _stop.is_set():
+        _wakeup.wait()
+        if _stop.is_set():
+            break
+        # Даем серии правок схлопнуться в одну задачу
+        _stop.wait(SYNC_QUEUE_DELAY_SECONDS)
+        _wakeup.clear()
+        while not _stop.is_set() and process_sync_jobs() >= SYNC_QUEUE_BATCH_SIZE:
+            pass
+
+
+def start_sync_worker():
+    """Запускает фоновый поток очереди; задачи, оставшиеся с прошлого запуска, применяются сразу"""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    _stop.clear()
+    _wakeup.set()
+    _worker = threading.Thread(target=run_sync_worker, name="sync-queue", daemon=True)
+    _worker.start()
+    print("✅ Sync queue worker started")
+
+
+def stop_sync_worker():
+    """Останавливает фоновый поток очереди (необработанные задачи остаются в БД)"""
+    global _worker
+    _stop.set()
+    _wakeup.set()
+    if _worker is not None:
+        _worker.join(timeout=5)
+        _worker = None
@@ -1,12 +1,238 @@
 """
 Утилиты для валидации Telegram WebApp initData
+
+WebApp может быть открыт через главного бота или любого подключенного бота, а подпись
+initData зависит от токена бота. Секретные ключи (HMAC "WebAppData" от токена) всех
+активных ботов считаются один раз и хранятся в памяти (реестр ключей); реестр
+сбрасывается при регистрации, реактивации и удалении бота (invalidate_bot_keys).
+
+Проверка подписи не ходит в БД: сначала пробуется бот из подсказки (заголовок
+X-Telegram-Bot-Id, его ставит WebApp по auth_bot_id из контекста), затем главный бот,
+бот, через которого пользователь входил последний раз, и боты пользователя-владельца.
+Перебор всех ключей - только если ни один из них не подошел.
+
+Результат проверки кэшируется по initData (init_data_cache): повторные запросы сессии
+с тем же заголовком проверку не выполняют.
+
+В пределах одного HTTP-запроса initData проверяется не больше одного раза: middleware
+создает RequestAuthState (request.state.auth), и все зависимости и обработчики запроса
+получают уже проверенный результат (utils/request_auth.py). Счетчики - request_auth_stats().
+
+Если запрос пришел с токеном сессии (заголовок X-Session-Token, выдается POST /api/session),
+initData не проверяется: пользователь и бот берутся из токена (один HMAC, без БД).
+Токен бота, отключенного после выдачи, не принимается - запрос проверяется по initData.
 """
+import os
 import hmac
 import hashlib
 import json
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
 from urllib.parse import parse_qs, unquote
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from fastapi import HTTPException
+from .init_data_cache import init_data_cache
+from .session_tokens import read_session_token
+
+# Заголовок с ID бота, через которого открыт WebApp (подсказка: подпись все равно проверяется)
+BOT_HINT_HEADER = "X-Telegram-Bot-Id"
+
+# Реестр ключей перечитывается из БД при промахе не чаще этого интервала
+# (бот мог быть зарегистрирован другим процессом)
+BOT_KEYS_RELOAD_INTERVAL = float(os.getenv("BOT_KEYS_RELOAD_INTERVAL", "5"))
+
+# Сколько пользователей помнить с ботом последнего входа
+MAX_REMEMBERED_USERS = 10000
+
+_request_auth: ContextVar[Optional["RequestAuthState"]] = ContextVar("telegram_request_auth", default=None)
+_request_stats = {
+    "requests": 0, "authenticated": 0, "session_tokens": 0, "validations": 0, "reused": 0,
+    "max_validations_per_request": 0
+}
+
+_keys_lock = threading.Lock()
+_bot_keys: Optional[Dict[int, Tuple[str, bytes, Optional[int]]]] = None  # bot_id -> (токен, ключ, владелец)
+_keys_loaded_at = 0.0
+_last_bot_by_user: Dict[int, Optional[int]] = {}
+
+
+@lru_cache(maxsize=256)
+def _secret_key(bot_token: str) -> bytes:
+    """Секретный ключ проверки initData для токена бота"""
+    return hmac.new(key=b"WebAppData", msg=bot_token.encode(), digestmod=hashlib.sha256).digest()
+
+
+def _signature_matches(data_check_string: str, received_hash: str, secret_key: bytes) -> bool:
+    expected_hash = hmac.new(key=secret_key, msg=data_check_string.encode(), digestmod=hashlib.sha256).hexdigest()
+    return hmac.compare_digest(received_hash, expected_hash)
+
+
+def _data_check_string(parsed: Dict[str, List[str]]) -> str:
+    """Строка проверки: все поля, кроме hash, по алфавиту через перевод строки"""
+    return '\n'.join(f"{key}={parsed[key][0]}" for key in sorted(parsed.keys()) if key != 'hash')
+
+
+class RequestAuthState:
+    """
+    Проверка initData в пределах одного HTTP-запроса (request.state.auth).
+    После проверки хранит user_id, bot_token и bot_id (или ошибку проверки).
+    """
+
+    def __init__(self, bot_hint: Optional[int] = None, session_token: Optional[str] = None):
+        self.bot_hint = bot_hint
+        self.session_token = session_token
+        self.session: Optional[tuple] = None  # Результат по токену сессии (если он действителен)
+        self._session_checked = False
+        self.validations = 0  # Сколько раз initData проверялся в этом запросе
+        self.reused = 0  # Сколько раз выдан уже проверенный результат
+        self.user_id: Optional[int] = None
+        self.bot_token: Optional[str] = None
+        self.bot_id: Optional[int] = None
+        self._key: Optional[bytes] = None
+        self._error: Optional[HTTPException] = None
+
+    @property
+    def is_authenticated(self) -> bool:
+        return self.session is not None or (self._key is not None and self._error is None)
+
+    def _lookup(self, key: bytes) -> Optional[tuple]:
+        """Результат проверки того же initData в этом запросе (ошибка выбрасывается снова)"""
+        if key != self._key:
+            return None
+        self.reused += 1
+        if self._error is not None:
+            raise self._error
+        return (self.user_id, self.bot_token, self.bot_id)
+
+    def _store(self, key: bytes, result: Optional[tuple] = None, error: Optional[HTTPException] = None):
+        self._key = key
+        self._error = error
+        self.user_id, self.bot_token, self.bot_id = result if result is not None else (None, None, None)
+
+
+def begin_request_auth(bot_hint: Optional[str] = None, session_token: Optional[str] = None) -> RequestAuthState:
+    """
+    Создает состояние проверки initData для текущего запроса. Вызывается middleware.
+
+    Args:
+        bot_hint: Значение заголовка X-Telegram-Bot-Id (некорректное игнорируется)
+        session_token: Значение заголовка X-Session-Token (проверяется при первой авторизации)
+    """
+    try:
+        hint = int(bot_hint) if bot_hint else None
+    except (TypeError, ValueError):
+        hint = None
+    state = RequestAuthState(hint, session_token)
+    _request_auth.set(state)
+    return state
+
+
+def finish_request_auth(state: RequestAuthState):
+    """Учитывает проверки завершившегося запроса в счетчиках"""
+    with _keys_lock:
+        _request_stats["requests"] += 1
+        _request_stats["validations"] += state.validations
+        _request_stats["reused"] += state.reused
+        if state.is_authenticated:
+            _request_stats["authenticated"] += 1
+        if state.session is not None:
+            _request_stats["session_tokens"] += 1
+        if state.validations > _request_stats["max_validations_per_request"]:
+            _request_stats["max_validations_per_request"] = state.validations
+
+
+def request_auth_stats() -> Dict[str, int]:
+    """Счетчики проверок initData по запросам (max_validations_per_request должен быть <= 1)"""
+    with _keys_lock:
+        return dict(_request_stats)
+
+
+def invalidate_bot_keys(deactivated_bot_id: Optional[int] = None):
+    """
+    Сбрасывает реестр ключей ботов: он будет перечитан при следующей проверке.
+
+    Args:
+        deactivated_bot_id: Деактивированный бот - его сессии удаляются из кэша initData
+    """
+    global _bot_keys
+    with _keys_lock:
+        _bot_keys = None
+        if deactivated_bot_id is not None:
+            for user_id in [user_id for user_id, bot_id in _last_bot_by_user.items() if bot_id == deactivated_bot_id]:
+                del _last_bot_by_user[user_id]
+    if deactivated_bot_id is not None:
+        init_data_cache.forget_bot(deactivated_bot_id)
+
+
+def _load_bot_keys(db) -> Dict[int, Tuple[str, bytes, Optional[int]]]:
+    """Читает токены активных ботов одним запросом и считает их ключи"""
+    global _bot_keys, _keys_loaded_at
+    from ..db import models
+
+    rows = db.query(models.Bot.id, models.Bot.bot_token, models.Bot.owner_user_id).filter(
+        models.Bot.is_active == True
+    ).all()
+    keys = {bot_id: (bot_token, _secret_key(bot_token), owner_id) for bot_id, bot_token, owner_id in rows if bot_token}
+    with _keys_lock:
+        _bot_keys = keys
+        _keys_loaded_at = time.monotonic()
+    print(f"🔑 Bot key registry loaded: {len(keys)} bots")
+    return keys
+
+
+def _get_bot_keys(db) -> Dict[int, Tuple[str, bytes, Optional[int]]]:
+    keys = _bot_keys
+    return keys if keys is not None else _load_bot_keys(db)
+
+
+def _remember_bot(user_id: int, bot_id: Optional[int]):
+    with _keys_lock:
+        if len(_last_bot_by_user) >= MAX_REMEMBERED_USERS and user_id not in _last_bot_by_user:
+            _last_bot_by_user.clear()
+        _last_bot_by_user[user_id] = bot_id
+
+
+def _candidate_keys(
+    keys: Dict[int, Tuple[str, bytes, Optional[int]]],
+    user_id: int,
+    default_bot_token: Optional[str],
+    bot_hint: Optional[int]
+) -> Iterator[Tuple[Optional[int], str, bytes]]:
+    """
+    Ключи в порядке вероятности: подсказка, главный бот, бот последнего входа,
+    боты пользователя, затем все остальные (bot_id None - главный бот).
+    """
+    tried = set()
+
+    def bot_key(bot_id):
+        if bot_id in tried or bot_id not in keys:
+            return None
+        tried.add(bot_id)
+        bot_token, secret_key, _ = keys[bot_id]
+        return bot_id, bot_token, secret_key
+
+    if bot_hint is not None:
+        candidate = bot_key(bot_hint)
+        if candidate:
+            yield candidate
+    if default_bot_token:
+        yield None, default_bot_token, _secret_key(default_bot_token)
+    last_bot_id = _last_bot_by_user.get(user_id)
+    if last_bot_id is not None:
+        candidate = bot_key(last_bot_id)
+        if candidate:
+            yield candidate
+    for bot_id, (_, _, owner_id) in keys.items():
+        if owner_id == user_id:
+            candidate = bot_key(bot_id)
+            if candidate:
+                yield candidate
+    for bot_id in list(keys):
+        candidate = bot_key(bot_id)
+        if candidate:
+            yield candidate
 
 
 def validate_telegram_init_data(init_data: str, bot_token: str) -> Dict[str, Any]:
@@ -38,31 +264,8 @@ def validate_telegram_init_data(init_data: str, bot_token: str) -> Dict[str, Any
         if not received_hash:
             raise HTTPException(status_code=401, detail="Hash not found in initData")
         
-        # Удаляем hash из данных для проверки
-        data_check_string = []
-        for key in sorted(parsed.keys()):
-            if key != 'hash':
-                value = parsed[key][0]
-                data_check_string.append(f"{key}={value}")
-        
-        data_check_string = '\n'.join(data_check_string)
-        
-        # Вычисляем секретный ключ
-        secret_key = hmac.new(
-            key=b"WebAppData",
-            msg=bot_token.encode(),
-            digestmod=hashlib.sha256
-        ).digest()
-        
-        # Вычисляем ожидаемый hash
-        expected_hash = hmac.new(
-            key=secret_key,
-            msg=data_check_string.encode(),
-            digestmod=hashlib.sha256
-        ).hexdigest()
-        
-        # Сравниваем hash
-        if received_hash != expected_hash:
+        # Сравниваем hash (секретный ключ токена считается один раз)
+        if not _signature_matches(_data_check_string(parsed), received_hash, _secret_key(bot_token)):
             raise HTTPException(status_code=401, detail="Invalid Telegram initData signature")
         
         # Извлекаем данные пользователя
@@ -109,17 +312,24 @@ def get_user_id_from_init_data(init_data: str, bot_token: str) -> int:
 async def validate_init_data_multi_bot(
     init_data: str,
     db,
-    default_bot_token: Optional[str] = None
+    default_bot_token: Optional[str] = None,
+    bot_hint: Optional[int] = None
 ) -> tuple[int, Optional[str], Optional[int]]:
     """
     Валидирует initData с любым токеном бота.
-    Сначала пытается валидировать с default_bot_token (главный бот),
-    затем ищет бота в БД по user_id и валидирует с его токеном.
+    initData разбирается один раз, подпись сверяется с ключами из реестра в памяти
+    (без запросов к БД): при верной подсказке бота или повторном входе - одна проверка
+    независимо от количества ботов. Повторный initData сессии берется из кэша без проверки.
     
     Args:
         init_data: Строка initData из Telegram.WebApp.initData
-        db: Сессия базы данных
+        db: Сессия базы данных (только для загрузки реестра ключей)
         default_bot_token: Токен главного бота (опционально)
+        bot_hint: ID бота, через которого открыт WebApp (по умолчанию - из заголовка X-Telegram-Bot-Id)
+        
+    В HTTP-запросе результат (или ошибка) запоминается в request.state.auth: повторный вызов
+    с тем же initData возвращает его без проверки. При действительном токене сессии
+    запроса результат берется из токена.
         
     Returns:
         tuple: (user_id, bot_token, bot_id) - ID пользователя, токен бота и ID бота в БД
@@ -127,81 +337,120 @@ async def validate_init_data_multi_bot(
     Raises:
         HTTPException: Если валидация не прошла
     """
-    from ..db import models
+    if not init_data:
+        raise HTTPException(status_code=401, detail="Telegram initData is required")
+    
+    state = _request_auth.get()
+    if state is not None and state.session_token:
+        session = _session_auth(state, init_data, db, default_bot_token)
+        if session is not None:
+            return session
+    
+    cache_key = init_data_cache.make_key(init_data, default_bot_token)
+    if state is None:
+        return await _validate_multi_bot(init_data, cache_key, db, default_bot_token, bot_hint)
+    
+    # Повторная проверка того же initData в этом запросе - готовый результат
+    reused = state._lookup(cache_key)
+    if reused is not None:
+        return reused
+    state.validations += 1
+    try:
+        result = await _validate_multi_bot(
+            init_data, cache_key, db, default_bot_token, bot_hint if bot_hint is not None else state.bot_hint
+        )
+    except HTTPException as e:
+        state._store(cache_key, error=e)
+        raise
+    state._store(cache_key, result)
+    return result
+
+
+def _session_auth(state: RequestAuthState, init_data: str, db, default_bot_token: Optional[str]) -> Optional[tuple]:
+    """
+    (user_id, bot_token, bot_id) по токену сессии запроса или None, если токен недействителен.
+    Токен должен быть выдан для initData запроса и для бота из заголовка X-Telegram-Bot-Id
+    (токен другого бота в той же WebView не действует - initData проверяется как обычно).
+    Подпись проверяется один раз на запрос.
+    """
+    if state._session_checked:
+        if state.session is not None:
+            state.reused += 1
+        return state.session
+    state._session_checked = True
+    
+    claims = read_session_token(state.session_token, init_data)
+    if claims is None:
+        return None
+    user_id, bot_id = claims
+    if state.bot_hint is not None and state.bot_hint != bot_id:
+        print(f"⚠️ Session token bot_id={bot_id} does not match X-Telegram-Bot-Id={state.bot_hint}, token ignored")
+        return None
+    if bot_id is None:
+        bot_token = default_bot_token
+    else:
+        # Реестр ключей в памяти: отключенного бота в нем нет - токен не действует
+        bot_entry = _get_bot_keys(db).get(bot_id)
+        if bot_entry is None:
+            return None
+        bot_token = bot_entry[0]
+    if not bot_token:
+        return None
+    state.session = (user_id, bot_token, bot_id)
+    state.user_id, state.bot_token, state.bot_id = state.session
+    return state.session
+
+
+async def _validate_multi_bot(
+    init_data: str,
+    cache_key: bytes,
+    db,
+    default_bot_token: Optional[str],
+    bot_hint: Optional[int]
+) -> tuple[int, Optional[str], Optional[int]]:
+    cached = init_data_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    # Сначала пытаемся валидировать с главным ботом
-    if default_bot_token:
-        try:
-            validated_data = validate_telegram_init_data(init_data, default_bot_token)
-            user_id = validated_data["user"]["id"]
-            # Главный бот не имеет bot_id в БД (используем None)
-            return (user_id, default_bot_token, None)
-        except HTTPException:
-            # Если не получилось, продолжаем поиск
-            pass
-    
-    # Парсим initData без валидации, чтобы получить user_id
     try:
-        from urllib.parse import parse_qs, unquote
-        import json
-        
         parsed = parse_qs(init_data)
+        received_hash = parsed.get('hash', [None])[0]
+        if not received_hash:
+            raise HTTPException(status_code=401, detail="Hash not found in initData")
         user_str = parsed.get('user', [None])[0]
         if not user_str:
             raise HTTPException(status_code=401, detail="User data not found in initData")
-        
-        user_data = json.loads(unquote(user_str))
-        user_id = user_data.get('id')
-        
+        user_id = json.loads(unquote(user_str)).get('id')
         if not user_id:
             raise HTTPException(status_code=401, detail="User ID not found in initData")
-        
-        # Пробуем валидировать со всеми зарегистрированными ботами
-        # Это нужно, потому что клиент может открыть WebApp через любого бота
-        all_bots = db.query(models.Bot).filter(
-            models.Bot.is_active == True
-        ).all()
-        
-        # Сначала пробуем бота владельца (если пользователь - владелец)
-        owner_bot = db.query(models.Bot).filter(
-            models.Bot.owner_user_id == user_id,
-            models.Bot.is_active == True
-        ).first()
-        
-        if owner_bot:
-            try:
-                validated_data = validate_telegram_init_data(init_data, owner_bot.bot_token)
-                return (user_id, owner_bot.bot_token, owner_bot.id)
-            except HTTPException:
-                pass  # Продолжаем поиск
-        
-        # Пробуем все остальные боты
-        for bot in all_bots:
-            if owner_bot and bot.id == owner_bot.id:
-                continue  # Уже пробовали
-            try:
-                validated_data = validate_telegram_init_data(init_data, bot.bot_token)
-                # Если валидация прошла, значит это правильный бот
-                return (user_id, bot.bot_token, bot.id)
-            except HTTPException:
-                continue  # Пробуем следующий бот
-        
-        # Если ни один бот не подошел, пробуем главный бот
-        if default_bot_token:
-            try:
-                validated_data = validate_telegram_init_data(init_data, default_bot_token)
-                return (user_id, default_bot_token, None)
-            except HTTPException:
-                pass
-        
-        raise HTTPException(
-            status_code=401,
-            detail="Bot not found. Please register your bot first or use the main bot."
-        )
-        
+    except HTTPException:
+        raise
     except Exception as e:
-        if isinstance(e, HTTPException):
-            raise
         raise HTTPException(status_code=401, detail=f"Invalid Telegram initData: {str(e)}")
-
-
+    
+    data_check_string = _data_check_string(parsed)
+    auth_date = parsed.get('auth_date', [None])[0]
+    
+    def validated(bot_token: str, bot_id: Optional[int]):
+        _remember_bot(user_id, bot_id)
+        result = (user_id, bot_token, bot_id)
+        init_data_cache.put(cache_key, result, auth_date)
+        return result
+    
+    keys = _get_bot_keys(db)
+    for bot_id, bot_token, secret_key in _candidate_keys(keys, user_id, default_bot_token, bot_hint):
+        if _signature_matches(data_check_string, received_hash, secret_key):
+            return validated(bot_token, bot_id)
+    
+    # Бот мог появиться после загрузки реестра (например, в другом процессе)
+    if time.monotonic() - _keys_loaded_at >= BOT_KEYS_RELOAD_INTERVAL:
+        fresh_keys = _load_bot_keys(db)
+        for bot_id in fresh_keys.keys() - keys.keys():
+            bot_token, secret_key, _ = fresh_keys[bot_id]
+            if _signature_matches(data_check_string, received_hash, secret_key):
+                return validated(bot_token, bot_id)
+    
+    raise HTTPException(
+        status_code=401,
+        detail="Bot not found. Please register your bot first or use the main bot."
+    )
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк массового изменения товаров: один UPDATE по группам синхронизации
+(apply_bulk_product_patch, PATCH /api/products/bulk) против прежнего подхода -
+загрузить товары основного магазина, изменить каждый и вызвать для него
+sync_product_to_all_bots (как раньше делал /bulk-update-made-to-order).
+
+Время обоих подходов включает пересборку витрины владельца (storefront_items) при коммите.
+
+Работает на временной БД, рабочая sql_app.db не затрагивается.
+
+Запуск (из папки backend):
+    python benchmark_bulk_update.py [количество_товаров] [количество_ботов]
+"""
+import os
+import sys
+import tempfile
+import time
+import io
+import contextlib
+
+PRODUCTS_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+BOTS_COUNT = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+SHOP_OWNER_ID = 1000
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+os.chdir(tempfile.mkdtemp(prefix="bulk_bench_"))
+
+
+def seed(db, models):
+    """Основной магазин и BOTS_COUNT ботов, в каждом копия каждого товара (одна группа синхронизации)"""
+    from sqlalchemy import insert
+
+    bots = [
+        models.Bot(bot_token=f"bench:{i}", bot_username=f"bench_{i}_bot", owner_user_id=SHOP_OWNER_ID, is_active=True)
+        for i in range(BOTS_COUNT)
+    ]
+    db.add_all(bots)
+    db.flush()
+    shops = [None] + [bot.id for bot in bots]
+
+    categories = {}
+    for shop in shops:
+        category = models.Category(name="Каталог", user_id=SHOP_OWNER_ID, bot_id=shop)
+        db.add(category)
+        db.flush()
+        categories[shop] = category.id
+
+    db.execute(insert(models.SyncGroup), [{"user_id": SHOP_OWNER_ID} for _ in range(PRODUCTS_COUNT)])
+    group_ids = [group_id for (group_id,) in db.query(models.SyncGroup.id).order_by(models.SyncGroup.id)]
+    for shop in shops:
+        db.execute(insert(models.Product), [
+            {
+                "name": f"Товар {i}", "price": float(100 + i), "quantity": 1,
+                "user_id": SHOP_OWNER_ID, "bot_id": shop, "category_id": categories[shop],
+                "sync_group_id": group_id, "is_made_to_order": False,
+            }
+            for i, group_id in enumerate(group_ids)
+        ])
+    db.commit()
+
+
+def count_statements(engine):
+    """Счетчик SQL-запросов к БД (кроме служебных BEGIN/COMMIT)"""
+    from sqlalchemy import event
+
+    counter = {"statements": 0}
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    return counter
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app.db import database, models
+        from app.utils.products_sync import sync_product_to_all_bots
+        from app.utils.products_bulk import apply_bulk_product_patch
+        models.Base.metadata.create_all(bind=database.engine)
+        db = database.SessionLocal()
+        seed(db, models)
+        db.close()
+    counter = count_statements(database.engine)
+
+    def per_product_loop(value):
+        """Прежний подход: ORM-правка и синхронизация каждого товара"""
+        db = database.SessionLocal()
+        products = db.query(models.Product).filter(
+            models.Product.user_id == SHOP_OWNER_ID,
+            models.Product.bot_id == None,
+            models.Product.is_sold == False
+        ).all()
+        for product in products:
+            product.is_made_to_order = value
+            sync_product_to_all_bots(product, db, action="update")
+        db.commit()
+        db.close()
+        return len(products)
+
+    def set_based(value):
+        """Новый подход: один UPDATE по группам синхронизации"""
+        db = database.SessionLocal()
+        result = apply_bulk_product_patch(SHOP_OWNER_ID, None, {}, {"is_made_to_order": value}, db)
+        db.commit()
+        db.close()
+        return result["matched_count"]
+
+    def changed_rows(value):
+        db = database.SessionLocal()
+        count = db.query(models.Product).filter(models.Product.is_made_to_order == value).count()
+        db.close()
+        return count
+
+    print(f"Товаров: {PRODUCTS_COUNT}, ботов: {BOTS_COUNT}, строк с копиями: {PRODUCTS_COUNT * (BOTS_COUNT + 1)}")
+    print(f"{'подход':<28}{'мс':>10}{'SQL-запросов':>14}{'товаров':>10}{'строк изменено':>16}")
+
+    for label, fn, value in (
+        ("цикл + sync_product_to_all_bots", per_product_loop, True),
+        ("UPDATE по группам", set_based, False),
+    ):
+        counter["statements"] = 0
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            matched = fn(value)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        statements = counter["statements"]
+        print(f"{label:<28}{elapsed_ms:>10.1f}{statements:>14}{matched:>10}{changed_rows(value):>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска товаров: GET /api/products/search (FTS5) против текущего подхода
+WebApp - скачать весь каталог (GET /api/products/) и отфильтровать его на клиенте
+(как в webapp/js/filters.js: подстрока в названии или описании).
+
+Работает на временной БД, рабочая sql_app.db не затрагивается.
+
+Запуск (из папки backend):
+    python benchmark_product_search.py [количество_товаров] [повторов]
+"""
+import os
+import sys
+import json
+import random
+import statistics
+import tempfile
+import time
+import io
+import contextlib
+
+PRODUCTS_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+SHOP_OWNER_ID = 1000
+QUERIES = ["крас", "платье", "синий кожан", "zz-not-found"]
+
+WORDS = [
+    "красный", "синий", "зеленый", "кожаный", "хлопковый", "платье", "куртка", "сумка",
+    "ботинки", "шарф", "винтаж", "новый", "летний", "зимний", "большой", "маленький"
+]
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+# Кэш ответов выключен: сравниваем стоимость построения ответа, а не попадание в кэш
+os.environ["CATALOG_CACHE_MAX_ENTRIES"] = "0"
+os.chdir(tempfile.mkdtemp(prefix="search_bench_"))
+
+
+def seed(db, models):
+    random.seed(42)
+    category = models.Category(name="Каталог", user_id=SHOP_OWNER_ID, bot_id=None)
+    db.add(category)
+    db.flush()
+    for i in range(PRODUCTS_COUNT):
+        name = " ".join(random.sample(WORDS, 3)) + f" {i}"
+        description = " ".join(random.choice(WORDS) for _ in range(30))
+        db.add(models.Product(
+            name=name, description=description, price=float(random.randint(100, 10000)),
+            user_id=SHOP_OWNER_ID, bot_id=None, category_id=category.id, quantity=1
+        ))
+    db.commit()
+
+
+def client_side_filter(products, query):
+    """Повторяет поиск из webapp/js/filters.js"""
+    query = query.lower().strip()
+    return [
+        prod for prod in products
+        if (prod.get("name") and query in prod["name"].lower())
+        or (prod.get("description") and query in prod["description"].lower())
+    ]
+
+
+def measure(fn):
+    timings = []
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    with contextlib.redirect_stdout(io.StringIO()):
+        from fastapi.testclient import TestClient
+        from app.main import app
+        from app.db import database, models
+        client = TestClient(app)
+        client.__enter__()
+        db = database.SessionLocal()
+        seed(db, models)
+        db.close()
+
+    print(f"Товаров в магазине: {PRODUCTS_COUNT}, повторов: {REPEATS}")
+    print(f"{'запрос':<16}{'подход':<22}{'мс (медиана)':>14}{'байт ответа':>14}{'найдено':>10}")
+
+    for query in QUERIES:
+        def full_download():
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = client.get("/api/products/", params={"user_id": SHOP_OWNER_ID})
+            return response.content, client_side_filter(response.json(), query)
+
+        def fts_search():
+            response = client.get("/api/products/search", params={"user_id": SHOP_OWNER_ID, "q": query, "limit": 50})
+            return response.content, response.json()["items"]
+
+        full_ms, (full_body, full_found) = measure(full_download)
+        fts_ms, (fts_body, fts_found) = measure(fts_search)
+        print(f"{query:<16}{'скачать всё + фильтр':<22}{full_ms:>14.1f}{len(full_body):>14}{len(full_found):>10}")
+        print(f"{'':<16}{'FTS5 /search':<22}{fts_ms:>14.1f}{len(fts_body):>14}{len(fts_found):>10}")
+
+    client.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@
 import sys
 from sqlalchemy.orm import Session
 from app.db import database, models
+from app.utils.category_resolver import CategoryResolver
 
 def fix_category_sync_for_user(user_id: int, db: Session):
     """
@@ -27,6 +28,9 @@ def fix_category_sync_for_user(user_id: int, db: Session):
     
     print(f"Найдено товаров: {len(all_products)}")
     
+    # Все категории пользователя - одним запросом вместо двух на каждый товар
+    resolver = CategoryResolver(user_id, db)
+    
     fixed_count = 0
     error_count = 0
     skipped_count = 0
@@ -42,10 +46,8 @@ def fix_category_sync_for_user(user_id: int, db: Session):
         # Определяем, в каком боте находится товар
         product_bot_id = product.bot_id
         
-        # Получаем категорию товара
-        original_category = db.query(models.Category).filter(
-            models.Category.id == product.category_id
-        ).first()
+        # Получаем категорию товара (категории владельца загружены один раз)
+        original_category = resolver.get(product.category_id)
         
         if not original_category:
             print(f"⚠️ Товар {product.id} '{product.name}' ссылается на несуществующую категорию {product.category_id}")
@@ -53,7 +55,8 @@ def fix_category_sync_for_user(user_id: int, db: Session):
             continue
         
         # Проверяем, принадлежит ли категория тому же боту, что и товар
-        if original_category.bot_id == product_bot_id:
+        original_bot_id, original_name = original_category
+        if original_bot_id == product_bot_id:
             # Категория и товар в одном боте - все правильно
             skipped_count += 1
             continue
@@ -61,24 +64,20 @@ def fix_category_sync_for_user(user_id: int, db: Session):
         # Категория и товар в разных ботах - нужно найти правильную категорию
         mismatch_count += 1
         # Ищем категорию с таким же именем в боте товара
-        correct_category = db.query(models.Category).filter(
-            models.Category.user_id == user_id,
-            models.Category.bot_id == product_bot_id,
-            models.Category.name == original_category.name
-        ).first()
+        correct_category_id = resolver.resolve(product.category_id, product_bot_id)
         
-        if correct_category:
+        if correct_category_id:
             # Нашли правильную категорию - обновляем товар
             old_category_id = product.category_id
-            product.category_id = correct_category.id
+            product.category_id = correct_category_id
             fixed_count += 1
-            print(f"✅ Товар {product.id} '{product.name}': category_id {old_category_id} -> {correct_category.id} (бот {product_bot_id})")
+            print(f"✅ Товар {product.id} '{product.name}': category_id {old_category_id} -> {correct_category_id} (бот {product_bot_id})")
         else:
             # Категория не найдена в боте товара - устанавливаем category_id=None
             old_category_id = product.category_id
             product.category_id = None
             set_to_none_count += 1
-            print(f"⚠️ Товар {product.id} '{product.name}' (бот {product_bot_id}): категория '{original_category.name}' не найдена в этом боте, установлено category_id=None")
+            print(f"⚠️ Товар {product.id} '{product.name}' (бот {product_bot_id}): категория '{original_name}' не найдена в этом боте, установлено category_id=None")
     
     print(f"\n{'='*60}")
     print(f"Результаты:")
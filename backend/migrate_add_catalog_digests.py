@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Миграция для добавления таблицы catalog_digests (контрольные суммы каталогов магазинов,
+см. app/utils/catalog_digest.py) и подсчета сумм для всех владельцев. Можно запускать повторно.
+"""
+from app.db import database, models
+from app.utils.catalog_digest import backfill_catalog_digests
+
+
+def migrate():
+    # Создает только отсутствующие таблицы и индексы
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.CatalogDigest.__table__])
+    db = database.SessionLocal()
+    try:
+        owners = backfill_catalog_digests(db)
+    finally:
+        db.close()
+    print(f"✅ Migration completed: table catalog_digests created, digests computed for {owners} shops")
+
+
+if __name__ == "__main__":
+    migrate()
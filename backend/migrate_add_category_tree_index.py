@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Миграция для добавления составного индекса categories (user_id, bot_id, parent_id)
+для дерева категорий (GET /api/categories/tree).
+
+Можно запускать повторно.
+"""
+import sqlite3
+import os
+
+
+def migrate():
+    db_path = "sql_app.db"
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found. Skipping migration.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS ix_categories_shop_parent ON categories (user_id, bot_id, parent_id)"
+        )
+        conn.commit()
+        print("✅ Migration completed: index ix_categories_shop_parent created")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Миграция для добавления таблицы product_images и переноса в нее изображений
+из JSON-колонки products.images_urls (с fallback на image_url).
+
+Миграция онлайн: приложение может работать во время ее выполнения.
+- новые и измененные товары пишутся в product_images самим приложением
+- товары, которые еще не перенесены, читаются из images_urls
+- перенос идет пачками по BATCH_SIZE товаров, каждая пачка - отдельная транзакция
+
+Можно запускать повторно: переносятся только товары без строк в product_images.
+"""
+from sqlalchemy import or_
+from app.db import database, models
+from app.utils.product_images import replace_product_images
+
+BATCH_SIZE = 500
+
+
+def migrate():
+    # Создает только отсутствующие таблицы и индексы
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.ProductImage.__table__])
+
+    db = database.SessionLocal()
+    migrated = 0
+    last_id = 0
+    try:
+        while True:
+            # Товары с изображениями, у которых еще нет строк в product_images
+            batch = db.query(models.Product).outerjoin(
+                models.ProductImage, models.ProductImage.product_id == models.Product.id
+            ).filter(
+                models.Product.id > last_id,
+                models.ProductImage.id == None,
+                or_(models.Product.images_urls != None, models.Product.image_url != None)
+            ).order_by(models.Product.id).limit(BATCH_SIZE).all()
+            if not batch:
+                break
+
+            replace_product_images(batch, db)
+            db.commit()
+            migrated += len(batch)
+            last_id = batch[-1].id
+            print(f"   migrated {migrated} products (last id {last_id})")
+
+        print(f"✅ Migration completed: product_images filled for {migrated} products")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Миграция для добавления полнотекстового индекса товаров products_fts (SQLite FTS5)
+и триггеров, которые поддерживают его при INSERT/UPDATE/DELETE в products.
+
+Приложение создает индекс и само при старте; скрипт нужен, чтобы подготовить БД заранее.
+Можно запускать повторно.
+"""
+from app.db.product_search import ensure_product_search_index
+
+
+def migrate():
+    try:
+        if ensure_product_search_index():
+            print("✅ Migration completed: products_fts created and filled")
+        else:
+            print("Table products_fts already exists. Skipping migration.")
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Миграция для резерваций с количеством:
+- колонка reservations.quantity (по умолчанию 1)
+- поштучные строки одной резервации (раньше резервация N единиц создавала N строк с одинаковыми
+  товаром, пользователем и сроком) сворачиваются в одну строку с quantity = N
+- индекс reservations (product_id, is_active, reserved_until, quantity) для SUM(quantity)
+
+Можно запускать повторно.
+"""
+import sqlite3
+import os
+
+# Строки одной резервации: совпадают товар, магазин, пользователь, срок и состояние
+GROUP_COLUMNS = ("product_id", "user_id", "reserved_by_user_id", "reserved_until", "is_active")
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_reservations_product_active ON reservations (product_id, is_active, reserved_until, quantity)",
+]
+
+
+def add_quantity_column(cursor) -> bool:
+    cursor.execute("PRAGMA table_info(reservations)")
+    columns = {row[1] for row in cursor.fetchall()}
+    if "quantity" in columns:
+        print("Column reservations.quantity already exists. Skipping.")
+        return False
+    cursor.execute("ALTER TABLE reservations ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1")
+    print("   added column reservations.quantity")
+    return True
+
+
+def collapse_unit_rows(cursor) -> int:
+    """
+    Сворачивает поштучные строки: в группе остается строка с наименьшим id и суммой quantity.
+
+    Returns:
+        Количество удаленных строк
+    """
+    group_by = ", ".join(GROUP_COLUMNS)
+    # IS вместо = : NULL в колонках группы тоже совпадает
+    same_group = " AND ".join(f"r.{column} IS g.{column}" for column in GROUP_COLUMNS)
+    cursor.execute("DROP TABLE IF EXISTS temp.reservation_groups")
+    cursor.execute(f"""
+        CREATE TEMP TABLE reservation_groups AS
+        SELECT {group_by}, MIN(id) AS keep_id, SUM(quantity) AS total_quantity
+        FROM reservations
+        GROUP BY {group_by}
+        HAVING COUNT(*) > 1
+    """)
+    cursor.execute("SELECT COUNT(*) FROM reservation_groups")
+    groups = cursor.fetchone()[0]
+    if not groups:
+        return 0
+
+    cursor.execute("""
+        UPDATE reservations
+        SET quantity = (SELECT total_quantity FROM reservation_groups g WHERE g.keep_id = reservations.id)
+        WHERE id IN (SELECT keep_id FROM reservation_groups)
+    """)
+    cursor.execute(f"""
+        DELETE FROM reservations
+        WHERE id IN (
+            SELECT r.id FROM reservations r
+            JOIN reservation_groups g ON {same_group}
+            WHERE r.id <> g.keep_id
+        )
+    """)
+    deleted = cursor.rowcount
+    cursor.execute("DROP TABLE reservation_groups")
+    print(f"   collapsed {groups} reservations ({deleted} unit rows removed)")
+    return deleted
+
+
+def migrate():
+    db_path = "sql_app.db"
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found. Skipping migration.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='reservations'")
+        if not cursor.fetchone():
+            print("Table reservations not found. It will be created on next app start.")
+            return
+
+        add_quantity_column(cursor)
+        collapse_unit_rows(cursor)
+        for statement in INDEXES:
+            cursor.execute(statement)
+
+        conn.commit()
+        print("✅ Migration completed: reservations.quantity is ready")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    migrate()
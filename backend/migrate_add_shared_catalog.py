@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Миграция для общего каталога ботов (app/utils/shared_catalog.py):
+- колонка bots.catalog_mode ("copied" по умолчанию - существующие боты не меняются)
+- таблица bot_product_overrides (переопределения товаров ботами с общим каталогом)
+
+С --bot-id переводит бота с копиями каталога в общий каталог (после сверки магазина владельца).
+Можно запускать повторно.
+
+Использование:
+    python migrate_add_shared_catalog.py
+    python migrate_add_shared_catalog.py --bot-id 5
+"""
+import argparse
+import os
+import sqlite3
+from app.db import database, models
+
+
+def add_catalog_mode_column(db_path: str) -> bool:
+    """Добавляет bots.catalog_mode, если колонки еще нет"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA table_info(bots)")
+        columns = [column[1] for column in cursor.fetchall()]
+        if "catalog_mode" in columns:
+            print("Column catalog_mode already exists. Skipping.")
+            return False
+        cursor.execute("ALTER TABLE bots ADD COLUMN catalog_mode VARCHAR NOT NULL DEFAULT 'copied'")
+        conn.commit()
+        print("   added column bots.catalog_mode")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def convert_bot(bot_id: int):
+    """Сверяет магазин владельца и переводит бота в общий каталог"""
+    from app.utils.catalog_cache import bump_shop_version
+    from app.utils.catalog_reconciler import reconcile_owner_catalog
+    from app.utils.shared_catalog import convert_bot_to_shared_catalog
+    from app.utils.storefront_projection import mark_storefront_dirty
+
+    db = database.SessionLocal()
+    try:
+        bot = db.get(models.Bot, bot_id)
+        if bot is None:
+            print(f"❌ Bot {bot_id} not found")
+            return
+        reconcile_owner_catalog(bot.owner_user_id, db, commit=False)
+        stats = convert_bot_to_shared_catalog(bot, db)
+        mark_storefront_dirty(db, bot.owner_user_id)
+        db.commit()
+        bump_shop_version(bot.owner_user_id)
+        print(f"✅ Bot {bot_id} converted: {stats}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def migrate(bot_id: int = None):
+    db_path = "sql_app.db"
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found. Skipping migration.")
+        return
+
+    add_catalog_mode_column(db_path)
+    # Создает только отсутствующие таблицы и индексы
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.BotProductOverride.__table__])
+    print("✅ Migration completed: bots.catalog_mode and bot_product_overrides are ready")
+
+    if bot_id is not None:
+        convert_bot(bot_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Общий каталог ботов: схема и перевод бота")
+    parser.add_argument("--bot-id", type=int, default=None, help="Перевести бота в общий каталог")
+    args = parser.parse_args()
+    migrate(args.bot_id)
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Миграция для добавления таблицы shop_settings_changes (изменения настроек магазина по полям,
+см. app/utils/shop_settings_sync.py). Можно запускать повторно.
+"""
+from app.db import database, models
+
+
+def migrate():
+    # Создает только отсутствующие таблицы и индексы
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.ShopSettingsChange.__table__])
+    print("✅ Migration completed: table shop_settings_changes created")
+
+
+if __name__ == "__main__":
+    migrate()
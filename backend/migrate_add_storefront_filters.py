@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Миграция для серверных фильтров и сортировки витрины:
+- колонки effective_price, is_hot_offer, is_made_to_order, is_for_sale, in_stock, has_discount
+  в storefront_items и их заполнение (пересборка проекции)
+- составной индекс products (user_id, bot_id, is_sold, is_hidden, category_id)
+- индекс storefront_items (user_id, bot_id, effective_price, product_id)
+
+Можно запускать повторно.
+"""
+import sqlite3
+import os
+
+NEW_COLUMNS = [
+    ("effective_price", "FLOAT"),
+    ("is_hot_offer", "BOOLEAN DEFAULT 0"),
+    ("is_made_to_order", "BOOLEAN DEFAULT 0"),
+    ("is_for_sale", "BOOLEAN DEFAULT 0"),
+    ("in_stock", "BOOLEAN DEFAULT 0"),
+    ("has_discount", "BOOLEAN DEFAULT 0"),
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_products_storefront ON products (user_id, bot_id, is_sold, is_hidden, category_id)",
+    "CREATE INDEX IF NOT EXISTS ix_storefront_items_shop_price ON storefront_items (user_id, bot_id, effective_price, product_id)",
+]
+
+
+def migrate():
+    db_path = "sql_app.db"
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found. Skipping migration.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='storefront_items'")
+        if not cursor.fetchone():
+            print("Table storefront_items not found. Run migrate_add_storefront_items.py first.")
+            return
+
+        cursor.execute("PRAGMA table_info(storefront_items)")
+        existing_columns = {row[1] for row in cursor.fetchall()}
+        for column_name, column_type in NEW_COLUMNS:
+            if column_name not in existing_columns:
+                cursor.execute(f"ALTER TABLE storefront_items ADD COLUMN {column_name} {column_type}")
+                print(f"   added column storefront_items.{column_name}")
+
+        for statement in INDEXES:
+            cursor.execute(statement)
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+    # Заполняем новые колонки: пересборка пишет только изменившиеся строки
+    from migrate_add_storefront_items import migrate as rebuild_storefront
+    rebuild_storefront()
+    print("✅ Migration completed: storefront filter columns and indexes added")
+
+
+if __name__ == "__main__":
+    migrate()
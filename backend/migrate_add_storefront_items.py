@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Миграция для добавления таблицы storefront_items (проекция витрины) и ее заполнения.
+
+Можно запускать повторно: строки витрины всех владельцев пересобираются по текущим
+товарам и резервациям (например, после правки БД скриптами в обход приложения
+или после смены API_PUBLIC_URL, от которого зависят полные URL изображений).
+"""
+from app.db import database, models
+from app.utils.storefront_projection import rebuild_storefront_items
+
+
+def migrate():
+    # Создает только отсутствующие таблицы и индексы
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.StorefrontItem.__table__])
+
+    db = database.SessionLocal()
+    try:
+        owner_ids = [
+            owner_id for (owner_id,) in db.query(models.Product.user_id).distinct().all()
+            if owner_id is not None
+        ]
+        for owner_id in owner_ids:
+            stats = rebuild_storefront_items(owner_id, db)
+            print(f"   user {owner_id}: {stats}")
+        db.commit()
+        print(f"✅ Migration completed: storefront_items rebuilt for {len(owner_ids)} shops")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Миграция для групп синхронизации товаров:
+- таблица sync_groups и колонка products.sync_group_id
+- назначение групп существующим товарам: связи по sync_product_id, а старые связи
+  по совпадению имени и цены разрешаются один раз (sync_product_id проставляется)
+- уникальный индекс products (sync_group_id, coalesce(bot_id, 0)): не больше одной
+  копии товара в каждом магазине, все копии товара - один индексный запрос
+
+Дубликаты (вторая копия той же группы в том же магазине) получают собственные группы
+и выводятся в отчете. Можно запускать повторно.
+"""
+import sqlite3
+import os
+
+DB_PATH = "sql_app.db"
+
+
+def migrate():
+    if not os.path.exists(DB_PATH):
+        print(f"Database {DB_PATH} not found. Skipping migration.")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("PRAGMA table_info(products)")
+        columns = {row[1] for row in cursor.fetchall()}
+        if "sync_group_id" not in columns:
+            cursor.execute("ALTER TABLE products ADD COLUMN sync_group_id INTEGER REFERENCES sync_groups(id)")
+            print("   added column products.sync_group_id")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+    # Колонка уже есть - дальше можно работать через модели приложения
+    from app.db import database, models
+    from app.utils.sync_groups import assign_sync_groups
+
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.SyncGroup.__table__])
+
+    db = database.SessionLocal()
+    try:
+        owner_ids = [
+            owner_id for (owner_id,) in db.query(models.Product.user_id).filter(
+                models.Product.sync_group_id == None
+            ).distinct().all()
+        ]
+        for owner_id in owner_ids:
+            stats = assign_sync_groups(owner_id, db)
+            print(f"   user {owner_id}: {stats}")
+            if stats["duplicates"]:
+                print(f"   ⚠️ user {owner_id}: {stats['duplicates']} duplicate copies got their own sync groups")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        db.close()
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_products_sync_group_bot ON products (sync_group_id, coalesce(bot_id, 0))"
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"✅ Migration completed: sync groups assigned for {len(owner_ids)} shops, index ux_products_sync_group_bot created")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Миграция для счетчика неудачных попыток задач синхронизации:
+- sync_jobs.attempts - неудачные попытки применения подряд (задача откладывается после
+  SYNC_QUEUE_MAX_ATTEMPTS попыток и больше не блокирует очередь)
+- sync_jobs.last_error - ошибка последней неудачной попытки
+
+Требует migrate_add_sync_jobs.py. Можно запускать повторно.
+"""
+import sqlite3
+import os
+
+COLUMNS = [
+    ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("last_error", "TEXT"),
+]
+
+
+def migrate():
+    db_path = "sql_app.db"
+    if not os.path.exists(db_path):
+        print(f"Database {db_path} not found. Skipping migration.")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sync_jobs'")
+        if not cursor.fetchone():
+            print("Table sync_jobs not found. Run migrate_add_sync_jobs.py first.")
+            return
+
+        cursor.execute("PRAGMA table_info(sync_jobs)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, definition in COLUMNS:
+            if name in existing:
+                print(f"Column sync_jobs.{name} already exists. Skipping.")
+                continue
+            cursor.execute(f"ALTER TABLE sync_jobs ADD COLUMN {name} {definition}")
+            print(f"   added column sync_jobs.{name}")
+
+        conn.commit()
+        print("✅ Migration completed: sync_jobs.attempts and sync_jobs.last_error are ready")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Migration failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    migrate()
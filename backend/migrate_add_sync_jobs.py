@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Миграция для добавления таблицы sync_jobs (очередь синхронизации правок товаров).
+Требует migrate_add_sync_groups.py. Можно запускать повторно.
+"""
+from app.db import database, models
+
+
+def migrate():
+    # Создает только отсутствующие таблицы и индексы
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.SyncJob.__table__])
+    print("✅ Migration completed: table sync_jobs created")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Сверка каталогов всех владельцев одной командой: деревья категорий, категории товаров
+и копии товаров между основным магазином и ботами.
+
+Заменяет поочередный запуск sync_all_categories.py, fix_category_sync.py и sync_products.py,
+которые обходили ORM по одному объекту, печатали каждую строку и коммитили в разных местах:
+- владельцы обрабатываются по одному, коммит - пачкой из --batch-size владельцев
+- сверенный владелец записывается в reconcile_checkpoints в той же транзакции, что и
+  исправления: после сбоя повторный запуск с тем же --run-id пропускает готовых владельцев
+- план расхождений строят --workers потоков-читателей (каждый в своей сессии), исправления
+  пишет один поток; владельцы без расхождений только отмечаются в checkpoint
+- --dry-run выводит план расхождений по каждому владельцу и ничего не пишет
+- сначала сравниваются суммы каталогов (catalog_digests): владельцы, у которых все боты
+  совпадают с основным магазином, построчно не читаются; --full отключает эту проверку
+- в конце - пропускная способность (строк/с) и количество примененных изменений
+
+Запуск (из папки backend):
+    python reconcile_catalog.py [--user-id ID] [--dry-run] [--workers N] [--batch-size N] [--run-id ID] [--full] [--verbose]
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Dict, List, Optional
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.utils.catalog_cache import bump_shop_version
+from app.utils.catalog_digest import drifted_bot_ids, mark_catalog_digest_dirty, refresh_catalog_digests
+from app.utils.catalog_reconciler import reconcile_owner_catalog
+from app.utils.category_resolver import get_category_resolver
+from app.utils.category_sync import sync_category_tree
+from app.utils.shared_catalog import copied_bot_filter
+from app.utils.storefront_projection import mark_storefront_dirty
+
+# Сколько примеров расхождений каждого вида выводить в --dry-run
+DIFF_SAMPLES = 5
+
+
+def list_owners(db: Session) -> List[int]:
+    """Все владельцы с товарами, категориями или ботами"""
+    owners = set()
+    for column in (models.Product.user_id, models.Category.user_id, models.Bot.owner_user_id):
+        owners.update(owner_id for (owner_id,) in db.query(column).distinct().all() if owner_id is not None)
+    return sorted(owners)
+
+
+def plan_owner(user_id: int, use_digests: bool = True) -> Dict:
+    """
+    Строит план расхождений владельца только чтением (выполняется потоками-читателями).
+
+    Args:
+        user_id: ID владельца магазина
+        use_digests: Не читать товары, если суммы каталогов всех ботов совпадают с основным магазином
+
+    Returns:
+        {"user_id", "rows": прочитано строк, "diff": вид -> список примеров, "changes": всего расхождений,
+         "skipped": сверка пропущена по суммам}
+    """
+    db = database.SessionLocal()
+    try:
+        bot_ids = [bot_id for (bot_id,) in db.query(models.Bot.id).filter(
+            models.Bot.owner_user_id == user_id,
+            models.Bot.is_active == True,
+            copied_bot_filter()
+        ).order_by(models.Bot.id).all()]
+        if use_digests and bot_ids and not drifted_bot_ids(user_id, bot_ids, db):
+            return {"user_id": user_id, "rows": len(bot_ids) + 1, "diff": {}, "changes": 0, "skipped": True}
+        categories = db.query(
+            models.Category.id, models.Category.bot_id, models.Category.name, models.Category.parent_id
+        ).filter(models.Category.user_id == user_id).order_by(models.Category.id).all()
+        products = db.query(
+            models.Product.id, models.Product.bot_id, models.Product.category_id,
+            models.Product.sync_group_id, models.Product.is_sold, models.Product.name
+        ).filter(models.Product.user_id == user_id).all()
+    finally:
+        db.close()
+
+    diff = {
+        "missing_categories": [],
+        "reparented_categories": [],
+        "wrong_product_categories": [],
+        "products_without_group": [],
+        "missing_product_copies": [],
+    }
+    shops = [None] + bot_ids
+    category_by_id = {category.id: category for category in categories}
+
+    # Деревья категорий: имя -> имя родителя в каждом магазине (первая категория с именем)
+    trees: Dict[Optional[int], Dict[str, Optional[str]]] = {shop: {} for shop in shops}
+    for category in categories:
+        if category.bot_id in trees and category.name not in trees[category.bot_id]:
+            parent = category_by_id.get(category.parent_id)
+            trees[category.bot_id][category.name] = parent.name if parent is not None and parent.bot_id == category.bot_id else None
+    if bot_ids:
+        all_names = set().union(*(tree.keys() for tree in trees.values()))
+        for shop in shops:
+            for name in sorted(all_names - trees[shop].keys()):
+                diff["missing_categories"].append(f"'{name}' -> {_shop_label(shop)}")
+        # Итоговая иерархия - как в основном магазине (он сверяется последним)
+        for shop in bot_ids:
+            for name, parent in trees[shop].items():
+                if name in trees[None] and trees[None][name] != parent:
+                    diff["reparented_categories"].append(f"'{name}' in {_shop_label(shop)}: '{parent}' -> '{trees[None][name]}'")
+
+    groups_by_shop: Dict[Optional[int], set] = {shop: set() for shop in shops}
+    for product in products:
+        category = category_by_id.get(product.category_id) if product.category_id is not None else None
+        if category is not None and category.bot_id != product.bot_id:
+            diff["wrong_product_categories"].append(f"#{product.id} '{product.name}' ({_shop_label(product.bot_id)})")
+        if product.sync_group_id is None:
+            # Группы назначаются только при сверке с ботами (reconcile_owner_catalog)
+            if bot_ids:
+                diff["products_without_group"].append(f"#{product.id} '{product.name}'")
+        elif product.bot_id in groups_by_shop:
+            groups_by_shop[product.bot_id].add(product.sync_group_id)
+
+    if bot_ids:
+        for product in products:
+            if product.is_sold or product.sync_group_id is None or product.bot_id not in groups_by_shop:
+                continue
+            # Товары ботов копируются в основной магазин, товары основного магазина - в боты
+            targets = [None] if product.bot_id is not None else bot_ids
+            for shop in targets:
+                if product.sync_group_id not in groups_by_shop[shop]:
+                    diff["missing_product_copies"].append(f"'{product.name}' -> {_shop_label(shop)}")
+
+    return {
+        "user_id": user_id,
+        "rows": len(bot_ids) + len(categories) + len(products),
+        "diff": diff,
+        "changes": sum(len(items) for items in diff.values()),
+        "skipped": False,
+    }
+
+
+def _shop_label(bot_id: Optional[int]) -> str:
+    return "main shop" if bot_id is None else f"bot {bot_id}"
+
+
+def fix_product_categories(user_id: int, db: Session) -> int:
+    """
+    Переносит товары, чья категория из другого магазина, в категорию с тем же именем
+    своего магазина (None, если такой нет). Один пакетный UPDATE по первичному ключу.
+    """
+    mismatched = db.query(models.Product.id, models.Product.bot_id, models.Product.category_id).join(
+        models.Category, models.Category.id == models.Product.category_id
+    ).filter(
+        models.Product.user_id == user_id,
+        models.Category.bot_id.is_not(models.Product.bot_id)
+    ).all()
+    if not mismatched:
+        return 0
+
+    resolver = get_category_resolver(user_id, db)
+    db.execute(update(models.Product), [
+        {"id": product_id, "category_id": resolver.resolve(category_id, bot_id)}
+        for product_id, bot_id, category_id in mismatched
+    ])
+    # UPDATE в обход flush: витрину и суммы каталогов владельца пересчитываем при коммите явно
+    mark_storefront_dirty(db, user_id)
+    mark_catalog_digest_dirty(db, user_id)
+    return len(mismatched)
+
+
+def apply_owner(user_id: int, run_id: str, db: Session) -> int:
+    """
+    Исправляет расхождения владельца и записывает checkpoint. Не коммитит.
+
+    Returns:
+        Количество примененных изменений
+    """
+    changes = 0
+    bot_ids = [bot_id for (bot_id,) in db.query(models.Bot.id).filter(
+        models.Bot.owner_user_id == user_id,
+        models.Bot.is_active == True,
+        copied_bot_filter()
+    ).order_by(models.Bot.id).all()]
+    # Категории: каждый бот, затем основной магазин - его иерархия итоговая (как sync_all_categories.py)
+    for source_bot_id in bot_ids + [None]:
+        changes += sum(sync_category_tree(user_id, source_bot_id, db, detect_renames=False).values())
+    changes += fix_product_categories(user_id, db)
+    changes += sum(reconcile_owner_catalog(user_id, db, commit=False).values())
+    db.add(models.ReconcileCheckpoint(run_id=run_id, user_id=user_id, changes=changes))
+    return changes
+
+
+def print_plan(plan: Dict):
+    print(f"\n📋 user {plan['user_id']}: {plan['changes']} differences")
+    for kind, items in plan["diff"].items():
+        if not items:
+            continue
+        more = f" (+{len(items) - DIFF_SAMPLES} more)" if len(items) > DIFF_SAMPLES else ""
+        print(f"   {kind}: {len(items)}")
+        for item in items[:DIFF_SAMPLES]:
+            print(f"     - {item}")
+        if more:
+            print(f"     {more.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка каталогов: категории, категории товаров и копии товаров между ботами")
+    parser.add_argument("--user-id", type=int, help="Сверить только этого владельца")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать расхождения, ничего не менять")
+    parser.add_argument("--workers", type=int, default=4, help="Потоков-читателей для построения плана (по умолчанию 4)")
+    parser.add_argument("--batch-size", type=int, default=20, help="Владельцев в одном коммите (по умолчанию 20)")
+    parser.add_argument("--run-id", help="Идентификатор запуска; повторный запуск с тем же id продолжает прерванный")
+    parser.add_argument("--full", action="store_true", help="Сверять построчно даже при совпадающих суммах каталогов")
+    parser.add_argument("--verbose", action="store_true", help="Печатать каждое исправление")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=database.engine, tables=[models.ReconcileCheckpoint.__table__, models.CatalogDigest.__table__])
+    run_id = args.run_id or datetime.utcnow().strftime("reconcile-%Y%m%d-%H%M%S")
+
+    db = database.SessionLocal()
+    owners = [args.user_id] if args.user_id is not None else list_owners(db)
+    done = set()
+    if not args.dry_run:
+        done = {user_id for (user_id,) in db.query(models.ReconcileCheckpoint.user_id).filter(
+            models.ReconcileCheckpoint.run_id == run_id
+        ).all()}
+    pending = [user_id for user_id in owners if user_id not in done]
+    print(f"🔄 Run {run_id}: {len(owners)} owners, {len(done)} already done, {len(pending)} to check"
+          f"{' (dry run)' if args.dry_run else ''}")
+
+    started = time.perf_counter()
+    totals = {"owners": 0, "skipped": 0, "rows": 0, "differences": 0, "changes": 0, "failed": 0}
+    batch: List[int] = []
+    batch_changed: List[int] = []
+
+    def commit_batch():
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            totals["failed"] += len(batch)
+            print(f"❌ Batch of {len(batch)} owners failed on commit: {type(e).__name__} - {e}")
+        else:
+            for user_id in batch_changed:
+                bump_shop_version(user_id)
+        batch.clear()
+        batch_changed.clear()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as readers:
+            # Читатели строят планы впереди писателя; писатель применяет их по порядку
+            for plan in readers.map(partial(plan_owner, use_digests=not args.full), pending):
+                totals["owners"] += 1
+                totals["skipped"] += plan["skipped"]
+                totals["rows"] += plan["rows"]
+                totals["differences"] += plan["changes"]
+                if args.dry_run:
+                    if plan["changes"]:
+                        print_plan(plan)
+                    continue
+
+                user_id = plan["user_id"]
+                if not plan["changes"]:
+                    if not plan["skipped"]:
+                        # Каталоги совпадают: суммы, если их не было или они устарели, -
+                        # чтобы следующая сверка пропустила владельца без чтения товаров
+                        refresh_catalog_digests(user_id, db)
+                    db.add(models.ReconcileCheckpoint(run_id=run_id, user_id=user_id, changes=0))
+                else:
+                    log = io.StringIO()
+                    try:
+                        with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+                            changes = apply_owner(user_id, run_id, db)
+                    except Exception as e:
+                        # Откатывается вся пачка: владельцы без checkpoint будут сверены при повторном запуске
+                        db.rollback()
+                        totals["failed"] += len(batch) + 1
+                        print(f"❌ user {user_id}: {type(e).__name__} - {e}; batch of {len(batch) + 1} owners rolled back")
+                        batch.clear()
+                        batch_changed.clear()
+                        continue
+                    totals["changes"] += changes
+                    if changes:
+                        batch_changed.append(user_id)
+                    print(f"✅ user {user_id}: {changes} changes")
+
+                batch.append(user_id)
+                if len(batch) >= args.batch_size:
+                    commit_batch()
+        if batch:
+            commit_batch()
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    rate = totals["rows"] / elapsed if elapsed > 0 else 0.0
+    print(f"\n{'=' * 60}")
+    print(f"Run {run_id}{' (dry run)' if args.dry_run else ''}: {totals['owners']} owners in {elapsed:.2f}s")
+    print(f"  Пропущено по суммам каталогов: {totals['skipped']}")
+    print(f"  Прочитано строк: {totals['rows']} ({rate:.0f} строк/с)")
+    print(f"  Найдено расхождений: {totals['differences']}")
+    if not args.dry_run:
+        print(f"  Применено изменений: {totals['changes']}")
+        if totals["failed"]:
+            print(f"  ⚠️ Не сверено (будут сверены при повторном запуске с --run-id {run_id}): {totals['failed']}")
+    print(f"{'=' * 60}")
+
+
+if __name__ == "__main__":
+    main()
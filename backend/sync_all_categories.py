@@ -4,6 +4,7 @@
 Используется для исправления рассинхронизации категорий.
 """
 from app.db import database, models
+from app.utils.category_sync import sync_category_tree
 from sqlalchemy.orm import Session
 
 def sync_all_categories_for_user(user_id: int, db: Session):
@@ -24,84 +25,15 @@ def sync_all_categories_for_user(user_id: int, db: Session):
     
     synced_count = 0
     
-    # 1. Синхронизируем категории из основного бота во все подключенные боты
-    main_categories = db.query(models.Category).filter(
-        models.Category.user_id == user_id,
-        models.Category.bot_id == None
-    ).all()
-    
-    print(f"\n📂 Категории в основном боте: {len(main_categories)}")
-    for main_cat in main_categories:
-        print(f"  - {main_cat.name} (ID: {main_cat.id})")
-    
-    for main_cat in main_categories:
-        for bot in connected_bots:
-            # Проверяем, не существует ли уже такая категория
-            existing = db.query(models.Category).filter(
-                models.Category.user_id == user_id,
-                models.Category.bot_id == bot.id,
-                models.Category.name == main_cat.name
-            ).first()
-            
-            if not existing:
-                new_category = models.Category(
-                    name=main_cat.name,
-                    user_id=user_id,
-                    bot_id=bot.id
-                )
-                db.add(new_category)
-                synced_count += 1
-                print(f"🔄 Синхронизирована категория '{main_cat.name}' в бот {bot.id} (bot_id={bot.id})")
-    
-    # 2. Синхронизируем категории из подключенных ботов в основной бот
-    for bot in connected_bots:
-        bot_categories = db.query(models.Category).filter(
-            models.Category.user_id == user_id,
-            models.Category.bot_id == bot.id
-        ).all()
-        
-        print(f"\n📂 Категории в боте {bot.id}: {len(bot_categories)}")
-        for bot_cat in bot_categories:
-            print(f"  - {bot_cat.name} (ID: {bot_cat.id})")
-        
-        for bot_cat in bot_categories:
-            # Проверяем, не существует ли уже такая категория в основном боте
-            existing = db.query(models.Category).filter(
-                models.Category.user_id == user_id,
-                models.Category.bot_id == None,
-                models.Category.name == bot_cat.name
-            ).first()
-            
-            if not existing:
-                new_category = models.Category(
-                    name=bot_cat.name,
-                    user_id=user_id,
-                    bot_id=None
-                )
-                db.add(new_category)
-                synced_count += 1
-                print(f"🔄 Синхронизирована категория '{bot_cat.name}' в основной бот")
-            
-            # 3. Синхронизируем категории из одного подключенного бота в другие подключенные боты
-            for other_bot in connected_bots:
-                if other_bot.id == bot.id:
-                    continue  # Пропускаем текущий бот
-                
-                existing_other = db.query(models.Category).filter(
-                    models.Category.user_id == user_id,
-                    models.Category.bot_id == other_bot.id,
-                    models.Category.name == bot_cat.name
-                ).first()
-                
-                if not existing_other:
-                    new_category = models.Category(
-                        name=bot_cat.name,
-                        user_id=user_id,
-                        bot_id=other_bot.id
-                    )
-                    db.add(new_category)
-                    synced_count += 1
-                    print(f"🔄 Синхронизирована категория '{bot_cat.name}' из бота {bot.id} в бот {other_bot.id}")
+    # Дерево каждого магазина сравнивается с деревьями остальных в памяти
+    # (utils/category_sync.py): недостающие категории добавляются, родители выравниваются.
+    # Основной бот - последним, чтобы его иерархия была итоговой.
+    # Переименования не ищутся: при объединении магазинов расхождение имен - это разные категории
+    for source_bot_id in [bot.id for bot in connected_bots] + [None]:
+        stats = sync_category_tree(user_id, source_bot_id, db, detect_renames=False)
+        synced_count += stats["inserted"]
+        source = "основного бота" if source_bot_id is None else f"бота {source_bot_id}"
+        print(f"🔄 Сверка категорий из {source}: {stats}")
     
     db.commit()
     return synced_count
@@ -4,6 +4,7 @@
 Используется для синхронизации товаров, которые были созданы до добавления автоматической синхронизации.
 """
 from app.db import database, models
+from app.utils.category_resolver import get_category_resolver
 from sqlalchemy.orm import Session
 
 def sync_all_products_for_user(user_id: int, db: Session):
@@ -23,6 +24,8 @@ def sync_all_products_for_user(user_id: int, db: Session):
     print(f"✅ Найдено {len(connected_bots)} подключенных ботов для пользователя {user_id}")
     
     synced_count = 0
+    # Категории пользователя загружаются один раз, а не на каждый товар и бот
+    resolver = get_category_resolver(user_id, db)
     
     # 1. Синхронизируем товары из основного бота во все подключенные боты
     main_products = db.query(models.Product).filter(
@@ -47,19 +50,7 @@ def sync_all_products_for_user(user_id: int, db: Session):
             
             if not existing:
                 # Находим соответствующую категорию в этом боте по имени
-                category_id_for_bot = None
-                if main_product.category_id:
-                    original_category = db.query(models.Category).filter(
-                        models.Category.id == main_product.category_id
-                    ).first()
-                    if original_category:
-                        matching_category = db.query(models.Category).filter(
-                            models.Category.user_id == user_id,
-                            models.Category.bot_id == bot.id,
-                            models.Category.name == original_category.name
-                        ).first()
-                        if matching_category:
-                            category_id_for_bot = matching_category.id
+                category_id_for_bot = resolver.resolve(main_product.category_id, bot.id)
                 
                 new_product = models.Product(
                     name=main_product.name,
@@ -103,19 +94,7 @@ def sync_all_products_for_user(user_id: int, db: Session):
             
             if not existing:
                 # Находим соответствующую категорию в основном боте по имени
-                category_id_for_main = None
-                if bot_product.category_id:
-                    original_category = db.query(models.Category).filter(
-                        models.Category.id == bot_product.category_id
-                    ).first()
-                    if original_category:
-                        matching_category = db.query(models.Category).filter(
-                            models.Category.user_id == user_id,
-                            models.Category.bot_id == None,
-                            models.Category.name == original_category.name
-                        ).first()
-                        if matching_category:
-                            category_id_for_main = matching_category.id
+                category_id_for_main = resolver.resolve(bot_product.category_id, None)
                 
                 new_product = models.Product(
                     name=bot_product.name,
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для кэша ответов витрины (CatalogCache): инвалидация версией магазина,
+истечение записей и вытеснение LRU.
+
+Запуск: python test_catalog_cache.py
+"""
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app.utils.catalog_cache import CatalogCache, viewer_class
+
+SHOP_A = 999999999
+SHOP_B = 999999998
+
+
+def builder(value, expires_at=None):
+    """Функция построения значения для get_or_build со счетчиком вызовов"""
+    calls = []
+
+    def build():
+        calls.append(1)
+        return value, expires_at
+    return build, calls
+
+
+def test_1_hit_after_build():
+    """Тест 1: второе обращение к тому же ключу - из кэша, без построения"""
+    print("\n[TEST 1] get_or_build дважды → одно построение, одно попадание")
+    cache = CatalogCache(max_entries=10, ttl_seconds=60)
+    build, calls = builder(["item"])
+    key = ("products", SHOP_A, None)
+    assert cache.get_or_build(key, SHOP_A, build) == ["item"]
+    assert cache.get_or_build(key, SHOP_A, build) == ["item"]
+    assert len(calls) == 1, f"Expected 1 build, got {len(calls)}"
+    assert cache.hits == 1 and cache.misses == 1, f"Expected 1 hit and 1 miss, got {cache.stats()}"
+    print(f"✅ PASS: stats={cache.stats()}")
+
+
+def test_2_bump_invalidates_only_that_shop():
+    """Тест 2: bump_shop_version инвалидирует записи только этого магазина"""
+    print("\n[TEST 2] bump_shop_version(A) → A перестраивается, B остается в кэше")
+    cache = CatalogCache(max_entries=10, ttl_seconds=60)
+    key_a, key_b = ("products", SHOP_A, None), ("products", SHOP_B, None)
+    cache.put(key_a, cache.shop_version(SHOP_A), "a-old")
+    cache.put(key_b, cache.shop_version(SHOP_B), "b")
+
+    cache.bump_shop_version(SHOP_A)
+
+    assert cache.get(key_a, SHOP_A) is None, "Entry of bumped shop must not be served"
+    assert cache.get(key_b, SHOP_B) == "b", "Entry of another shop must stay cached"
+    build, calls = builder("a-new")
+    assert cache.get_or_build(key_a, SHOP_A, build) == "a-new"
+    assert len(calls) == 1
+    print("✅ PASS")
+
+
+def test_3_write_during_build():
+    """Тест 3: запись во время построения → значение сохранено под старой версией и не выдается"""
+    print("\n[TEST 3] bump во время построения → построенное значение не выдается")
+    cache = CatalogCache(max_entries=10, ttl_seconds=60)
+    key = ("products", SHOP_A, None)
+
+    def build():
+        cache.bump_shop_version(SHOP_A)
+        return "stale", None
+
+    assert cache.get_or_build(key, SHOP_A, build) == "stale"
+    assert cache.get(key, SHOP_A) is None, "Value built before the write must not be served"
+    print("✅ PASS")
+
+
+def test_4_expiry():
+    """Тест 4: запись истекает по expires_at и по TTL кэша"""
+    print("\n[TEST 4] истекшие записи не выдаются (expires_at и TTL)")
+    cache = CatalogCache(max_entries=10, ttl_seconds=60)
+    key = ("products", SHOP_A, None)
+    cache.put(key, cache.shop_version(SHOP_A), "expired", expires_at=time.time() - 1)
+    assert cache.get(key, SHOP_A) is None, "Entry past expires_at must not be served"
+
+    # expires_at позже TTL обрезается до TTL
+    short = CatalogCache(max_entries=10, ttl_seconds=0.05)
+    short.put(key, short.shop_version(SHOP_A), "ttl", expires_at=time.time() + 3600)
+    assert short.get(key, SHOP_A) == "ttl"
+    time.sleep(0.1)
+    assert short.get(key, SHOP_A) is None, "Entry past cache TTL must not be served"
+    print("✅ PASS")
+
+
+def test_5_lru_eviction():
+    """Тест 5: при переполнении вытесняется давно не читанная запись"""
+    print("\n[TEST 5] max_entries=2 → вытесняется самая старая по чтению запись")
+    cache = CatalogCache(max_entries=2, ttl_seconds=60)
+    version = cache.shop_version(SHOP_A)
+    cache.put("first", version, 1)
+    cache.put("second", version, 2)
+    assert cache.get("first", SHOP_A) == 1  # "first" становится самой свежей
+    cache.put("third", version, 3)
+    assert cache.get("second", SHOP_A) is None, "Least recently used entry must be evicted"
+    assert cache.get("first", SHOP_A) == 1 and cache.get("third", SHOP_A) == 3
+    assert cache.evictions == 1, f"Expected 1 eviction, got {cache.evictions}"
+    print(f"✅ PASS: stats={cache.stats()}")
+
+
+def test_6_viewer_class():
+    """Тест 6: владелец и зритель без initData - 'owner', другой пользователь - 'client'"""
+    print("\n[TEST 6] viewer_class")
+    assert viewer_class(SHOP_A, None) == "owner"
+    assert viewer_class(SHOP_A, SHOP_A) == "owner"
+    assert viewer_class(SHOP_A, SHOP_B) == "client"
+    print("✅ PASS")
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: CatalogCache")
+    print("=" * 60)
+
+    try:
+        test_1_hit_after_build()
+        test_2_bump_invalidates_only_that_shop()
+        test_3_write_during_build()
+        test_4_expiry()
+        test_5_lru_eviction()
+        test_6_viewer_class()
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для контрольных сумм каталогов (catalog_digest): одинаковые каталоги
+основного магазина и бота дают одинаковые суммы, а суммы, обновленные при коммите,
+совпадают с полным пересчетом.
+
+Запуск: python test_catalog_digest.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.utils.catalog_digest import compute_shop_digests, drifted_bot_ids
+
+TEST_USER_ID = 999999999
+TEST_BOT_ID = 999
+
+
+def setup_test_data(db: Session):
+    """Создает бота, одинаковые категории (родитель и дочерняя) и 3 товара в обоих магазинах"""
+    cleanup_test_data(db)
+
+    db.add(models.Bot(id=TEST_BOT_ID, owner_user_id=TEST_USER_ID, bot_token="test_token", is_active=True))
+    db.flush()
+
+    categories = {}
+    for bot_id in (None, TEST_BOT_ID):
+        parent = models.Category(name="Digest Parent", user_id=TEST_USER_ID, bot_id=bot_id)
+        db.add(parent)
+        db.flush()
+        child = models.Category(name="Digest Child", user_id=TEST_USER_ID, bot_id=bot_id, parent_id=parent.id)
+        db.add(child)
+        db.flush()
+        categories[bot_id] = (parent.id, child.id)
+
+    products = {None: [], TEST_BOT_ID: []}
+    for i in range(3):
+        group = models.SyncGroup(user_id=TEST_USER_ID)
+        db.add(group)
+        db.flush()
+        for bot_id in (None, TEST_BOT_ID):
+            product = models.Product(
+                name=f"Digest Product {i}", price=10.0 * (i + 1), quantity=1,
+                user_id=TEST_USER_ID, bot_id=bot_id, sync_group_id=group.id,
+                category_id=categories[bot_id][1]
+            )
+            db.add(product)
+            db.flush()
+            products[bot_id].append(product.id)
+    db.commit()
+
+    return categories, products
+
+
+def stored_digests(db: Session):
+    """Сохраненные суммы владельца: bot_id -> (сумма, товаров, категорий)"""
+    db.expire_all()
+    return {
+        row.bot_id: (row.digest, row.products_count, row.categories_count)
+        for row in db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).all()
+    }
+
+
+def assert_stored_matches_computed(db: Session):
+    """Суммы, обновленные при коммитах, равны полному пересчету"""
+    stored = stored_digests(db)
+    computed = {
+        bot_id: (f"{digest:016x}", products_count, categories_count)
+        for bot_id, (digest, products_count, categories_count) in compute_shop_digests(TEST_USER_ID, db).items()
+    }
+    assert stored == computed, f"Stored digests {stored} differ from computed {computed}"
+    return stored
+
+
+def test_1_equal_catalogs(db: Session):
+    """Тест 1: одинаковые каталоги с разными id → одинаковые суммы, бот не требует сверки"""
+    print("\n[TEST 1] одинаковые каталоги основного магазина и бота → одинаковые суммы")
+    stored = assert_stored_matches_computed(db)
+    assert stored[None] == stored[TEST_BOT_ID], f"Expected equal digests, got {stored}"
+    assert stored[None][1:] == (3, 2), f"Expected 3 products and 2 categories, got {stored[None]}"
+    assert drifted_bot_ids(TEST_USER_ID, [TEST_BOT_ID], db) == set()
+    print(f"✅ PASS: digest={stored[None][0]}")
+
+
+def test_2_copy_edit_drifts(db: Session, products: dict):
+    """Тест 2: правка копии в боте → суммы расходятся, после возврата значения - снова равны"""
+    print("\n[TEST 2] цена копии в боте изменена → бот расходится; цена возвращена → совпадает")
+    copy = db.get(models.Product, products[TEST_BOT_ID][0])
+    original_price = copy.price
+    copy.price = original_price + 1
+    db.commit()
+    stored = assert_stored_matches_computed(db)
+    assert stored[None][0] != stored[TEST_BOT_ID][0], "Expected different digests after edit"
+    assert drifted_bot_ids(TEST_USER_ID, [TEST_BOT_ID], db) == {TEST_BOT_ID}
+
+    copy = db.get(models.Product, products[TEST_BOT_ID][0])
+    copy.price = original_price
+    db.commit()
+    stored = assert_stored_matches_computed(db)
+    assert stored[None] == stored[TEST_BOT_ID], f"Expected equal digests after revert, got {stored}"
+    print("✅ PASS")
+
+
+def test_3_category_rename(db: Session, categories: dict):
+    """Тест 3: переименование родительской категории меняет суммы товаров и дочерних категорий"""
+    print("\n[TEST 3] переименование родителя в основном магазине, затем в боте")
+    before = stored_digests(db)[None][0]
+    db.get(models.Category, categories[None][0]).name = "Digest Parent Renamed"
+    db.commit()
+    stored = assert_stored_matches_computed(db)
+    assert stored[None][0] != before, "Main digest must change after parent rename"
+    assert stored[None][0] != stored[TEST_BOT_ID][0]
+
+    db.get(models.Category, categories[TEST_BOT_ID][0]).name = "Digest Parent Renamed"
+    db.commit()
+    stored = assert_stored_matches_computed(db)
+    assert stored[None] == stored[TEST_BOT_ID], f"Expected equal digests after both renames, got {stored}"
+    print("✅ PASS")
+
+
+def test_4_sell_and_delete(db: Session, products: dict):
+    """Тест 4: продажа и удаление товара уменьшают количество товаров в сумме"""
+    print("\n[TEST 4] продажа товара в основном магазине и удаление копии в боте → по 2 товара")
+    db.get(models.Product, products[None][2]).is_sold = True
+    db.delete(db.get(models.Product, products[TEST_BOT_ID][2]))
+    db.commit()
+    stored = assert_stored_matches_computed(db)
+    assert stored[None][1] == 2 and stored[TEST_BOT_ID][1] == 2, f"Expected 2 products, got {stored}"
+    assert stored[None] == stored[TEST_BOT_ID], f"Expected equal digests, got {stored}"
+    print("✅ PASS")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == TEST_USER_ID).delete()
+    db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).delete()
+    db.query(models.Product).filter(models.Product.user_id == TEST_USER_ID).delete()
+    db.query(models.SyncGroup).filter(models.SyncGroup.user_id == TEST_USER_ID).delete()
+    db.query(models.Category).filter(models.Category.user_id == TEST_USER_ID).delete()
+    db.query(models.Bot).filter(models.Bot.owner_user_id == TEST_USER_ID).delete()
+    db.commit()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: контрольные суммы каталогов")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        categories, products = setup_test_data(db)
+
+        test_1_equal_catalogs(db)
+        test_2_copy_edit_drifts(db, products)
+        test_3_category_rename(db, categories)
+        test_4_sell_and_delete(db, products)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для синхронизации дерева категорий (sync_category_tree):
+переименование по общим товарам, перенос под нового родителя и удаление только
+категорий из prune_names.
+
+Запуск: python test_category_sync.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.utils.category_sync import sync_category_tree
+
+TEST_USER_ID = 999999999
+TEST_BOT_ID = 999
+
+
+def setup_test_data(db: Session):
+    """
+    Создает бота и категории:
+    - основной магазин: "Clothes" с 2 товарами
+    - бот: "Old Clothes" с копиями этих товаров (та же группа синхронизации),
+      пустые "Keep Extra" и "Drop Extra", которых нет в основном магазине
+    """
+    cleanup_test_data(db)
+
+    db.add(models.Bot(id=TEST_BOT_ID, owner_user_id=TEST_USER_ID, bot_token="test_token", is_active=True))
+    db.flush()
+
+    main_category = models.Category(name="Clothes", user_id=TEST_USER_ID, bot_id=None)
+    bot_category = models.Category(name="Old Clothes", user_id=TEST_USER_ID, bot_id=TEST_BOT_ID)
+    db.add_all([
+        main_category, bot_category,
+        models.Category(name="Keep Extra", user_id=TEST_USER_ID, bot_id=TEST_BOT_ID),
+        models.Category(name="Drop Extra", user_id=TEST_USER_ID, bot_id=TEST_BOT_ID),
+    ])
+    db.flush()
+
+    for i in range(2):
+        group = models.SyncGroup(user_id=TEST_USER_ID)
+        db.add(group)
+        db.flush()
+        for bot_id, category in ((None, main_category), (TEST_BOT_ID, bot_category)):
+            db.add(models.Product(
+                name=f"Category Sync Product {i}", price=10.0, quantity=1,
+                user_id=TEST_USER_ID, bot_id=bot_id, sync_group_id=group.id, category_id=category.id
+            ))
+    db.commit()
+    return bot_category.id
+
+
+def bot_categories(db: Session):
+    """Категории бота: имя -> категория (из БД)"""
+    db.expire_all()
+    return {
+        category.name: category
+        for category in db.query(models.Category).filter(models.Category.bot_id == TEST_BOT_ID).all()
+    }
+
+
+def test_1_rename_by_sync_groups(db: Session, bot_category_id: int):
+    """Тест 1: категория бота с копиями тех же товаров переименовывается, а не создается заново"""
+    print("\n[TEST 1] 'Old Clothes' в боте с копиями товаров из 'Clothes' → переименование")
+    stats = sync_category_tree(TEST_USER_ID, None, db, target_bot_ids=[TEST_BOT_ID])
+    db.commit()
+    assert stats == {"inserted": 0, "renamed": 1, "reparented": 0, "deleted": 0}, f"Unexpected stats {stats}"
+
+    categories = bot_categories(db)
+    assert "Old Clothes" not in categories, "Old name must be gone"
+    assert categories["Clothes"].id == bot_category_id, "Renamed category must keep its id (and products)"
+    assert {"Keep Extra", "Drop Extra"} <= set(categories), "Without prune categories must be kept"
+    print(f"✅ PASS: stats={stats}")
+
+
+def test_2_new_child_under_new_parent(db: Session):
+    """Тест 2: новые родитель и дочерняя категория вставляются одним flush, существующая переносится"""
+    print("\n[TEST 2] новые 'Accessories' и 'Rings' (дочерняя), 'Clothes' под 'Accessories' → один flush")
+    parent = models.Category(name="Accessories", user_id=TEST_USER_ID, bot_id=None)
+    db.add(parent)
+    db.flush()
+    db.add(models.Category(name="Rings", user_id=TEST_USER_ID, bot_id=None, parent_id=parent.id))
+    db.query(models.Category).filter(
+        models.Category.bot_id == None, models.Category.user_id == TEST_USER_ID, models.Category.name == "Clothes"
+    ).one().parent_id = parent.id
+    db.commit()
+
+    flushes = []
+
+    def listener(session, flush_context):
+        flushes.append(1)
+
+    event.listen(db, "after_flush", listener)
+    try:
+        stats = sync_category_tree(TEST_USER_ID, None, db, target_bot_ids=[TEST_BOT_ID])
+    finally:
+        event.remove(db, "after_flush", listener)
+    db.commit()
+    assert stats == {"inserted": 2, "renamed": 0, "reparented": 1, "deleted": 0}, f"Unexpected stats {stats}"
+    assert len(flushes) == 1, f"Expected a single flush, got {len(flushes)}"
+
+    categories = bot_categories(db)
+    accessories_id = categories["Accessories"].id
+    assert categories["Accessories"].parent_id is None
+    assert categories["Rings"].parent_id == accessories_id, "New child must point to the new parent of the bot"
+    assert categories["Clothes"].parent_id == accessories_id, "Existing category must be moved under the new parent"
+    print(f"✅ PASS: stats={stats}")
+
+
+def test_3_prune_only_named(db: Session):
+    """Тест 3: prune с prune_names удаляет только названные категории"""
+    print("\n[TEST 3] prune=True, prune_names={'Drop Extra'} → удалена только 'Drop Extra'")
+    stats = sync_category_tree(
+        TEST_USER_ID, None, db, prune=True, prune_names=["Drop Extra"], target_bot_ids=[TEST_BOT_ID]
+    )
+    db.commit()
+    assert stats == {"inserted": 0, "renamed": 0, "reparented": 0, "deleted": 1}, f"Unexpected stats {stats}"
+
+    categories = bot_categories(db)
+    assert "Drop Extra" not in categories, "Named category must be deleted"
+    assert "Keep Extra" in categories, "Category not in prune_names must be kept"
+    assert {"Clothes", "Accessories", "Rings"} <= set(categories)
+    print(f"✅ PASS: stats={stats}")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == TEST_USER_ID).delete()
+    db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).delete()
+    db.query(models.Product).filter(models.Product.user_id == TEST_USER_ID).delete()
+    db.query(models.SyncGroup).filter(models.SyncGroup.user_id == TEST_USER_ID).delete()
+    db.query(models.Category).filter(models.Category.user_id == TEST_USER_ID).delete()
+    db.query(models.Bot).filter(models.Bot.owner_user_id == TEST_USER_ID).delete()
+    db.commit()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: синхронизация дерева категорий")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        bot_category_id = setup_test_data(db)
+
+        test_1_rename_by_sync_groups(db, bot_category_id)
+        test_2_new_child_under_new_parent(db)
+        test_3_prune_only_named(db)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
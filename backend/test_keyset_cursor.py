@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для keyset-пагинации списка товаров (encode_cursor / decode_cursor, get_products_page).
+
+Запуск: python test_keyset_cursor.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.handlers.products_read import encode_cursor, decode_cursor, get_products_page
+# Импорт регистрирует обновление строк витрины при коммите (как при запуске приложения)
+from app.utils import storefront_projection  # noqa: F401
+
+TEST_USER_ID = 999999999
+
+
+def setup_test_data(db: Session):
+    """Создает 5 товаров основного магазина (строки витрины строятся при коммите)"""
+    cleanup_test_data(db)
+
+    product_ids = []
+    for i in range(5):
+        product = models.Product(
+            name=f"Cursor Product {i}",
+            price=100.0 + i,
+            quantity=1,
+            user_id=TEST_USER_ID,
+            bot_id=None
+        )
+        db.add(product)
+        db.flush()
+        product_ids.append(product.id)
+    db.commit()
+
+    return product_ids
+
+
+def test_1_roundtrip():
+    """Тест 1: decode_cursor(encode_cursor(id)) == id, курсор без '=' в конце"""
+    print("\n[TEST 1] decode_cursor(encode_cursor(id)) == id")
+    for last_id in (0, 1, 42, 10 ** 12):
+        cursor = encode_cursor(last_id)
+        assert not cursor.endswith("="), f"Cursor must be unpadded, got {cursor}"
+        result = decode_cursor(cursor)
+        assert result == last_id, f"Expected {last_id}, got {result}"
+    print("✅ PASS")
+
+
+def test_2_offset_key():
+    """Тест 2: курсор смещения читается только с тем же ключом"""
+    print("\n[TEST 2] курсор с key='offset' → id-курсором не читается")
+    cursor = encode_cursor(40, key="offset")
+    assert decode_cursor(cursor, key="offset") == 40
+    try:
+        decode_cursor(cursor)
+        assert False, "Expected HTTPException for offset cursor decoded as id"
+    except HTTPException as e:
+        assert e.status_code == 400, f"Expected 400, got {e.status_code}"
+    print("✅ PASS")
+
+
+def test_3_invalid_cursor():
+    """Тест 3: поврежденный курсор → 400"""
+    print("\n[TEST 3] поврежденный курсор → 400")
+    for cursor in ("", "not-base64!", encode_cursor(1) + "xx", "eyJpZCI6ImEifQ"):
+        try:
+            decode_cursor(cursor)
+            assert False, f"Expected HTTPException for cursor {cursor!r}"
+        except HTTPException as e:
+            assert e.status_code == 400, f"Expected 400, got {e.status_code}"
+    print("✅ PASS")
+
+
+def test_4_pages_cover_all_products(db: Session, product_ids: list):
+    """Тест 4: страницы по 2 товара возвращают все товары по порядку, без повторов"""
+    print("\n[TEST 4] страницы по 2 товара → все товары, без повторов и пропусков")
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        page = get_products_page(TEST_USER_ID, None, None, db, limit=2, cursor=cursor)
+        seen.extend(item["id"] for item in page["items"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert pages < 10, "Pagination does not terminate"
+    assert seen == product_ids, f"Expected {product_ids}, got {seen}"
+    assert pages == 3, f"Expected 3 pages, got {pages}"
+    print(f"✅ PASS: pages={pages}, ids={seen}")
+
+
+def test_5_fields_projection(db: Session):
+    """Тест 5: fields ограничивает поля элемента (id всегда есть), неизвестное поле → 400"""
+    print("\n[TEST 5] fields='name,price' → только id, name, price")
+    page = get_products_page(TEST_USER_ID, None, None, db, limit=1, fields="name,price")
+    keys = set(page["items"][0].keys())
+    assert keys == {"id", "name", "price"}, f"Expected id, name, price, got {keys}"
+    try:
+        get_products_page(TEST_USER_ID, None, None, db, fields="name,no_such_field")
+        assert False, "Expected HTTPException for unknown field"
+    except HTTPException as e:
+        assert e.status_code == 400, f"Expected 400, got {e.status_code}"
+    print(f"✅ PASS: keys={sorted(keys)}")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == TEST_USER_ID).delete()
+    db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).delete()
+    db.query(models.Product).filter(models.Product.user_id == TEST_USER_ID).delete()
+    db.query(models.SyncGroup).filter(models.SyncGroup.user_id == TEST_USER_ID).delete()
+    db.commit()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: keyset-пагинация товаров")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        product_ids = setup_test_data(db)
+
+        test_1_roundtrip()
+        test_2_offset_key()
+        test_3_invalid_cursor()
+        test_4_pages_cover_all_products(db, product_ids)
+        test_5_fields_projection(db)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для массового изменения товаров apply_bulk_product_patch.
+
+Запуск: python test_products_bulk.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.utils.products_bulk import apply_bulk_product_patch
+
+TEST_USER_ID = 999999999
+TEST_BOT_ID = 999
+
+
+def setup_test_data(db: Session):
+    """Создает бота, категории "Source" и "Target" в обоих магазинах и 3 товара с копиями в боте"""
+    cleanup_test_data(db)
+
+    db.add(models.Bot(id=TEST_BOT_ID, owner_user_id=TEST_USER_ID, bot_token="test_token", is_active=True))
+    db.flush()
+
+    categories = {}
+    for bot_id in (None, TEST_BOT_ID):
+        for name in ("Source", "Target"):
+            category = models.Category(name=name, user_id=TEST_USER_ID, bot_id=bot_id)
+            db.add(category)
+            db.flush()
+            categories[(bot_id, name)] = category.id
+
+    main_ids = []
+    for i in range(3):
+        group = models.SyncGroup(user_id=TEST_USER_ID)
+        db.add(group)
+        db.flush()
+        for bot_id in (None, TEST_BOT_ID):
+            product = models.Product(
+                name=f"Bulk Product {i}", price=10.0 * (i + 1), quantity=1,
+                user_id=TEST_USER_ID, bot_id=bot_id, sync_group_id=group.id,
+                category_id=categories[(bot_id, "Source")]
+            )
+            db.add(product)
+            db.flush()
+            if bot_id is None:
+                main_ids.append(product.id)
+    db.commit()
+
+    return main_ids, categories
+
+
+def copies_of(db: Session, product_id: int):
+    """Все копии товара (по группе синхронизации), из БД"""
+    db.expire_all()
+    product = db.get(models.Product, product_id)
+    return db.query(models.Product).filter(models.Product.sync_group_id == product.sync_group_id).all()
+
+
+def test_1_patch_applies_to_copies(db: Session, main_ids: list):
+    """Тест 1: изменение выбранных товаров основного магазина применяется и к копиям в боте"""
+    print("\n[TEST 1] is_hot_offer для 2 товаров → изменены 4 строки (с копиями)")
+    result = apply_bulk_product_patch(
+        TEST_USER_ID, None, {"product_ids": main_ids[:2]}, {"is_hot_offer": True}, db
+    )
+    db.commit()
+    assert result == {"matched_count": 2, "updated_count": 4}, f"Unexpected result {result}"
+    for product_id in main_ids[:2]:
+        assert all(copy.is_hot_offer for copy in copies_of(db, product_id)), f"Copies of {product_id} not patched"
+    assert not any(copy.is_hot_offer for copy in copies_of(db, main_ids[2])), "Unselected product was patched"
+    print(f"✅ PASS: result={result}")
+
+
+def test_2_category_mapped_per_shop(db: Session, main_ids: list, categories: dict):
+    """Тест 2: перенос в категорию → в каждом магазине категория с тем же именем"""
+    print("\n[TEST 2] category_id=Target основного магазина → в боте Target бота")
+    apply_bulk_product_patch(
+        TEST_USER_ID, None, {"product_ids": [main_ids[0]]}, {"category_id": categories[(None, "Target")]}, db
+    )
+    db.commit()
+    for copy in copies_of(db, main_ids[0]):
+        expected = categories[(copy.bot_id, "Target")]
+        assert copy.category_id == expected, f"Expected category {expected} in bot {copy.bot_id}, got {copy.category_id}"
+    print("✅ PASS")
+
+
+def test_3_discount_range(db: Session, main_ids: list):
+    """Тест 3: скидка вне 0-100 → 400, 20 → применяется"""
+    print("\n[TEST 3] discount=150 и discount=-5 → 400, discount=20 → OK")
+    for discount in (150, -5):
+        try:
+            apply_bulk_product_patch(TEST_USER_ID, None, {"product_ids": main_ids}, {"discount": discount}, db)
+            assert False, f"Expected HTTPException for discount {discount}"
+        except HTTPException as e:
+            assert e.status_code == 400, f"Expected 400, got {e.status_code}"
+        db.rollback()
+    apply_bulk_product_patch(TEST_USER_ID, None, {"product_ids": main_ids}, {"discount": 20.0}, db)
+    db.commit()
+    assert all(copy.discount == 20.0 for copy in copies_of(db, main_ids[1])), "Discount not applied"
+    print("✅ PASS")
+
+
+def test_4_errors_and_empty_selection(db: Session, main_ids: list):
+    """Тест 4: без изменений → 400, чужая категория → 404, пустая выборка → 0 строк"""
+    print("\n[TEST 4] без изменений → 400, категория не найдена → 404, пустая выборка → 0")
+    try:
+        apply_bulk_product_patch(TEST_USER_ID, None, {"product_ids": main_ids}, {"no_such_field": 1}, db)
+        assert False, "Expected HTTPException without changes"
+    except HTTPException as e:
+        assert e.status_code == 400, f"Expected 400, got {e.status_code}"
+    try:
+        apply_bulk_product_patch(TEST_USER_ID, None, {"product_ids": main_ids}, {"category_id": 999999}, db)
+        assert False, "Expected HTTPException for unknown category"
+    except HTTPException as e:
+        assert e.status_code == 404, f"Expected 404, got {e.status_code}"
+    db.rollback()
+    result = apply_bulk_product_patch(TEST_USER_ID, None, {"product_ids": [999999]}, {"is_hidden": True}, db)
+    db.rollback()
+    assert result == {"matched_count": 0, "updated_count": 0}, f"Unexpected result {result}"
+    print("✅ PASS")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == TEST_USER_ID).delete()
+    db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).delete()
+    db.query(models.Product).filter(models.Product.user_id == TEST_USER_ID).delete()
+    db.query(models.SyncGroup).filter(models.SyncGroup.user_id == TEST_USER_ID).delete()
+    db.query(models.Category).filter(models.Category.user_id == TEST_USER_ID).delete()
+    db.query(models.Bot).filter(models.Bot.owner_user_id == TEST_USER_ID).delete()
+    db.commit()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: apply_bulk_product_patch")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        main_ids, categories = setup_test_data(db)
+
+        test_1_patch_applies_to_copies(db, main_ids)
+        test_2_category_mapped_per_shop(db, main_ids, categories)
+        test_3_discount_range(db, main_ids)
+        test_4_errors_and_empty_selection(db, main_ids)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
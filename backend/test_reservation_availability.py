@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для зарезервированного количества (get_reservation_states):
+SUM(quantity) активных неистекших резерваций по всем копиям товара.
+
+Запуск: python test_reservation_availability.py
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.handlers.products_read import get_reservation_states
+
+TEST_USER_ID = 999999999
+TEST_BOT_ID = 999
+
+
+def setup_test_data(db: Session):
+    """
+    Создает бота и товары:
+    - товар основного магазина с копией в боте (связь по sync_product_id)
+    - товар без резерваций
+    - старый товар без sync_product_id и его двойник в боте (связь по имени и цене)
+    - такая же пара старых товаров с ценой по запросу (price=None)
+    """
+    cleanup_test_data(db)
+
+    db.add(models.Bot(id=TEST_BOT_ID, owner_user_id=TEST_USER_ID, bot_token="test_token", is_active=True))
+    db.flush()
+
+    main = models.Product(name="Reserved Product", price=50.0, quantity=10, user_id=TEST_USER_ID, bot_id=None)
+    db.add(main)
+    db.flush()
+    main.sync_product_id = main.id
+    copy = models.Product(
+        name=main.name, price=main.price, quantity=10,
+        user_id=TEST_USER_ID, bot_id=TEST_BOT_ID, sync_product_id=main.id
+    )
+    free = models.Product(name="Free Product", price=20.0, quantity=3, user_id=TEST_USER_ID, bot_id=None)
+    legacy_main = models.Product(name="Legacy Product", price=70.0, quantity=5, user_id=TEST_USER_ID, bot_id=None)
+    legacy_bot = models.Product(name="Legacy Product", price=70.0, quantity=5, user_id=TEST_USER_ID, bot_id=TEST_BOT_ID)
+    on_request_main = models.Product(name="On Request Product", price=None, quantity=1, user_id=TEST_USER_ID, bot_id=None)
+    on_request_bot = models.Product(name="On Request Product", price=None, quantity=1, user_id=TEST_USER_ID, bot_id=TEST_BOT_ID)
+    db.add_all([copy, free, legacy_main, legacy_bot, on_request_main, on_request_bot])
+    db.flush()
+
+    products = {
+        "main": main, "copy": copy, "free": free, "legacy_main": legacy_main, "legacy_bot": legacy_bot,
+        "on_request_main": on_request_main, "on_request_bot": on_request_bot
+    }
+    db.commit()
+    return {name: product.id for name, product in products.items()}
+
+
+def reserve(db: Session, product_id: int, quantity: int, is_active: bool = True, hours: float = 1):
+    """Добавляет резервацию товара"""
+    reservation = models.Reservation(
+        product_id=product_id, user_id=TEST_USER_ID, reserved_by_user_id=7, quantity=quantity,
+        reserved_until=datetime.utcnow() + timedelta(hours=hours), is_active=is_active
+    )
+    db.add(reservation)
+    db.commit()
+    return reservation.id
+
+
+def states_for(db: Session, ids: dict):
+    """Состояния резервации всех тестовых товаров"""
+    db.expire_all()
+    products = db.query(models.Product).filter(models.Product.id.in_(ids.values())).all()
+    return get_reservation_states(products, TEST_USER_ID, db)
+
+
+def test_1_sum_of_active_quantities(db: Session, ids: dict):
+    """Тест 1: количество - сумма quantity активных резерваций; отмененные и истекшие не считаются"""
+    print("\n[TEST 1] резервации 2 и 1 шт. активны, 3 шт. отменена, 4 шт. истекла → 3")
+    first_id = reserve(db, ids["main"], 2)
+    reserve(db, ids["main"], 1)
+    reserve(db, ids["main"], 3, is_active=False)
+    reserve(db, ids["main"], 4, hours=-1)
+
+    reservation, count = states_for(db, ids)[ids["main"]]
+    assert count == 3, f"Expected reserved quantity 3, got {count}"
+    assert reservation is not None and reservation.id == first_id, f"Expected first reservation {first_id}"
+    print(f"✅ PASS: count={count}")
+
+
+def test_2_copies_share_reservations(db: Session, ids: dict):
+    """Тест 2: резервация копии в боте учитывается и у товара основного магазина"""
+    print("\n[TEST 2] резервация копии (5 шт.) → 8 шт. у товара и у копии")
+    reserve(db, ids["copy"], 5)
+
+    states = states_for(db, ids)
+    for name in ("main", "copy"):
+        _, count = states[ids[name]]
+        assert count == 8, f"Expected reserved quantity 8 for {name}, got {count}"
+    print("✅ PASS")
+
+
+def test_3_legacy_name_price(db: Session, ids: dict):
+    """Тест 3: старые товары без sync_product_id связаны по имени и цене"""
+    print("\n[TEST 3] резервация старого товара в боте (2 шт.) → 2 шт. у двойника в основном магазине")
+    reserve(db, ids["legacy_bot"], 2)
+
+    states = states_for(db, ids)
+    for name in ("legacy_main", "legacy_bot"):
+        _, count = states[ids[name]]
+        assert count == 2, f"Expected reserved quantity 2 for {name}, got {count}"
+    print("✅ PASS")
+
+
+def test_4_legacy_without_price_and_query_count(db: Session, ids: dict):
+    """Тест 4: старые товары с ценой по запросу связаны по имени; запросов не больше, чем без них"""
+    print("\n[TEST 4] резервация товара с price=None в боте (1 шт.) → 1 шт. у двойника, число запросов постоянно")
+    reserve(db, ids["on_request_bot"], 1)
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    products = db.query(models.Product).filter(models.Product.id.in_(ids.values())).all()
+    event.listen(database.engine, "before_cursor_execute", count_statement)
+    try:
+        states = get_reservation_states(products, TEST_USER_ID, db)
+        all_products_queries = len(statements)
+        del statements[:]
+        get_reservation_states([product for product in products if product.id == ids["legacy_main"]], TEST_USER_ID, db)
+        one_product_queries = len(statements)
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count_statement)
+
+    for name in ("on_request_main", "on_request_bot"):
+        _, count = states[ids[name]]
+        assert count == 1, f"Expected reserved quantity 1 for {name}, got {count}"
+    assert all_products_queries == one_product_queries, (
+        f"Query count grows with legacy products: {all_products_queries} vs {one_product_queries}"
+    )
+    print(f"✅ PASS: queries={all_products_queries}")
+
+
+def test_5_no_reservations(db: Session, ids: dict):
+    """Тест 5: товар без резерваций → (None, 0)"""
+    print("\n[TEST 5] товар без резерваций → (None, 0)")
+    state = states_for(db, ids)[ids["free"]]
+    assert state == (None, 0), f"Expected (None, 0), got {state}"
+    print("✅ PASS")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == TEST_USER_ID).delete()
+    db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).delete()
+    db.query(models.Reservation).filter(models.Reservation.user_id == TEST_USER_ID).delete()
+    db.query(models.Product).filter(models.Product.user_id == TEST_USER_ID).delete()
+    db.query(models.Bot).filter(models.Bot.owner_user_id == TEST_USER_ID).delete()
+    db.commit()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: зарезервированное количество товара")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        ids = setup_test_data(db)
+
+        test_1_sum_of_active_quantities(db, ids)
+        test_2_copies_share_reservations(db, ids)
+        test_3_legacy_name_price(db, ids)
+        test_4_legacy_without_price_and_query_count(db, ids)
+        test_5_no_reservations(db, ids)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для токенов сессии WebApp (session_tokens) и их проверки в запросе
+(подпись, срок действия, привязка к initData и к боту из X-Telegram-Bot-Id).
+
+Запуск: python test_session_tokens.py
+"""
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.utils.session_tokens import issue_session_token, read_session_token
+from app.utils.telegram_auth import begin_request_auth, invalidate_bot_keys, validate_init_data_multi_bot
+
+TEST_USER_ID = 999999999
+TEST_BOT_ID = 999
+TEST_BOT_TOKEN = "test_token"
+MAIN_BOT_TOKEN = "main_test_token"
+# Подпись initData в этих тестах не проверяется: действительный токен ее заменяет
+INIT_DATA = "query_id=q1&user=%7B%22id%22%3A999999999%7D&auth_date=1700000000&hash=00"
+
+
+def setup_test_data(db: Session):
+    """Создает подключенного бота (его ключ попадает в реестр ключей ботов)"""
+    cleanup_test_data(db)
+    db.add(models.Bot(id=TEST_BOT_ID, owner_user_id=TEST_USER_ID, bot_token=TEST_BOT_TOKEN, is_active=True))
+    db.commit()
+    invalidate_bot_keys()
+
+
+def authorize(db: Session, token: str, bot_hint=None):
+    """Проверка initData так же, как в HTTP-запросе с заголовками X-Session-Token и X-Telegram-Bot-Id"""
+    async def run():
+        begin_request_auth(bot_hint=bot_hint, session_token=token)
+        return await validate_init_data_multi_bot(INIT_DATA, db, default_bot_token=MAIN_BOT_TOKEN)
+    return asyncio.run(run())
+
+
+def test_1_roundtrip():
+    """Тест 1: токен читается обратно в (user_id, bot_id) для главного бота и подключенного"""
+    print("\n[TEST 1] issue_session_token → read_session_token")
+    token, _ = issue_session_token(TEST_USER_ID, None, INIT_DATA)
+    assert read_session_token(token, INIT_DATA) == (TEST_USER_ID, None)
+    token, _ = issue_session_token(TEST_USER_ID, TEST_BOT_ID, INIT_DATA)
+    assert read_session_token(token, INIT_DATA) == (TEST_USER_ID, TEST_BOT_ID)
+    print("✅ PASS")
+
+
+def test_2_bound_to_init_data():
+    """Тест 2: токен не действует с другим initData или без него"""
+    print("\n[TEST 2] другой initData или без initData → None")
+    token, _ = issue_session_token(TEST_USER_ID, None, INIT_DATA)
+    assert read_session_token(token, INIT_DATA + "&x=1") is None, "Token must be bound to its initData"
+    assert read_session_token(token, None) is None
+    assert read_session_token(None, INIT_DATA) is None
+    print("✅ PASS")
+
+
+def test_3_tampered_token():
+    """Тест 3: измененный user_id, подпись или версия → None"""
+    print("\n[TEST 3] подделанный токен → None")
+    token, _ = issue_session_token(TEST_USER_ID, None, INIT_DATA)
+    version, user_id, rest = token.split(".", 2)
+    forged = [
+        f"{version}.{int(user_id) + 1}.{rest}",
+        token[:-2] + ("AA" if not token.endswith("AA") else "BB"),
+        f"v1.{user_id}.{rest}",
+        "garbage",
+    ]
+    for candidate in forged:
+        assert read_session_token(candidate, INIT_DATA) is None, f"Forged token accepted: {candidate}"
+    print("✅ PASS")
+
+
+def test_4_expiry():
+    """Тест 4: истекший токен → None"""
+    print("\n[TEST 4] ttl_seconds=-1 → None")
+    token, expires_at = issue_session_token(TEST_USER_ID, None, INIT_DATA, ttl_seconds=-1)
+    assert read_session_token(token, INIT_DATA) is None, f"Expired token accepted (expires_at={expires_at})"
+    print("✅ PASS")
+
+
+def test_5_request_with_token(db: Session):
+    """Тест 5: действительный токен в запросе → результат без проверки подписи initData"""
+    print("\n[TEST 5] токен главного бота без X-Telegram-Bot-Id → (user_id, токен главного бота, None)")
+    token, _ = issue_session_token(TEST_USER_ID, None, INIT_DATA)
+    result = authorize(db, token)
+    assert result == (TEST_USER_ID, MAIN_BOT_TOKEN, None), f"Unexpected result {result}"
+
+    token, _ = issue_session_token(TEST_USER_ID, TEST_BOT_ID, INIT_DATA)
+    result = authorize(db, token, bot_hint=str(TEST_BOT_ID))
+    assert result == (TEST_USER_ID, TEST_BOT_TOKEN, TEST_BOT_ID), f"Unexpected result {result}"
+    print("✅ PASS")
+
+
+def test_6_bot_mismatch(db: Session):
+    """Тест 6: токен другого бота игнорируется - initData проверяется обычно (здесь не подписан → 401)"""
+    print("\n[TEST 6] токен главного бота при X-Telegram-Bot-Id=999 → токен не действует, 401")
+    token, _ = issue_session_token(TEST_USER_ID, None, INIT_DATA)
+    try:
+        authorize(db, token, bot_hint=str(TEST_BOT_ID))
+        assert False, "Token of another bot must not authorize the request"
+    except HTTPException as e:
+        assert e.status_code == 401, f"Expected 401, got {e.status_code}"
+    print("✅ PASS")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.Bot).filter(models.Bot.owner_user_id == TEST_USER_ID).delete()
+    db.commit()
+    invalidate_bot_keys()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: токены сессии")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        setup_test_data(db)
+
+        test_1_roundtrip()
+        test_2_bound_to_init_data()
+        test_3_tampered_token()
+        test_4_expiry()
+        test_5_request_with_token(db)
+        test_6_bot_mismatch(db)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
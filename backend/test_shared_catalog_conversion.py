@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для перевода бота в общий каталог (convert_bot_to_shared_catalog):
+отличия копий становятся переопределениями, ссылки на копии переносятся на товары
+основного магазина, а бот с копией без оригинала не переводится.
+
+Запуск: python test_shared_catalog_conversion.py
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.utils.shared_catalog import CATALOG_MODE_SHARED, convert_bot_to_shared_catalog
+
+TEST_USER_ID = 999999999
+TEST_BOT_ID = 999
+
+
+def setup_test_data(db: Session):
+    """
+    Создает бота с копиями каталога и 3 товара основного магазина с копиями в боте:
+    - "same": копия совпадает с оригиналом
+    - "edited": у копии другие цена и скидка
+    - "sold": копия продана и отличается названием
+    На копию "edited" ссылаются резервация, заказ и продажа.
+    """
+    cleanup_test_data(db)
+
+    db.add(models.Bot(id=TEST_BOT_ID, owner_user_id=TEST_USER_ID, bot_token="test_token", is_active=True))
+    db.flush()
+
+    category = models.Category(name="Conversion Category", user_id=TEST_USER_ID, bot_id=TEST_BOT_ID)
+    db.add(category)
+    db.flush()
+
+    ids = {}
+    for key in ("same", "edited", "sold"):
+        group = models.SyncGroup(user_id=TEST_USER_ID)
+        db.add(group)
+        db.flush()
+        main = models.Product(
+            name=f"Conversion {key}", price=100.0, discount=0.0, quantity=1,
+            user_id=TEST_USER_ID, bot_id=None, sync_group_id=group.id
+        )
+        copy = models.Product(
+            name=main.name, price=main.price, discount=main.discount, quantity=1,
+            user_id=TEST_USER_ID, bot_id=TEST_BOT_ID, sync_group_id=group.id, category_id=category.id
+        )
+        db.add_all([main, copy])
+        db.flush()
+        ids[key] = (main.id, copy.id)
+
+    edited = db.get(models.Product, ids["edited"][1])
+    edited.price = 120.0
+    edited.discount = 10.0
+    sold = db.get(models.Product, ids["sold"][1])
+    sold.name = "Conversion sold (bot)"
+    sold.is_sold = True
+
+    copy_id = ids["edited"][1]
+    db.add_all([
+        models.Reservation(
+            product_id=copy_id, user_id=TEST_USER_ID, reserved_by_user_id=7, quantity=1,
+            reserved_until=datetime.utcnow() + timedelta(hours=1), is_active=True
+        ),
+        models.Order(product_id=copy_id, user_id=TEST_USER_ID, ordered_by_user_id=7, quantity=1),
+        models.Sale(product_id=copy_id, user_id=TEST_USER_ID, sold_by_user_id=7, quantity=1),
+    ])
+    db.commit()
+    return ids
+
+
+def references_of(db: Session, product_id: int):
+    """Количество резерваций, заказов и продаж товара"""
+    return tuple(
+        db.query(model).filter(model.product_id == product_id).count()
+        for model in (models.Reservation, models.Order, models.Sale)
+    )
+
+
+def test_1_orphan_blocks_conversion(db: Session, ids: dict):
+    """Тест 1: копия без товара основного магазина → ValueError, в БД ничего не меняется"""
+    print("\n[TEST 1] копия без оригинала → ValueError, бот и копии без изменений")
+    group = models.SyncGroup(user_id=TEST_USER_ID)
+    db.add(group)
+    db.flush()
+    orphan = models.Product(
+        name="Conversion orphan", price=5.0, quantity=1,
+        user_id=TEST_USER_ID, bot_id=TEST_BOT_ID, sync_group_id=group.id
+    )
+    db.add(orphan)
+    db.commit()
+    orphan_id = orphan.id
+
+    try:
+        convert_bot_to_shared_catalog(db.get(models.Bot, TEST_BOT_ID), db)
+        assert False, "Expected ValueError for orphaned copy"
+    except ValueError as e:
+        assert f"#{orphan_id}" in str(e), f"Orphan not named in error: {e}"
+    db.rollback()
+
+    db.expire_all()
+    assert db.get(models.Bot, TEST_BOT_ID).catalog_mode != CATALOG_MODE_SHARED, "Bot must keep copied catalog"
+    assert db.query(models.Product).filter(models.Product.bot_id == TEST_BOT_ID).count() == 4, "Copies must be kept"
+    assert db.query(models.Category).filter(models.Category.bot_id == TEST_BOT_ID).count() == 1
+    assert db.query(models.BotProductOverride).filter(models.BotProductOverride.bot_id == TEST_BOT_ID).count() == 0
+    assert references_of(db, ids["edited"][1]) == (1, 1, 1), "References must stay on the copy"
+
+    db.delete(db.get(models.Product, orphan_id))
+    db.commit()
+    print("✅ PASS")
+
+
+def test_2_overrides_for_differing_fields(db: Session, ids: dict):
+    """Тест 2: переопределения создаются только для отличающихся полей непроданных копий"""
+    print("\n[TEST 2] перевод бота → одно переопределение: price=120, discount=10")
+    stats = convert_bot_to_shared_catalog(db.get(models.Bot, TEST_BOT_ID), db)
+    db.commit()
+    assert stats["overrides"] == 1, f"Expected 1 override, got {stats}"
+    assert stats["products"] == 3 and stats["categories"] == 1, f"Unexpected stats {stats}"
+
+    db.expire_all()
+    overrides = db.query(models.BotProductOverride).filter(models.BotProductOverride.bot_id == TEST_BOT_ID).all()
+    assert len(overrides) == 1, f"Expected 1 override, got {len(overrides)}"
+    override = overrides[0]
+    assert override.product_id == ids["edited"][0], f"Override must belong to main product {ids['edited'][0]}"
+    assert (override.price, override.discount) == (120.0, 10.0), f"Unexpected override {override.price}, {override.discount}"
+    for field in ("name", "description", "is_hidden", "is_hot_offer"):
+        assert getattr(override, field) is None, f"Field {field} must not be overridden"
+    assert db.get(models.Bot, TEST_BOT_ID).catalog_mode == CATALOG_MODE_SHARED
+    print(f"✅ PASS: stats={stats}")
+
+
+def test_3_references_moved(db: Session, ids: dict):
+    """Тест 3: резервации, заказы и продажи копии перенесены на товар основного магазина"""
+    print("\n[TEST 3] ссылки на копию → на товар основного магазина, копии и категории бота удалены")
+    main_id, copy_id = ids["edited"]
+    assert references_of(db, main_id) == (1, 1, 1), f"Expected references on main product, got {references_of(db, main_id)}"
+    assert references_of(db, copy_id) == (0, 0, 0)
+    assert db.query(models.Product).filter(models.Product.bot_id == TEST_BOT_ID).count() == 0, "Copies must be deleted"
+    assert db.query(models.Category).filter(models.Category.bot_id == TEST_BOT_ID).count() == 0
+    print("✅ PASS")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == TEST_USER_ID).delete()
+    db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).delete()
+    db.query(models.BotProductOverride).filter(models.BotProductOverride.user_id == TEST_USER_ID).delete()
+    db.query(models.Reservation).filter(models.Reservation.user_id == TEST_USER_ID).delete()
+    db.query(models.Order).filter(models.Order.user_id == TEST_USER_ID).delete()
+    db.query(models.Sale).filter(models.Sale.user_id == TEST_USER_ID).delete()
+    db.query(models.Product).filter(models.Product.user_id == TEST_USER_ID).delete()
+    db.query(models.SyncGroup).filter(models.SyncGroup.user_id == TEST_USER_ID).delete()
+    db.query(models.Category).filter(models.Category.user_id == TEST_USER_ID).delete()
+    db.query(models.Bot).filter(models.Bot.owner_user_id == TEST_USER_ID).delete()
+    db.commit()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: перевод бота в общий каталог")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        ids = setup_test_data(db)
+
+        test_1_orphan_blocks_conversion(db, ids)
+        test_2_overrides_for_differing_fields(db, ids)
+        test_3_references_moved(db, ids)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Self-check тесты для проекции витрины storefront_items: строки обновляются при коммите
+правок товаров и резерваций и совпадают с полной пересборкой.
+
+Запуск: python test_storefront_projection.py
+"""
+import sys
+import os
+import json
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(__file__))
+
+from sqlalchemy.orm import Session
+from app.db import database, models
+from app.handlers.products_read import get_effective_price
+from app.utils.storefront_projection import rebuild_storefront_items
+
+TEST_USER_ID = 999999999
+TEST_BOT_ID = 999
+
+
+def setup_test_data(db: Session):
+    """Создает бота и 3 товара основного магазина с копиями в боте (одна группа на товар)"""
+    cleanup_test_data(db)
+
+    db.add(models.Bot(id=TEST_BOT_ID, owner_user_id=TEST_USER_ID, bot_token="test_token", is_active=True))
+    db.flush()
+
+    main_ids, copy_ids = [], []
+    for i in range(3):
+        group = models.SyncGroup(user_id=TEST_USER_ID)
+        db.add(group)
+        db.flush()
+        main = models.Product(
+            name=f"Projection Product {i}", price=100.0, quantity=5,
+            user_id=TEST_USER_ID, bot_id=None, sync_group_id=group.id
+        )
+        db.add(main)
+        db.flush()
+        main.sync_product_id = main.id
+        copy = models.Product(
+            name=main.name, price=main.price, quantity=main.quantity,
+            user_id=TEST_USER_ID, bot_id=TEST_BOT_ID, sync_group_id=group.id, sync_product_id=main.id
+        )
+        db.add(copy)
+        db.flush()
+        main_ids.append(main.id)
+        copy_ids.append(copy.id)
+    db.commit()
+
+    return main_ids, copy_ids
+
+
+def get_row(db: Session, product_id: int):
+    """Строка витрины товара (из БД, без кэша сессии)"""
+    db.expire_all()
+    return db.query(models.StorefrontItem).filter(models.StorefrontItem.product_id == product_id).first()
+
+
+def test_1_rows_created(db: Session, main_ids: list, copy_ids: list):
+    """Тест 1: коммит новых товаров → строка витрины у каждого товара"""
+    print("\n[TEST 1] новые товары → строки витрины в основном магазине и в боте")
+    for product_id in main_ids + copy_ids:
+        row = get_row(db, product_id)
+        assert row is not None, f"No storefront row for product {product_id}"
+        product = db.get(models.Product, product_id)
+        assert row.bot_id == product.bot_id, f"Expected bot_id {product.bot_id}, got {row.bot_id}"
+        assert json.loads(row.payload)["name"] == product.name
+    print(f"✅ PASS: rows={len(main_ids + copy_ids)}")
+
+
+def test_2_product_edit(db: Session, main_ids: list):
+    """Тест 2: правка цены и скидки → payload и effective_price строки обновлены"""
+    print("\n[TEST 2] правка цены и скидки → строка обновлена")
+    product = db.get(models.Product, main_ids[0])
+    product.price = 250.0
+    product.discount = 20.0
+    db.commit()
+
+    row = get_row(db, main_ids[0])
+    payload = json.loads(row.payload)
+    assert payload["price"] == 250.0, f"Expected price 250.0, got {payload['price']}"
+    expected = get_effective_price(250.0, 20.0)
+    assert row.effective_price == expected, f"Expected effective_price {expected}, got {row.effective_price}"
+    assert row.has_discount, "Expected has_discount"
+    print(f"✅ PASS: effective_price={row.effective_price}")
+
+
+def test_3_reservation_on_copy(db: Session, main_ids: list, copy_ids: list):
+    """Тест 3: резервация копии в боте видна в строках всех копий группы"""
+    print("\n[TEST 3] резервация копии (quantity=2) → резервация в строках основного магазина и бота")
+    reservation = models.Reservation(
+        product_id=copy_ids[1], user_id=TEST_USER_ID, reserved_by_user_id=7, quantity=2,
+        reserved_until=datetime.utcnow() + timedelta(hours=1), is_active=True
+    )
+    db.add(reservation)
+    db.commit()
+
+    for product_id in (main_ids[1], copy_ids[1]):
+        row = get_row(db, product_id)
+        assert row.reservation is not None, f"Expected reservation in row of product {product_id}"
+        assert json.loads(row.reservation)["active_count"] == 2, f"Expected active_count 2, got {row.reservation}"
+        assert row.reservation_expires_at is not None
+    assert get_row(db, main_ids[2]).reservation is None, "Reservation leaked to another group"
+
+    reservation = db.get(models.Reservation, reservation.id)
+    reservation.is_active = False
+    db.commit()
+    for product_id in (main_ids[1], copy_ids[1]):
+        assert get_row(db, product_id).reservation is None, f"Cancelled reservation still in row of {product_id}"
+    print("✅ PASS")
+
+
+def test_4_sold_and_deleted(db: Session, main_ids: list, copy_ids: list):
+    """Тест 4: проданный и удаленный товары уходят с витрины"""
+    print("\n[TEST 4] продажа и удаление → строки удалены")
+    db.get(models.Product, main_ids[2]).is_sold = True
+    db.delete(db.get(models.Product, copy_ids[2]))
+    db.commit()
+
+    assert get_row(db, main_ids[2]) is None, "Row of sold product must be removed"
+    assert get_row(db, copy_ids[2]) is None, "Row of deleted product must be removed"
+    print("✅ PASS")
+
+
+def test_5_matches_full_rebuild(db: Session):
+    """Тест 5: после всех правок полная пересборка не находит расхождений"""
+    print("\n[TEST 5] полная пересборка → 0 созданных, измененных и удаленных строк")
+    db.expire_all()
+    stats = rebuild_storefront_items(TEST_USER_ID, db)
+    db.rollback()
+    assert not any(stats.values()), f"Projection is stale: {stats}"
+    print(f"✅ PASS: stats={stats}")
+
+
+def cleanup_test_data(db: Session):
+    """Очищает тестовые данные"""
+    db.query(models.StorefrontItem).filter(models.StorefrontItem.user_id == TEST_USER_ID).delete()
+    db.query(models.CatalogDigest).filter(models.CatalogDigest.user_id == TEST_USER_ID).delete()
+    db.query(models.Reservation).filter(models.Reservation.user_id == TEST_USER_ID).delete()
+    db.query(models.Product).filter(models.Product.user_id == TEST_USER_ID).delete()
+    db.query(models.SyncGroup).filter(models.SyncGroup.user_id == TEST_USER_ID).delete()
+    db.query(models.Bot).filter(models.Bot.owner_user_id == TEST_USER_ID).delete()
+    db.commit()
+
+
+def run_tests():
+    """Запускает все тесты"""
+    print("=" * 60)
+    print("SELF-CHECK ТЕСТЫ: проекция витрины storefront_items")
+    print("=" * 60)
+
+    db = next(database.get_db())
+
+    try:
+        main_ids, copy_ids = setup_test_data(db)
+
+        test_1_rows_created(db, main_ids, copy_ids)
+        test_2_product_edit(db, main_ids)
+        test_3_reservation_on_copy(db, main_ids, copy_ids)
+        test_4_sold_and_deleted(db, main_ids, copy_ids)
+        test_5_matches_full_rebuild(db)
+
+        cleanup_test_data(db)
+
+        print("\n" + "=" * 60)
+        print("✅ ВСЕ ТЕСТЫ ПРОЙДЕНЫ")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ ТЕСТ НЕ ПРОЙДЕН: {e}")
+        cleanup_test_data(db)
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ ОШИБКА: {e}")
+        import traceback
+        traceback.print_exc()
+        cleanup_test_data(db)
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -707,6 +707,11 @@ export async function loadShopSettings(shopOwnerId = null) {
     );
 }
 
+// Установка уже загруженных настроек (из GET /api/bootstrap) без повторного запроса
+export function setShopSettings(settings) {
+    shopSettings = settings;
+}
+
 // СТАРЫЙ КОД (закомментирован, будет удален после проверки)
 /*
 export async function loadShopSettings(shopOwnerId = null) {
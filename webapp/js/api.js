@@ -96,7 +96,7 @@ export const fetchOptions = {
 // ========== REFACTORING STEP 2.1: getContext() ==========
 // НОВЫЙ КОД (используется сейчас)
 // Реэкспорт для обратной совместимости
-export { getContext, getShopSettings, updateShopSettings } from './api/context.js';
+export { getBootstrap, getContext, getShopSettings, updateShopSettings } from './api/context.js';
 
 // СТАРЫЙ КОД (закомментирован, будет удален после проверки)
 /*
@@ -158,7 +158,7 @@ export async function getContext(shopOwnerId = null) {
 // ========== REFACTORING STEP 3.1: fetchCategories() ==========
 // НОВЫЙ КОД (используется сейчас)
 // Реэкспорт для обратной совместимости
-export { fetchCategories } from './api/categories.js';
+export { fetchCategories, fetchCategoryTree } from './api/categories.js';
 
 // СТАРЫЙ КОД (закомментирован, будет удален после проверки)
 /*
@@ -204,7 +204,7 @@ export async function fetchCategories(shopOwnerId, botId = null, flat = false) {
 // НОВЫЙ КОД (используется сейчас)
 // Импорт уже добавлен в начале файла
 // Реэкспорт для обратной совместимости
-export { fetchProducts, getSoldProductsAPI } from './api/products_read.js';
+export { fetchProducts, fetchProductsPage, searchProducts, getSoldProductsAPI } from './api/products_read.js';
 
 // СТАРЫЙ КОД (закомментирован, будет удален после проверки)
 /*
@@ -4,6 +4,7 @@
 // Статус: В процессе
 
 import { API_BASE, getBaseHeadersNoAuth } from './config.js';
+import { apiRequest } from './client.js';
 
 // Загрузка категорий (не требует авторизации - только просмотр)
 export async function fetchCategories(shopOwnerId, botId = null, flat = false) {
@@ -85,3 +86,21 @@ export async function fetchCategories(shopOwnerId, botId = null, flat = false) {
 }
 // ========== END REFACTORING STEP 3.1 ==========
 
+// Дерево категорий с количеством видимых товаров (не требует авторизации)
+// Узлы: { id, name, parent_id, product_count, subtree_product_count, subcategories: [...] }
+// subtree_product_count === 0 - в категории и ее подкатегориях нет товаров (можно скрыть)
+export async function fetchCategoryTree(shopOwnerId, botId = null, viewerId = null) {
+    let url = `${API_BASE}/api/categories/tree?user_id=${shopOwnerId}`;
+    if (botId !== null && botId !== undefined) {
+        url += `&bot_id=${botId}`;
+    }
+    if (viewerId !== null && viewerId !== undefined) {
+        url += `&viewer_id=${viewerId}`;
+    }
+    console.log("📂 Fetching category tree from:", url);
+    
+    const data = await apiRequest(url, {
+        headers: getBaseHeadersNoAuth()
+    });
+    return Array.isArray(data) ? data : [];
+}
@@ -1,5 +1,5 @@
 // Базовый HTTP клиент для API запросов
-import { getInitData, requireTelegram } from '../telegram.js';
+import { getAuthBotId, getInitData, getSessionToken, requireTelegram, setSessionToken } from '../telegram.js';
 
 // НАСТРОЙКА АДРЕСА
 export const API_BASE = "https://unmaneuvered-chronogrammatically-otelia.ngrok-free.dev".trim();
@@ -31,6 +31,16 @@ export function getBaseHeaders() {
     }
     
     headers["X-Telegram-Init-Data"] = initData;
+    // Подсказка бота: backend сразу проверяет подпись ключом этого бота
+    const botId = getAuthBotId();
+    if (botId) {
+        headers["X-Telegram-Bot-Id"] = botId;
+    }
+    // Токен сессии: backend авторизует запрос по нему без проверки initData
+    const token = getSessionToken();
+    if (token) {
+        headers["X-Session-Token"] = token;
+    }
     return headers;
 }
 
@@ -43,8 +53,76 @@ export const fetchOptions = {
     }
 };
 
+// Запрос токена сессии, который сейчас выполняется (один на все вызовы ensureSession)
+let sessionRequest = null;
+// После неудачи токен не запрашивается до этого времени (мс); Infinity - до перезагрузки страницы
+let sessionRetryAt = 0;
+let sessionRetryDelayMs = 0;
+const SESSION_RETRY_MIN_MS = 30000;
+const SESSION_RETRY_MAX_MS = 600000;
+
+function sessionFailed(permanent) {
+    if (permanent) {
+        // 4xx: initData не принят или сервер без /api/session - повтор не поможет
+        sessionRetryAt = Infinity;
+        return;
+    }
+    sessionRetryDelayMs = Math.min(Math.max(sessionRetryDelayMs * 2, SESSION_RETRY_MIN_MS), SESSION_RETRY_MAX_MS);
+    sessionRetryAt = Date.now() + sessionRetryDelayMs;
+}
+
+/**
+ * Получить токен сессии (POST /api/session), если действующего нет.
+ * Ошибки не выбрасываются: без токена запросы авторизуются по initData, как раньше.
+ * После неудачи повтор откладывается (ошибка сети/5xx) или не выполняется до перезагрузки (4xx).
+ * @returns {Promise<string|null>} Токен сессии или null
+ */
+export function ensureSession() {
+    const current = getSessionToken();
+    if (current) {
+        return Promise.resolve(current);
+    }
+    if (!getInitData() || Date.now() < sessionRetryAt) {
+        return Promise.resolve(null);
+    }
+    if (!sessionRequest) {
+        sessionRequest = fetch(`${API_BASE}/api/session`, {
+            method: 'POST',
+            headers: getBaseHeaders()
+        })
+            .then(response => {
+                if (!response.ok) {
+                    console.warn(`⚠️ [ensureSession] Session token not issued: ${response.status}`);
+                    sessionFailed(response.status < 500);
+                    return null;
+                }
+                return response.json();
+            })
+            .then(session => {
+                if (!session) {
+                    return null;
+                }
+                setSessionToken(session);
+                sessionRetryDelayMs = 0;
+                return session.token;
+            })
+            .catch(e => {
+                console.warn('⚠️ [ensureSession] Failed to get session token:', e);
+                sessionFailed(false);
+                return null;
+            })
+            .finally(() => {
+                sessionRequest = null;
+            });
+    }
+    return sessionRequest;
+}
+
 // Базовая функция для выполнения запросов с обработкой ошибок
 export async function apiRequest(url, options = {}) {
+    // Токен истек - обновляем в фоне, текущий запрос авторизуется по initData
+    ensureSession();
+
     // #region agent log
     console.log('[DEBUG] apiRequest called:', {url, method: options.method || 'GET', hasHeaders: !!options.headers});
     fetch('http://127.0.0.1:7242/ingest/a529e8ef-268e-4207-8623-432f61be7d3f',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({location:'api/client.js:44',message:'apiRequest entry',data:{url,method:options.method||'GET'},timestamp:Date.now(),sessionId:'debug-session',runId:'run1',hypothesisId:'C'})}).catch(()=>{});
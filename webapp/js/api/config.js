@@ -31,30 +31,8 @@ export function getBaseHeadersNoAuth() {
 // ========== END REFACTORING STEP 1.2 ==========
 
 // ========== REFACTORING STEP 1.3: getBaseHeaders() ==========
-// Импорт необходимых зависимостей для функции авторизации
-import { getInitData } from '../telegram.js';
-
-// Базовые опции для запросов с авторизацией
-export function getBaseHeaders() {
-    const headers = {
-        "ngrok-skip-browser-warning": "69420",
-        "Content-Type": "application/json"
-    };
-    
-    // Добавляем initData в заголовок для валидации на backend
-    // Согласно аудиту: приложение работает ТОЛЬКО через Telegram, initData всегда должен быть доступен
-    // === ИСПРАВЛЕНИЕ: Graceful degradation вместо throw ===
-    const initData = getInitData();
-    if (!initData) {
-        console.warn('⚠️ [getBaseHeaders] No initData available - request will fail on backend');
-        // НЕ выбрасываем ошибку - backend вернет 401, что обработается в getContext()
-        // Возвращаем заголовки без initData для graceful degradation
-        return headers;
-    }
-    
-    headers["X-Telegram-Init-Data"] = initData;
-    return headers;
-}
+// Заголовки с авторизацией (initData, подсказка бота, токен сессии) собираются в одном месте - api/client.js
+export { getBaseHeaders } from './client.js';
 
 // ========== END REFACTORING STEP 1.3 ==========
 
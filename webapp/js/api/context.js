@@ -29,6 +29,34 @@ export async function getContext(shopOwnerId = null) {
     console.log("📡 Fetching context from:", url);
     console.log("📡 Headers keys:", Object.keys(headers));
     
+    return await fetchContextData(url, headers);
+}
+
+// Данные для первого экрана одним запросом: { context, shop_settings, categories, products: { items, next_cursor } }
+// Ошибки те же, что у getContext (app.js различает их по статусу в сообщении)
+// limit - максимальный размер страницы: каталог до 200 товаров приходит целиком, без отдельного запроса товаров
+export async function getBootstrap(shopOwnerId = null, limit = 200) {
+    console.log('🚀 getBootstrap called, shopOwnerId:', shopOwnerId);
+    
+    const telegramUser = requireTelegram();
+    if (telegramUser && telegramUser.isFallback) {
+        throw new Error('Приложение должно открываться через Telegram-бота');
+    }
+    
+    const headers = getBaseHeaders();
+    
+    let url = `${API_BASE}/api/bootstrap?limit=${limit}`;
+    if (shopOwnerId !== null) {
+        url += `&shop_owner_id=${shopOwnerId}`;
+    }
+    
+    console.log("🚀 Fetching bootstrap from:", url);
+    
+    return await fetchContextData(url, headers);
+}
+
+// Загрузка контекста (GET /api/context или /api/bootstrap) с таймаутом
+async function fetchContextData(url, headers) {
     // === ИСПРАВЛЕНИЕ: Добавляем таймаут для предотвращения зависания ===
     const TIMEOUT_MS = 10000; // 10 секунд
     const controller = new AbortController();
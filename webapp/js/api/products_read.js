@@ -59,6 +59,92 @@ export async function fetchProducts(shopOwnerId, categoryId = null, botId = null
     }
 }
 
+// Постраничная загрузка товаров (keyset-пагинация на backend)
+// fields - массив полей для проекции (например ['name', 'price', 'image_url'] для сетки), null - все поля
+// Возвращает { items, next_cursor }; next_cursor === null означает последнюю страницу
+export async function fetchProductsPage(shopOwnerId, { categoryId = null, botId = null, viewerId = null, limit = 50, cursor = null, fields = null, filters = null, sort = null } = {}) {
+    let url = `${API_BASE}/api/products/?user_id=${shopOwnerId}&limit=${limit}`;
+    if (viewerId !== null && viewerId !== undefined) {
+        url += `&viewer_id=${viewerId}`;
+    }
+    if (categoryId !== null) {
+        url += `&category_id=${categoryId}`;
+    }
+    if (botId !== null && botId !== undefined) {
+        url += `&bot_id=${botId}`;
+    }
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    if (fields && fields.length > 0) {
+        url += `&fields=${encodeURIComponent(fields.join(','))}`;
+    }
+    // Фильтры выполняются на сервере: price_min, price_max, hot_offer, in_stock, made_to_order, for_sale, with_discount
+    if (filters) {
+        for (const [key, value] of Object.entries(filters)) {
+            if (value !== null && value !== undefined && value !== '') {
+                url += `&${key}=${encodeURIComponent(value)}`;
+            }
+        }
+    }
+    if (sort) {
+        url += `&sort=${encodeURIComponent(sort)}`;
+    }
+    console.log("📦 Fetching products page from:", url);
+    
+    try {
+        const data = await apiRequest(url, {
+            headers: getBaseHeadersNoAuth()
+        });
+        if (!data || !Array.isArray(data.items)) {
+            console.warn('⚠️ [PRODUCTS API] Page response has no items array:', data);
+            return { items: [], next_cursor: null };
+        }
+        console.log("✅ Products page fetched:", data.items.length, "next_cursor:", data.next_cursor);
+        return data;
+    } catch (e) {
+        console.error("❌ Error fetching products page:", e);
+        throw e;
+    }
+}
+
+// Полнотекстовый поиск товаров на сервере (по названию и описанию, слова ищутся по префиксу)
+// Возвращает { items, next_cursor }, результаты отсортированы по релевантности
+export async function searchProducts(shopOwnerId, query, { categoryId = null, botId = null, viewerId = null, limit = 50, cursor = null, fields = null } = {}) {
+    let url = `${API_BASE}/api/products/search?user_id=${shopOwnerId}&q=${encodeURIComponent(query)}&limit=${limit}`;
+    if (viewerId !== null && viewerId !== undefined) {
+        url += `&viewer_id=${viewerId}`;
+    }
+    if (categoryId !== null) {
+        url += `&category_id=${categoryId}`;
+    }
+    if (botId !== null && botId !== undefined) {
+        url += `&bot_id=${botId}`;
+    }
+    if (cursor) {
+        url += `&cursor=${encodeURIComponent(cursor)}`;
+    }
+    if (fields && fields.length > 0) {
+        url += `&fields=${encodeURIComponent(fields.join(','))}`;
+    }
+    console.log("🔍 Searching products:", url);
+    
+    try {
+        const data = await apiRequest(url, {
+            headers: getBaseHeadersNoAuth()
+        });
+        if (!data || !Array.isArray(data.items)) {
+            console.warn('⚠️ [PRODUCTS API] Search response has no items array:', data);
+            return { items: [], next_cursor: null };
+        }
+        console.log("✅ Products found:", data.items.length, "next_cursor:", data.next_cursor);
+        return data;
+    } catch (e) {
+        console.error("❌ Error searching products:", e);
+        throw e;
+    }
+}
+
 
 // ========== END REFACTORING STEP 4.1 ==========
 
@@ -1,10 +1,11 @@
 // Главный файл приложения - инициализация и координация модулей
-import { initAdmin, loadShopSettings, openAdmin } from './admin.js';
-import { getContext } from './api.js';
+import { initAdmin, loadShopSettings, openAdmin, setShopSettings } from './admin.js';
+import { getBootstrap } from './api.js';
+import { ensureSession } from './api/client.js';
 import { initCart, loadCart, loadOrders, loadPurchases, setupCartButton, setupCartModal, updateCartUI } from './cart.js';
 import { initSettingsModal, openSettings } from './handlers/admin_settings_modal.js';
 import { initProfile, setupProfileButton } from './profile.js';
-import { getInitData, getTelegramInstance, initTelegram, requireTelegram } from './telegram.js';
+import { getInitData, getTelegramInstance, initTelegram, requireTelegram, setAuthBotId } from './telegram.js';
 // Импорт функций категорий из отдельного модуля (рефакторинг)
 import {
     categoriesHierarchy,
@@ -29,7 +30,7 @@ import { applyFilters, initFilters, initFiltersDependencies, updateProductFilter
 // Импорт функций настройки модальных окон из отдельного модуля (рефакторинг)
 import { initModalsDependencies, setupModals } from './modals.js';
 // Импорт функций загрузки данных из отдельного модуля (рефакторинг)
-import { initDataDependencies, loadData, updateShopNameInHeader } from './data.js';
+import { initDataDependencies, loadData, setBootstrapData, updateShopNameInHeader } from './data.js';
 // Импорт функций переключения вида карточек
 import { initCardViewToggle } from './handlers/cardViewToggle.js';
 // Импорт remoteLogger для отладки
@@ -37,6 +38,7 @@ import { initRemoteLogger } from './utils/remoteLogger.js';
 
 // Глобальные переменные
 let appContext = null; // Контекст магазина (viewer_id, shop_owner_id, role, permissions)
+let bootstrapShopSettings = null; // Настройки магазина из GET /api/bootstrap
 
 // Состояние фильтров
 let allProducts = []; // Все товары для фильтрации на клиенте
@@ -298,7 +300,18 @@ document.addEventListener('DOMContentLoaded', async () => {
             }
         }
         
-        appContext = await getContext(shopOwnerId);
+        // Токен сессии запрашивается параллельно с bootstrap: следующие запросы
+        // авторизуются по нему без проверки initData на backend
+        ensureSession();
+        
+        // Контекст, настройки, категории и первая страница товаров одним запросом
+        const bootstrap = await getBootstrap(shopOwnerId);
+        appContext = bootstrap ? bootstrap.context : null;
+        if (appContext) {
+            setAuthBotId(appContext.auth_bot_id);
+        }
+        bootstrapShopSettings = bootstrap ? bootstrap.shop_settings : null;
+        setBootstrapData(bootstrap);
         
         if (!appContext) {
             throw new Error('Context is null after loading');
@@ -401,14 +414,22 @@ document.addEventListener('DOMContentLoaded', async () => {
     setupCartButton();
     initCart();
     
-    // 8. Загружаем настройки магазина
+    // 8. Загружаем настройки магазина (если они уже пришли в bootstrap - без запроса)
     if (appContext.role === 'owner') {
         // Для владельца загружаем свои настройки
-        await loadShopSettings();
+        if (bootstrapShopSettings) {
+            setShopSettings(bootstrapShopSettings);
+        } else {
+            await loadShopSettings();
+        }
         initAdmin();
     } else {
         // Для клиентов загружаем настройки владельца магазина
-        await loadShopSettings(appContext.shop_owner_id);
+        if (bootstrapShopSettings) {
+            setShopSettings(bootstrapShopSettings);
+        } else {
+            await loadShopSettings(appContext.shop_owner_id);
+        }
     }
     
     // 8.1 Инициализируем личный кабинет для всех пользователей
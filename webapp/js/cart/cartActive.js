@@ -136,7 +136,7 @@ export async function loadCart(updateCartUI = null) {
                 cartItem.innerHTML = `
                     <div class="cart-item-info">
                         <h3>${product.name}</h3>
-                        <p class="cart-item-price">${priceDisplay}</p>
+                        <p class="cart-item-price">${priceDisplay}${reservation.quantity > 1 ? ` × ${reservation.quantity} шт.` : ''}</p>
                         <p class="cart-item-time">⏰ До ${timeText}</p>
                         ${dateText ? `<p style="font-size: 12px; color: var(--tg-theme-hint-color); margin-top: 4px;">📅 ${dateText}</p>` : ''}
                     </div>
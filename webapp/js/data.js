@@ -13,6 +13,8 @@ let productsGridElement = null;
 let allProductsGetter = null;
 let allProductsSetter = null;
 let userNameElement = null;
+// Данные первого экрана из GET /api/bootstrap (используются один раз при первой загрузке)
+let bootstrapData = null;
 
 // Инициализация зависимостей
 export function initDataDependencies(dependencies) {
@@ -23,6 +25,11 @@ export function initDataDependencies(dependencies) {
     userNameElement = dependencies.userNameElement;
 }
 
+// Сохранение ответа GET /api/bootstrap, чтобы не запрашивать категории, товары и настройки повторно
+export function setBootstrapData(data) {
+    bootstrapData = data;
+}
+
 // Загрузка данных (категории и товары)
 export async function loadData() {
     console.log('🚀 loadData() called');
@@ -43,6 +50,11 @@ export async function loadData() {
         productsGridElement.innerHTML = '<p class="loading">Загрузка товаров...</p>';
     }
     
+    // Данные из bootstrap используются только для первой загрузки, дальше - обычные запросы
+    const bootstrap = bootstrapData && bootstrapData.context &&
+        bootstrapData.context.shop_owner_id === appContext.shop_owner_id ? bootstrapData : null;
+    bootstrapData = null;
+    
     try {
         console.log('📦 Loading data for shop_owner_id:', appContext.shop_owner_id);
         console.log('📦 API_BASE:', API_BASE);
@@ -64,7 +76,12 @@ export async function loadData() {
         let categories = [];
         try {
             // Загружаем категории с иерархией (flat=false для отображения)
-            categories = await fetchCategories(appContext.shop_owner_id, botId, false);
+            if (bootstrap && Array.isArray(bootstrap.categories)) {
+                categories = bootstrap.categories;
+                console.log('📂 Categories taken from bootstrap');
+            } else {
+                categories = await fetchCategories(appContext.shop_owner_id, botId, false);
+            }
             console.log('✅ Step 1 complete: Categories loaded:', categories.length);
         } catch (e) {
             console.error('❌ [DATA] Ошибка при загрузке категорий:', e);
@@ -179,7 +196,13 @@ export async function loadData() {
         // === ИСПРАВЛЕНИЕ: Безопасная загрузка товаров с обработкой ошибок ===
         let products = [];
         try {
-            products = await fetchProducts(appContext.shop_owner_id, null, botId, viewerId); // Загружаем все товары
+            // Если весь каталог поместился в первую страницу bootstrap - повторный запрос не нужен
+            if (bootstrap && bootstrap.products && Array.isArray(bootstrap.products.items) && !bootstrap.products.next_cursor) {
+                products = bootstrap.products.items;
+                console.log('📦 Products taken from bootstrap');
+            } else {
+                products = await fetchProducts(appContext.shop_owner_id, null, botId, viewerId); // Загружаем все товары
+            }
             console.log('✅ Step 2 complete: Products loaded:', products.length);
         } catch (e) {
             console.error('❌ [DATA] Ошибка при загрузке товаров:', e);
@@ -269,8 +292,10 @@ export async function updateShopNameInHeader() {
         console.log(`🏷️ Updating shop name header for shop_owner_id: ${currentShopOwnerId}`);
         
         try {
-            // Загружаем настройки заново для текущего магазина
-            const shopSettings = await getShopSettings(currentShopOwnerId);
+            // Загружаем настройки заново для текущего магазина (при первом запуске они уже пришли в bootstrap)
+            const fromBootstrap = bootstrapData && bootstrapData.shop_settings &&
+                bootstrapData.context && bootstrapData.context.shop_owner_id === currentShopOwnerId;
+            const shopSettings = fromBootstrap ? bootstrapData.shop_settings : await getShopSettings(currentShopOwnerId);
             console.log(`🏷️ Shop settings loaded for shop_owner_id ${currentShopOwnerId}:`, shopSettings);
             
             const shopName = shopSettings && shopSettings.shop_name ? shopSettings.shop_name : 'Магазин';
@@ -279,7 +304,9 @@ export async function updateShopNameInHeader() {
             }
             
             // Обновляем глобальную переменную для других частей приложения
-            await loadShopSettings(currentShopOwnerId);
+            if (!fromBootstrap) {
+                await loadShopSettings(currentShopOwnerId);
+            }
             console.log(`✅ Shop name header updated to: "${shopName}"`);
         } catch (error) {
             console.error(`❌ Error loading shop settings for header (shop_owner_id: ${currentShopOwnerId}):`, error);
@@ -143,8 +143,8 @@ export async function loadReservations(dependencies = {}) {
             
             const product = productsMap.get(reservation.product_id);
             const productName = product?.name || `Товар #${reservation.product_id}`;
-            // В резервации нет поля quantity, всегда 1
-            const quantity = 1;
+            // Зарезервированное количество (у старых резерваций поля нет - 1)
+            const quantity = reservation.quantity || 1;
             // Парсим дату: бекенд возвращает UTC время без timezone, добавляем Z
             let reservedUntilStr = reservation.reserved_until;
             if (!reservedUntilStr.includes('Z') && !reservedUntilStr.includes('+') && !reservedUntilStr.includes('-', 10)) {
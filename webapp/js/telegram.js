@@ -89,6 +89,103 @@ export function isTelegramAvailable() {
     return !!tg && !!window.Telegram && !!window.Telegram.WebApp;
 }
 
+// Бот, подписавший initData (auth_bot_id из контекста): backend проверяет его ключ первым
+const AUTH_BOT_ID_KEY = 'auth_bot_id';
+let authBotId = null;
+
+/**
+ * Запомнить бота, через которого открыт WebApp (из ответа /api/context или /api/bootstrap)
+ * @param {number|null} botId - ID бота или null для главного бота
+ */
+export function setAuthBotId(botId) {
+    authBotId = botId !== undefined && botId !== null ? String(botId) : null;
+    try {
+        if (authBotId) {
+            sessionStorage.setItem(AUTH_BOT_ID_KEY, authBotId);
+        } else {
+            sessionStorage.removeItem(AUTH_BOT_ID_KEY);
+        }
+    } catch (e) {
+        // sessionStorage может быть недоступен - подсказка просто не переживет перезагрузку
+    }
+}
+
+/**
+ * ID бота для заголовка X-Telegram-Bot-Id
+ * @returns {string|null}
+ */
+export function getAuthBotId() {
+    if (authBotId === null) {
+        try {
+            authBotId = sessionStorage.getItem(AUTH_BOT_ID_KEY);
+        } catch (e) {
+            authBotId = null;
+        }
+    }
+    return authBotId;
+}
+
+// Токены сессии (POST /api/session) по ботам: пока токен действует, backend не проверяет initData.
+// Токен выдан для конкретного бота и initData - в WebView другого бота нужен свой токен
+const SESSION_TOKENS_KEY = 'session_tokens';
+// Токен, истекающий раньше чем через столько секунд, считается истекшим (запрос не успеет)
+const SESSION_TOKEN_MARGIN_SEC = 60;
+let sessionTokens = null;
+
+function sessionBotKey(botId) {
+    return botId !== undefined && botId !== null ? String(botId) : 'main';
+}
+
+function loadSessionTokens() {
+    if (sessionTokens === null) {
+        try {
+            sessionTokens = JSON.parse(sessionStorage.getItem(SESSION_TOKENS_KEY) || '{}') || {};
+        } catch (e) {
+            sessionTokens = {};
+        }
+    }
+    return sessionTokens;
+}
+
+/**
+ * Запомнить токен сессии бота, выдавшего его
+ * @param {Object} session - {token, expires_at, user_id, bot_id} из ответа /api/session
+ */
+export function setSessionToken(session) {
+    if (!session || !session.token) {
+        return;
+    }
+    const tokens = loadSessionTokens();
+    tokens[sessionBotKey(session.bot_id)] = {
+        token: session.token,
+        expiresAt: session.expires_at,
+        userId: session.user_id,
+        authDate: tg && tg.initDataUnsafe ? tg.initDataUnsafe.auth_date : null
+    };
+    try {
+        sessionStorage.setItem(SESSION_TOKENS_KEY, JSON.stringify(tokens));
+    } catch (e) {
+        // sessionStorage может быть недоступен - токен будет получен заново после перезагрузки
+    }
+}
+
+/**
+ * Действующий токен сессии текущего бота (getAuthBotId) для заголовка X-Session-Token
+ * @returns {string|null}
+ */
+export function getSessionToken() {
+    const session = loadSessionTokens()[sessionBotKey(getAuthBotId())];
+    if (!session || session.expiresAt - SESSION_TOKEN_MARGIN_SEC <= Date.now() / 1000) {
+        return null;
+    }
+    // Токен выдан для другого initData (WebApp открыт заново в той же вкладке)
+    const unsafe = tg && tg.initDataUnsafe ? tg.initDataUnsafe : null;
+    if (unsafe && ((unsafe.user && unsafe.user.id !== session.userId) || unsafe.auth_date !== session.authDate)) {
+        return null;
+    }
+    return session.token;
+}
+
 /**
  * Получить initData из Telegram WebApp
  * @returns {string|null} initData строка или null если Telegram недоступен